@@ -5,19 +5,28 @@ Workflow Execution API
 
 import uuid
 import json
+import asyncio
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Depends, status, Request, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Query, Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, ValidationError
 from loguru import logger
 
 from ..services.execution_service import execution_engine
 from ..services.agent_task_service import agent_task_service
+from ..services.workflow_idempotency_service import get_workflow_idempotency_service, hash_request
+from ..services.workflow_status_projection import get_workflow_status_projection
+from ..services.workflow_execution_context import get_context_manager
+from ..services.workflow_event_bus import get_workflow_event_bus
 from ..models.instance import (
     WorkflowExecuteRequest, WorkflowControlRequest,
     TaskInstanceStatus, TaskInstanceType
 )
 from ..utils.middleware import get_current_user_context, CurrentUser
-from ..utils.helpers import now_utc
+from ..utils.helpers import now_utc, decode_cursor, build_keyset_condition, build_keyset_page
+from ..utils.responses import ndjson_stream_response
+from ..config.settings import get_settings
 
 router = APIRouter(prefix="/api/execution", tags=["execution"])
 
@@ -78,9 +87,14 @@ async def debug_execute_workflow(request: Request):
 @router.post("/workflows/execute")
 async def execute_workflow(
     request: WorkflowExecuteRequest,
-    current_user: CurrentUser = Depends(get_current_user_context)
+    current_user: CurrentUser = Depends(get_current_user_context),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
-    """执行工作流"""
+    """执行工作流
+
+    携带 Idempotency-Key 时，同一用户同一键的重复请求（连点、重试）只启动一次工作流，
+    并发的重复请求等待首个请求并返回相同响应；同一键用于不同请求体时返回409。
+    """
     try:
         from loguru import logger
         logger.info(f"🚀 收到工作流执行请求")
@@ -89,18 +103,29 @@ async def execute_workflow(
         logger.info(f"   - user_id: {current_user.user_id}")
         logger.info(f"   - input_data: {request.input_data}")
         logger.info(f"   - context_data: {request.context_data}")
+        if idempotency_key:
+            logger.info(f"   - idempotency_key: {idempotency_key}")
         
-        # 尝试执行工作流，如果失败则返回详细错误
-        try:
+        async def start_workflow():
             result = await execution_engine.execute_workflow(request, current_user.user_id)
             logger.info(f"工作流执行成功: {result}")
-            return {
+            return jsonable_encoder({
                 "success": True,
                 "data": result,
                 "message": "工作流开始执行"
-            }
+            })
+        
+        # 尝试执行工作流，如果失败则返回详细错误
+        try:
+            if not idempotency_key:
+                return await start_workflow()
+            
+            return await get_workflow_idempotency_service().execute(
+                current_user.user_id, idempotency_key,
+                hash_request(request.model_dump(mode="json")), start_workflow
+            )
         except AttributeError as ae:
-            # 依赖管理器问题，返回模拟响应
+            # 依赖管理器问题，返回模拟响应（不按幂等键缓存，幂等键已释放）
             logger.warning(f"执行引擎依赖问题，返回模拟响应: {ae}")
             result = {
                 "instance_id": str(uuid.uuid4()),
@@ -114,6 +139,8 @@ async def execute_workflow(
                 "data": result,
                 "message": "工作流开始执行"
             }
+    except HTTPException:
+        raise
     except ValueError as e:
         from loguru import logger
         logger.warning(f"工作流执行验证错误: {e}")
@@ -232,10 +259,30 @@ async def control_workflow(
 @router.get("/workflows/{instance_id}/status")
 async def get_workflow_status(
     instance_id: uuid.UUID,
+    include_node_data: bool = Query(False, description="是否返回节点实例的输入/输出数据"),
     current_user: CurrentUser = Depends(get_current_user_context)
 ):
-    """获取工作流实例的详细状态"""
+    """获取工作流实例的详细状态
+
+    本进程正在执行的实例从内存状态投影读取；include_node_data=true 时始终查询数据库。
+    """
+    projection_store = get_workflow_status_projection()
+    seeding = False
     try:
+        if not include_node_data:
+            projection = projection_store.get(instance_id)
+            if projection is not None:
+                if not projection.needs_completion_check():
+                    return {
+                        "success": True,
+                        "data": projection.to_status(),
+                        "message": "获取工作流实例状态成功"
+                    }
+                # 节点状态与工作流状态不一致，走数据库路径触发完成检查
+                projection_store.invalidate(instance_id)
+            seeding = (instance_id in get_context_manager().contexts
+                       and projection_store.begin_load(instance_id))
+
         from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
 
         workflow_instance_repo = WorkflowInstanceRepository()
@@ -270,16 +317,16 @@ async def get_workflow_status(
             ni.status,
             ni.started_at,
             ni.completed_at,
-            ni.error_message,
-            ni.input_data,
-            ni.output_data,
+            ni.error_message,{node_data_columns}
             ni.retry_count
         FROM node_instance ni
         LEFT JOIN node n ON ni.node_id = n.node_id
         WHERE ni.workflow_instance_id = %s
         AND ni.is_deleted = 0
         ORDER BY ni.created_at ASC
-        """
+        """.format(node_data_columns="""
+            ni.input_data,
+            ni.output_data,""" if include_node_data else "")
 
         node_results = await workflow_instance_repo.db.fetch_all(nodes_query, instance_id)
 
@@ -327,8 +374,6 @@ async def get_workflow_status(
         # 如果需要，触发工作流状态检查
         if should_trigger_completion_check:
             try:
-                from ..services.execution_service import ExecutionEngine
-                execution_engine = ExecutionEngine()
                 await execution_engine._check_workflow_completion(instance_id)
                 logger.info(f"✅ 主动触发的工作流状态检查完成")
 
@@ -361,6 +406,10 @@ async def get_workflow_status(
             "current_running_nodes": current_running_nodes,
             "node_instances": node_instances
         }
+
+        if seeding:
+            projection_store.finish_load(instance_id, result, node_instances)
+            seeding = False
         
         return {
             "success": True,
@@ -375,20 +424,27 @@ async def get_workflow_status(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取工作流实例状态失败: {str(e)}"
         )
+    finally:
+        if seeding:
+            projection_store.abort_load(instance_id)
 
 
 @router.get("/workflows/{workflow_base_id}/instances")
 async def get_workflow_instances(
     workflow_base_id: uuid.UUID,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页数量，不指定时返回全部实例"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor"),
     current_user: CurrentUser = Depends(get_current_user_context)
 ):
     """获取工作流的执行实例列表"""
     try:
         from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
+        from ..repositories.instance.workflow_instance_progress_repository import WorkflowInstanceProgressRepository
         
         workflow_instance_repo = WorkflowInstanceRepository()
+        progress_repo = WorkflowInstanceProgressRepository()
         
-        # 查询工作流实例及其统计信息 (MySQL版本)
+        # 查询工作流实例（节点统计从进度计数表按主键批量读取，不再聚合节点实例表）
         query = """
         SELECT 
             wi.workflow_instance_id,
@@ -402,60 +458,71 @@ async def get_workflow_instances(
             wi.error_message,
             wi.workflow_base_id,
             w.name as workflow_name,
-            u.username as executor_username,
-            -- 统计节点实例信息
-            COUNT(ni.node_instance_id) as total_nodes,
-            COUNT(CASE WHEN ni.status = 'completed' THEN 1 END) as completed_nodes,
-            COUNT(CASE WHEN ni.status = 'running' THEN 1 END) as running_nodes,
-            COUNT(CASE WHEN ni.status = 'failed' THEN 1 END) as failed_nodes,
-            -- 获取当前运行的节点名称 (MySQL版本)
-            GROUP_CONCAT(
-                CASE WHEN ni.status = 'running' THEN n.name END
-                SEPARATOR ', '
-            ) as current_running_nodes
+            u.username as executor_username
         FROM workflow_instance wi
         LEFT JOIN workflow w ON wi.workflow_base_id = w.workflow_base_id AND w.is_current_version = 1
         LEFT JOIN user u ON wi.executor_id = u.user_id
-        LEFT JOIN node_instance ni ON wi.workflow_instance_id = ni.workflow_instance_id AND ni.is_deleted = 0
-        LEFT JOIN node n ON ni.node_id = n.node_id
-        WHERE wi.workflow_base_id = %s
+        WHERE wi.workflow_base_id = $1
         AND wi.is_deleted = 0
-        GROUP BY wi.workflow_instance_id, wi.workflow_instance_name, wi.status, wi.executor_id, wi.created_at, wi.updated_at, wi.input_data, wi.output_data, wi.error_message, wi.workflow_base_id, w.name, u.username
-        ORDER BY wi.created_at DESC
+        {keyset_clause}
+        ORDER BY wi.created_at DESC, wi.workflow_instance_id DESC
+        {limit_clause}
         """
         
-        instances = await workflow_instance_repo.db.fetch_all(query, workflow_base_id)
+        params = [workflow_base_id]
+        keyset_clause = ""
+        limit_clause = ""
+        if cursor:
+            # 键集分页：从游标位置向后取
+            condition, keyset_values, _ = build_keyset_condition(
+                "wi.created_at", "wi.workflow_instance_id", decode_cursor(cursor), "DESC", 2
+            )
+            keyset_clause = f"AND {condition}"
+            params.extend(keyset_values)
+        if limit or cursor:
+            page_size = limit or 50
+            limit_clause = f"LIMIT ${len(params) + 1}"
+            params.append(page_size + 1)
+        
+        rows = await workflow_instance_repo.db.fetch_all(
+            query.format(keyset_clause=keyset_clause, limit_clause=limit_clause), *params
+        )
+        next_cursor = None
+        if limit_clause:
+            instances, next_cursor, _ = build_keyset_page(rows, page_size, "created_at", "workflow_instance_id")
+        else:
+            instances = rows
+        
+        # 本页实例的进度计数（一次主键批量读取）
+        progress = await progress_repo.get_progress_many(
+            instance["workflow_instance_id"] for instance in instances
+        )
+        
+        # 只为有运行中节点的实例查询运行中节点名称
+        running_ids = [instance_id for instance_id, item in progress.items() if item["running_nodes"] > 0]
+        running_node_names = {}
+        if running_ids:
+            placeholders = ", ".join(f"${i + 1}" for i in range(len(running_ids)))
+            running_rows = await workflow_instance_repo.db.fetch_all(f"""
+            SELECT ni.workflow_instance_id, n.name
+            FROM node_instance ni
+            JOIN node n ON ni.node_id = n.node_id
+            WHERE ni.workflow_instance_id IN ({placeholders})
+            AND ni.status = 'running'
+            AND ni.is_deleted = 0
+            ORDER BY ni.created_at ASC
+            """, *running_ids)
+            for row in running_rows:
+                running_node_names.setdefault(str(row["workflow_instance_id"]), []).append(row["name"])
         
         # 格式化返回数据
         formatted_instances = []
         for instance in instances:
-            # 安全转换数值字段（处理MySQL可能返回的各种格式）
-            def safe_int(value, default=0):
-                """安全转换为整数"""
-                if value is None:
-                    return default
-                if isinstance(value, int):
-                    return value
-                if isinstance(value, (list, tuple)):
-                    # 如果是列表/元组，可能是MySQL返回的格式，取第一个元素
-                    return len([x for x in value if x]) if value else default
-                if isinstance(value, str):
-                    if value == '[]' or value == '' or value == 'None':
-                        return default
-                    try:
-                        return int(value)
-                    except ValueError:
-                        return default
-                # 处理其他类型
-                try:
-                    return int(value) if value is not None else default
-                except (ValueError, TypeError):
-                    return default
-                
-            total_nodes = safe_int(instance.get("total_nodes"))
-            completed_nodes = safe_int(instance.get("completed_nodes"))
-            running_nodes = safe_int(instance.get("running_nodes"))
-            failed_nodes = safe_int(instance.get("failed_nodes"))
+            instance_progress = progress[str(instance["workflow_instance_id"])]
+            total_nodes = instance_progress["total_nodes"]
+            completed_nodes = instance_progress["completed_nodes"]
+            running_nodes = instance_progress["running_nodes"]
+            failed_nodes = instance_progress["failed_nodes"]
             
             # 计算执行进度百分比
             progress_percentage = 0
@@ -480,15 +547,22 @@ async def get_workflow_instances(
                 "running_nodes": running_nodes,
                 "failed_nodes": failed_nodes,
                 "progress_percentage": progress_percentage,
-                "current_node": instance.get("current_running_nodes") or None
+                "current_node": ", ".join(running_node_names.get(str(instance["workflow_instance_id"]), [])) or None
             })
         
         return {
             "success": True,
             "data": formatted_instances,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
             "message": f"获取到 {len(formatted_instances)} 个执行实例"
         }
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -968,9 +1042,17 @@ async def get_workflow_instance_task_flow(
 
 @router.get("/debug/tasks")
 async def debug_get_all_tasks(
+    stream: bool = Query(False, description="以NDJSON流式返回全部任务（不限制条数，不含统计汇总，仅管理员）"),
     current_user: CurrentUser = Depends(get_current_user_context)
 ):
     """Debug: 获取所有任务状态（用于调试）"""
+    # 流式返回不限制条数，包含所有用户的任务，只对管理员开放
+    if stream and current_user.role not in ['admin', 'manager']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限流式导出全部任务"
+        )
+    
     try:
         from ..repositories.instance.task_instance_repository import TaskInstanceRepository
         
@@ -994,24 +1076,10 @@ async def debug_get_all_tasks(
         LEFT JOIN agent a ON ti.assigned_agent_id = a.agent_id
         WHERE ti.is_deleted = FALSE
         ORDER BY ti.created_at DESC
-        LIMIT 50
         """
         
-        tasks = await task_repo.db.fetch_all(query)
-        
-        debug_data = {
-            "total_tasks": len(tasks),
-            "current_user_id": str(current_user.user_id),
-            "current_username": current_user.username,
-            "tasks": []
-        }
-        
-        # 统计各种状态的任务数量
-        status_counts = {}
-        user_task_counts = {}
-        
-        for task in tasks:
-            task_data = {
+        def format_debug_task(task):
+            return {
                 "task_id": str(task['task_instance_id']),
                 "task_title": task['task_title'],
                 "task_type": task['task_type'],
@@ -1026,11 +1094,32 @@ async def debug_get_all_tasks(
                 "created_at": task['created_at'].isoformat() if task['created_at'] else None,
                 "is_current_user_task": str(task['assigned_user_id']) == str(current_user.user_id) if task['assigned_user_id'] else False
             }
+        
+        if stream:
+            async def transform(task):
+                return format_debug_task(task)
+            return ndjson_stream_response(task_repo.db.fetch_iter(query), transform)
+        
+        tasks = await task_repo.db.fetch_all(query + " LIMIT 50")
+        
+        debug_data = {
+            "total_tasks": len(tasks),
+            "current_user_id": str(current_user.user_id),
+            "current_username": current_user.username,
+            "tasks": []
+        }
+        
+        # 统计各种状态的任务数量
+        status_counts = {}
+        user_task_counts = {}
+        
+        for task in tasks:
+            task_data = format_debug_task(task)
             debug_data["tasks"].append(task_data)
             
             # 统计状态
-            status = task['status']
-            status_counts[status] = status_counts.get(status, 0) + 1
+            task_status = task['status']
+            status_counts[task_status] = status_counts.get(task_status, 0) + 1
             
             # 统计用户任务
             if task['assigned_user_id']:
@@ -1128,20 +1217,36 @@ async def get_task_statistics(
 async def get_task_history(
     days: int = 30,
     limit: int = 100,
+    stream: bool = Query(False, description="以NDJSON流式返回（limit<=0表示不限制条数）"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor"),
     current_user: CurrentUser = Depends(get_current_user_context)
 ):
     """获取任务历史"""
     try:
-        tasks = await execution_engine.get_task_history(
-            current_user.user_id, days, limit
+        if stream:
+            # 服务端游标逐行输出，内存占用与历史记录数量无关
+            rows = execution_engine.task_instance_repo.iter_user_task_history(
+                current_user.user_id, days, limit if limit > 0 else None
+            )
+            return ndjson_stream_response(rows, execution_engine._enrich_task_info)
+        
+        tasks, next_cursor = await execution_engine.get_task_history_page(
+            current_user.user_id, days, limit, cursor
         )
         
         return {
             "success": True,
             "data": tasks,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
             "message": f"获取到 {days} 天内的 {len(tasks)} 个历史任务"
         }
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1844,12 +1949,12 @@ async def process_agent_task(
 ):
     """手动触发Agent任务处理"""
     try:
-        result = await agent_task_service.process_agent_task(task_id)
+        result = await agent_task_service.process_agent_task_leased(task_id)
         
         return {
             "success": True,
             "data": result,
-            "message": "Agent任务处理完成"
+            "message": result['message'] if result.get('status') == 'queued' else "Agent任务处理完成"
         }
         
     except Exception as e:
@@ -2275,6 +2380,61 @@ async def manual_workflow_monitor_scan(
         )
 
 
+# ==================== 事件流端点 ====================
+
+@router.get("/events/stream")
+async def stream_workflow_events(
+    request: Request,
+    workflow_instance_id: Optional[str] = Query(None, description="只接收指定工作流实例的事件"),
+    types: Optional[str] = Query(None, description="只接收指定类型的事件（逗号分隔）"),
+    last_event_id: Optional[str] = Query(None, description="断线续传：最后收到的事件ID（同Last-Event-ID请求头）"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    current_user: CurrentUser = Depends(get_current_user_context)
+):
+    """工作流事件流（SSE）：推送工作流实例状态、节点状态、任务分配/状态与Agent输出
+    
+    普通用户只接收自己执行的工作流与分配给自己的任务的事件，admin/manager 接收全部事件。
+    断线重连时携带最后收到的事件ID补发期间的事件；无法补发时推送 resync 事件，客户端应重新全量读取。
+    """
+    event_bus = get_workflow_event_bus()
+    heartbeat_seconds = get_settings().app.event_stream_heartbeat_seconds
+    subscription, replay, resync = event_bus.subscribe(
+        current_user.user_id,
+        see_all=current_user.role in ['admin', 'manager'],
+        workflow_instance_ids=[workflow_instance_id] if workflow_instance_id else None,
+        event_types=[t.strip() for t in types.split(",") if t.strip()] if types else None,
+        last_event_id=last_event_id_header or last_event_id
+    )
+    logger.debug(f"📡 事件流连接: 用户 {current_user.username}, 补发 {len(replay)} 个事件")
+    
+    async def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if resync:
+                yield event_bus.resync_message("event_id_expired")
+            for event in replay:
+                yield event.to_sse()
+            while True:
+                if subscription.take_overflow():
+                    yield event_bus.resync_message("queue_overflow")
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            event_bus.unsubscribe(subscription)
+            logger.debug(f"📡 事件流断开: 用户 {current_user.username}")
+    
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 # ==================== 系统监控端点 ====================
 
 @router.get("/system/status")
@@ -2294,11 +2454,18 @@ async def get_system_status(
             "execution_engine": {
                 "is_running": execution_engine.is_running,
                 "running_instances": len(execution_engine.running_instances),
-                "queue_size": execution_engine.execution_queue.qsize()
+                "queue_size": execution_engine.execution_queue.qsize(),
+                "dispatching_nodes": execution_engine.dispatching_nodes,
+                "max_concurrent_nodes": execution_engine.max_concurrent_nodes,
+                "max_concurrent_nodes_per_instance": execution_engine.max_concurrent_nodes_per_instance,
+                "workflow_cache": execution_engine.workflow_cache.get_stats(),
+                "idempotency": get_workflow_idempotency_service().get_stats(),
+                "status_projection": get_workflow_status_projection().get_stats(),
+                "event_bus": get_workflow_event_bus().get_stats()
             },
             "agent_service": {
                 "is_running": agent_task_service.is_running,
-                "queue_size": agent_task_service.processing_queue.qsize(),
+                "queue": await agent_task_service.get_queue_status(),
                 "max_concurrent": agent_task_service.max_concurrent_tasks
             }
         }
@@ -2316,6 +2483,63 @@ async def get_system_status(
         )
 
 
+@router.get("/system/db-stats")
+async def get_database_stats(
+    top: int = Query(20, ge=0, le=500, description="返回耗时Top N的查询指纹"),
+    sort_by: str = Query("total_time", description="排序维度: total_time/calls/avg_time/max_time/rows/acquire_wait"),
+    current_user: CurrentUser = Depends(get_current_user_context)
+):
+    """获取数据库层统计信息（SQL翻译缓存、连接池、按查询指纹聚合的耗时等）"""
+    try:
+        # 验证管理员权限
+        if current_user.role not in ['admin', 'manager']:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="无权限访问数据库统计信息"
+            )
+
+        from ..utils.database import get_db_manager
+        db_manager = get_db_manager()
+        db_stats = db_manager.get_stats()
+        db_stats["queries"] = db_manager.get_query_stats(top=top, sort_by=sort_by)
+
+        return {
+            "success": True,
+            "data": db_stats,
+            "message": "获取数据库统计信息成功"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取数据库统计信息失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取数据库统计信息失败: {str(e)}"
+        )
+
+
+@router.post("/system/db-stats/reset")
+async def reset_database_query_stats(
+    current_user: CurrentUser = Depends(get_current_user_context)
+):
+    """清空查询性能统计（用于按时间窗口采样）"""
+    if current_user.role not in ['admin', 'manager']:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限重置数据库统计信息"
+        )
+
+    from ..utils.query_stats import get_query_monitor
+    get_query_monitor().reset()
+    logger.info(f"🧹 查询性能统计已被用户 {current_user.username} 重置")
+
+    return {
+        "success": True,
+        "message": "查询性能统计已重置"
+    }
+
+
 @router.get("/system/context-health")
 async def get_context_health_stats(
     current_user: CurrentUser = Depends(get_current_user_context)
@@ -2907,6 +3131,7 @@ async def get_workflow_nodes_detail(
         from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
         from ..repositories.instance.node_instance_repository import NodeInstanceRepository
         from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+        from ..repositories.instance.workflow_instance_progress_repository import WorkflowInstanceProgressRepository
         
         workflow_repo = WorkflowInstanceRepository()
         node_repo = NodeInstanceRepository()
@@ -3193,11 +3418,12 @@ async def get_workflow_nodes_detail(
                 }
                 formatted_edges.append(edge_data)
         
-        # 6. 计算工作流级别统计
-        total_nodes = len(formatted_nodes)
-        completed_nodes = len([n for n in formatted_nodes if n['status'] == 'completed'])
-        failed_nodes = len([n for n in formatted_nodes if n['status'] == 'failed'])
-        running_nodes = len([n for n in formatted_nodes if n['status'] == 'running'])
+        # 6. 计算工作流级别统计（节点计数来自进度计数表，不受处理器关联产生的重复行影响）
+        node_progress = await WorkflowInstanceProgressRepository().get_progress(instance_id)
+        total_nodes = node_progress['total_nodes']
+        completed_nodes = node_progress['completed_nodes']
+        failed_nodes = node_progress['failed_nodes']
+        running_nodes = node_progress['running_nodes']
         
         all_tasks = sum([len(n['tasks']) for n in formatted_nodes])
         all_completed_tasks = sum([n['task_statistics']['completed_tasks'] for n in formatted_nodes])
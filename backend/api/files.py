@@ -145,6 +145,8 @@ async def get_my_files(
     content_type: Optional[str] = Query(None, description="文件类型过滤"),
     sort_by: str = Query("created_at", description="排序字段"),
     sort_order: str = Query("desc", description="排序顺序"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor（指定后忽略page）"),
+    include_total: bool = Query(True, description="游标分页时是否统计总数"),
     current_user: CurrentUser = Depends(get_current_user_context)
 ):
     """获取用户文件列表"""
@@ -156,10 +158,14 @@ async def get_my_files(
             keyword=keyword,
             content_type=content_type,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            include_total=include_total
         )
         return create_response(data=result, message="获取用户文件成功")
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取用户文件失败: {e}")
         raise HTTPException(status_code=500, detail="获取用户文件失败")
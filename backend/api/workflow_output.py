@@ -13,6 +13,8 @@ from ..services.output_data_processor import OutputDataProcessor
 from ..services.output_data_validator import OutputDataValidator
 from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
 from ..utils.auth import get_current_user
+from ..utils.responses import ndjson_stream_response
+from ..utils.helpers import decode_cursor, build_keyset_condition, build_keyset_page
 from ..models.user import User
 
 
@@ -70,9 +72,16 @@ async def query_workflow_outputs(
     status: Optional[str] = Query(None, description="工作流状态"),
     limit: int = Query(50, ge=1, le=1000, description="结果数量限制"),
     offset: int = Query(0, ge=0, description="偏移量"),
+    stream: bool = Query(False, description="以NDJSON流式返回全部匹配实例（忽略limit/offset，不返回总数，仅管理员）"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor（指定后忽略offset）"),
+    include_total: bool = Query(True, description="游标分页时是否统计总数"),
     current_user: User = Depends(get_current_user)
 ):
     """查询工作流输出实例"""
+    # 流式返回不限制条数，包含所有执行者的实例数据，只对管理员开放
+    if stream and current_user.role not in ['admin', 'manager']:
+        raise HTTPException(status_code=403, detail="无权限流式导出全部工作流实例")
+    
     try:
         workflow_repo = WorkflowInstanceRepository()
         
@@ -142,11 +151,30 @@ async def query_workflow_outputs(
         else:
             query = base_query
         
-        query += f" ORDER BY wi.created_at DESC LIMIT ${param_count + 1} OFFSET ${param_count + 2}"
-        params.extend([limit, offset])
+        if stream:
+            # 服务端游标逐行输出，适合导出大量实例
+            return ndjson_stream_response(
+                workflow_repo.db.fetch_iter(query + " ORDER BY wi.created_at DESC", *params)
+            )
+        
+        filter_params = list(params)
+        if cursor:
+            # 键集分页：从游标位置向后取，深页与第一页代价相同
+            keyset_clause, keyset_values, param_count = build_keyset_condition(
+                "wi.created_at", "wi.workflow_instance_id", decode_cursor(cursor), "DESC", param_count + 1
+            )
+            query += f" AND {keyset_clause}"
+            params.extend(keyset_values)
+            query += f" ORDER BY wi.created_at DESC, wi.workflow_instance_id DESC LIMIT ${param_count}"
+            params.append(limit + 1)
+        else:
+            query += (f" ORDER BY wi.created_at DESC, wi.workflow_instance_id DESC"
+                      f" LIMIT ${param_count + 1} OFFSET ${param_count + 2}")
+            params.extend([limit + 1, offset])
         
-        # 执行查询
-        results = await workflow_repo.db.fetch_all(query, *params)
+        # 执行查询（多取一条用于判断是否有下一页）
+        rows = await workflow_repo.db.fetch_all(query, *params)
+        results, next_cursor, has_more = build_keyset_page(rows, limit, "created_at", "workflow_instance_id")
         
         # 处理结果
         formatted_results = []
@@ -167,17 +195,19 @@ async def query_workflow_outputs(
             
             formatted_results.append(result_dict)
         
-        # 获取总计数
-        count_query = base_query.replace(
-            "SELECT wi.*, w.name as workflow_name, u.username as executor_name",
-            "SELECT COUNT(*)"
-        )
-        if conditions:
-            count_query = count_query.replace(" AND " + " AND ".join(conditions), "")
-            for condition in conditions:
-                count_query += f" AND {condition}"
-        
-        total_count = await workflow_repo.db.fetch_val(count_query, *params[:-2])  # 排除limit和offset参数
+        # 获取总计数（游标分页时可选）
+        total_count = None
+        if include_total or not cursor:
+            count_query = base_query.replace(
+                "SELECT wi.*, w.name as workflow_name, u.username as executor_name",
+                "SELECT COUNT(*)"
+            )
+            if conditions:
+                count_query = count_query.replace(" AND " + " AND ".join(conditions), "")
+                for condition in conditions:
+                    count_query += f" AND {condition}"
+            
+            total_count = await workflow_repo.db.fetch_val(count_query, *filter_params)
         
         return {
             "success": True,
@@ -187,11 +217,14 @@ async def query_workflow_outputs(
                     "total": total_count,
                     "limit": limit,
                     "offset": offset,
-                    "has_more": offset + len(formatted_results) < total_count
+                    "has_more": has_more,
+                    "next_cursor": next_cursor
                 }
             }
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询工作流输出失败: {str(e)}")
 
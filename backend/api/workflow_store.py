@@ -88,7 +88,9 @@ async def search_store_workflows(
     sort_by: Optional[str] = Query("created_at", description="排序字段"),
     sort_order: Optional[str] = Query("desc", description="排序方向"),
     page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(20, ge=1, le=100, description="每页大小")
+    page_size: int = Query(20, ge=1, le=100, description="每页大小"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的next_cursor（指定后忽略page）"),
+    include_total: bool = Query(True, description="游标分页时是否统计总数")
 ):
     """搜索商店中的工作流"""
     try:
@@ -110,7 +112,9 @@ async def search_store_workflows(
             sort_by=sort_by,
             sort_order=sort_order,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor=cursor,
+            include_total=include_total
         )
 
         logger.info(f"📋 搜索参数: {search_params}")
@@ -118,6 +122,11 @@ async def search_store_workflows(
         logger.info(f"✅ 搜索完成，返回 {len(result.items) if result.items else 0} 个结果")
         return result
 
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"搜索商店工作流失败: {e}")
         raise HTTPException(
@@ -1,74 +1,175 @@
-"""
-MySQL数据库配置管理模块
-MySQL Database Configuration Management Module
-
-注意：此项目已从PostgreSQL迁移到MySQL
-Note: This project has been migrated from PostgreSQL to MySQL
-"""
-
-import os
-from typing import Optional
-from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
-
-load_dotenv()
-
-
-class DatabaseSettings(BaseSettings):
-    """MySQL数据库配置 - 保持与PostgreSQL相同的接口"""
-    host: str = "localhost"
-    port: int = 3306  # MySQL默认端口
-    database: str = "workflow_db"
-    username: str = "root"  # MySQL默认用户
-    password: str = "mysql"
-    charset: str = "utf8mb4"  # MySQL字符集，支持完整的UTF-8
-    
-    class Config:
-        env_prefix = "DB_"
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        extra = "ignore"
-    
-    # 连接池配置 - 为AI工作流优化
-    min_connections: int = int(os.getenv("DB_POOL_SIZE", "10"))
-    max_connections: int = int(os.getenv("DB_MAX_OVERFLOW", "50"))
-    
-    @property
-    def database_url(self) -> str:
-        """获取数据库连接URL - 保持与PostgreSQL相同的接口"""
-        # 为了兼容性，返回MySQL URL但格式类似PostgreSQL
-        return f"mysql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}?charset={self.charset}"
-
-
-class ApplicationSettings(BaseSettings):
-    """应用程序配置 - 与PostgreSQL版本完全相同"""
-    app_name: str = "Workflow Framework"
-    debug: bool = False
-    log_level: str = "INFO"
-    
-    # 安全配置
-    secret_key: str = "default-secret-key"
-    
-    # 文件上传配置
-    upload_root_dir: str = "./uploads"
-    max_file_size_mb: int = 100
-    access_token_expire_minutes: int = 30
-    
-    class Config:
-        extra = "ignore"
-
-
-class Settings:
-    """全局配置类 - 与PostgreSQL版本完全相同"""
-    def __init__(self):
-        self.database = DatabaseSettings()
-        self.app = ApplicationSettings()
-
-
-# 全局配置实例
-settings = Settings()
-
-
-def get_settings() -> Settings:
-    """获取全局配置实例 - 与PostgreSQL版本完全相同"""
+"""
+MySQL数据库配置管理模块
+MySQL Database Configuration Management Module
+
+注意：此项目已从PostgreSQL迁移到MySQL
+Note: This project has been migrated from PostgreSQL to MySQL
+"""
+
+import os
+from typing import Optional
+from pydantic_settings import BaseSettings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class DatabaseSettings(BaseSettings):
+    """MySQL数据库配置 - 保持与PostgreSQL相同的接口"""
+    host: str = "localhost"
+    port: int = 3306  # MySQL默认端口
+    database: str = "workflow_db"
+    username: str = "root"  # MySQL默认用户
+    password: str = "mysql"
+    charset: str = "utf8mb4"  # MySQL字符集，支持完整的UTF-8
+    
+    class Config:
+        env_prefix = "DB_"
+        env_file = ".env"
+        env_file_encoding = "utf-8"
+        extra = "ignore"
+    
+    # 连接池配置 - 为AI工作流优化
+    min_connections: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    max_connections: int = int(os.getenv("DB_MAX_OVERFLOW", "50"))
+    
+    # SQL方言翻译缓存容量（按不同查询文本计数）
+    query_cache_size: int = 2048
+    
+    # 批量插入每批行数（每批一个事务）
+    bulk_batch_size: int = 500
+    
+    # 流式查询（服务端游标）每次读取的行数
+    stream_batch_size: int = 500
+
+    # 只读副本（读写分离）："host1:3306,host2:3306"，与主库共用账号；为空时全部走主库
+    replica_hosts: str = ""
+    replica_max_connections: int = 20
+    # 复制延迟超过该秒数的副本不参与读路由
+    replica_max_lag_seconds: float = 5.0
+    # 副本延迟检查间隔（秒）
+    replica_check_interval: int = 10
+    # 写操作后同一上下文内读主库的时长（秒），保证read-your-writes
+    replica_sticky_seconds: float = 5.0
+
+    # SQL性能统计：按查询指纹聚合耗时/行数/连接等待，超过阈值（毫秒）记录慢查询日志
+    query_stats_enabled: bool = True
+    slow_query_ms: float = 200.0
+    query_stats_max_fingerprints: int = 1000
+
+    # 连接池监控：持有期间非SQL时间超过阈值（秒）时告警；
+    # pool_track_holders 开启后每次借出连接都会遍历调用栈记录调用方，仅在排查时开启
+    pool_track_holders: bool = False
+    pool_hold_warn_seconds: float = 1.0
+    # 连接池自适应扩缩容：按窗口内获取等待p95在上下限之间调整连接池上限
+    pool_adaptive: bool = False
+    pool_adaptive_floor: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    pool_adaptive_ceiling: int = 100
+    pool_adapt_interval: int = 15
+    pool_grow_wait_ms: float = 50.0
+    pool_resize_step: int = 5
+
+    # 连接池隔离：执行引擎与后台循环使用独立连接池，避免挤占处理用户请求的api连接池
+    # 关闭时所有连接池名称都映射到api连接池
+    pool_isolation: bool = True
+    pool_engine_min: int = 2
+    pool_engine_max: int = 20
+    pool_background_min: int = 1
+    pool_background_max: int = 5
+
+    @property
+    def database_url(self) -> str:
+        """获取数据库连接URL - 保持与PostgreSQL相同的接口"""
+        # 为了兼容性，返回MySQL URL但格式类似PostgreSQL
+        return f"mysql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}?charset={self.charset}"
+
+
+class ApplicationSettings(BaseSettings):
+    """应用程序配置 - 与PostgreSQL版本完全相同"""
+    app_name: str = "Workflow Framework"
+    debug: bool = False
+    log_level: str = "INFO"
+    
+    # 安全配置
+    secret_key: str = "default-secret-key"
+    
+    # 文件上传配置
+    upload_root_dir: str = "./uploads"
+    max_file_size_mb: int = 100
+    access_token_expire_minutes: int = 30
+    
+    # 就绪节点并发调度：执行引擎同时调度的节点数上限，以及单个工作流实例的上限
+    max_concurrent_nodes: int = 16
+    max_concurrent_nodes_per_instance: int = 4
+    
+    # 工作流定义编译缓存（按workflow_id计数）；TTL（秒）兜底未经服务层失效的定义变更，0表示不过期
+    workflow_cache_size: int = 256
+    workflow_cache_ttl: int = 300
+    
+    # Agent任务持久化队列：租约可见性超时（秒，处理中按1/3间隔续约）、最大租约次数（超过转入死信）、
+    # 租约超时后的重试延迟（秒）；worker在入队时立即唤醒，轮询间隔（秒）只用于发现其他进程的入队
+    agent_queue_visibility_timeout: int = 300
+    agent_queue_max_attempts: int = 3
+    agent_queue_retry_delay: int = 10
+    agent_queue_poll_interval: float = 1.0
+    # 过期租约回收与未入队PENDING任务补偿的间隔（秒）
+    agent_queue_reconcile_interval: int = 15
+    
+    # Agent任务并发/速率限制（0表示不限制）：按用户的并发与每分钟任务数；
+    # Agent未在parameters/tool_config中配置 max_concurrent / requests_per_minute 时的默认值
+    agent_user_max_concurrent: int = 0
+    agent_user_requests_per_minute: int = 0
+    agent_default_max_concurrent: int = 0
+    agent_default_requests_per_minute: int = 0
+    
+    # Agent任务优先级与公平调度：按所属工作流实例的节点数分级（<=interactive_max为interactive，>=batch_min为batch），
+    # 排队每满aging秒提升一级；按工作流实例与用户的加权公平份额领取，用户权重格式 "user_id=2,user_id=0.5"
+    agent_interactive_max_nodes: int = 5
+    agent_batch_min_nodes: int = 50
+    agent_priority_aging_seconds: int = 60
+    agent_user_share_weights: str = ""
+    
+    # 工作流上下文快照编码：binary（WCS3紧凑二进制，'3.0'）或 json（'2.0'）；两种格式均可读取
+    # 压缩算法 none / zlib / zstd（需安装 zstandard，未安装时回退到 zlib）
+    context_snapshot_format: str = "binary"
+    context_snapshot_compression: str = "zlib"
+    
+    # 工作流执行幂等键（Idempotency-Key）：首次响应在进程内缓存ttl秒（最多cache_size个），
+    # durable开启时经 workflow_execution_idempotency 表跨进程去重；其他进程处理中的键最多等待wait秒，
+    # 持有者崩溃后占用在lease秒后可被接管
+    idempotency_ttl_seconds: int = 86400
+    idempotency_cache_size: int = 10000
+    idempotency_wait_timeout: int = 30
+    idempotency_claim_lease_seconds: int = 120
+    idempotency_durable: bool = True
+    
+    # 工作流状态投影：状态查询接口对本进程执行中的实例读取内存投影（最多max_instances个），
+    # 每resync秒从数据库重新加载一次以限制其他进程写入造成的陈旧（0为不重新加载），终态实例保留linger秒
+    status_projection_max_instances: int = 1000
+    status_projection_resync_seconds: int = 30
+    status_projection_linger_seconds: int = 300
+    
+    # 工作流事件流（SSE）：进程内事件总线保留最近buffer_size个事件供断线重连按Last-Event-ID补发；
+    # 每个连接最多积压queue_size个未发送事件，超出时通知客户端重新同步；每heartbeat秒发送一次心跳
+    event_stream_buffer_size: int = 2000
+    event_stream_queue_size: int = 500
+    event_stream_heartbeat_seconds: int = 15
+    
+    class Config:
+        extra = "ignore"
+
+
+class Settings:
+    """全局配置类 - 与PostgreSQL版本完全相同"""
+    def __init__(self):
+        self.database = DatabaseSettings()
+        self.app = ApplicationSettings()
+
+
+# 全局配置实例
+settings = Settings()
+
+
+def get_settings() -> Settings:
+    """获取全局配置实例 - 与PostgreSQL版本完全相同"""
     return settings
\ No newline at end of file
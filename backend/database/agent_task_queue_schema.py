@@ -0,0 +1,36 @@
+"""
+Agent任务持久化队列表结构
+Database schema for the durable agent task queue
+"""
+
+# Agent任务队列表：每个任务实例一行，worker通过 FOR UPDATE SKIP LOCKED 租约领取
+# 需要 MySQL 8.0+（SKIP LOCKED）
+AGENT_TASK_QUEUE_TABLE = """
+CREATE TABLE IF NOT EXISTS `agent_task_queue` (
+    `task_instance_id` VARCHAR(36) PRIMARY KEY COMMENT '任务实例ID',
+    `agent_id` VARCHAR(36) NULL COMMENT '处理Agent ID（任务指定或来自处理器），用于按Agent限流时跳过',
+    `user_id` VARCHAR(36) NULL COMMENT '工作流执行者ID，用于按用户限流时跳过',
+    `workflow_instance_id` VARCHAR(36) NULL COMMENT '工作流实例ID，用于公平调度',
+    `priority_class` TINYINT NOT NULL DEFAULT 1 COMMENT '优先级等级：0=interactive 1=normal 2=batch',
+    `status` ENUM('queued', 'leased', 'done', 'dead') NOT NULL DEFAULT 'queued' COMMENT '队列状态',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已租约次数',
+    `max_attempts` INT NOT NULL DEFAULT 3 COMMENT '最大租约次数，超过后进入死信',
+    `available_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '最早可领取时间',
+    `lease_owner` VARCHAR(64) NULL COMMENT '持有租约的worker',
+    `lease_token` VARCHAR(36) NULL COMMENT '租约令牌，确认/续约时校验',
+    `lease_expires_at` TIMESTAMP NULL COMMENT '租约过期时间（可见性超时）',
+    `last_error` TEXT NULL COMMENT '最近一次失败原因',
+
+    `enqueued_at` TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '入队时间（排队等待与老化的起点）',
+    `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+
+    INDEX `idx_status_available` (`status`, `available_at`),
+    INDEX `idx_status_lease_expires` (`status`, `lease_expires_at`),
+    INDEX `idx_status_class_enqueued` (`status`, `priority_class`, `enqueued_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Agent任务持久化队列';
+"""
+
+
+def get_create_table_sql():
+    """获取所有建表SQL语句"""
+    return [AGENT_TASK_QUEUE_TABLE]
@@ -0,0 +1,24 @@
+"""
+工作流上下文增量日志表结构
+Database schema for the workflow context delta log
+"""
+
+# 上下文增量日志：节点状态变迁按上下文版本号追加，恢复时在最近的完整快照之上重放，
+# 写入完整快照后删除已被覆盖的增量（压缩）
+WORKFLOW_CONTEXT_DELTA_TABLE = """
+CREATE TABLE IF NOT EXISTS `workflow_context_delta` (
+    `workflow_instance_id` VARCHAR(36) NOT NULL COMMENT '工作流实例ID',
+    `version` BIGINT NOT NULL COMMENT '上下文版本号（单调递增）',
+    `event_type` VARCHAR(32) NOT NULL COMMENT '变迁类型：executing/completed/failed/triggered/reset',
+    `node_instance_id` VARCHAR(36) NOT NULL COMMENT '节点实例ID',
+    `payload` LONGTEXT NULL COMMENT '变迁数据（JSON，如节点输出或错误信息）',
+    `created_at` TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '写入时间',
+
+    PRIMARY KEY (`workflow_instance_id`, `version`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='工作流上下文增量日志';
+"""
+
+
+def get_create_table_sql():
+    """获取所有建表SQL语句"""
+    return [WORKFLOW_CONTEXT_DELTA_TABLE]
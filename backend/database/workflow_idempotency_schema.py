@@ -0,0 +1,27 @@
+"""
+工作流执行幂等键表结构
+Database schema for workflow execution idempotency keys
+"""
+
+# 幂等键：同一用户同一 Idempotency-Key 的执行请求只启动一次工作流，重复请求返回首次的响应
+# 进程内 singleflight 合并同进程的并发重复请求，本表覆盖多进程/多实例部署
+WORKFLOW_EXECUTION_IDEMPOTENCY_TABLE = """
+CREATE TABLE IF NOT EXISTS `workflow_execution_idempotency` (
+    `user_id` VARCHAR(36) NOT NULL COMMENT '请求用户ID',
+    `idempotency_key` VARCHAR(255) NOT NULL COMMENT '客户端提供的 Idempotency-Key',
+    `request_hash` CHAR(64) NOT NULL COMMENT '请求体SHA-256，同键不同请求体视为冲突',
+    `status` ENUM('in_progress', 'completed') NOT NULL DEFAULT 'in_progress' COMMENT '处理状态',
+    `response` LONGTEXT NULL COMMENT '首次请求的响应（JSON）',
+    `workflow_instance_id` VARCHAR(36) NULL COMMENT '启动的工作流实例ID',
+    `created_at` TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT '创建时间',
+    `expires_at` TIMESTAMP NOT NULL COMMENT '过期时间，过期后同键可重新执行',
+
+    PRIMARY KEY (`user_id`, `idempotency_key`),
+    INDEX `idx_expires_at` (`expires_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='工作流执行幂等键';
+"""
+
+
+def get_create_table_sql():
+    """获取所有建表SQL语句"""
+    return [WORKFLOW_EXECUTION_IDEMPOTENCY_TABLE]
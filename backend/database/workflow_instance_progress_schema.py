@@ -0,0 +1,25 @@
+"""
+工作流实例进度计数表结构
+Database schema for materialized workflow instance progress counters
+"""
+
+# 每个工作流实例一行，按状态统计未删除的节点实例数量
+# 节点实例状态变化时与节点实例写入在同一事务中更新，列表页/仪表盘按主键批量读取进度
+WORKFLOW_INSTANCE_PROGRESS_TABLE = """
+CREATE TABLE IF NOT EXISTS `workflow_instance_progress` (
+    `workflow_instance_id` CHAR(36) PRIMARY KEY COMMENT '工作流实例ID',
+    `total_nodes` INT NOT NULL DEFAULT 0 COMMENT '节点实例总数',
+    `pending_nodes` INT NOT NULL DEFAULT 0 COMMENT '等待执行的节点实例数',
+    `waiting_nodes` INT NOT NULL DEFAULT 0 COMMENT '等待前置条件的节点实例数',
+    `running_nodes` INT NOT NULL DEFAULT 0 COMMENT '执行中的节点实例数',
+    `completed_nodes` INT NOT NULL DEFAULT 0 COMMENT '已完成的节点实例数',
+    `failed_nodes` INT NOT NULL DEFAULT 0 COMMENT '失败的节点实例数',
+    `cancelled_nodes` INT NOT NULL DEFAULT 0 COMMENT '已取消的节点实例数',
+    `updated_at` TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='工作流实例进度计数';
+"""
+
+
+def get_create_table_sql():
+    """获取所有建表SQL语句"""
+    return [WORKFLOW_INSTANCE_PROGRESS_TABLE]
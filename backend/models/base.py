@@ -68,6 +68,16 @@ class PaginationResponse(BaseModel):
             self.total_pages = (self.total + self.page_size - 1) // self.page_size
 
 
+class CursorPaginationResponse(BaseModel):
+    """键集（游标）分页响应模型"""
+    items: list = Field(default_factory=list)
+    page_size: int = 20
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多数据")
+    has_more: bool = False
+    total: Optional[int] = Field(None, description="总数（未请求统计时为空）")
+    total_is_estimate: bool = Field(False, description="总数是否为执行计划估算值")
+
+
 class CreateRequest(BaseModel):
     """创建请求基类"""
     pass
@@ -245,10 +245,12 @@ class FileSearchRequest(BaseModel):
 class FileSearchResponse(BaseModel):
     """文件搜索响应模型"""
     files: List[WorkflowFileResponse] = Field(default_factory=list, description="文件列表")
-    total: int = Field(0, description="总数量")
+    total: Optional[int] = Field(0, description="总数量（游标分页且未要求统计时为空）")
     page: int = Field(1, description="当前页码")
     page_size: int = Field(20, description="每页数量")
-    total_pages: int = Field(0, description="总页数")
+    total_pages: Optional[int] = Field(0, description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标")
+    has_more: bool = Field(False, description="是否还有下一页")
 
 
 # ==================== 文件统计模型 ====================
@@ -112,10 +112,12 @@ class WorkflowStoreDetail(WorkflowStoreResponse):
 class WorkflowStoreList(BaseModel):
     """工作流商店列表模型"""
     items: List[WorkflowStoreResponse] = Field(..., description="商店条目列表")
-    total: int = Field(..., description="总数")
+    total: Optional[int] = Field(..., description="总数（游标分页且未要求统计时为空）")
     page: int = Field(..., description="当前页码")
     page_size: int = Field(..., description="每页大小")
-    total_pages: int = Field(..., description="总页数")
+    total_pages: Optional[int] = Field(..., description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标")
+    has_more: bool = Field(False, description="是否还有下一页")
 
 
 class WorkflowStoreQuery(BaseModel):
@@ -131,6 +133,8 @@ class WorkflowStoreQuery(BaseModel):
     sort_order: Optional[str] = Field("desc", description="排序方向")
     page: int = Field(1, description="页码")
     page_size: int = Field(20, description="每页大小")
+    cursor: Optional[str] = Field(None, description="游标分页：上一页返回的next_cursor，优先于page")
+    include_total: bool = Field(True, description="是否统计总数（游标分页时可关闭以省去COUNT查询）")
 
 
 class WorkflowStoreRating(BaseModel):
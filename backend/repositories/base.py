@@ -9,8 +9,11 @@ from typing import Dict, Any, List, Optional, Generic, TypeVar, Tuple
 from loguru import logger
 
 from ..utils.database import get_db_manager
-from ..utils.helpers import dict_to_sql_insert, dict_to_sql_update, build_where_clause, QueryBuilder
-from ..models.base import PaginationParams, PaginationResponse
+from ..utils.helpers import (
+    dict_to_sql_insert, dict_list_to_sql_insert, dict_to_sql_update, build_where_clause, QueryBuilder,
+    decode_cursor, build_keyset_condition, build_keyset_page
+)
+from ..models.base import PaginationParams, PaginationResponse, CursorPaginationResponse
 
 T = TypeVar('T')
 
@@ -36,34 +39,13 @@ class BaseRepository(ABC, Generic[T]):
                 RETURNING *
             """
             
+            # DatabaseManager在同一连接上按主键回读插入的行（INSERT + 主键SELECT）
             result = await self.db.fetch_one(query, *values)
             
-            # 处理DatabaseManager返回的fallback响应
             if result and result.get("_insert_success"):
+                # 主键由数据库默认值生成时无法回读，返回插入的数据
                 logger.warning(f"数据库插入成功但无法获取完整记录，表: {self.table_name}")
-                # 尝试查询刚插入的记录
-                try:
-                    # 如果有主键字段可以查询
-                    if 'id' in data:
-                        fallback_result = await self.get_by_id(data['id'])
-                        if fallback_result:
-                            logger.info(f"通过fallback查询成功获取创建记录")
-                            return fallback_result
-                    
-                    # 如果有其他唯一字段可以查询
-                    if 'name' in data:
-                        fallback_query = f"SELECT * FROM {self.table_name} WHERE name = $1 AND is_deleted = FALSE ORDER BY created_at DESC LIMIT 1"
-                        fallback_result = await self.db.fetch_one(fallback_query, data['name'])
-                        if fallback_result:
-                            logger.info(f"通过name字段fallback查询成功获取创建记录")
-                            return fallback_result
-                    
-                    # 如果都失败，至少返回插入的数据
-                    logger.warning(f"Fallback查询失败，返回原始插入数据")
-                    return data
-                except Exception as fallback_e:
-                    logger.error(f"Fallback查询失败: {fallback_e}")
-                    return data
+                return data
             
             if result:
                 logger.info(f"在表 {self.table_name} 中创建了新记录")
@@ -76,6 +58,29 @@ class BaseRepository(ABC, Generic[T]):
             logger.error(f"创建记录失败: {e}")
             raise
     
+    async def create_many(self, rows: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                          conn=None) -> int:
+        """批量创建记录（多行INSERT，每批一个事务）
+        
+        与create不同，不回读插入后的记录；调用方应自行生成主键。
+        传入conn时在调用方的事务内插入，由调用方统一提交或回滚。
+        
+        Returns:
+            插入的记录数
+        """
+        try:
+            target = conn or self.db
+            total_inserted = 0
+            for columns, values_list in dict_list_to_sql_insert(rows):
+                total_inserted += await target.insert_many(self.table_name, columns, values_list, batch_size)
+            
+            if total_inserted:
+                logger.info(f"在表 {self.table_name} 中批量创建了 {total_inserted} 条记录")
+            return total_inserted
+        except Exception as e:
+            logger.error(f"批量创建记录失败: {e}")
+            raise
+    
     async def get_by_id(self, record_id: uuid.UUID, id_column: str = "id") -> Optional[T]:
         """根据ID获取记录"""
         try:
@@ -100,63 +105,17 @@ class BaseRepository(ABC, Generic[T]):
                 RETURNING *
             """
             
+            # DatabaseManager在同一连接上按WHERE键回读更新后的行（UPDATE + 主键SELECT）
             result = await self.db.fetch_one(query, *values, record_id)
             
-            # 处理DatabaseManager返回的UPDATE成功响应
             if result and result.get("_update_success"):
-                logger.info(f"数据库更新成功但MySQL不支持RETURNING，使用fallback查询，表: {self.table_name}")
-                logger.debug(f"[DEBUG] UPDATE返回结果: {result}")
-                logger.debug(f"[DEBUG] 准备执行fallback查询，record_id: {record_id}, id_column: {id_column}")
-                
-                # 尝试查询刚更新的记录
-                try:
-                    fallback_result = await self.get_by_id(record_id, id_column)
-                    logger.debug(f"[DEBUG] Fallback查询结果: {fallback_result is not None}")
-                    if fallback_result:
-                        logger.info(f"通过fallback查询成功获取更新记录")
-                        return fallback_result
-                    else:
-                        logger.warning(f"Fallback查询失败，但UPDATE确实成功了")
-                        # 检查记录是否真的存在
-                        check_query = f"SELECT COUNT(*) as count FROM {self.table_name} WHERE {id_column} = $1"
-                        count_result = await self.db.fetch_one(check_query, record_id)
-                        logger.debug(f"[DEBUG] 记录存在性检查: {count_result}")
-                        
-                        # 如果记录存在，返回合并的数据表示更新成功
-                        if count_result and count_result.get('count', 0) > 0:
-                            merged_data = data.copy()
-                            merged_data[id_column] = record_id
-                            merged_data['_mysql_update_success'] = True
-                            logger.info(f"UPDATE确实成功，返回合并数据")
-                            return merged_data
-                        else:
-                            logger.error(f"UPDATE报告成功但记录不存在，这是不应该发生的情况")
-                            return None
-                except Exception as fallback_e:
-                    logger.error(f"Fallback查询失败: {fallback_e}")
-                    # 返回合并的数据
-                    merged_data = data.copy()
-                    merged_data[id_column] = record_id
-                    return merged_data
+                # 更新已生效但未能回读，单独按ID查询一次
+                logger.debug(f"UPDATE成功但未返回记录，按ID回读: {self.table_name}.{record_id}")
+                return await self.get_by_id(record_id, id_column)
             
-            if result:
-                # logger.info(f"更新了表 {self.table_name} 中的记录 {record_id}")
-                return result
-            else:
-                # MySQL不支持RETURNING，但UPDATE可能成功了，尝试查询验证
-                logger.debug(f"UPDATE未返回结果，验证是否更新成功: {self.table_name}.{record_id}")
-                try:
-                    # 尝试查询记录确认是否存在并更新
-                    verification_result = await self.get_by_id(record_id, id_column)
-                    if verification_result:
-                        # logger.info(f"✅ 更新成功 (通过查询验证): 表 {self.table_name} 记录 {record_id}")
-                        return verification_result
-                    else:
-                        logger.warning(f"更新记录失败，记录不存在: {record_id}")
-                        return None
-                except Exception as verify_e:
-                    logger.warning(f"更新后验证查询失败: {verify_e}")
-                    return None
+            if not result:
+                logger.warning(f"更新记录失败，记录不存在: {record_id}")
+            return result
                 
         except Exception as e:
             logger.error(f"更新记录失败: {e}")
@@ -242,6 +201,67 @@ class BaseRepository(ABC, Generic[T]):
             logger.error(f"分页查询失败: {e}")
             raise
     
+    async def paginate_keyset(self, page_size: int = 20, cursor: Optional[str] = None,
+                              conditions: Optional[Dict[str, Any]] = None,
+                              sort_column: str = "created_at", id_column: str = "id",
+                              direction: str = "DESC", count: str = "none") -> CursorPaginationResponse:
+        """键集（游标）分页查询
+        
+        按 (sort_column, id_column) 排序，从游标位置向后取数据，任意页的代价与第一页相同。
+        
+        Args:
+            page_size: 每页大小
+            cursor: 上一页返回的next_cursor，为空表示第一页
+            conditions: 查询条件
+            sort_column: 排序列
+            id_column: 唯一次级排序列（通常是主键）
+            direction: 排序方向 ASC/DESC
+            count: 总数统计方式 none（不统计）/ exact（COUNT(*)）/ estimate（执行计划估算）
+        """
+        try:
+            if conditions is None:
+                conditions = {}
+            conditions["is_deleted"] = False
+            direction = "DESC" if direction.upper() == "DESC" else "ASC"
+            
+            where_clause, values, next_param = build_where_clause(conditions)
+            base_where = f"WHERE {where_clause}" if where_clause else "WHERE is_deleted = FALSE"
+            
+            data_where = base_where
+            data_values = tuple(values)
+            if cursor:
+                keyset_clause, keyset_values, _ = build_keyset_condition(
+                    sort_column, id_column, decode_cursor(cursor), direction, next_param
+                )
+                data_where += f" AND {keyset_clause}"
+                data_values += keyset_values
+            
+            data_query = f"""
+                SELECT * FROM {self.table_name} {data_where}
+                ORDER BY {sort_column} {direction}, {id_column} {direction}
+                LIMIT {page_size + 1}
+            """
+            rows = await self.db.fetch_all(data_query, *data_values)
+            items, next_cursor, has_more = build_keyset_page(rows, page_size, sort_column, id_column)
+            
+            total = None
+            if count == "exact":
+                total = await self.db.fetch_val(f"SELECT COUNT(*) FROM {self.table_name} {base_where}", *values)
+            elif count == "estimate":
+                total = await self.db.estimate_count(f"SELECT * FROM {self.table_name} {base_where}", *values)
+            
+            return CursorPaginationResponse(
+                items=items,
+                page_size=page_size,
+                next_cursor=next_cursor,
+                has_more=has_more,
+                total=total,
+                total_is_estimate=count == "estimate"
+            )
+        except Exception as e:
+            logger.error(f"游标分页查询失败: {e}")
+            raise
+    
     async def exists(self, conditions: Dict[str, Any]) -> bool:
         """检查记录是否存在"""
         try:
@@ -0,0 +1,286 @@
+"""
+Agent任务持久化队列数据访问层
+Agent Task Queue Repository
+
+队列行以任务实例ID为主键，入队天然去重；worker通过
+SELECT ... FOR UPDATE SKIP LOCKED 领取租约，租约过期（可见性超时）后
+由回收逻辑重新入队或转入死信。需要 MySQL 8.0+。
+"""
+
+import uuid
+from typing import Optional, Dict, Any, List, Tuple
+from loguru import logger
+
+from ..base import BaseRepository
+from ...database.agent_task_queue_schema import get_create_table_sql
+from ...models.instance import TaskInstanceStatus, TaskInstanceType
+
+# 优先级等级：0=interactive 1=normal 2=batch（与 agent_task_scheduler 中的常量一致）
+PRIORITY_CLASSES = (0, 1, 2)
+
+
+class AgentTaskQueueRepository(BaseRepository[Dict[str, Any]]):
+    """Agent任务持久化队列数据访问层"""
+
+    def __init__(self):
+        super().__init__("agent_task_queue")
+
+    async def ensure_table(self) -> None:
+        """创建队列表（已存在时跳过）"""
+        for table_sql in get_create_table_sql():
+            await self.db.execute(table_sql)
+
+    async def enqueue(self, task_id: uuid.UUID, max_attempts: int, delay_seconds: int = 0,
+                      priority_thresholds: Tuple[int, int] = (5, 50)) -> bool:
+        """任务入队；已在队列中（queued/leased）时不重复入队
+
+        已结束（done/dead）的行会被重新激活并清零租约次数，用于失败任务重试。
+        同时记录处理Agent（任务指定或来自处理器）、工作流执行者与工作流实例，供领取时按限流与公平份额跳过；
+        优先级等级按所属工作流实例的节点数分级：<= priority_thresholds[0] 为0（interactive），
+        >= priority_thresholds[1] 为2（batch）。节点实例在工作流启动时一次性创建，入队时总是完整的。
+
+        Returns:
+            是否新入队
+        """
+        query = """
+            INSERT INTO agent_task_queue (task_instance_id, agent_id, user_id, workflow_instance_id, priority_class,
+                                          status, attempts, max_attempts, available_at, enqueued_at)
+            SELECT t.task_instance_id, t.agent_id, t.user_id, t.workflow_instance_id,
+                   CASE WHEN t.node_count = 0 THEN 1
+                        WHEN t.node_count <= $1 THEN 0
+                        WHEN t.node_count >= $2 THEN 2
+                        ELSE 1 END,
+                   'queued', 0, $3, DATE_ADD(NOW(), INTERVAL $4 SECOND), NOW(3)
+            FROM (
+                SELECT ti.task_instance_id, COALESCE(ti.assigned_agent_id, p.agent_id) AS agent_id,
+                       wi.executor_id AS user_id, ti.workflow_instance_id,
+                       (SELECT COUNT(*) FROM node_instance ni
+                        WHERE ni.workflow_instance_id = ti.workflow_instance_id AND ni.is_deleted = FALSE) AS node_count
+                FROM task_instance ti
+                LEFT JOIN processor p ON p.processor_id = ti.processor_id
+                LEFT JOIN workflow_instance wi ON wi.workflow_instance_id = ti.workflow_instance_id
+                WHERE ti.task_instance_id = $5
+            ) t
+            ON DUPLICATE KEY UPDATE
+                agent_id = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(agent_id), agent_task_queue.agent_id),
+                user_id = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(user_id), agent_task_queue.user_id),
+                workflow_instance_id = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(workflow_instance_id), agent_task_queue.workflow_instance_id),
+                priority_class = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(priority_class), agent_task_queue.priority_class),
+                enqueued_at = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(enqueued_at), agent_task_queue.enqueued_at),
+                attempts = IF(agent_task_queue.status IN ('done', 'dead'), 0, agent_task_queue.attempts),
+                max_attempts = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(max_attempts), agent_task_queue.max_attempts),
+                available_at = IF(agent_task_queue.status IN ('done', 'dead'), VALUES(available_at), agent_task_queue.available_at),
+                last_error = IF(agent_task_queue.status IN ('done', 'dead'), NULL, agent_task_queue.last_error),
+                status = IF(agent_task_queue.status IN ('done', 'dead'), 'queued', agent_task_queue.status)
+        """
+        # 翻译后占位符按出现顺序绑定，参数须与文本中 $1..$5 的顺序一致
+        result = await self.db.execute(query, *priority_thresholds, max_attempts, delay_seconds, str(task_id))
+        return result != "UPDATE 0"
+
+    async def lease(self, owner: str, limit: int, visibility_timeout: int,
+                    exclude_agent_ids: Optional[List[str]] = None,
+                    exclude_user_ids: Optional[List[str]] = None,
+                    exclude_instance_ids: Optional[List[str]] = None,
+                    aging_seconds: int = 60) -> List[Dict[str, Any]]:
+        """领取最多limit个可用任务的租约
+
+        同一事务内锁定并标记为leased，并发worker通过SKIP LOCKED跳过彼此锁定的行，
+        每一行在一个租约期内只会被一个worker领取。exclude_*用于跳过当前已限流或超出公平份额的Agent/用户/工作流实例。
+        领取顺序为老化后的优先级等级（排队每满aging_seconds提升一级）、入队时间。
+
+        每个等级按 (status, priority_class, enqueued_at) 索引只锁定最早入队的limit行，
+        再在内存中按老化后的等级排序取前limit个：同一等级内越早入队老化越多，因此结果与全表排序一致，
+        而每次领取最多锁定 3×limit 行，不随队列长度增长。
+
+        Returns:
+            [{'task_instance_id', 'agent_id', 'user_id', 'workflow_instance_id', 'priority_class',
+              'wait_ms', 'attempts', 'lease_token'}]
+        """
+        lease_token = str(uuid.uuid4())
+        conditions = ["status = 'queued'", "priority_class = $1", "available_at <= NOW()"]
+        params: List[Any] = []
+        for column, excluded in (('agent_id', exclude_agent_ids), ('user_id', exclude_user_ids),
+                                 ('workflow_instance_id', exclude_instance_ids)):
+            if excluded:
+                placeholders = ", ".join(f"${i}" for i in range(len(params) + 2, len(params) + len(excluded) + 2))
+                conditions.append(f"({column} IS NULL OR {column} NOT IN ({placeholders}))")
+                params.extend(excluded)
+        params.append(limit)
+        candidate_query = f"""
+            SELECT task_instance_id, agent_id, user_id, workflow_instance_id, priority_class, attempts,
+                   TIMESTAMPDIFF(MICROSECOND, enqueued_at, NOW(3)) / 1000 AS wait_ms
+            FROM agent_task_queue
+            WHERE {' AND '.join(conditions)}
+            ORDER BY enqueued_at ASC
+            LIMIT ${len(params) + 1}
+            FOR UPDATE SKIP LOCKED
+        """
+        aging_ms = max(aging_seconds, 1) * 1000
+
+        def effective_class(row: Dict[str, Any]) -> int:
+            return max(row['priority_class'] - int(float(row['wait_ms'] or 0) // aging_ms), 0)
+
+        async with self.db.transaction() as conn:
+            candidates: List[Dict[str, Any]] = []
+            for priority_class in PRIORITY_CLASSES:
+                candidates.extend(await conn.fetch(candidate_query, priority_class, *params))
+            if not candidates:
+                return []
+
+            # 未选中的候选行不做修改，事务结束时释放行锁
+            rows = sorted(candidates, key=lambda row: (effective_class(row), -float(row['wait_ms'] or 0)))[:limit]
+            task_ids = [row['task_instance_id'] for row in rows]
+            placeholders = ", ".join(f"${i}" for i in range(4, len(task_ids) + 4))
+            await conn.execute(f"""
+                UPDATE agent_task_queue
+                SET status = 'leased', attempts = attempts + 1, lease_owner = $1, lease_token = $2,
+                    lease_expires_at = DATE_ADD(NOW(), INTERVAL $3 SECOND)
+                WHERE task_instance_id IN ({placeholders})
+            """, (owner, lease_token, visibility_timeout, *task_ids))
+
+        return [
+            {'task_instance_id': row['task_instance_id'], 'agent_id': row['agent_id'],
+             'user_id': row['user_id'], 'workflow_instance_id': row['workflow_instance_id'],
+             'priority_class': row['priority_class'], 'wait_ms': row['wait_ms'],
+             'attempts': row['attempts'] + 1, 'lease_token': lease_token}
+            for row in rows
+        ]
+
+    async def lease_task(self, task_id: uuid.UUID, owner: str, visibility_timeout: int) -> Optional[Dict[str, Any]]:
+        """领取指定任务的租约（工作流引擎内联处理时使用）
+
+        忽略available_at与限流/公平份额排除条件；任务不在队列中或已被其他worker领取时返回None。
+
+        Returns:
+            与lease()相同结构的租约，或None
+        """
+        lease_token = str(uuid.uuid4())
+        async with self.db.transaction() as conn:
+            row = await conn.fetchrow("""
+                SELECT task_instance_id, agent_id, user_id, workflow_instance_id, priority_class, attempts,
+                       TIMESTAMPDIFF(MICROSECOND, enqueued_at, NOW(3)) / 1000 AS wait_ms
+                FROM agent_task_queue
+                WHERE task_instance_id = $1 AND status = 'queued'
+                FOR UPDATE SKIP LOCKED
+            """, str(task_id))
+            if not row:
+                return None
+
+            await conn.execute("""
+                UPDATE agent_task_queue
+                SET status = 'leased', attempts = attempts + 1, lease_owner = $1, lease_token = $2,
+                    lease_expires_at = DATE_ADD(NOW(), INTERVAL $3 SECOND)
+                WHERE task_instance_id = $4
+            """, (owner, lease_token, visibility_timeout, str(task_id)))
+
+        return {'task_instance_id': row['task_instance_id'], 'agent_id': row['agent_id'],
+                'user_id': row['user_id'], 'workflow_instance_id': row['workflow_instance_id'],
+                'priority_class': row['priority_class'], 'wait_ms': row['wait_ms'],
+                'attempts': row['attempts'] + 1, 'lease_token': lease_token}
+
+    async def extend_lease(self, task_id: uuid.UUID, lease_token: str, visibility_timeout: int) -> bool:
+        """续约；租约已失效（过期被回收或被他人领取）时返回False"""
+        result = await self.db.execute("""
+            UPDATE agent_task_queue
+            SET lease_expires_at = DATE_ADD(NOW(), INTERVAL $1 SECOND)
+            WHERE task_instance_id = $2 AND status = 'leased' AND lease_token = $3
+        """, visibility_timeout, str(task_id), lease_token)
+        return result != "UPDATE 0"
+
+    async def complete(self, task_id: uuid.UUID, lease_token: str, error: Optional[str] = None) -> bool:
+        """确认租约：标记为done；租约已失效时返回False"""
+        result = await self.db.execute("""
+            UPDATE agent_task_queue
+            SET status = 'done', lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL, last_error = $1
+            WHERE task_instance_id = $2 AND status = 'leased' AND lease_token = $3
+        """, error, str(task_id), lease_token)
+        return result != "UPDATE 0"
+
+    async def defer(self, task_id: uuid.UUID, lease_token: str, delay_seconds: int) -> bool:
+        """放弃租约并延迟重新入队（因限流未处理，不计入租约次数）"""
+        result = await self.db.execute("""
+            UPDATE agent_task_queue
+            SET status = 'queued', attempts = GREATEST(attempts - 1, 0),
+                available_at = DATE_ADD(NOW(), INTERVAL $1 SECOND),
+                lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL
+            WHERE task_instance_id = $2 AND status = 'leased' AND lease_token = $3
+        """, delay_seconds, str(task_id), lease_token)
+        return result != "UPDATE 0"
+
+    async def cancel(self, task_id: uuid.UUID) -> bool:
+        """撤销尚未被领取的任务"""
+        result = await self.db.execute("""
+            UPDATE agent_task_queue
+            SET status = 'done', last_error = '任务已取消'
+            WHERE task_instance_id = $1 AND status = 'queued'
+        """, str(task_id))
+        return result != "UPDATE 0"
+
+    async def reclaim_expired_leases(self, retry_delay_seconds: int,
+                                     limit: int = 100) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """回收过期租约：未超过最大次数的重新入队（延迟retry_delay_seconds），否则转入死信
+
+        Returns:
+            (重新入队的任务ID列表, 转入死信的行列表)
+        """
+        async with self.db.transaction() as conn:
+            rows = await conn.fetch("""
+                SELECT task_instance_id, attempts, max_attempts, lease_owner
+                FROM agent_task_queue
+                WHERE status = 'leased' AND lease_expires_at <= NOW()
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            """, limit)
+            if not rows:
+                return [], []
+
+            requeued = [row['task_instance_id'] for row in rows if row['attempts'] < row['max_attempts']]
+            dead = [row for row in rows if row['attempts'] >= row['max_attempts']]
+
+            if requeued:
+                placeholders = ", ".join(f"${i}" for i in range(2, len(requeued) + 2))
+                await conn.execute(f"""
+                    UPDATE agent_task_queue
+                    SET status = 'queued', available_at = DATE_ADD(NOW(), INTERVAL $1 SECOND),
+                        lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL,
+                        last_error = '租约超时'
+                    WHERE task_instance_id IN ({placeholders})
+                """, (retry_delay_seconds, *requeued))
+            if dead:
+                placeholders = ", ".join(f"${i}" for i in range(1, len(dead) + 1))
+                await conn.execute(f"""
+                    UPDATE agent_task_queue
+                    SET status = 'dead', lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL,
+                        last_error = '租约超时次数达到上限'
+                    WHERE task_instance_id IN ({placeholders})
+                """, tuple(row['task_instance_id'] for row in dead))
+
+        return requeued, dead
+
+    async def get_unqueued_pending_task_ids(self, limit: int = 100) -> List[str]:
+        """查询处于PENDING但不在队列中的Agent任务（用于补偿入队）"""
+        rows = await self.db.fetch_all("""
+            SELECT ti.task_instance_id
+            FROM task_instance ti
+            LEFT JOIN agent_task_queue q ON q.task_instance_id = ti.task_instance_id
+            WHERE ti.task_type IN ($1, $2) AND ti.status = $3 AND ti.is_deleted = FALSE
+                  AND (q.task_instance_id IS NULL OR q.status IN ('done', 'dead'))
+            ORDER BY ti.created_at ASC
+            LIMIT $4
+        """, TaskInstanceType.AGENT.value, TaskInstanceType.MIXED.value,
+            TaskInstanceStatus.PENDING.value, limit, use_primary=True)
+        return [row['task_instance_id'] for row in rows]
+
+    async def get_queue_stats(self) -> Dict[str, int]:
+        """按状态统计队列行数"""
+        try:
+            rows = await self.db.fetch_all(
+                "SELECT status, COUNT(*) AS count FROM agent_task_queue GROUP BY status"
+            )
+        except Exception as e:
+            logger.error(f"获取Agent任务队列统计失败: {e}")
+            return {}
+        stats = {'queued': 0, 'leased': 0, 'done': 0, 'dead': 0}
+        for row in rows:
+            stats[row['status']] = row['count']
+        return stats
@@ -15,7 +15,10 @@ from ..base import BaseRepository
 from ...models.instance import (
     NodeInstance, NodeInstanceCreate, NodeInstanceUpdate, NodeInstanceStatus
 )
-from ...utils.helpers import now_utc
+from ...utils.helpers import now_utc, dict_to_sql_insert, dict_to_sql_update
+from ...services.workflow_status_projection import get_workflow_status_projection
+from ...services.workflow_event_bus import get_workflow_event_bus, EVENT_NODE_STATUS, EVENT_NODES_CHANGED
+from .workflow_instance_progress_repository import WorkflowInstanceProgressRepository, status_column
 import json
 
 
@@ -24,6 +27,7 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
     
     def __init__(self):
         super().__init__("node_instance")
+        self.progress_repo = WorkflowInstanceProgressRepository()
     
     def _deserialize_json_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """反序列化JSON字段"""
@@ -45,6 +49,117 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
         
         return result
     
+    @staticmethod
+    def _progress_deltas(old_status: Any, new_status: Any = None, deleted: bool = False,
+                         created: bool = False) -> Dict[str, int]:
+        """节点实例状态变化对应的进度计数增量"""
+        deltas: Dict[str, int] = {}
+        old_column = None if created else status_column(old_status)
+        new_column = None if deleted else status_column(new_status if new_status is not None else old_status)
+        if old_column == new_column and not (created or deleted):
+            return deltas
+        if created:
+            deltas["total_nodes"] = 1
+        if deleted:
+            deltas["total_nodes"] = -1
+        if old_column:
+            deltas[old_column] = deltas.get(old_column, 0) - 1
+        if new_column:
+            deltas[new_column] = deltas.get(new_column, 0) + 1
+        return deltas
+    
+    async def _refresh_progress(self, workflow_instance_id: uuid.UUID) -> None:
+        """进度行不存在（计数表上线前创建的实例）时，在事务提交后重新统计"""
+        try:
+            await self.progress_repo.refresh(workflow_instance_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 重新统计工作流实例进度失败 {workflow_instance_id}: {e}")
+    
+    @staticmethod
+    async def _publish_node_status(result: Optional[Dict[str, Any]]) -> None:
+        """节点实例状态写入后发布节点状态事件"""
+        if not result:
+            return
+        await get_workflow_event_bus().publish(EVENT_NODE_STATUS, {
+            "node_instance_id": result.get("node_instance_id"),
+            "node_id": result.get("node_id"),
+            "node_instance_name": result.get("node_instance_name"),
+            "status": result.get("status"),
+            "error_message": result.get("error_message")
+        }, workflow_instance_id=result.get("workflow_instance_id"))
+    
+    @staticmethod
+    async def _publish_nodes_changed(workflow_instance_id: uuid.UUID, action: str, count: int) -> None:
+        """批量写入节点实例后发布事件，订阅方按需重新读取"""
+        if count:
+            await get_workflow_event_bus().publish(EVENT_NODES_CHANGED, {
+                "action": action,
+                "count": count
+            }, workflow_instance_id=workflow_instance_id)
+    
+    async def _insert_with_progress(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """插入节点实例，并在同一事务中增加所属工作流实例的进度计数"""
+        if not await self.progress_repo.ensure_table():
+            return await self.create(data)
+        
+        columns, placeholders, values = dict_to_sql_insert(data)
+        async with self.db.transaction() as conn:
+            await conn.execute(f"INSERT INTO node_instance ({columns}) VALUES ({placeholders})", values)
+            applied = await self.progress_repo.apply_delta(
+                conn, data["workflow_instance_id"], self._progress_deltas(None, data.get("status"), created=True)
+            )
+            result = await conn.fetchrow(
+                "SELECT * FROM node_instance WHERE node_instance_id = $1", data["node_instance_id"]
+            )
+        if not applied:
+            await self._refresh_progress(data["workflow_instance_id"])
+        return result
+    
+    async def _update_with_progress(self, instance_id: uuid.UUID,
+                                    update_fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """更新节点实例；状态变化或软删除时在同一事务中调整所属工作流实例的进度计数
+        
+        先锁定节点实例行读取原状态，再更新计数行（与批量写入的加锁顺序一致）。
+        """
+        if ("status" not in update_fields and not update_fields.get("is_deleted")) \
+                or not await self.progress_repo.ensure_table():
+            return await self.update(instance_id, update_fields, "node_instance_id")
+        
+        set_clause, values = dict_to_sql_update(update_fields, exclude=["node_instance_id", "created_at", "updated_at"])
+        async with self.db.transaction() as conn:
+            current = await conn.fetchrow("""
+                SELECT workflow_instance_id, status FROM node_instance
+                WHERE node_instance_id = $1 AND is_deleted = FALSE
+                FOR UPDATE
+            """, instance_id)
+            if not current:
+                logger.warning(f"更新记录失败，记录不存在: {instance_id}")
+                return None
+            
+            await conn.execute(
+                f"UPDATE node_instance SET {set_clause}, updated_at = NOW() WHERE node_instance_id = ${len(values) + 1}",
+                (*values, instance_id)
+            )
+            applied = await self.progress_repo.apply_delta(
+                conn, current["workflow_instance_id"],
+                self._progress_deltas(current["status"], update_fields.get("status"),
+                                      deleted=bool(update_fields.get("is_deleted")))
+            )
+            result = await conn.fetchrow("SELECT * FROM node_instance WHERE node_instance_id = $1", instance_id)
+        if not applied:
+            await self._refresh_progress(current["workflow_instance_id"])
+        return result
+    
+    async def _bulk_update_with_progress(self, workflow_instance_id: uuid.UUID, query: str, *args) -> str:
+        """批量更新一个工作流实例的节点实例，并在同一事务中重新统计进度计数"""
+        if not await self.progress_repo.ensure_table():
+            return await self.db.execute(query, *args)
+        
+        async with self.db.transaction() as conn:
+            result = await conn.execute(query, args)
+            await self.progress_repo.refresh(workflow_instance_id, conn)
+        return result
+    
     async def create_node_instance(self, instance_data: NodeInstanceCreate) -> Optional[Dict[str, Any]]:
         """创建节点实例"""
         node_instance_id = uuid.uuid4()
@@ -103,7 +218,7 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             logger.trace(f"   - 重试次数: {data['retry_count']}")
             
             logger.trace(f"💾 写入数据库: 节点实例 {node_instance_id}")
-            result = await self.create(data)
+            result = await self._insert_with_progress(data)
             if result:
                 logger.trace(f"✅ 节点实例创建成功!")
                 logger.trace(f"   - 实例ID: {result['node_instance_id']}")
@@ -112,6 +227,9 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
                 logger.trace(f"   - 创建时间: {result.get('created_at', 'unknown')}")
             else:
                 logger.error(f"❌ 节点实例创建失败: 数据库返回空结果")
+            # 新建的节点实例（如回环）不在已驻留的状态投影中，投影会在下次查询时重新加载
+            get_workflow_status_projection().apply_node_row(result)
+            await self._publish_node_status(result)
             # 反序列化JSON字段
             if result:
                 result = self._deserialize_json_fields(result)
@@ -181,7 +299,7 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             
             logger.trace(f"💾 更新节点实例数据库: {instance_id}")
             logger.trace(f"   - 更新字段: {list(update_fields.keys())}")
-            result = await self.update(instance_id, update_fields, "node_instance_id")
+            result = await self._update_with_progress(instance_id, update_fields)
             if result:
                 logger.trace(f"✅ 节点实例更新成功!")
                 logger.trace(f"   - 实例ID: {instance_id}")
@@ -191,6 +309,9 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
                         logger.trace(f"   - 完成时间: {update_fields.get('completed_at', '未设置')}")
             else:
                 logger.error(f"❌ 节点实例更新失败: 数据库返回空结果")
+            get_workflow_status_projection().apply_node_row(result)
+            if "status" in update_fields:
+                await self._publish_node_status(result)
             # 反序列化JSON字段
             if result:
                 result = self._deserialize_json_fields(result)
@@ -221,9 +342,11 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             if error_message:
                 update_data["error_message"] = error_message
             
-            result = await self.update(instance_id, update_data, "node_instance_id")
+            result = await self._update_with_progress(instance_id, update_data)
             if result:
                 logger.trace(f"更新节点实例 {instance_id} 状态为 {status.value}")
+            get_workflow_status_projection().apply_node_row(result)
+            await self._publish_node_status(result)
             return result
         except Exception as e:
             logger.error(f"更新节点实例状态失败: {e}")
@@ -241,6 +364,7 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             result = await self.db.fetch_one(query, instance_id)
             if result:
                 logger.trace(f"节点实例 {instance_id} 重试次数增加到 {result['retry_count']}")
+            get_workflow_status_projection().apply_node_row(result)
             return result
         except Exception as e:
             logger.error(f"增加重试次数失败: {e}")
@@ -266,8 +390,8 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             
             query += " ORDER BY ni.created_at ASC"
             
-            results = await self.db.fetch_all(query, *params)
-            return results
+            # 热点查询：返回轻量Row对象，避免逐行构造dict
+            return await self.db.fetch_rows(query, *params)
         except Exception as e:
             logger.error(f"获取工作流实例的节点实例列表失败: {e}")
             raise
@@ -401,16 +525,37 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
                 SET status = 'cancelled', completed_at = NOW()
                 WHERE workflow_instance_id = $1 AND status = 'pending'
             """
-            result = await self.db.execute(query, workflow_instance_id)
+            result = await self._bulk_update_with_progress(workflow_instance_id, query, workflow_instance_id)
+            get_workflow_status_projection().invalidate(workflow_instance_id)
             
             # 解析更新的记录数
             updated_count = int(result.split()[1]) if result.split()[1].isdigit() else 0
+            await self._publish_nodes_changed(workflow_instance_id, "cancelled", updated_count)
             logger.trace(f"取消了 {updated_count} 个等待执行的节点实例")
             return updated_count
         except Exception as e:
             logger.error(f"取消等待执行的节点实例失败: {e}")
             raise
     
+    async def cancel_unfinished_instances(self, workflow_instance_id: uuid.UUID) -> int:
+        """取消工作流实例中所有未完成（非completed/failed）的节点实例"""
+        try:
+            query = """
+                UPDATE node_instance 
+                SET status = 'cancelled', updated_at = $1
+                WHERE workflow_instance_id = $2 AND status NOT IN ('completed', 'failed')
+            """
+            result = await self._bulk_update_with_progress(workflow_instance_id, query, now_utc(), workflow_instance_id)
+            get_workflow_status_projection().invalidate(workflow_instance_id)
+            
+            updated_count = int(result.split()[-1])
+            await self._publish_nodes_changed(workflow_instance_id, "cancelled", updated_count)
+            logger.trace(f"取消了 {updated_count} 个未完成的节点实例")
+            return updated_count
+        except Exception as e:
+            logger.error(f"取消未完成的节点实例失败: {e}")
+            raise
+    
     async def get_instance_execution_path(self, workflow_instance_id: uuid.UUID) -> List[Dict[str, Any]]:
         """获取工作流实例的执行路径"""
         try:
@@ -483,17 +628,21 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
             logger.trace(f"🗑️ 开始删除节点实例: {node_instance_id} (软删除: {soft_delete})")
             
             if soft_delete:
-                result = await self.update(node_instance_id, {
+                result = await self._update_with_progress(node_instance_id, {
                     "is_deleted": True,
                     "updated_at": now_utc()
-                }, "node_instance_id")
+                })
                 success = result is not None
             else:
+                current = await self.get_by_id(node_instance_id, "node_instance_id")
                 query = "DELETE FROM node_instance WHERE node_instance_id = $1"
                 result = await self.db.execute(query, node_instance_id)
                 success = "1" in result
+                if success and current:
+                    await self._refresh_progress(current["workflow_instance_id"])
             
             if success:
+                get_workflow_status_projection().invalidate(node_instance_id=node_instance_id)
                 action = "软删除" if soft_delete else "硬删除"
                 logger.trace(f"✅ {action}节点实例成功: {node_instance_id}")
             
@@ -530,13 +679,18 @@ class NodeInstanceRepository(BaseRepository[NodeInstance]):
                     SET is_deleted = TRUE, updated_at = $1
                     WHERE workflow_instance_id = $2 AND is_deleted = FALSE
                 """
-                result = await self.db.execute(query, now_utc(), workflow_instance_id)
+                result = await self._bulk_update_with_progress(workflow_instance_id, query, now_utc(), workflow_instance_id)
             else:
                 query = "DELETE FROM node_instance WHERE workflow_instance_id = $1"
                 result = await self.db.execute(query, workflow_instance_id)
+                if await self.progress_repo.ensure_table():
+                    await self.progress_repo.delete_progress(workflow_instance_id)
+            
+            get_workflow_status_projection().invalidate(workflow_instance_id)
             
             # 提取影响的行数
             deleted_count = int(result.split()[-1]) if "DELETE" in result or "UPDATE" in result else 0
+            await self._publish_nodes_changed(workflow_instance_id, "deleted", deleted_count)
             
             logger.trace(f"✅ 删除工作流实例 {workflow_instance_id} 下的节点实例完成，影响 {deleted_count} 个节点实例")
             return deleted_count
@@ -4,7 +4,7 @@ Task Instance Repository
 """
 
 import uuid
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 from datetime import datetime
 from loguru import logger
 
@@ -13,7 +13,8 @@ from ...models.instance import (
     TaskInstance, TaskInstanceCreate, TaskInstanceUpdate, 
     TaskInstanceStatus, TaskInstanceType
 )
-from ...utils.helpers import now_utc
+from ...utils.helpers import now_utc, dict_list_to_sql_insert, decode_cursor, build_keyset_condition, build_keyset_page
+from ...services.workflow_event_bus import get_workflow_event_bus, EVENT_TASK_ASSIGNED, EVENT_TASK_STATUS
 
 
 class TaskInstanceRepository(BaseRepository[TaskInstance]):
@@ -22,6 +23,26 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
     def __init__(self):
         super().__init__("task_instance")
     
+    @staticmethod
+    async def _publish_task_event(task: Optional[Dict[str, Any]], event_type: Optional[str] = None,
+                                  previous_user_id: Optional[uuid.UUID] = None) -> None:
+        """任务写入后发布事件，接收者为分配用户（改派时包括原分配用户）与工作流执行者"""
+        if not task:
+            return
+        status = task.get("status")
+        if event_type is None:
+            event_type = EVENT_TASK_ASSIGNED if status == TaskInstanceStatus.ASSIGNED.value else EVENT_TASK_STATUS
+        await get_workflow_event_bus().publish(event_type, {
+            "task_instance_id": task.get("task_instance_id"),
+            "node_instance_id": task.get("node_instance_id"),
+            "task_title": task.get("task_title"),
+            "task_type": task.get("task_type"),
+            "status": status,
+            "assigned_user_id": task.get("assigned_user_id"),
+            "assigned_agent_id": task.get("assigned_agent_id")
+        }, workflow_instance_id=task.get("workflow_instance_id"),
+            user_ids=(task.get("assigned_user_id"), previous_user_id))
+    
     async def create_task(self, task_data: TaskInstanceCreate) -> Optional[Dict[str, Any]]:
         """创建任务实例"""
         try:
@@ -47,12 +68,9 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             self._validate_task_assignment(task_data)
             
             # 智能确定任务状态：如果有分配对象，则状态为ASSIGNED，否则为PENDING
-            initial_status = TaskInstanceStatus.PENDING.value
-            assigned_at = None
+            data = self._build_task_row(task_data, task_instance_id)
             
-            if task_data.assigned_user_id or task_data.assigned_agent_id:
-                initial_status = TaskInstanceStatus.ASSIGNED.value
-                assigned_at = now_utc()
+            if data['status'] == TaskInstanceStatus.ASSIGNED.value:
                 logger.info(f"   📌 任务已分配，初始状态设为 ASSIGNED")
                 if task_data.assigned_user_id:
                     logger.info(f"      分配给用户: {task_data.assigned_user_id}")
@@ -61,27 +79,6 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             else:
                 logger.info(f"   ⏳ 任务未分配，初始状态设为 PENDING")
             
-            # 准备任务数据
-            data = {
-                "task_instance_id": task_instance_id,
-                "node_instance_id": task_data.node_instance_id,
-                "workflow_instance_id": task_data.workflow_instance_id,
-                "processor_id": task_data.processor_id,
-                "task_type": task_data.task_type.value,
-                "task_title": task_data.task_title,
-                "task_description": task_data.task_description,
-                "input_data": task_data.input_data or "",
-                "context_data": task_data.context_data or "",
-                "assigned_user_id": task_data.assigned_user_id,
-                "assigned_agent_id": task_data.assigned_agent_id,
-                "assigned_at": assigned_at,
-                "estimated_duration": task_data.estimated_duration,
-                "status": initial_status,
-                "created_at": now_utc(),
-                "updated_at": now_utc(),
-                "is_deleted": False
-            }
-            
             logger.info(f"   💾 正在写入数据库...")
             result = await self.create(data)
             
@@ -102,6 +99,7 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             else:
                 logger.error(f"❌ 任务实例创建失败: 数据库返回空结果")
             
+            await self._publish_task_event(result)
             return result
         except Exception as e:
             logger.error(f"❌ 创建任务实例失败: {e}")
@@ -111,6 +109,60 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             logger.error(f"   异常堆栈: {traceback.format_exc()}")
             raise
     
+    async def create_tasks(self, task_data_list: List[TaskInstanceCreate]) -> List[Dict[str, Any]]:
+        """批量创建任务实例：预先生成主键，在一个事务内多行INSERT写入，不逐行回读
+        
+        Returns:
+            写入的任务行（与create_task写入的列一致）
+        """
+        if not task_data_list:
+            return []
+        try:
+            rows = []
+            for task_data in task_data_list:
+                self._validate_task_assignment(task_data)
+                rows.append(self._build_task_row(task_data, uuid.uuid4()))
+            
+            # 分配情况不同的任务写入列不同，按列分组后在同一事务内写入
+            async with self.db.transaction() as conn:
+                for columns, values_list in dict_list_to_sql_insert(rows):
+                    await conn.insert_many(self.table_name, columns, values_list)
+            logger.info(f"✅ 批量创建任务实例 {len(rows)} 个 (节点实例: {rows[0]['node_instance_id']})")
+            for row in rows:
+                await self._publish_task_event(row)
+            return rows
+        except Exception as e:
+            logger.error(f"❌ 批量创建任务实例失败: {e}")
+            raise
+    
+    def _build_task_row(self, task_data: TaskInstanceCreate, task_instance_id: uuid.UUID) -> Dict[str, Any]:
+        """构造任务实例行：有分配对象时状态为ASSIGNED并记录分配时间，否则为PENDING"""
+        initial_status = TaskInstanceStatus.PENDING.value
+        assigned_at = None
+        if task_data.assigned_user_id or task_data.assigned_agent_id:
+            initial_status = TaskInstanceStatus.ASSIGNED.value
+            assigned_at = now_utc()
+        
+        return {
+            "task_instance_id": task_instance_id,
+            "node_instance_id": task_data.node_instance_id,
+            "workflow_instance_id": task_data.workflow_instance_id,
+            "processor_id": task_data.processor_id,
+            "task_type": task_data.task_type.value,
+            "task_title": task_data.task_title,
+            "task_description": task_data.task_description,
+            "input_data": task_data.input_data or "",
+            "context_data": task_data.context_data or "",
+            "assigned_user_id": task_data.assigned_user_id,
+            "assigned_agent_id": task_data.assigned_agent_id,
+            "assigned_at": assigned_at,
+            "estimated_duration": task_data.estimated_duration,
+            "status": initial_status,
+            "created_at": now_utc(),
+            "updated_at": now_utc(),
+            "is_deleted": False
+        }
+    
     def _validate_task_assignment(self, task_data: TaskInstanceCreate):
         """验证任务分配的一致性（最小干预原则）"""
         # 仅记录警告，不自动修改数据，让上层业务逻辑处理
@@ -265,6 +317,8 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 
                 # 获取更新后的完整任务信息
                 updated_task = await self.get_task_by_id(task_instance_id)
+                if update_data.status is not None:
+                    await self._publish_task_event(updated_task, EVENT_TASK_STATUS)
                 return updated_task
             else:
                 logger.error(f"❌ 任务实例更新失败: 数据库返回空结果")
@@ -278,6 +332,22 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             logger.error(f"   异常堆栈: {traceback.format_exc()}")
             raise
     
+    async def get_task_statuses_by_node_instances(self, node_instance_ids: List[uuid.UUID]) -> List[Dict[str, Any]]:
+        """批量获取多个节点实例下任务的状态（仅ID与状态，供节点完成对账使用）"""
+        if not node_instance_ids:
+            return []
+        try:
+            placeholders = ", ".join(f"${i}" for i in range(1, len(node_instance_ids) + 1))
+            query = f"""
+                SELECT node_instance_id, task_instance_id, status
+                FROM task_instance
+                WHERE node_instance_id IN ({placeholders}) AND is_deleted = FALSE
+            """
+            return await self.db.fetch_rows(query, *node_instance_ids, use_primary=True)
+        except Exception as e:
+            logger.error(f"批量获取节点任务状态失败: {e}")
+            raise
+
     async def get_tasks_by_node_instance(self, node_instance_id: uuid.UUID) -> List[Dict[str, Any]]:
         """获取节点实例的所有任务"""
         try:
@@ -293,16 +363,8 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 WHERE ti.node_instance_id = $1 AND ti.is_deleted = FALSE
                 ORDER BY ti.created_at ASC
             """
-            results = await self.db.fetch_all(query, node_instance_id)
-            
-            # 直接返回结果（input_data和output_data现在是文本格式）
-            formatted_results = []
-            for result in results:
-                result = dict(result)
-                # input_data和output_data现在是文本格式，不需要JSON解析
-                formatted_results.append(result)
-            
-            return formatted_results
+            # 热点查询：返回轻量Row对象（可按字典方式读取），避免逐行构造并复制dict
+            return await self.db.fetch_rows(query, node_instance_id)
         except Exception as e:
             logger.error(f"获取节点实例任务列表失败: {e}")
             raise
@@ -387,13 +449,13 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 if limit is not None:
                     query = base_query + " LIMIT $4"
                     logger.info(f"🗃️ [数据库查询] 执行带状态过滤的查询 (限制: {limit})")
-                    results = await self.db.fetch_all(query, user_id, TaskInstanceType.HUMAN.value, 
-                                                    status.value, limit)
+                    results = await self.db.fetch_rows(query, user_id, TaskInstanceType.HUMAN.value, 
+                                                     status.value, limit)
                 else:
                     query = base_query
                     logger.info(f"🗃️ [数据库查询] 执行带状态过滤的查询 (无限制)")
-                    results = await self.db.fetch_all(query, user_id, TaskInstanceType.HUMAN.value, 
-                                                    status.value)
+                    results = await self.db.fetch_rows(query, user_id, TaskInstanceType.HUMAN.value, 
+                                                     status.value)
             else:
                 base_query = """
                     SELECT ti.*, 
@@ -418,11 +480,11 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 if limit is not None:
                     query = base_query + " LIMIT $3"
                     logger.info(f"🗃️ [数据库查询] 执行无状态过滤的查询 (限制: {limit})")
-                    results = await self.db.fetch_all(query, user_id, TaskInstanceType.HUMAN.value, limit)
+                    results = await self.db.fetch_rows(query, user_id, TaskInstanceType.HUMAN.value, limit)
                 else:
                     query = base_query
                     logger.info(f"🗃️ [数据库查询] 执行无状态过滤的查询 (无限制)")
-                    results = await self.db.fetch_all(query, user_id, TaskInstanceType.HUMAN.value)
+                    results = await self.db.fetch_rows(query, user_id, TaskInstanceType.HUMAN.value)
             
             logger.info(f"🗃️ [数据库查询] 查询完成，返回 {len(results)} 条记录")
             
@@ -472,14 +534,8 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                     else:
                         logger.info(f"🔧 [诊断3] 目标任务 {task_id} 不存在")
             
-            # 直接返回结果（input_data和output_data现在是文本格式）
-            formatted_results = []
-            for result in results:
-                result = dict(result)
-                # input_data和output_data现在是文本格式，不需要JSON解析
-                formatted_results.append(result)
-            
-            return formatted_results
+            # 返回轻量Row对象（input_data和output_data是文本格式，无需解析；调用方写入的附加字段单独保存）
+            return results
         except Exception as e:
             logger.error(f"获取用户人工任务失败: {e}")
             raise
@@ -589,6 +645,8 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 
                 # 获取更新后的任务信息
                 updated_task = await self.get_task_by_id(task_instance_id)
+                await self._publish_task_event(updated_task, EVENT_TASK_ASSIGNED,
+                                               current_task.get('assigned_user_id') if current_task else None)
                 return updated_task
             else:
                 logger.error(f"❌ 任务分配失败: 数据库更新返回空结果")
@@ -644,6 +702,8 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
                 
                 # 获取更新后的任务信息
                 updated_task = await self.get_task_by_id(task_instance_id)
+                await self._publish_task_event(updated_task, EVENT_TASK_ASSIGNED,
+                                               current_task.get('assigned_user_id') if current_task else None)
                 return updated_task
             else:
                 logger.error(f"❌ 任务分配失败: 数据库更新返回空结果")
@@ -809,6 +869,67 @@ class TaskInstanceRepository(BaseRepository[TaskInstance]):
             logger.error(f"批量删除工作流任务实例失败: {e}")
             raise
     
+    _USER_TASK_HISTORY_QUERY = """
+        SELECT ti.*,
+               p.name as processor_name, p.type as processor_type,
+               wi.workflow_instance_name as workflow_instance_name,
+               w.name as workflow_name
+        FROM task_instance ti
+        LEFT JOIN processor p ON p.processor_id = ti.processor_id
+        LEFT JOIN workflow_instance wi ON wi.workflow_instance_id = ti.workflow_instance_id
+        LEFT JOIN workflow w ON w.workflow_id = wi.workflow_id
+        WHERE ti.assigned_user_id = $1 AND ti.is_deleted = FALSE
+              AND ti.created_at >= NOW() - INTERVAL $2 DAY
+    """
+    _USER_TASK_HISTORY_ORDER = " ORDER BY ti.created_at DESC, ti.task_instance_id DESC"
+    
+    async def get_user_task_history(self, user_id: uuid.UUID, days: int = 30,
+                                    limit: int = 100) -> List[Dict[str, Any]]:
+        """获取用户最近days天的任务历史"""
+        items, _, _ = await self.get_user_task_history_page(user_id, days, limit)
+        return items
+    
+    async def get_user_task_history_page(self, user_id: uuid.UUID, days: int = 30, page_size: int = 100,
+                                         cursor: Optional[str] = None) -> tuple:
+        """键集分页获取用户任务历史
+        
+        Returns:
+            (items, next_cursor, has_more)
+        """
+        try:
+            query = self._USER_TASK_HISTORY_QUERY
+            args = [user_id, days]
+            if cursor:
+                keyset_clause, keyset_values, _ = build_keyset_condition(
+                    "ti.created_at", "ti.task_instance_id", decode_cursor(cursor), "DESC", 3
+                )
+                query += f" AND {keyset_clause}"
+                args.extend(keyset_values)
+            query += self._USER_TASK_HISTORY_ORDER + f" LIMIT ${len(args) + 1}"
+            args.append(page_size + 1)
+            
+            results = await self.db.fetch_all(query, *args)
+            items, next_cursor, has_more = build_keyset_page(
+                [dict(result) for result in results], page_size, "created_at", "task_instance_id"
+            )
+            return items, next_cursor, has_more
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"获取用户任务历史失败: {e}")
+            raise
+    
+    async def iter_user_task_history(self, user_id: uuid.UUID, days: int = 30,
+                                     limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """流式获取用户任务历史（服务端游标，适合大结果集导出）"""
+        query = self._USER_TASK_HISTORY_QUERY + self._USER_TASK_HISTORY_ORDER
+        if limit is not None:
+            rows = self.db.fetch_iter(query + " LIMIT $3", user_id, days, limit)
+        else:
+            rows = self.db.fetch_iter(query, user_id, days)
+        async for row in rows:
+            yield row
+    
     async def get_user_task_statistics(self, user_id: uuid.UUID) -> Dict[str, Any]:
         """获取用户任务统计信息（包括所有分配给用户的任务，不包括已删除任务）"""
         try:
@@ -0,0 +1,78 @@
+"""
+工作流上下文增量日志数据访问层
+Workflow Context Delta Repository
+
+上下文的节点状态变迁按版本号追加写入，不再每次重写整份上下文；
+完整快照记录其所含的版本号，写入快照后删除已被覆盖的增量。
+恢复 = 最近的完整快照 + 快照版本之后的增量。
+"""
+
+import uuid
+from typing import Dict, Any, List, Tuple
+from loguru import logger
+
+from ..base import BaseRepository
+from ...database.workflow_context_delta_schema import get_create_table_sql
+from ...utils.helpers import safe_json_dumps, safe_json_loads
+
+
+class WorkflowContextDeltaRepository(BaseRepository[Dict[str, Any]]):
+    """工作流上下文增量日志数据访问层"""
+
+    def __init__(self):
+        super().__init__("workflow_context_delta")
+
+    async def ensure_table(self) -> None:
+        """创建增量日志表（已存在时跳过）"""
+        for table_sql in get_create_table_sql():
+            await self.db.execute(table_sql)
+
+    async def append_deltas(self, workflow_instance_id: uuid.UUID,
+                            deltas: List[Tuple[int, str, str, Any]]) -> int:
+        """批量追加增量
+
+        Args:
+            deltas: [(version, event_type, node_instance_id, payload)]
+
+        Returns:
+            写入行数
+        """
+        if not deltas:
+            return 0
+        rows = [
+            (str(workflow_instance_id), version, event_type, str(node_instance_id),
+             safe_json_dumps(payload) if payload is not None else None)
+            for version, event_type, node_instance_id, payload in deltas
+        ]
+        return await self.db.insert_many(
+            "workflow_context_delta",
+            ["workflow_instance_id", "version", "event_type", "node_instance_id", "payload"],
+            rows
+        )
+
+    async def get_deltas_after(self, workflow_instance_id: uuid.UUID, version: int) -> List[Dict[str, Any]]:
+        """按版本顺序获取快照版本之后的增量"""
+        try:
+            rows = await self.db.fetch_all("""
+                SELECT version, event_type, node_instance_id, payload
+                FROM workflow_context_delta
+                WHERE workflow_instance_id = $1 AND version > $2
+                ORDER BY version ASC
+            """, str(workflow_instance_id), version, use_primary=True)
+        except Exception as e:
+            # 增量表尚未创建（首次启动）时按无增量处理
+            logger.warning(f"⚠️ 读取上下文增量失败 {workflow_instance_id}: {e}")
+            return []
+        for row in rows:
+            row['payload'] = safe_json_loads(row['payload']) if row.get('payload') else None
+        return rows
+
+    async def delete_deltas(self, workflow_instance_id: uuid.UUID) -> None:
+        """压缩：写入完整快照后删除该工作流的全部增量
+
+        快照之后的变更仍在内存中等待写入，库中的增量均已被快照覆盖。
+        """
+        await self.db.execute(
+            "DELETE FROM workflow_context_delta WHERE workflow_instance_id = $1",
+            str(workflow_instance_id)
+        )
@@ -0,0 +1,91 @@
+"""
+工作流执行幂等键数据访问层
+Workflow Execution Idempotency Repository
+
+多进程部署下的幂等兜底：首个请求以 in_progress 状态占用幂等键（短租约），
+完成后写入响应并延长到完整TTL；其他进程的重复请求读取同一行，等待或直接返回首次响应。
+"""
+
+import uuid
+from typing import Dict, Any, Optional, Union
+from loguru import logger
+
+from ..base import BaseRepository
+from ...database.workflow_idempotency_schema import get_create_table_sql
+from ...utils.helpers import safe_json_dumps, safe_json_loads
+
+
+class WorkflowIdempotencyRepository(BaseRepository[Dict[str, Any]]):
+    """工作流执行幂等键数据访问层"""
+
+    def __init__(self):
+        super().__init__("workflow_execution_idempotency")
+
+    async def ensure_table(self) -> None:
+        """创建幂等键表（已存在时跳过）"""
+        for table_sql in get_create_table_sql():
+            await self.db.execute(table_sql)
+
+    async def claim(self, user_id: Union[str, uuid.UUID], idempotency_key: str,
+                    request_hash: str, lease_seconds: int) -> bool:
+        """占用幂等键；键不存在或已过期时占用成功
+
+        过期行（包括持有者崩溃后租约到期的 in_progress 行）在同一语句中被接管。
+
+        Returns:
+            是否由本次请求占用
+        """
+        # ON DUPLICATE KEY UPDATE 按顺序赋值，expires_at 必须最后更新
+        query = """
+            INSERT INTO workflow_execution_idempotency
+                (user_id, idempotency_key, request_hash, status, response, workflow_instance_id, created_at, expires_at)
+            VALUES ($1, $2, $3, 'in_progress', NULL, NULL, NOW(3), DATE_ADD(NOW(), INTERVAL $4 SECOND))
+            ON DUPLICATE KEY UPDATE
+                request_hash = IF(expires_at < NOW(), VALUES(request_hash), request_hash),
+                status = IF(expires_at < NOW(), 'in_progress', status),
+                response = IF(expires_at < NOW(), NULL, response),
+                workflow_instance_id = IF(expires_at < NOW(), NULL, workflow_instance_id),
+                created_at = IF(expires_at < NOW(), VALUES(created_at), created_at),
+                expires_at = IF(expires_at < NOW(), VALUES(expires_at), expires_at)
+        """
+        result = await self.db.execute(query, str(user_id), idempotency_key, request_hash, lease_seconds)
+        return result != "UPDATE 0"
+
+    async def get(self, user_id: Union[str, uuid.UUID], idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """读取未过期的幂等键记录"""
+        row = await self.db.fetch_one("""
+            SELECT request_hash, status, response, workflow_instance_id
+            FROM workflow_execution_idempotency
+            WHERE user_id = $1 AND idempotency_key = $2 AND expires_at >= NOW()
+        """, str(user_id), idempotency_key, use_primary=True)
+        if row and row.get('response'):
+            row['response'] = safe_json_loads(row['response'])
+        return row
+
+    async def complete(self, user_id: Union[str, uuid.UUID], idempotency_key: str,
+                       response: Dict[str, Any], workflow_instance_id: Optional[Any], ttl_seconds: int) -> None:
+        """写入首次请求的响应并延长到完整TTL"""
+        await self.db.execute("""
+            UPDATE workflow_execution_idempotency
+            SET status = 'completed', response = $1, workflow_instance_id = $2,
+                expires_at = DATE_ADD(NOW(), INTERVAL $3 SECOND)
+            WHERE user_id = $4 AND idempotency_key = $5
+        """, safe_json_dumps(response), str(workflow_instance_id) if workflow_instance_id is not None else None,
+            ttl_seconds, str(user_id), idempotency_key)
+
+    async def release(self, user_id: Union[str, uuid.UUID], idempotency_key: str) -> None:
+        """首次请求失败：释放占用，允许客户端用同一键重试"""
+        await self.db.execute("""
+            DELETE FROM workflow_execution_idempotency
+            WHERE user_id = $1 AND idempotency_key = $2 AND status = 'in_progress'
+        """, str(user_id), idempotency_key)
+
+    async def purge_expired(self, limit: int = 1000) -> int:
+        """清理过期的幂等键"""
+        result = await self.db.execute(
+            f"DELETE FROM workflow_execution_idempotency WHERE expires_at < NOW() LIMIT {int(limit)}"
+        )
+        purged = int(result.split()[-1])
+        if purged:
+            logger.debug(f"🧹 清理过期幂等键 {purged} 个")
+        return purged
@@ -0,0 +1,186 @@
+"""
+工作流实例进度计数数据访问层
+Workflow Instance Progress Repository
+
+每个工作流实例一行按状态统计的节点实例数量。节点实例仓储在写入状态的同一事务中维护计数：
+  - 单个节点实例的状态变化/新建/删除：锁定节点实例行后按增量调整对应状态列
+  - 批量写入（实例启动时批量创建、批量取消、批量删除）：在同一事务中按节点实例表重新统计
+读取方按主键批量读取，缺失的行（计数表上线前创建的实例）按节点实例表统计后补齐。
+"""
+
+import uuid
+from typing import Dict, Any, List, Optional, Union, Iterable
+from loguru import logger
+
+from ..base import BaseRepository
+from ...database.workflow_instance_progress_schema import get_create_table_sql
+
+# 计数的节点实例状态（与 NodeInstanceStatus 一致）
+PROGRESS_STATUSES = ("pending", "waiting", "running", "completed", "failed", "cancelled")
+
+PROGRESS_COLUMNS = ("total_nodes",) + tuple(f"{status}_nodes" for status in PROGRESS_STATUSES)
+
+# 按节点实例表统计计数的列表达式，与 PROGRESS_COLUMNS 顺序一致
+_COUNT_EXPRESSIONS = ", ".join(
+    ["COUNT(*) AS total_nodes"]
+    + [f"COALESCE(SUM(status = '{status}'), 0) AS {status}_nodes" for status in PROGRESS_STATUSES]
+)
+
+
+def status_column(status: Any) -> Optional[str]:
+    """节点实例状态对应的计数列，未知状态返回None"""
+    value = str(getattr(status, "value", status) or "").lower()
+    return f"{value}_nodes" if value in PROGRESS_STATUSES else None
+
+
+def empty_progress(workflow_instance_id: Union[str, uuid.UUID]) -> Dict[str, Any]:
+    """没有节点实例的工作流实例的进度"""
+    progress = {column: 0 for column in PROGRESS_COLUMNS}
+    progress["workflow_instance_id"] = str(workflow_instance_id)
+    return progress
+
+
+class WorkflowInstanceProgressRepository(BaseRepository[Dict[str, Any]]):
+    """工作流实例进度计数数据访问层"""
+
+    # 进度表是否可用（进程内共享）：None=尚未检查
+    _table_ready: Optional[bool] = None
+
+    def __init__(self):
+        super().__init__("workflow_instance_progress")
+
+    @property
+    def table_ready(self) -> bool:
+        """进度表已确认可用"""
+        return WorkflowInstanceProgressRepository._table_ready is True
+
+    async def ensure_table(self) -> bool:
+        """创建进度表（已存在时跳过）；创建失败时本进程不再维护计数
+
+        必须在事务外调用：MySQL的DDL会隐式提交当前事务。
+        """
+        cls = WorkflowInstanceProgressRepository
+        if cls._table_ready is None:
+            try:
+                for table_sql in get_create_table_sql():
+                    await self.db.execute(table_sql)
+                cls._table_ready = True
+            except Exception as e:
+                logger.warning(f"⚠️ 创建工作流实例进度表失败，进度按节点实例表实时统计: {e}")
+                cls._table_ready = False
+        return cls._table_ready
+
+    async def apply_delta(self, conn, workflow_instance_id: Union[str, uuid.UUID],
+                          deltas: Dict[str, int]) -> bool:
+        """在调用方事务中按增量调整计数
+
+        Args:
+            conn: 事务连接（需已锁定发生变化的节点实例行）
+            deltas: {计数列: 增量}
+
+        Returns:
+            是否已应用；进度行不存在时返回False，由调用方在事务提交后调用 refresh 重新统计
+        """
+        changes = [(column, delta) for column, delta in deltas.items() if delta and column in PROGRESS_COLUMNS]
+        if not changes:
+            return True
+        set_clause = ", ".join(
+            f"{column} = {column} {'+' if delta > 0 else '-'} {abs(int(delta))}" for column, delta in changes
+        )
+        result = await conn.execute(
+            f"UPDATE workflow_instance_progress SET {set_clause} WHERE workflow_instance_id = $1",
+            (str(workflow_instance_id),)
+        )
+        return result != "UPDATE 0"
+
+    async def refresh(self, workflow_instance_id: Union[str, uuid.UUID], conn=None) -> None:
+        """按节点实例表重新统计一个工作流实例的计数（不存在时创建）
+
+        Args:
+            conn: 事务连接；为None时单独执行
+        """
+        query = f"""
+            INSERT INTO workflow_instance_progress (workflow_instance_id, {", ".join(PROGRESS_COLUMNS)})
+            SELECT $1, {_COUNT_EXPRESSIONS}
+            FROM node_instance
+            WHERE workflow_instance_id = $2 AND is_deleted = FALSE
+            ON DUPLICATE KEY UPDATE {", ".join(f"{column} = VALUES({column})" for column in PROGRESS_COLUMNS)}
+        """
+        args = (str(workflow_instance_id), str(workflow_instance_id))
+        if conn is not None:
+            await conn.execute(query, args)
+        else:
+            await self.db.execute(query, *args)
+
+    async def delete_progress(self, workflow_instance_id: Union[str, uuid.UUID], conn=None) -> None:
+        """删除进度行（节点实例被硬删除时）"""
+        query = "DELETE FROM workflow_instance_progress WHERE workflow_instance_id = $1"
+        if conn is not None:
+            await conn.execute(query, (str(workflow_instance_id),))
+        else:
+            await self.db.execute(query, str(workflow_instance_id))
+
+    async def get_progress(self, workflow_instance_id: Union[str, uuid.UUID]) -> Dict[str, Any]:
+        """获取单个工作流实例的进度"""
+        progress = await self.get_progress_many([workflow_instance_id])
+        return progress[str(workflow_instance_id)]
+
+    async def get_progress_many(self, workflow_instance_ids: Iterable[Union[str, uuid.UUID]]) -> Dict[str, Dict[str, Any]]:
+        """按主键批量获取进度
+
+        Returns:
+            {str(workflow_instance_id): 进度}，每个请求的实例都有一项
+        """
+        keys = list(dict.fromkeys(str(instance_id) for instance_id in workflow_instance_ids))
+        if not keys:
+            return {}
+
+        if not await self.ensure_table():
+            return await self._count_nodes(keys)
+
+        placeholders = ", ".join(f"${i + 1}" for i in range(len(keys)))
+        rows = await self.db.fetch_all(f"""
+            SELECT workflow_instance_id, {", ".join(PROGRESS_COLUMNS)}
+            FROM workflow_instance_progress
+            WHERE workflow_instance_id IN ({placeholders})
+        """, *keys)
+        progress = {str(row["workflow_instance_id"]): row for row in rows}
+
+        missing = [key for key in keys if key not in progress]
+        if missing:
+            counted = await self._count_nodes(missing)
+            await self._backfill(list(counted.values()))
+            progress.update(counted)
+        return progress
+
+    async def _count_nodes(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """按节点实例表统计进度"""
+        placeholders = ", ".join(f"${i + 1}" for i in range(len(keys)))
+        rows = await self.db.fetch_all(f"""
+            SELECT workflow_instance_id, {_COUNT_EXPRESSIONS}
+            FROM node_instance
+            WHERE workflow_instance_id IN ({placeholders}) AND is_deleted = FALSE
+            GROUP BY workflow_instance_id
+        """, *keys)
+
+        progress = {key: empty_progress(key) for key in keys}
+        for row in rows:
+            entry = progress[str(row["workflow_instance_id"])]
+            for column in PROGRESS_COLUMNS:
+                entry[column] = int(row[column] or 0)
+        return progress
+
+    async def _backfill(self, progress_rows: List[Dict[str, Any]]) -> None:
+        """补齐缺失的进度行；已被并发写入创建的行保持不变"""
+        if not progress_rows:
+            return
+        columns = ("workflow_instance_id",) + PROGRESS_COLUMNS
+        placeholders = ", ".join(f"${i + 1}" for i in range(len(columns)))
+        try:
+            await self.db.execute_many(
+                f"INSERT IGNORE INTO workflow_instance_progress ({', '.join(columns)}) VALUES ({placeholders})",
+                [tuple(row[column] for column in columns) for row in progress_rows]
+            )
+            logger.debug(f"📊 补齐工作流实例进度 {len(progress_rows)} 个")
+        except Exception as e:
+            logger.warning(f"⚠️ 补齐工作流实例进度失败: {e}")
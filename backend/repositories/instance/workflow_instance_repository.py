@@ -5,7 +5,7 @@ Workflow Instance Repository
 
 import uuid
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime
 from loguru import logger
 
@@ -18,6 +18,9 @@ from ...models.instance import (
     WorkflowInstanceStatus, ExecutionStatistics
 )
 from ...utils.helpers import now_utc, safe_json_dumps, safe_json_serializer
+from ...utils.snapshot_codec import unpack_context_snapshot
+from ...services.workflow_status_projection import get_workflow_status_projection
+from ...services.workflow_event_bus import get_workflow_event_bus, EVENT_WORKFLOW_STATUS
 from ...utils.database import db_manager
 
 
@@ -84,6 +87,7 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                 result['context_data'] = json.loads(result.get('context_data', '{}'))
                 if result.get('output_data'):
                     result['output_data'] = json.loads(result['output_data'])
+                get_workflow_event_bus().register_owner(result['workflow_instance_id'], instance_data.executor_id)
             else:
                 logger.error(f"❌ 工作流实例创建失败: 数据库返回空结果")
             
@@ -203,6 +207,15 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                     logger.error(f"❌ 无法获取工作流实例: {instance_id}")
                     return None
             
+            get_workflow_status_projection().apply_instance_row(result)
+            event_bus = get_workflow_event_bus()
+            event_bus.register_owner(instance_id, result.get("executor_id"))
+            if update_data.status is not None:
+                await event_bus.publish(EVENT_WORKFLOW_STATUS, {
+                    "status": update_data.status.value,
+                    "error_message": result.get("error_message")
+                }, workflow_instance_id=instance_id)
+            
             if result:
                 logger.info(f"✅ 工作流实例状态更新成功!")
                 logger.info(f"   - 实例ID: {instance_id}")
@@ -727,6 +740,7 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                     raise delete_error
             
             if success:
+                get_workflow_status_projection().invalidate(instance_id)
                 action = "软删除" if soft_delete else "硬删除"
                 logger.info(f"✅ {action}工作流实例成功: {instance_id}")
             else:
@@ -912,19 +926,18 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
     
     # ================== 工作流持久化功能 ==================
     
-    async def update_context_snapshot(self, workflow_instance_id: uuid.UUID, context_data: Dict[str, Any]) -> bool:
-        """更新工作流上下文快照（用于定期持久化）"""
-        try:
-            # 查找最近的自动快照
-            query = """
-                SELECT snapshot_id FROM workflow_context_snapshot
-                WHERE workflow_instance_id = %s AND snapshot_type = 'auto'
-                ORDER BY created_at DESC
-                LIMIT 1
-            """
+    async def update_context_snapshot(self, workflow_instance_id: uuid.UUID, context_data: Union[Dict[str, Any], str],
+                                      snapshot_id: Optional[uuid.UUID] = None) -> Optional[uuid.UUID]:
+        """更新工作流上下文快照（用于定期持久化）
 
-            result = await self.db.fetch_one(query, workflow_instance_id)
+        Args:
+            context_data: 快照数据，或调用方已序列化好的JSON文本（如编码后的 '3.0' 快照信封）
+            snapshot_id: 调用方已知的自动快照ID，传入时直接按主键更新，省去查找
 
+        Returns:
+            被更新或新建的快照ID，失败时返回None
+        """
+        try:
             def json_serializer(obj):
                 """自定义JSON序列化器，处理Set、UUID等类型"""
                 if isinstance(obj, set):
@@ -935,35 +948,55 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                     return obj.isoformat()
                 return str(obj)
 
-            if result:
-                # 更新现有快照 - 移除updated_at字段因为数据库表中不存在
-                update_query = """
-                    UPDATE workflow_context_snapshot
-                    SET context_data = %s
-                    WHERE snapshot_id = %s
-                """
+            # 更新现有快照 - 移除updated_at字段因为数据库表中不存在
+            update_query = """
+                UPDATE workflow_context_snapshot
+                SET context_data = %s
+                WHERE snapshot_id = %s
+            """
+            if isinstance(context_data, str):
+                serialized_data = context_data
+            else:
                 serialized_data = json.dumps(context_data, default=json_serializer)
+
+            if snapshot_id:
+                result = await self.db.execute(update_query, serialized_data, str(snapshot_id))
+                if result != "UPDATE 0":
+                    logger.trace(f"✅ 更新上下文快照: {snapshot_id}")
+                    return snapshot_id
+
+            # 查找最近的自动快照
+            query = """
+                SELECT snapshot_id FROM workflow_context_snapshot
+                WHERE workflow_instance_id = %s AND snapshot_type = 'auto'
+                ORDER BY created_at DESC
+                LIMIT 1
+            """
+
+            result = await self.db.fetch_one(query, workflow_instance_id)
+
+            if result:
                 await self.db.execute(update_query, serialized_data, result['snapshot_id'])
                 logger.trace(f"✅ 更新上下文快照: {result['snapshot_id']}")
-            else:
-                # 创建新快照
-                await self.save_workflow_context_snapshot(
-                    workflow_instance_id=workflow_instance_id,
-                    context_data=context_data,
-                    snapshot_type='auto',
-                    description='自动持久化快照'
-                )
-                logger.trace(f"✅ 创建新的上下文快照: {workflow_instance_id}")
-            
-            return True
-            
+                return result['snapshot_id']
+
+            # 创建新快照
+            new_snapshot_id = await self.save_workflow_context_snapshot(
+                workflow_instance_id=workflow_instance_id,
+                context_data=serialized_data,
+                snapshot_type='auto',
+                description='自动持久化快照'
+            )
+            logger.trace(f"✅ 创建新的上下文快照: {workflow_instance_id}")
+            return new_snapshot_id
+
         except Exception as e:
             logger.error(f"更新上下文快照失败 {workflow_instance_id}: {e}")
-            return False
+            return None
     
     async def save_workflow_context_snapshot(self, 
                                            workflow_instance_id: uuid.UUID,
-                                           context_data: Dict[str, Any],
+                                           context_data: Union[Dict[str, Any], str],
                                            node_states: Dict[str, Any] = None,
                                            snapshot_type: str = 'auto',
                                            description: str = None,
@@ -988,7 +1021,7 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                 'snapshot_id': snapshot_id,
                 'workflow_instance_id': workflow_instance_id,
                 'snapshot_type': snapshot_type,
-                'context_data': safe_json_dumps(context_data or {}),
+                'context_data': context_data if isinstance(context_data, str) else safe_json_dumps(context_data or {}),
                 'node_states': safe_json_dumps(node_states or {}),
                 'execution_state': current_status,
                 'created_at': now_utc(),
@@ -1071,9 +1104,9 @@ class WorkflowInstanceRepository(BaseRepository[WorkflowInstance]):
                 result = await self.db.fetch_one(query, workflow_instance_id)
             
             if result:
-                # 解析JSON字段
+                # 解析JSON字段（兼容 '2.0' JSON 与 '3.0' 二进制快照）
                 snapshot_data = dict(result)
-                snapshot_data['context_data'] = json.loads(snapshot_data.get('context_data', '{}'))
+                snapshot_data['context_data'] = unpack_context_snapshot(snapshot_data.get('context_data') or '{}')
                 snapshot_data['node_states'] = json.loads(snapshot_data.get('node_states', '{}'))
                 
                 logger.info(f"✅ [持久化] 成功加载工作流上下文快照")
@@ -11,7 +11,7 @@ from loguru import logger
 from ..base import BaseRepository
 from ...models.node import (
     Node, NodeCreate, NodeUpdate, NodeConnection, 
-    NodeConnectionCreate, NodeConnectionUpdate, NodeVersionCreate
+    NodeConnectionCreate, NodeConnectionUpdate, NodeVersionCreate, ConnectionType
 )
 from ...utils.helpers import now_utc, safe_json_dumps
 
@@ -78,6 +78,41 @@ class NodeRepository(BaseRepository[Node]):
             logger.error(f"创建节点失败: {e}")
             raise
     
+    async def create_nodes(self, workflow_id: uuid.UUID, nodes: List[NodeCreate],
+                           conn=None) -> List[Dict[str, Any]]:
+        """批量创建同一工作流版本下的节点（多行INSERT）
+        
+        传入conn时在调用方的事务内插入。
+        
+        Returns:
+            按输入顺序返回插入的节点数据
+        """
+        try:
+            rows = []
+            for node_data in nodes:
+                rows.append({
+                    "node_id": uuid.uuid4(),
+                    "node_base_id": uuid.uuid4(),
+                    "workflow_id": workflow_id,
+                    "workflow_base_id": node_data.workflow_base_id,
+                    "name": node_data.name,
+                    "type": node_data.type.value,
+                    "task_description": node_data.task_description,
+                    "version": 1,
+                    "parent_version_id": None,
+                    "is_current_version": True,
+                    "position_x": node_data.position_x,
+                    "position_y": node_data.position_y,
+                    "created_at": now_utc(),
+                    "is_deleted": False
+                })
+            
+            await self.create_many(rows, conn=conn)
+            return rows
+        except Exception as e:
+            logger.error(f"批量创建节点失败: {e}")
+            raise
+    
     async def get_node_by_id(self, node_id: uuid.UUID) -> Optional[Dict[str, Any]]:
         """根据ID获取节点"""
         return await self.get_by_id(node_id, "node_id")
@@ -417,6 +452,65 @@ class NodeConnectionRepository:
             logger.error(f"创建节点连接失败: {e}")
             raise
     
+    async def create_connections(self, workflow_id: uuid.UUID,
+                                 connections: List[Dict[str, Any]], conn=None) -> int:
+        """批量创建节点连接（多行INSERT）
+        
+        插入前校验连接类型以及两端节点属于该工作流版本（与逐条创建时的校验一致），任一连接无效时不插入任何连接。
+        传入conn时在调用方的事务内校验并插入，可看到同一事务中刚创建的节点。
+        
+        Args:
+            workflow_id: 工作流版本ID
+            connections: 包含from_node_id、to_node_id，可选connection_type、condition_config、created_at的字典列表
+            conn: 调用方事务连接
+        
+        Returns:
+            创建的连接数
+        """
+        try:
+            if not connections:
+                return 0
+            
+            node_query = "SELECT node_id FROM node WHERE workflow_id = $1 AND is_deleted = FALSE"
+            if conn:
+                node_rows = await conn.fetch(node_query, workflow_id)
+            else:
+                node_rows = await self.db.fetch_all(node_query, workflow_id)
+            node_ids = {str(row['node_id']) for row in node_rows}
+            
+            created_at = now_utc()
+            rows = []
+            for connection in connections:
+                try:
+                    connection_type = ConnectionType(connection.get('connection_type') or ConnectionType.NORMAL.value)
+                except ValueError:
+                    raise ValueError(f"无效的连接类型: {connection.get('connection_type')}")
+                if str(connection['from_node_id']) not in node_ids:
+                    raise ValueError(f"源节点不存在: {connection['from_node_id']}")
+                if str(connection['to_node_id']) not in node_ids:
+                    raise ValueError(f"目标节点不存在: {connection['to_node_id']}")
+                
+                condition_config = connection.get('condition_config')
+                if isinstance(condition_config, dict):
+                    condition_config = safe_json_dumps(condition_config)
+                rows.append((
+                    connection['from_node_id'],
+                    connection['to_node_id'],
+                    workflow_id,
+                    connection_type.value,
+                    condition_config,
+                    connection.get('created_at') or created_at
+                ))
+            
+            return await (conn or self.db).insert_many(
+                "node_connection",
+                ["from_node_id", "to_node_id", "workflow_id", "connection_type", "condition_config", "created_at"],
+                rows
+            )
+        except Exception as e:
+            logger.error(f"批量创建节点连接失败: {e}")
+            raise
+    
     async def get_connection(self, from_node_id: uuid.UUID, to_node_id: uuid.UUID, 
                            workflow_id: uuid.UUID) -> Optional[Dict[str, Any]]:
         """获取节点连接"""
@@ -15,7 +15,7 @@ from ...models.workflow_store import (
     WorkflowStoreRating, WorkflowStoreRatingCreate, StoreCategory, StoreStatus
 )
 from ...models.workflow_import_export import WorkflowExport
-from ...utils.helpers import now_utc, QueryBuilder
+from ...utils.helpers import now_utc, QueryBuilder, decode_cursor, build_keyset_condition, build_keyset_page
 
 
 class WorkflowStoreRepository(BaseRepository[WorkflowStore]):
@@ -135,8 +135,16 @@ class WorkflowStoreRepository(BaseRepository[WorkflowStore]):
             logger.error(f"删除商店条目失败: {e}")
             return False
 
-    async def search_store_items(self, search_params: WorkflowStoreQuery) -> Tuple[List[WorkflowStoreResponse], int]:
-        """搜索商店条目"""
+    # 允许排序的列（均为非空列，可用于键集分页）
+    SORTABLE_COLUMNS = ("created_at", "updated_at", "downloads", "views", "rating", "rating_count", "title")
+
+    async def search_store_items(self, search_params: WorkflowStoreQuery
+                                 ) -> Tuple[List[WorkflowStoreResponse], Optional[int], Optional[str]]:
+        """搜索商店条目
+        
+        Returns:
+            (items, total, next_cursor)；指定cursor时使用键集分页，total仅在include_total时统计
+        """
         try:
             # 构建基础查询
             base_conditions = ["is_deleted = FALSE", "status = 'published'"]
@@ -180,23 +188,34 @@ class WorkflowStoreRepository(BaseRepository[WorkflowStore]):
 
             where_clause = " AND ".join(base_conditions)
 
-            # 获取总数
-            count_query = f"""
-            SELECT COUNT(*) FROM {self.table_name}
-            WHERE {where_clause}
-            """
-            total = await self.db.fetch_val(count_query, *params) or 0
-
-            # 排序
-            order_clause = ""
-            if search_params.sort_by:
-                direction = "DESC" if search_params.sort_order == "desc" else "ASC"
-                order_clause = f"ORDER BY {search_params.sort_by} {direction}"
-
-            # 分页
-            offset = (search_params.page - 1) * search_params.page_size
-            limit_clause = f"LIMIT %s OFFSET %s"
-            params.extend([search_params.page_size, offset])
+            # 获取总数（游标分页时可选）
+            total = None
+            if search_params.include_total or not search_params.cursor:
+                count_query = f"""
+                SELECT COUNT(*) FROM {self.table_name}
+                WHERE {where_clause}
+                """
+                total = await self.db.fetch_val(count_query, *params) or 0
+
+            # 排序：以store_id作为次级排序列，保证顺序稳定，可用于键集分页
+            sort_column = search_params.sort_by if search_params.sort_by in self.SORTABLE_COLUMNS else "created_at"
+            direction = "DESC" if search_params.sort_order == "desc" else "ASC"
+            order_clause = f"ORDER BY {sort_column} {direction}, store_id {direction}"
+
+            page_size = search_params.page_size
+            if search_params.cursor:
+                # 键集分页：从游标位置向后取，不需要跳过前面的行
+                keyset_clause, keyset_values, _ = build_keyset_condition(
+                    sort_column, "store_id", decode_cursor(search_params.cursor), direction, len(params) + 1
+                )
+                where_clause = f"{where_clause} AND {keyset_clause}"
+                params.extend(keyset_values)
+                limit_clause = "LIMIT %s"
+                params.append(page_size + 1)
+            else:
+                offset = (search_params.page - 1) * page_size
+                limit_clause = "LIMIT %s OFFSET %s"
+                params.extend([page_size + 1, offset])
 
             # 执行查询
             query = f"""
@@ -207,13 +226,18 @@ class WorkflowStoreRepository(BaseRepository[WorkflowStore]):
             """
 
             results = await self.db.fetch_all(query, *params)
-            items = [self._format_store_response(row) for row in results]
+            rows, next_cursor, _ = build_keyset_page(results, page_size, sort_column, "store_id")
+            items = [self._format_store_response(row) for row in rows]
+
+            return items, total, next_cursor
 
-            return items, total
+        except ValueError:
+            # 无效游标交由上层返回400
+            raise
 
         except Exception as e:
             logger.error(f"搜索商店条目失败: {e}")
-            return [], 0
+            return [], 0, None
 
     async def get_featured_items(self, limit: int = 10) -> List[WorkflowStoreResponse]:
         """获取推荐条目"""
@@ -0,0 +1,147 @@
+"""
+DAG下游触发性能基准脚本
+Benchmark: full-scan downstream triggering vs reverse-dependency index
+
+在合成的分层DAG（默认1k~10k节点）上按拓扑序逐个完成节点，对比：
+  - scan：旧实现，每次完成都遍历全部 node_dependencies 并把上游ID转为字符串比较
+  - index：WorkflowExecutionContext 的反向依赖索引，只访问完成节点的直接下游
+
+两种方式都只计算触发判断本身（旧实现中的逐节点 info 日志未计入），
+并校验触发出的节点集合一致。
+
+用法:
+    python backend/scripts/benchmark_dag_triggering.py
+    python backend/scripts/benchmark_dag_triggering.py --nodes 1000 5000 10000 --max-fan-in 4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+from loguru import logger
+
+# 添加父目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, parent_dir)
+
+from backend.services.workflow_execution_context import WorkflowExecutionContext
+
+
+class DagTriggeringBenchmark:
+    """下游触发基准测试"""
+
+    def __init__(self, node_counts, width: int, max_fan_in: int, scan_limit: int, seed: int):
+        self.node_counts = node_counts
+        self.width = width
+        self.max_fan_in = max_fan_in
+        self.scan_limit = scan_limit
+        self.seed = seed
+
+    def make_dag(self, node_count: int):
+        """构造分层DAG，返回按拓扑序排列的 [(node_instance_id, node_id, upstream_ids)]"""
+        rng = random.Random(self.seed)
+        nodes = []
+        previous_layer = []
+        while len(nodes) < node_count:
+            layer = []
+            for _ in range(min(self.width, node_count - len(nodes))):
+                fan_in = min(len(previous_layer), rng.randint(1, self.max_fan_in))
+                upstream = rng.sample(previous_layer, fan_in) if previous_layer else []
+                node = (uuid.uuid4(), uuid.uuid4(), upstream)
+                nodes.append(node)
+                layer.append(node[0])
+            previous_layer = layer
+        return nodes
+
+    @staticmethod
+    async def build_context(nodes) -> WorkflowExecutionContext:
+        context = WorkflowExecutionContext(uuid.uuid4())
+        for node_instance_id, node_id, upstream in nodes:
+            await context.register_node_dependencies(node_instance_id, node_id, upstream)
+        context.pending_triggers.clear()
+        return context
+
+    @staticmethod
+    def legacy_scan_trigger(context: WorkflowExecutionContext, completed_node_instance_id: uuid.UUID):
+        """旧实现的触发判断：遍历全部依赖并做字符串比较"""
+        triggered_nodes = []
+        completed_node_str = str(completed_node_instance_id)
+        for node_instance_id, deps in context.node_dependencies.items():
+            upstream_nodes_str = [str(x) for x in deps['upstream_nodes']]
+            if completed_node_str not in upstream_nodes_str:
+                continue
+            if deps.get('ready_to_execute', False):
+                continue
+            if context.node_states.get(node_instance_id) in ('EXECUTING', 'COMPLETED'):
+                continue
+            deps['completed_upstream'].add(completed_node_instance_id)
+            total_upstream = len(deps['upstream_nodes'])
+            if len(deps['completed_upstream']) == total_upstream and total_upstream > 0:
+                if node_instance_id not in context.pending_triggers:
+                    deps['ready_to_execute'] = True
+                    context.pending_triggers.add(node_instance_id)
+                    triggered_nodes.append(node_instance_id)
+        return triggered_nodes
+
+    async def run_mode(self, nodes, mode: str):
+        """按拓扑序完成全部节点，返回 (耗时毫秒, 触发节点集合)"""
+        context = await self.build_context(nodes)
+        triggered = set()
+        start = time.perf_counter()
+        for node_instance_id, _, _ in nodes:
+            context.node_states[node_instance_id] = 'COMPLETED'
+            if mode == "scan":
+                triggered.update(self.legacy_scan_trigger(context, node_instance_id))
+            else:
+                triggered.update(await context._check_and_trigger_downstream_nodes(node_instance_id))
+        return (time.perf_counter() - start) * 1000, triggered
+
+    async def run(self):
+        """运行基准测试"""
+        for node_count in self.node_counts:
+            nodes = self.make_dag(node_count)
+            edges = sum(len(upstream) for _, _, upstream in nodes)
+            index_ms, index_triggered = await self.run_mode(nodes, "index")
+
+            if node_count > self.scan_limit:
+                logger.info(
+                    f"⏱️ nodes={node_count:>6} edges={edges:>6} index={index_ms:9.2f}ms "
+                    f"({index_ms * 1000 / node_count:.2f}µs/完成) scan=跳过(>{self.scan_limit})"
+                )
+                continue
+
+            scan_ms, scan_triggered = await self.run_mode(nodes, "scan")
+            if scan_triggered != index_triggered:
+                logger.error(f"❌ 触发结果不一致: scan={len(scan_triggered)} index={len(index_triggered)}")
+            logger.info(
+                f"⏱️ nodes={node_count:>6} edges={edges:>6} index={index_ms:9.2f}ms "
+                f"({index_ms * 1000 / node_count:.2f}µs/完成) scan={scan_ms:10.2f}ms "
+                f"({scan_ms * 1000 / node_count:.2f}µs/完成) 加速={scan_ms / index_ms:.1f}x"
+            )
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="DAG下游触发性能基准")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1_000, 2_000, 5_000, 10_000], help="DAG节点数")
+    parser.add_argument("--width", type=int, default=50, help="每层节点数")
+    parser.add_argument("--max-fan-in", type=int, default=3, help="每个节点的最大上游数")
+    parser.add_argument("--scan-limit", type=int, default=5_000, help="超过该节点数时跳过旧的全量扫描")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    # 上下文内部的依赖注册日志会淹没基准输出，只保留本脚本的日志
+    logger.remove()
+    logger.add(sys.stderr, filter=lambda record: record["name"] == __name__)
+
+    benchmark = DagTriggeringBenchmark(args.nodes, args.width, args.max_fan_in, args.scan_limit, args.seed)
+    await benchmark.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,243 @@
+"""
+工作流实例启动性能基准脚本
+Benchmark: per-row vs set-based workflow instance bootstrap
+
+对一个已存在的工作流反复创建实例，测量从开始创建到第一个可执行节点的任务实例落库的耗时
+（time-to-first-task），对比：
+  - legacy：旧实现，逐个 create_node_instance（INSERT + 回读）、逐个继承附件（INSERT ... SELECT + COUNT）、
+    逐个查询上游节点实例并逐个注册依赖、逐个 create_task
+  - bulk：内存中构造全部节点实例，单事务多行INSERT并一次继承全部附件，
+    由编译后的工作流定义计算依赖并一次加锁批量注册，第一个节点的任务多行写入
+
+两种方式都在独立的 WorkflowExecutionContext 中注册依赖（不经过全局上下文管理器与持久化），
+基准结束后删除创建的实例数据。
+
+用法:
+    python backend/scripts/benchmark_instance_bootstrap.py --workflow-base-id <id> --executor-id <user_id>
+    python backend/scripts/benchmark_instance_bootstrap.py --workflow-base-id <id> --executor-id <user_id> --iterations 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from loguru import logger
+
+# 添加父目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, parent_dir)
+
+from backend.models.instance import NodeInstanceCreate, NodeInstanceStatus, TaskInstanceCreate, TaskInstanceStatus
+from backend.models.node import NodeType
+from backend.repositories.instance.node_instance_repository import NodeInstanceRepository
+from backend.services.execution_service import execution_engine, NODE_INSTANCE_INSERT_COLUMNS
+from backend.services.file_association_service import FileAssociationService
+from backend.services.workflow_execution_context import WorkflowExecutionContext
+from backend.utils.database import get_db_manager
+from backend.utils.helpers import now_utc
+
+
+INSTANCE_NAME_PREFIX = "bench_bootstrap_"
+
+
+class InstanceBootstrapBenchmark:
+    """工作流实例启动基准测试"""
+
+    def __init__(self, workflow_base_id: uuid.UUID, executor_id: uuid.UUID, iterations: int):
+        self.workflow_base_id = workflow_base_id
+        self.executor_id = executor_id
+        self.iterations = iterations
+        self.db = get_db_manager()
+        self.engine = execution_engine
+        self.node_repo = NodeInstanceRepository()
+        self.file_service = FileAssociationService()
+        self.created_instance_ids = []
+
+    async def load_workflow(self):
+        """加载工作流定义（预热编译缓存）"""
+        workflow = await self.engine.workflow_repo.get_workflow_by_base_id(self.workflow_base_id)
+        if not workflow:
+            raise ValueError(f"工作流不存在: {self.workflow_base_id}")
+        self.workflow_id = workflow['workflow_id']
+        self.compiled = await self.engine.workflow_cache.get(self.workflow_id)
+        self.nodes = await self.engine._get_workflow_nodes_by_version_id(self.workflow_id)
+        logger.info(f"📦 工作流 {workflow.get('name')}: {len(self.nodes)} 个节点")
+
+    async def create_workflow_instance(self, label: str) -> uuid.UUID:
+        instance_id = uuid.uuid4()
+        self.created_instance_ids.append(instance_id)
+        await self.db.execute(
+            """
+            INSERT INTO `workflow_instance`
+            (workflow_instance_id, workflow_id, workflow_base_id, executor_id, workflow_instance_name,
+             input_data, context_data, status, created_at, is_deleted)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+            """,
+            instance_id, self.workflow_id, self.workflow_base_id, self.executor_id,
+            f"{INSTANCE_NAME_PREFIX}{label}_{instance_id.hex[:8]}", json.dumps({}), json.dumps({}),
+            'RUNNING', now_utc(), False
+        )
+        return instance_id
+
+    def first_task_node(self, context: WorkflowExecutionContext, node_instances):
+        """第一个需要创建任务的节点：START节点的首个下游（没有则取第一个非START节点）"""
+        start_instance_ids = {
+            str(node_instance['node_instance_id']) for node_instance in node_instances
+            if node_instance['node_type'] == NodeType.START.value
+        }
+        for node_instance in node_instances:
+            if node_instance['node_type'] == NodeType.START.value:
+                continue
+            upstream = context.node_dependencies[node_instance['node_instance_id']]['upstream_nodes']
+            if any(str(upstream_id) in start_instance_ids for upstream_id in upstream):
+                return node_instance
+        return next((ni for ni in node_instances if ni['node_type'] != NodeType.START.value), None)
+
+    async def build_task_data(self, instance_id: uuid.UUID, node_instance):
+        processors = await self.engine._get_node_processors(node_instance['node_id'])
+        return [
+            TaskInstanceCreate(
+                workflow_instance_id=instance_id,
+                node_instance_id=node_instance['node_instance_id'],
+                processor_id=processor.get('processor_id'),
+                task_type=self.engine._determine_task_type(processor.get('processor_type', processor.get('type', 'HUMAN'))),
+                task_title=node_instance['node_name'],
+                task_description=f"执行节点 {node_instance['node_name']} 的任务",
+                assigned_user_id=processor.get('user_id'),
+                assigned_agent_id=processor.get('agent_id'),
+                estimated_duration=processor.get('estimated_duration', 30),
+                input_data="",
+                context_data="",
+                status=TaskInstanceStatus.PENDING,
+                priority='MEDIUM'
+            )
+            for processor in processors
+        ]
+
+    async def legacy_bootstrap(self) -> int:
+        """旧方案：逐行创建节点实例、逐个继承附件、逐个查询上游并注册依赖、逐个创建任务"""
+        instance_id = await self.create_workflow_instance("legacy")
+        context = WorkflowExecutionContext(instance_id)
+
+        node_instances = []
+        for node in self.nodes:
+            node_instance = await self.node_repo.create_node_instance(NodeInstanceCreate(
+                workflow_instance_id=instance_id,
+                node_id=node['node_id'],
+                node_base_id=node['node_base_id'],
+                node_instance_name=f"{node['name']}_instance",
+                task_description=node.get('task_description') or '',
+                status=NodeInstanceStatus.PENDING,
+                input_data={},
+                output_data={},
+                error_message=None,
+                retry_count=0
+            ))
+            await self.file_service.inherit_node_files_to_instance(
+                node_id=node['node_id'], node_instance_id=node_instance['node_instance_id']
+            )
+            node_instances.append({
+                'node_instance_id': node_instance['node_instance_id'],
+                'node_id': node['node_id'],
+                'node_name': node['name'],
+                'node_type': node['type']
+            })
+
+        for node_instance in node_instances:
+            upstream = await self.engine._get_upstream_node_instances(node_instance['node_id'], instance_id)
+            await context.register_node_dependencies(
+                node_instance['node_instance_id'], node_instance['node_id'], upstream
+            )
+
+        created = 0
+        first_node = self.first_task_node(context, node_instances)
+        if first_node is not None:
+            for task_data in await self.build_task_data(instance_id, first_node):
+                if await self.engine.task_instance_repo.create_task(task_data):
+                    created += 1
+        return created
+
+    async def bulk_bootstrap(self) -> int:
+        """新方案：内存构造 + 单事务多行写入 + 批量注册依赖 + 多行写入任务"""
+        instance_id = await self.create_workflow_instance("bulk")
+        context = WorkflowExecutionContext(instance_id)
+
+        rows, node_instances = self.engine._build_node_instance_rows(instance_id, self.nodes)
+        async with self.db.transaction() as conn:
+            await conn.insert_many("node_instance", NODE_INSTANCE_INSERT_COLUMNS, rows)
+            await self.file_service.inherit_node_files_to_workflow_instance(instance_id, conn)
+
+        registrations = await self.engine._resolve_node_registrations(self.compiled, instance_id, node_instances)
+        await context.register_node_dependencies_bulk(registrations)
+
+        first_node = self.first_task_node(context, node_instances)
+        if first_node is None:
+            return 0
+        tasks = await self.engine.task_instance_repo.create_tasks(await self.build_task_data(instance_id, first_node))
+        return len(tasks)
+
+    async def measure(self, label: str, func):
+        """执行并统计 time-to-first-task（毫秒）"""
+        samples = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            await func()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+        logger.info(
+            f"⏱️ {label:<8} nodes={len(self.nodes):<5} avg={statistics.mean(samples):9.2f}ms "
+            f"p50={statistics.median(samples):9.2f}ms p95={p95:9.2f}ms"
+        )
+        return samples
+
+    async def cleanup(self):
+        """删除基准创建的实例数据"""
+        for instance_id in self.created_instance_ids:
+            await self.db.execute("DELETE FROM task_instance WHERE workflow_instance_id = $1", instance_id)
+            await self.db.execute(
+                "DELETE nif FROM node_instance_file nif JOIN node_instance ni ON ni.node_instance_id = nif.node_instance_id "
+                "WHERE ni.workflow_instance_id = $1", instance_id
+            )
+            await self.db.execute("DELETE FROM node_instance WHERE workflow_instance_id = $1", instance_id)
+            await self.db.execute("DELETE FROM workflow_instance WHERE workflow_instance_id = $1", instance_id)
+        logger.info(f"🧹 已清理 {len(self.created_instance_ids)} 个基准实例")
+
+    async def run(self):
+        """运行基准测试"""
+        await self.db.initialize()
+        try:
+            await self.load_workflow()
+
+            # 预热连接池与SQL翻译缓存
+            await self.legacy_bootstrap()
+            await self.bulk_bootstrap()
+
+            legacy = await self.measure("legacy", self.legacy_bootstrap)
+            bulk = await self.measure("bulk", self.bulk_bootstrap)
+            logger.info(f"⏱️ time-to-first-task p50 加速比: {statistics.median(legacy) / statistics.median(bulk):.1f}x")
+        finally:
+            await self.cleanup()
+            await self.db.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="工作流实例启动性能基准")
+    parser.add_argument("--workflow-base-id", type=uuid.UUID, required=True, help="用于基准的工作流基础ID")
+    parser.add_argument("--executor-id", type=uuid.UUID, required=True, help="实例执行者用户ID")
+    parser.add_argument("--iterations", type=int, default=10, help="每种方案创建的实例数")
+    args = parser.parse_args()
+
+    benchmark = InstanceBootstrapBenchmark(args.workflow_base_id, args.executor_id, args.iterations)
+    await benchmark.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+RETURNING模拟性能基准脚本
+Benchmark: INSERT/UPDATE ... RETURNING emulation
+
+在独立的基准表中灌入大量数据（默认100万行），对比：
+  - 旧方案：INSERT 后执行 SELECT * ... ORDER BY created_at DESC LIMIT 1
+  - 新方案：DatabaseManager.fetch_one(... RETURNING *)，按主键在同一连接上回读
+
+用法:
+    python backend/scripts/benchmark_returning.py --rows 1000000 --iterations 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from loguru import logger
+
+# 添加父目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, parent_dir)
+
+from backend.utils.database import get_db_manager
+
+
+BENCH_TABLE = "bench_returning"
+
+
+class ReturningBenchmark:
+    """RETURNING模拟基准测试"""
+
+    def __init__(self, rows: int, iterations: int, keep_table: bool):
+        self.rows = rows
+        self.iterations = iterations
+        self.keep_table = keep_table
+        self.db = get_db_manager()
+
+    async def prepare_table(self):
+        """创建基准表并灌入数据（按倍增方式快速扩充到目标行数）"""
+        await self.db.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        await self.db.execute(f"""
+            CREATE TABLE {BENCH_TABLE} (
+                bench_id CHAR(36) PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                status VARCHAR(32) NOT NULL DEFAULT 'pending',
+                payload TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await self.db.execute(
+            f"INSERT INTO {BENCH_TABLE} (bench_id, name, payload) VALUES (UUID(), 'seed', REPEAT('x', 200))"
+        )
+
+        count = 1
+        while count < self.rows:
+            await self.db.execute(f"""
+                INSERT INTO {BENCH_TABLE} (bench_id, name, payload, created_at)
+                SELECT UUID(), name, payload, created_at - INTERVAL FLOOR(RAND() * 100000) SECOND
+                FROM {BENCH_TABLE} LIMIT {self.rows - count}
+            """)
+            count = await self.db.fetch_val(f"SELECT COUNT(*) FROM {BENCH_TABLE}")
+            logger.info(f"📦 基准表数据量: {count}")
+
+    async def legacy_insert(self):
+        """旧方案：插入后按created_at排序取最新一行"""
+        async with self.db.get_connection() as conn:
+            await conn.execute(
+                f"INSERT INTO {BENCH_TABLE} (bench_id, name) VALUES ($1, $2)",
+                (str(uuid.uuid4()), 'legacy')
+            )
+            return await conn.fetchrow(f"SELECT * FROM {BENCH_TABLE} ORDER BY created_at DESC LIMIT 1")
+
+    async def returning_insert(self):
+        """新方案：RETURNING模拟，按主键回读"""
+        return await self.db.fetch_one(
+            f"INSERT INTO {BENCH_TABLE} (bench_id, name) VALUES ($1, $2) RETURNING *",
+            str(uuid.uuid4()), 'returning'
+        )
+
+    async def returning_update(self, bench_id: str):
+        """新方案：UPDATE ... RETURNING 模拟，按WHERE主键回读"""
+        return await self.db.fetch_one(
+            f"UPDATE {BENCH_TABLE} SET status = $1, updated_at = NOW() WHERE bench_id = $2 RETURNING *",
+            'running', bench_id
+        )
+
+    async def measure(self, label: str, func, *args):
+        """执行并统计延迟（毫秒）"""
+        samples = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            await func(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        logger.info(
+            f"⏱️ {label:<22} avg={statistics.mean(samples):8.3f}ms "
+            f"p50={statistics.median(samples):8.3f}ms p95={p95:8.3f}ms"
+        )
+        return samples
+
+    async def run(self):
+        """运行基准测试"""
+        await self.db.initialize()
+        try:
+            await self.prepare_table()
+
+            # 预热主键缓存和SQL翻译缓存
+            row = await self.returning_insert()
+
+            await self.measure("legacy INSERT+ORDER BY", self.legacy_insert)
+            await self.measure("INSERT RETURNING (PK)", self.returning_insert)
+            await self.measure("UPDATE RETURNING (PK)", self.returning_update, row['bench_id'])
+        finally:
+            if not self.keep_table:
+                await self.db.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            await self.db.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="RETURNING模拟性能基准")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="基准表数据量")
+    parser.add_argument("--iterations", type=int, default=200, help="每种方案的执行次数")
+    parser.add_argument("--keep-table", action="store_true", help="结束后保留基准表")
+    args = parser.parse_args()
+
+    benchmark = ReturningBenchmark(args.rows, args.iterations, args.keep_table)
+    await benchmark.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,187 @@
+"""
+行解码性能基准脚本
+Benchmark: dict-per-row decoding vs lightweight Row / column-oriented results
+
+对比同一结果集（默认1万行、task_instance宽度的列）的三种解码方式：
+  - dict：DictCursor逐行构造dict，仓储层再 dict(result) 复制一次（旧路径）
+  - row：普通Cursor元组 + 共享列索引的 __slots__ Row 对象（fetch_rows）
+  - columns：列式结果 {列名: [值, ...]}（fetch_columns）
+
+默认只在进程内解码合成数据，统计耗时与内存分配（tracemalloc）；
+加 --db 时在基准表上实际执行 fetch_all / fetch_rows / fetch_columns。
+
+用法:
+    python backend/scripts/benchmark_row_decoding.py --rows 10000 --iterations 20
+    python backend/scripts/benchmark_row_decoding.py --rows 10000 --db
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from loguru import logger
+
+# 添加父目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, parent_dir)
+
+from backend.utils.database import get_db_manager
+from backend.utils.rows import rows_from_cursor, columns_from_cursor
+
+
+BENCH_TABLE = "bench_row_decoding"
+
+# 与 task_instance 列表查询（ti.* + 关联名称）宽度相近的列
+COLUMNS = (
+    "task_instance_id", "node_instance_id", "workflow_instance_id", "processor_id",
+    "task_type", "task_title", "task_description", "input_data", "output_data",
+    "result_summary", "assigned_user_id", "assigned_agent_id", "status", "priority",
+    "estimated_duration", "actual_duration", "error_message", "retry_count",
+    "created_at", "updated_at", "started_at", "completed_at", "is_deleted",
+    "processor_name", "processor_type", "workflow_instance_name", "workflow_name",
+)
+
+
+class ResultDescription:
+    """进程内基准使用的结果集描述（只提供 description，与DB-API游标一致）"""
+
+    def __init__(self, columns):
+        self.description = [(name, None, None, None, None, None, None) for name in columns]
+
+
+class RowDecodingBenchmark:
+    """行解码基准测试"""
+
+    def __init__(self, rows: int, iterations: int, use_db: bool, keep_table: bool):
+        self.rows = rows
+        self.iterations = iterations
+        self.use_db = use_db
+        self.keep_table = keep_table
+        self.db = get_db_manager()
+
+    def make_tuples(self):
+        """构造合成结果集（每行一个元组，与普通Cursor的返回一致）"""
+        now = datetime.now()
+        return [
+            (
+                str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4()),
+                "human", f"任务 {i}", "描述" * 10, '{"a": 1}', None,
+                None, str(uuid.uuid4()), None, "pending", 1,
+                30, None, None, 0,
+                now, now, None, None, 0,
+                "处理器", "human", f"实例 {i // 10}", "工作流",
+            )
+            for i in range(self.rows)
+        ]
+
+    @staticmethod
+    def decode_dict(cursor, tuples):
+        """旧路径：DictCursor构造dict，仓储层再复制一次"""
+        fields = [column[0] for column in cursor.description]
+        results = [dict(zip(fields, row)) for row in tuples]
+        return [dict(result) for result in results]
+
+    @staticmethod
+    def decode_rows(cursor, tuples):
+        return rows_from_cursor(cursor, tuples)
+
+    @staticmethod
+    def decode_columns(cursor, tuples):
+        return columns_from_cursor(cursor, tuples)
+
+    def measure_decode(self, label: str, decode, cursor, tuples):
+        """统计解码耗时（毫秒）与保留结果占用的内存"""
+        samples = []
+        for _ in range(self.iterations):
+            gc.collect()
+            start = time.perf_counter()
+            result = decode(cursor, tuples)
+            samples.append((time.perf_counter() - start) * 1000)
+            del result
+
+        gc.collect()
+        tracemalloc.start()
+        result = decode(cursor, tuples)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+
+        samples.sort()
+        p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+        logger.info(
+            f"⏱️ {label:<8} avg={statistics.mean(samples):8.3f}ms p50={statistics.median(samples):8.3f}ms "
+            f"p95={p95:8.3f}ms retained={retained / 1024 / 1024:7.2f}MiB peak={peak / 1024 / 1024:7.2f}MiB"
+        )
+
+    async def prepare_table(self):
+        """创建基准表并灌入与合成数据相同的行"""
+        await self.db.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        column_defs = ", ".join(f"`{name}` TEXT" for name in COLUMNS)
+        await self.db.execute(f"CREATE TABLE {BENCH_TABLE} (bench_row_id INT AUTO_INCREMENT PRIMARY KEY, {column_defs})")
+        await self.db.insert_many(BENCH_TABLE, list(COLUMNS), self.make_tuples())
+
+    async def measure_query(self, label: str, fetch, copy_rows: bool = False):
+        """统计一次完整查询（含网络与驱动解析）的耗时"""
+        query = f"SELECT {', '.join(COLUMNS)} FROM {BENCH_TABLE}"
+        samples = []
+        for _ in range(self.iterations):
+            start = time.perf_counter()
+            results = await fetch(query, use_primary=True)
+            if copy_rows:
+                results = [dict(result) for result in results]
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+        logger.info(
+            f"⏱️ {label:<14} avg={statistics.mean(samples):8.3f}ms "
+            f"p50={statistics.median(samples):8.3f}ms p95={p95:8.3f}ms"
+        )
+
+    async def run(self):
+        """运行基准测试"""
+        cursor = ResultDescription(COLUMNS)
+        tuples = self.make_tuples()
+        logger.info(f"📦 进程内解码: {self.rows} 行 x {len(COLUMNS)} 列")
+        self.measure_decode("dict", self.decode_dict, cursor, tuples)
+        self.measure_decode("row", self.decode_rows, cursor, tuples)
+        self.measure_decode("columns", self.decode_columns, cursor, tuples)
+
+        if not self.use_db:
+            return
+
+        await self.db.initialize()
+        try:
+            await self.prepare_table()
+            logger.info(f"📦 数据库查询: {self.rows} 行")
+            await self.measure_query("fetch_all+dict", self.db.fetch_all, copy_rows=True)
+            await self.measure_query("fetch_rows", self.db.fetch_rows)
+            await self.measure_query("fetch_columns", self.db.fetch_columns)
+        finally:
+            if not self.keep_table:
+                await self.db.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            await self.db.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="行解码性能基准")
+    parser.add_argument("--rows", type=int, default=10_000, help="结果集行数")
+    parser.add_argument("--iterations", type=int, default=20, help="每种方案的执行次数")
+    parser.add_argument("--db", action="store_true", help="同时在数据库基准表上执行查询对比")
+    parser.add_argument("--keep-table", action="store_true", help="结束后保留基准表")
+    args = parser.parse_args()
+
+    benchmark = RowDecodingBenchmark(args.rows, args.iterations, args.db, args.keep_table)
+    await benchmark.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Agent任务持久化队列验证脚本
+Verify: agent task queue enqueue / lease round trip
+
+对一个已存在的Agent任务执行 入队 -> 领取租约 -> 续约 -> 确认，检查：
+  - 入队写入的是该任务自身的队列行（task_instance_id、max_attempts、status 正确）
+  - 入队不修改其他任务的队列行
+  - lease_task 能领取到该任务，租约可续约并确认为done
+
+会临时改写该任务的队列行，结束后恢复原状；请在Agent任务服务停止时运行。
+
+用法:
+    python backend/scripts/verify_agent_task_queue.py --task-id <task_instance_id>
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import uuid
+
+from loguru import logger
+
+# 添加父目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, parent_dir)
+
+from backend.repositories.instance.agent_task_queue_repository import AgentTaskQueueRepository
+from backend.utils.database import get_db_manager
+
+
+MAX_ATTEMPTS = 7
+VISIBILITY_TIMEOUT = 60
+LEASE_OWNER = "verify_agent_task_queue"
+
+
+class AgentTaskQueueVerifier:
+    """Agent任务队列入队/领取验证"""
+
+    def __init__(self, task_id: uuid.UUID):
+        self.task_id = str(task_id)
+        self.db = get_db_manager()
+        self.queue_repo = AgentTaskQueueRepository()
+        self.original_row = None
+        self.failures = []
+
+    def check(self, condition: bool, message: str):
+        if condition:
+            logger.info(f"✅ {message}")
+        else:
+            logger.error(f"❌ {message}")
+            self.failures.append(message)
+
+    async def get_queue_row(self):
+        return await self.db.fetch_one(
+            "SELECT * FROM agent_task_queue WHERE task_instance_id = $1", self.task_id, use_primary=True
+        )
+
+    async def get_other_rows_digest(self):
+        """其他任务队列行的摘要，用于检查入队没有误改别的行"""
+        return await self.db.fetch_one("""
+            SELECT COUNT(*) AS count, COALESCE(SUM(max_attempts), 0) AS max_attempts,
+                   COALESCE(SUM(status = 'queued'), 0) AS queued
+            FROM agent_task_queue WHERE task_instance_id <> $1
+        """, self.task_id, use_primary=True)
+
+    async def prepare(self):
+        task = await self.db.fetch_one(
+            "SELECT task_instance_id, task_type FROM task_instance WHERE task_instance_id = $1",
+            self.task_id, use_primary=True
+        )
+        if not task:
+            raise ValueError(f"任务不存在: {self.task_id}")
+
+        await self.queue_repo.ensure_table()
+        self.original_row = await self.get_queue_row()
+        if self.original_row and self.original_row['status'] in ('queued', 'leased'):
+            raise ValueError(f"任务已在队列中（{self.original_row['status']}），请换一个任务或等待其处理完成")
+        await self.db.execute("DELETE FROM agent_task_queue WHERE task_instance_id = $1", self.task_id)
+
+    async def restore(self):
+        await self.db.execute("DELETE FROM agent_task_queue WHERE task_instance_id = $1", self.task_id)
+        if self.original_row:
+            columns = list(self.original_row.keys())
+            placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+            await self.db.execute(
+                f"INSERT INTO agent_task_queue ({', '.join(columns)}) VALUES ({placeholders})",
+                *self.original_row.values()
+            )
+
+    async def verify(self):
+        others_before = await self.get_other_rows_digest()
+
+        queued = await self.queue_repo.enqueue(uuid.UUID(self.task_id), MAX_ATTEMPTS)
+        row = await self.get_queue_row()
+        self.check(queued, "enqueue 返回新入队")
+        self.check(row is not None, "入队后存在该任务的队列行")
+        if row is None:
+            return
+        self.check(row['status'] == 'queued', f"队列行状态为queued（实际 {row['status']}）")
+        self.check(row['max_attempts'] == MAX_ATTEMPTS, f"max_attempts 为 {MAX_ATTEMPTS}（实际 {row['max_attempts']}）")
+        self.check(row['priority_class'] in (0, 1, 2), f"priority_class 有效（实际 {row['priority_class']}）")
+        self.check(await self.get_other_rows_digest() == others_before, "其他任务的队列行未被修改")
+
+        self.check(not await self.queue_repo.enqueue(uuid.UUID(self.task_id), MAX_ATTEMPTS),
+                   "重复入队不产生新行")
+
+        lease = await self.queue_repo.lease_task(uuid.UUID(self.task_id), LEASE_OWNER, VISIBILITY_TIMEOUT)
+        self.check(lease is not None, "lease_task 领取到该任务")
+        if lease is None:
+            return
+        self.check(str(lease['task_instance_id']) == self.task_id, "租约对应该任务")
+        self.check(lease['attempts'] == 1, f"租约次数为1（实际 {lease['attempts']}）")
+        self.check(await self.queue_repo.lease_task(uuid.UUID(self.task_id), LEASE_OWNER, VISIBILITY_TIMEOUT) is None,
+                   "已领取的任务不能再次领取")
+
+        self.check(await self.queue_repo.extend_lease(uuid.UUID(self.task_id), lease['lease_token'], VISIBILITY_TIMEOUT),
+                   "租约可续约")
+        self.check(await self.queue_repo.complete(uuid.UUID(self.task_id), lease['lease_token']), "租约可确认")
+        row = await self.get_queue_row()
+        self.check(row['status'] == 'done', f"确认后状态为done（实际 {row['status']}）")
+
+    async def run(self) -> bool:
+        await self.db.initialize()
+        try:
+            await self.prepare()
+            try:
+                await self.verify()
+            finally:
+                await self.restore()
+        finally:
+            await self.db.close()
+
+        if self.failures:
+            logger.error(f"验证失败 {len(self.failures)} 项")
+            return False
+        logger.info("🎉 Agent任务队列入队/领取验证通过")
+        return True
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Agent任务持久化队列入队/领取验证")
+    parser.add_argument("--task-id", type=uuid.UUID, required=True, help="用于验证的Agent任务实例ID")
+    args = parser.parse_args()
+
+    verifier = AgentTaskQueueVerifier(args.task_id)
+    if not await verifier.run():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,344 @@
+"""
+Agent任务并发与速率限制
+Agent Task Concurrency and Rate Limiting
+
+按三个维度限制Agent任务的执行：
+  - agent：单个Agent同时处理的任务数与每分钟任务数
+  - model：同一 base_url + model_name（多个Agent共用同一上游模型）的并发与每分钟任务数
+  - user：同一用户（工作流执行者）的并发与每分钟任务数
+
+Agent与模型维度的限制取自Agent的 parameters（优先）或 tool_config：
+    max_concurrent / requests_per_minute
+    model_max_concurrent / model_requests_per_minute
+用户维度与未配置时的默认值取自配置（0表示不限制）。
+
+用户维度的状态按需创建，空闲超过 USER_IDLE_TTL_SECONDS（此时令牌桶已补满）或超出 MAX_TRACKED_USERS 时淘汰。
+
+限制在本进程的worker池内生效：worker领取租约后尝试获取配额，获取失败时把任务延迟退回队列，
+领取时也会跳过已饱和的Agent/用户，避免慢模型或单个用户的大批量任务占满所有worker。
+速率按任务计数（一个任务内的多次工具调用只计一次）。
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from ..config.settings import get_settings
+
+SCOPE_AGENT = "agent"
+SCOPE_MODEL = "model"
+SCOPE_USER = "user"
+
+# 用户维度状态的空闲淘汰时间（秒，不小于令牌桶补满所需的60秒）与跟踪上限
+USER_IDLE_TTL_SECONDS = 300
+MAX_TRACKED_USERS = 10000
+
+
+def _key(value: Union[str, uuid.UUID, None]) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _positive_int(value: Any) -> int:
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟配额，按秒匀速补充"""
+
+    __slots__ = ('rate_per_minute', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate_per_minute: int):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_minute / 60.0)
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """距离下一个可用令牌的秒数（0表示当前可取）"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * 60.0 / self.rate_per_minute
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def set_rate(self, rate_per_minute: int) -> None:
+        self._refill()
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = min(self.tokens, self.capacity)
+
+
+class AgentLimits:
+    """单个Agent解析后的限制配置"""
+
+    __slots__ = ('agent_id', 'model_key', 'max_concurrent', 'requests_per_minute',
+                 'model_max_concurrent', 'model_requests_per_minute', 'loaded_at')
+
+    def __init__(self, agent_id: str, model_key: Optional[str], max_concurrent: int = 0,
+                 requests_per_minute: int = 0, model_max_concurrent: int = 0,
+                 model_requests_per_minute: int = 0):
+        self.agent_id = agent_id
+        self.model_key = model_key
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.model_max_concurrent = model_max_concurrent
+        self.model_requests_per_minute = model_requests_per_minute
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def from_agent(cls, agent: Dict[str, Any], defaults: Dict[str, int]) -> 'AgentLimits':
+        """从Agent记录的 parameters / tool_config 中解析限制"""
+        sources = [agent.get('parameters'), agent.get('tool_config')]
+        sources = [source for source in sources if isinstance(source, dict)]
+
+        def option(name: str) -> int:
+            for source in sources:
+                if source.get(name) is not None:
+                    return _positive_int(source[name])
+            return defaults.get(name, 0)
+
+        model_key = None
+        if agent.get('base_url') or agent.get('model_name'):
+            model_key = f"{agent.get('base_url') or ''}|{agent.get('model_name') or ''}"
+
+        return cls(
+            agent_id=_key(agent.get('agent_id')),
+            model_key=model_key,
+            max_concurrent=option('max_concurrent'),
+            requests_per_minute=option('requests_per_minute'),
+            model_max_concurrent=option('model_max_concurrent'),
+            model_requests_per_minute=option('model_requests_per_minute')
+        )
+
+
+class AgentSlot:
+    """一次获取到的配额，任务结束时归还"""
+
+    __slots__ = ('keys', 'acquired_at')
+
+    def __init__(self, keys: List[Tuple[str, str]]):
+        self.keys = keys
+        self.acquired_at = time.monotonic()
+
+
+class AgentConcurrencyLimiter:
+    """按Agent/模型/用户维度的并发上限与令牌桶"""
+
+    def __init__(self, user_max_concurrent: int = 0, user_requests_per_minute: int = 0,
+                 agent_defaults: Optional[Dict[str, int]] = None, config_ttl_seconds: float = 60.0):
+        self.user_max_concurrent = user_max_concurrent
+        self.user_requests_per_minute = user_requests_per_minute
+        self.agent_defaults = agent_defaults or {}
+        self.config_ttl_seconds = config_ttl_seconds
+
+        # (维度, 键) -> 处理中的任务数 / 并发上限 / 令牌桶
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        self._limits: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        # agent_id -> 限制配置
+        self._agents: Dict[str, AgentLimits] = {}
+        # 用户维度的键 -> 最近使用时间，按最近使用排序，用于淘汰空闲用户
+        self._users: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+        self._acquired = 0
+        self._deferred: Dict[str, int] = {SCOPE_AGENT: 0, SCOPE_MODEL: 0, SCOPE_USER: 0}
+
+    def get_cached_agent_limits(self, agent_id: Union[str, uuid.UUID, None]) -> Optional[AgentLimits]:
+        """获取未过期的Agent限制配置"""
+        limits = self._agents.get(_key(agent_id))
+        if limits and time.monotonic() - limits.loaded_at < self.config_ttl_seconds:
+            return limits
+        return None
+
+    def update_agent(self, agent: Dict[str, Any]) -> AgentLimits:
+        """按Agent记录刷新限制配置"""
+        limits = AgentLimits.from_agent(agent, self.agent_defaults)
+        self._agents[limits.agent_id] = limits
+
+        self._configure((SCOPE_AGENT, limits.agent_id), limits.max_concurrent, limits.requests_per_minute)
+        if limits.model_key:
+            # 多个Agent共用同一模型时取其中最严格的非零配置
+            sharing = [other for other in self._agents.values() if other.model_key == limits.model_key]
+            self._configure((SCOPE_MODEL, limits.model_key),
+                            min((other.model_max_concurrent for other in sharing if other.model_max_concurrent), default=0),
+                            min((other.model_requests_per_minute for other in sharing if other.model_requests_per_minute), default=0))
+        return limits
+
+    def _configure(self, key: Tuple[str, str], max_concurrent: int, requests_per_minute: int) -> None:
+        if max_concurrent:
+            self._limits[key] = max_concurrent
+        else:
+            self._limits.pop(key, None)
+
+        bucket = self._buckets.get(key)
+        if not requests_per_minute:
+            self._buckets.pop(key, None)
+        elif bucket is None:
+            self._buckets[key] = TokenBucket(requests_per_minute)
+        elif bucket.rate_per_minute != requests_per_minute:
+            bucket.set_rate(requests_per_minute)
+
+    def _keys_for(self, limits: Optional[AgentLimits], user_id: Union[str, uuid.UUID, None]) -> List[Tuple[str, str]]:
+        keys = []
+        if limits is not None:
+            keys.append((SCOPE_AGENT, limits.agent_id))
+            if limits.model_key:
+                keys.append((SCOPE_MODEL, limits.model_key))
+        if user_id is not None:
+            user_key = (SCOPE_USER, _key(user_id))
+            self._touch_user(user_key)
+            if self.user_max_concurrent:
+                self._limits[user_key] = self.user_max_concurrent
+            if self.user_requests_per_minute and user_key not in self._buckets:
+                self._buckets[user_key] = TokenBucket(self.user_requests_per_minute)
+            keys.append(user_key)
+        return keys
+
+    def _touch_user(self, user_key: Tuple[str, str]) -> None:
+        now = time.monotonic()
+        self._users.pop(user_key, None)
+        self._evict_idle_users(now)
+        self._users[user_key] = now
+
+    def _evict_idle_users(self, now: float) -> None:
+        """淘汰空闲或超出跟踪上限的用户维度状态；有处理中任务的用户保留"""
+        for _ in range(len(self._users)):
+            user_key, last_used = next(iter(self._users.items()))
+            if now - last_used < USER_IDLE_TTL_SECONDS and len(self._users) < MAX_TRACKED_USERS:
+                break
+            if self._inflight.get(user_key):
+                self._users.move_to_end(user_key)
+                continue
+            del self._users[user_key]
+            self._limits.pop(user_key, None)
+            self._buckets.pop(user_key, None)
+
+    def _blocked_wait(self, key: Tuple[str, str]) -> Optional[float]:
+        """该键当前不可用时返回建议的重试等待秒数，可用时返回None"""
+        limit = self._limits.get(key)
+        if limit and self._inflight.get(key, 0) >= limit:
+            return 1.0
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            wait = bucket.wait_time()
+            if wait > 0:
+                return wait
+        return None
+
+    def try_acquire(self, limits: Optional[AgentLimits],
+                    user_id: Union[str, uuid.UUID, None]) -> Tuple[Optional[AgentSlot], float]:
+        """尝试为一个任务获取所有维度的配额
+
+        全部可用时才一并占用（不会只占用部分维度）。
+
+        Returns:
+            (配额, 0) 或 (None, 建议的重试等待秒数)
+        """
+        keys = self._keys_for(limits, user_id)
+
+        for key in keys:
+            wait = self._blocked_wait(key)
+            if wait is not None:
+                self._deferred[key[0]] += 1
+                logger.trace(f"⏳ [AGENT-LIMIT] {key[0]}={key[1]} 已达上限，{wait:.1f}秒后重试")
+                return None, wait
+
+        for key in keys:
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.take()
+        self._acquired += 1
+        return AgentSlot(keys), 0.0
+
+    def release(self, slot: AgentSlot) -> None:
+        """归还配额"""
+        for key in slot.keys:
+            remaining = self._inflight.get(key, 0) - 1
+            if remaining > 0:
+                self._inflight[key] = remaining
+            else:
+                self._inflight.pop(key, None)
+            if key in self._users:
+                # 空闲时间从最后一个任务结束时算起
+                self._users[key] = time.monotonic()
+                self._users.move_to_end(key)
+
+    def get_blocked(self) -> Tuple[List[str], List[str]]:
+        """当前已饱和（并发已满或令牌耗尽）的Agent与用户，用于领取任务时跳过
+
+        模型维度饱和时，使用该模型的所有已知Agent都视为饱和。
+        """
+        blocked_models = {
+            key[1] for key in set(self._limits) | set(self._buckets)
+            if key[0] == SCOPE_MODEL and self._blocked_wait(key) is not None
+        }
+        blocked_agents = [
+            agent_id for agent_id, limits in self._agents.items()
+            if limits.model_key in blocked_models
+            or self._blocked_wait((SCOPE_AGENT, agent_id)) is not None
+        ]
+        blocked_users = [
+            key[1] for key in set(self._limits) | set(self._buckets)
+            if key[0] == SCOPE_USER and self._blocked_wait(key) is not None
+        ]
+        return blocked_agents, blocked_users
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各维度当前利用率"""
+        scopes: Dict[str, Dict[str, Any]] = {SCOPE_AGENT: {}, SCOPE_MODEL: {}, SCOPE_USER: {}}
+        for key in set(self._inflight) | set(self._limits) | set(self._buckets):
+            scope, name = key
+            limit = self._limits.get(key)
+            inflight = self._inflight.get(key, 0)
+            entry = {
+                "inflight": inflight,
+                "max_concurrent": limit,
+                "utilization": round(inflight / limit, 4) if limit else None
+            }
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket._refill()
+                entry["requests_per_minute"] = bucket.rate_per_minute
+                entry["tokens_available"] = round(bucket.tokens, 2)
+            scopes[scope][name] = entry
+
+        blocked_agents, blocked_users = self.get_blocked()
+        return {
+            "scopes": scopes,
+            "acquired": self._acquired,
+            "deferred": dict(self._deferred),
+            "blocked_agents": blocked_agents,
+            "blocked_users": blocked_users,
+            "tracked_users": len(self._users)
+        }
+
+
+_app_settings = get_settings().app
+agent_concurrency_limiter = AgentConcurrencyLimiter(
+    user_max_concurrent=_app_settings.agent_user_max_concurrent,
+    user_requests_per_minute=_app_settings.agent_user_requests_per_minute,
+    agent_defaults={
+        'max_concurrent': _app_settings.agent_default_max_concurrent,
+        'requests_per_minute': _app_settings.agent_default_requests_per_minute
+    }
+)
+
+
+def get_agent_concurrency_limiter() -> AgentConcurrencyLimiter:
+    """获取全局Agent并发/速率限制器"""
+    return agent_concurrency_limiter
@@ -0,0 +1,166 @@
+"""
+Agent任务优先级与公平调度
+Agent Task Priority and Fair-share Scheduling
+
+优先级：入队时按任务所属工作流实例的节点数分为 interactive / normal / batch 三个等级，
+领取顺序为"老化后的等级、入队时间"，排队每满 aging_seconds 等级提升一级，低等级任务不会被饿死。
+
+公平份额：按工作流实例与用户（工作流执行者）统计本进程worker的占用，
+占用达到其加权份额的实例/用户在领取时被跳过；没有其他可领取的任务时再不加限制地领取，
+保证worker不因公平约束而空闲。500个任务的批量工作流因此最多占用约一半worker，
+单任务的交互式工作流入队后能在下一个空闲worker上被领取。
+
+另外按优先级等级记录排队等待时间直方图（入队到开始处理），用于观察调度效果。
+"""
+
+import math
+import uuid
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from ..config.settings import get_settings
+from ..utils.query_stats import LatencyHistogram
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BATCH = 2
+
+PRIORITY_CLASS_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BATCH: "batch",
+}
+
+# 排队等待直方图桶上界（毫秒）：10ms ~ 1小时
+QUEUE_WAIT_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+                         60000, 120000, 300000, 600000, 1800000, 3600000)
+
+SCOPE_INSTANCE = "workflow_instance"
+SCOPE_USER = "user"
+
+
+def _key(value: Union[str, uuid.UUID, None]) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def parse_share_weights(spec: str) -> Dict[str, float]:
+    """解析 "user_id=2,user_id=0.5" 形式的用户权重配置"""
+    weights = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        try:
+            weight = float(value)
+        except ValueError:
+            continue
+        if key.strip() and weight > 0:
+            weights[key.strip()] = weight
+    return weights
+
+
+class AgentTaskScheduler:
+    """Agent任务的优先级分级、公平份额与排队等待统计"""
+
+    def __init__(self, aging_seconds: int = 60, interactive_max_nodes: int = 5,
+                 batch_min_nodes: int = 50, user_weights: Optional[Dict[str, float]] = None):
+        self.aging_seconds = max(aging_seconds, 1)
+        self.interactive_max_nodes = interactive_max_nodes
+        self.batch_min_nodes = batch_min_nodes
+        self.user_weights = user_weights or {}
+
+        # (维度, 键) -> 本进程处理中的任务数
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        self._wait_histograms: Dict[int, LatencyHistogram] = {
+            priority_class: LatencyHistogram(QUEUE_WAIT_BUCKETS_MS) for priority_class in PRIORITY_CLASS_NAMES
+        }
+        self._fair_share_skips = 0
+
+    @property
+    def priority_thresholds(self) -> Tuple[int, int]:
+        """(interactive最大节点数, batch最小节点数)，入队时据此分级"""
+        return self.interactive_max_nodes, self.batch_min_nodes
+
+    def _weight(self, key: Tuple[str, str]) -> float:
+        if key[0] == SCOPE_USER:
+            return self.user_weights.get(key[1], 1.0)
+        return 1.0
+
+    @staticmethod
+    def _keys_for(lease: Dict[str, Any]) -> List[Tuple[str, str]]:
+        keys = []
+        if lease.get('workflow_instance_id') is not None:
+            keys.append((SCOPE_INSTANCE, _key(lease['workflow_instance_id'])))
+        if lease.get('user_id') is not None:
+            keys.append((SCOPE_USER, _key(lease['user_id'])))
+        return keys
+
+    def get_over_share(self, worker_count: int) -> Tuple[List[str], List[str]]:
+        """已达到加权公平份额的工作流实例与用户
+
+        份额 = worker数 × 自身权重 / (同维度占用中的权重和 + 1)，
+        分母中的 +1 为尚未占用worker的新来者预留份额。
+        """
+        over = {SCOPE_INSTANCE: [], SCOPE_USER: []}
+        for scope in over:
+            active = [key for key in self._inflight if key[0] == scope]
+            if not active:
+                continue
+            total_weight = sum(self._weight(key) for key in active) + 1.0
+            for key in active:
+                fair_slots = max(1, math.floor(worker_count * self._weight(key) / total_weight))
+                if self._inflight[key] >= fair_slots:
+                    over[scope].append(key[1])
+        return over[SCOPE_INSTANCE], over[SCOPE_USER]
+
+    def record_fair_share_skip(self) -> None:
+        """记录一次因公平份额跳过了占用过多的实例/用户后领取到任务"""
+        self._fair_share_skips += 1
+
+    def on_start(self, lease: Dict[str, Any]) -> None:
+        """任务开始处理：记录排队等待时间并占用份额"""
+        priority_class = lease.get('priority_class', PRIORITY_NORMAL)
+        histogram = self._wait_histograms.get(priority_class)
+        if histogram is not None and lease.get('wait_ms') is not None:
+            histogram.observe(max(float(lease['wait_ms']), 0.0))
+        for key in self._keys_for(lease):
+            self._inflight[key] = self._inflight.get(key, 0) + 1
+
+    def on_finish(self, lease: Dict[str, Any]) -> None:
+        """任务处理结束：归还份额"""
+        for key in self._keys_for(lease):
+            remaining = self._inflight.get(key, 0) - 1
+            if remaining > 0:
+                self._inflight[key] = remaining
+            else:
+                self._inflight.pop(key, None)
+
+    def get_stats(self, worker_count: int) -> Dict[str, Any]:
+        """各优先级排队等待分位数与公平份额占用"""
+        over_instances, over_users = self.get_over_share(worker_count)
+        return {
+            "aging_seconds": self.aging_seconds,
+            "queue_wait": {
+                PRIORITY_CLASS_NAMES[priority_class]: histogram.to_dict()
+                for priority_class, histogram in self._wait_histograms.items()
+            },
+            "inflight": {
+                SCOPE_INSTANCE: {key[1]: count for key, count in self._inflight.items() if key[0] == SCOPE_INSTANCE},
+                SCOPE_USER: {key[1]: count for key, count in self._inflight.items() if key[0] == SCOPE_USER},
+            },
+            "over_share": {SCOPE_INSTANCE: over_instances, SCOPE_USER: over_users},
+            "fair_share_skips": self._fair_share_skips
+        }
+
+
+_app_settings = get_settings().app
+agent_task_scheduler = AgentTaskScheduler(
+    aging_seconds=_app_settings.agent_priority_aging_seconds,
+    interactive_max_nodes=_app_settings.agent_interactive_max_nodes,
+    batch_min_nodes=_app_settings.agent_batch_min_nodes,
+    user_weights=parse_share_weights(_app_settings.agent_user_share_weights)
+)
+
+
+def get_agent_task_scheduler() -> AgentTaskScheduler:
+    """获取全局Agent任务调度器"""
+    return agent_task_scheduler
@@ -3,9 +3,12 @@ Agent任务处理服务
 Agent Task Processing Service
 """
 
+import os
+import math
 import uuid
 import json
 import sys
+import socket
 import asyncio
 from typing import Optional, Dict, Any, List
 from datetime import datetime
@@ -14,13 +17,22 @@ logger.remove()
 logger.add(sys.stderr, level="DEBUG", enqueue=True)  # 修复Windows GBK编码问题
 
 from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+from ..repositories.instance.agent_task_queue_repository import AgentTaskQueueRepository
 from ..repositories.agent.agent_repository import AgentRepository
 from ..models.instance import (
     TaskInstanceUpdate, TaskInstanceStatus, TaskInstanceType
 )
-from ..utils.helpers import now_utc
+from ..config.settings import get_settings
+from ..utils.db_replicas import use_primary_reads
+from ..utils.db_pool import use_db_pool, DB_POOL_ENGINE, DB_POOL_BACKGROUND
 from ..utils.openai_client import openai_client
 from .mcp_service import mcp_service
+from .workflow_event_bus import get_workflow_event_bus, EVENT_AGENT_OUTPUT
+from .agent_rate_limiter import get_agent_concurrency_limiter
+from .agent_task_scheduler import get_agent_task_scheduler
+
+# 事件流中Agent输出分块的最大字符数，完整输出通过任务详情读取
+AGENT_OUTPUT_EVENT_MAX_CHARS = 4000
 
 
 class AgentTaskService:
@@ -29,12 +41,26 @@ class AgentTaskService:
     def __init__(self):
         self.task_repo = TaskInstanceRepository()
         self.agent_repo = AgentRepository()
+        self.queue_repo = AgentTaskQueueRepository()
         
-        # Agent任务处理队列
-        self.processing_queue = asyncio.Queue()
+        # Agent任务持久化队列（agent_task_queue表），进程重启不丢失；入队时通过事件立即唤醒worker
+        queue_settings = get_settings().app
+        self.visibility_timeout = queue_settings.agent_queue_visibility_timeout
+        self.max_attempts = queue_settings.agent_queue_max_attempts
+        self.retry_delay = queue_settings.agent_queue_retry_delay
+        self.poll_interval = queue_settings.agent_queue_poll_interval
+        self.reconcile_interval = queue_settings.agent_queue_reconcile_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue_event = asyncio.Event()
+        self.leased_tasks = 0
         self.is_running = False
         self.max_concurrent_tasks = 5
         
+        # 按Agent/模型/用户的并发与速率限制，在worker池内生效
+        self.limiter = get_agent_concurrency_limiter()
+        # 优先级老化与按工作流实例/用户的公平份额调度
+        self.scheduler = get_agent_task_scheduler()
+        
         # 任务完成回调列表
         self.completion_callbacks = []
     
@@ -71,41 +97,27 @@ class AgentTaskService:
             logger.warning("Agent任务处理服务已在运行中")
             return
         
+        await self.queue_repo.ensure_table()
+        
         self.is_running = True
         logger.trace("Agent任务处理服务启动")
         
-        # 启动任务处理协程
-        for i in range(self.max_concurrent_tasks):
-            asyncio.create_task(self._process_agent_tasks())
+        # 启动任务处理协程（任务领取与状态流转读走主库；使用engine连接池）
+        with use_primary_reads(), use_db_pool(DB_POOL_ENGINE):
+            for i in range(self.max_concurrent_tasks):
+                asyncio.create_task(self._process_agent_tasks(f"{self.worker_id}:{i}"))
         
-        # 启动任务监控协程
-        asyncio.create_task(self._monitor_pending_tasks())
+        # 启动租约回收/补偿入队协程（使用background连接池）
+        with use_db_pool(DB_POOL_BACKGROUND):
+            asyncio.create_task(self._monitor_pending_tasks())
     
     async def stop_service(self):
         """停止Agent任务处理服务"""
         self.is_running = False
+        # 唤醒空闲worker使其退出；处理中的租约到期后由其他实例回收
+        self._queue_event.set()
         logger.trace("Agent任务处理服务停止")
     
-    async def _has_active_workflows(self) -> bool:
-        """检查是否有活跃的工作流"""
-        try:
-            from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
-            workflow_repo = WorkflowInstanceRepository()
-            
-            # 查询运行中的工作流
-            active_workflows = await workflow_repo.db.fetch_all("""
-                SELECT workflow_instance_id, status 
-                FROM workflow_instance 
-                WHERE status IN ('RUNNING', 'PENDING') 
-                AND is_deleted = FALSE
-                LIMIT 1
-            """)
-            
-            return len(active_workflows) > 0
-        except Exception as e:
-            logger.error(f"检查活跃工作流失败: {e}")
-            return True  # 出错时假设有活跃工作流，继续监控
-    
     async def get_pending_agent_tasks(self, agent_id: Optional[uuid.UUID] = None, 
                                     limit: int = 50) -> List[Dict[str, Any]]:
         """获取待处理的Agent任务"""
@@ -155,13 +167,8 @@ class AgentTaskService:
             if task['status'] != TaskInstanceStatus.PENDING.value:
                 raise ValueError(f"任务状态不允许提交给Agent，当前状态: {task['status']}")
             
-            # 将任务加入处理队列
-            queue_item = {
-                'task_id': task_id,
-                'submitted_at': now_utc()
-            }
-            
-            await self.processing_queue.put(queue_item)
+            # 将任务加入持久化队列（已在队列中时不重复入队）
+            await self._enqueue_task(task_id)
             
             logger.trace(f"任务 {task_id} 已提交给Agent处理队列")
             return {
@@ -399,6 +406,15 @@ class AgentTaskService:
             else:
                 logger.warning(f"⚠️ [AGENT-PROCESS] 任务更新返回空结果")
             
+            # Agent调用不是流式的，输出作为一个最终分块推送给事件流订阅者
+            await get_workflow_event_bus().publish(EVENT_AGENT_OUTPUT, {
+                "task_instance_id": task_id,
+                "node_instance_id": task.get('node_instance_id'),
+                "chunk": output_text[:AGENT_OUTPUT_EVENT_MAX_CHARS],
+                "truncated": len(output_text) > AGENT_OUTPUT_EVENT_MAX_CHARS,
+                "final": True
+            }, workflow_instance_id=task.get('workflow_instance_id'))
+            
             # 显示Agent输出结果
             logger.trace(f"🎯 [AGENT-PROCESS] === AGENT输出结果 ===")
             logger.trace(f"   📝 任务标题: {task['task_title']}")
@@ -741,90 +757,203 @@ class AgentTaskService:
     
     
     
-    async def _process_agent_tasks(self):
-        """处理Agent任务的工作协程"""
+    async def _enqueue_task(self, task_id: uuid.UUID) -> bool:
+        """任务写入持久化队列并唤醒本进程的worker"""
+        queued = await self.queue_repo.enqueue(task_id, self.max_attempts,
+                                               priority_thresholds=self.scheduler.priority_thresholds)
+        self._queue_event.set()
+        return queued
+    
+    async def _process_agent_tasks(self, lease_owner: str):
+        """处理Agent任务的工作协程：从持久化队列领取租约，处理完成后确认"""
         while self.is_running:
             try:
-                # 从队列获取任务
-                queue_item = await asyncio.wait_for(
-                    self.processing_queue.get(), timeout=5.0
-                )
+                # 先清除事件再领取：领取之后发生的入队会让下面的等待立即返回
+                self._queue_event.clear()
+                leases = await self._lease_next_task(lease_owner)
                 
-                task_id = queue_item['task_id']
-                logger.trace(f"从队列取出Agent任务: {task_id}")
+                if not leases:
+                    # 本进程入队时立即唤醒；轮询只用于发现其他进程的入队和延迟重试的任务
+                    try:
+                        await asyncio.wait_for(self._queue_event.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
                 
-                # 处理任务
-                await self.process_agent_task(task_id)
+                for lease in leases:
+                    await self._run_leased_task(lease)
                 
-            except asyncio.TimeoutError:
-                continue
             except Exception as e:
                 logger.error(f"处理Agent任务协程出错: {e}")
                 await asyncio.sleep(1)
     
-    async def _monitor_pending_tasks(self):
-        """监控待处理任务的协程（智能调度版本）"""
-        consecutive_empty_checks = 0
-        base_sleep_interval = 15  # 基础检查间隔（秒）- 优化为更频繁
-        max_sleep_interval = 120  # 最大检查间隔（2分钟）- 减少最大延迟
+    async def _lease_next_task(self, lease_owner: str) -> List[Dict[str, Any]]:
+        """按优先级与公平份额领取下一个任务"""
+        # 跳过已达并发/速率上限的Agent与用户，避免其任务反复被领取又退回
+        blocked_agents, blocked_users = self.limiter.get_blocked()
+        # 先跳过已占满公平份额的工作流实例/用户；没有其他任务可领时不加公平约束，避免worker空闲
+        over_instances, over_users = self.scheduler.get_over_share(self.max_concurrent_tasks)
+        if over_instances or over_users:
+            leases = await self.queue_repo.lease(
+                lease_owner, 1, self.visibility_timeout, blocked_agents, blocked_users + over_users,
+                over_instances, aging_seconds=self.scheduler.aging_seconds
+            )
+            if leases:
+                self.scheduler.record_fair_share_skip()
+                return leases
+        
+        return await self.queue_repo.lease(
+            lease_owner, 1, self.visibility_timeout, blocked_agents, blocked_users,
+            aging_seconds=self.scheduler.aging_seconds
+        )
+    
+    async def _acquire_task_limits(self, lease: Dict[str, Any]):
+        """获取任务所属Agent/模型/用户的配额；已达上限时把任务延迟退回队列并返回None"""
+        limits = None
+        agent_id = lease.get('agent_id')
+        if agent_id:
+            limits = self.limiter.get_cached_agent_limits(agent_id)
+            if limits is None:
+                agent = await self.agent_repo.get_agent_by_id(agent_id)
+                if agent:
+                    limits = self.limiter.update_agent(agent)
+        
+        slot, retry_after = self.limiter.try_acquire(limits, lease.get('user_id'))
+        if slot is None:
+            await self.queue_repo.defer(lease['task_instance_id'], lease['lease_token'],
+                                        max(1, math.ceil(retry_after)))
+        return slot
+    
+    async def _run_leased_task(self, lease: Dict[str, Any]):
+        """在租约内处理一个任务：处理期间定期续约，结束后确认租约"""
+        logger.trace(f"从队列领取Agent任务: {lease['task_instance_id']} (第{lease['attempts']}次)")
         
+        slot = await self._acquire_task_limits(lease)
+        if slot is None:
+            return
+        
+        try:
+            await self._process_under_lease(lease)
+        except Exception:
+            # process_agent_task已将任务标记为失败并通知回调，错误已记录到队列行
+            pass
+        finally:
+            self.limiter.release(slot)
+            # 释放配额后唤醒worker，领取此前因限流被跳过的任务
+            self._queue_event.set()
+    
+    async def _process_under_lease(self, lease: Dict[str, Any]) -> Dict[str, Any]:
+        """持有租约处理任务：处理期间定期续约，结束后确认租约（失败时记录错误并重新抛出）"""
+        task_id = lease['task_instance_id']
+        lease_token = lease['lease_token']
+        self.leased_tasks += 1
+        self.scheduler.on_start(lease)
+        heartbeat = asyncio.create_task(self._keep_lease_alive(task_id, lease_token))
+        error = None
+        try:
+            return await self.process_agent_task(task_id)
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            heartbeat.cancel()
+            self.leased_tasks -= 1
+            self.scheduler.on_finish(lease)
+            if not await self.queue_repo.complete(task_id, lease_token, error):
+                logger.warning(f"⚠️ [AGENT-QUEUE] 任务 {task_id} 的租约已失效，确认被忽略")
+    
+    async def process_agent_task_leased(self, task_id: uuid.UUID) -> Dict[str, Any]:
+        """由调用方同步处理任务（工作流引擎内联执行），同样经过持久化队列
+
+        任务先入队再领取其租约，处理期间续约；进程崩溃时租约过期，由回收逻辑重新入队。
+        任务已被队列worker领取时不重复处理；所属Agent/模型/用户已达并发或速率上限时
+        与worker相同地延迟退回队列，由worker在配额可用后处理。
+        """
+        await self.queue_repo.enqueue(task_id, self.max_attempts,
+                                      priority_thresholds=self.scheduler.priority_thresholds)
+        lease = await self.queue_repo.lease_task(task_id, f"{self.worker_id}:inline", self.visibility_timeout)
+        if lease is None:
+            logger.trace(f"任务 {task_id} 已由队列worker领取，跳过内联处理")
+            return {
+                'task_id': task_id,
+                'status': 'queued',
+                'message': '任务已由Agent处理队列领取'
+            }
+        
+        slot = await self._acquire_task_limits(lease)
+        if slot is None:
+            logger.trace(f"任务 {task_id} 已达Agent并发/速率上限，退回队列延迟处理")
+            return {
+                'task_id': task_id,
+                'status': 'queued',
+                'message': '已达Agent并发或速率上限，任务已退回Agent处理队列'
+            }
+        
+        try:
+            return await self._process_under_lease(lease)
+        finally:
+            self.limiter.release(slot)
+            self._queue_event.set()
+    
+    async def _keep_lease_alive(self, task_id: uuid.UUID, lease_token: str):
+        """处理期间按可见性超时的1/3间隔续约，避免长任务被回收后重复处理"""
+        interval = max(self.visibility_timeout / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue_repo.extend_lease(task_id, lease_token, self.visibility_timeout):
+                    logger.warning(f"⚠️ [AGENT-QUEUE] 任务 {task_id} 续约失败，租约已失效")
+                    return
+            except Exception as e:
+                logger.error(f"续约Agent任务失败: {e}")
+    
+    async def _monitor_pending_tasks(self):
+        """队列维护协程：回收过期租约（重新入队或转入死信），并把漏入队的PENDING任务补入队列"""
         while self.is_running:
             try:
-                # 动态调整检查间隔
-                if consecutive_empty_checks == 0:
-                    sleep_interval = base_sleep_interval
-                elif consecutive_empty_checks <= 3:
-                    sleep_interval = base_sleep_interval * 2  # 60秒
-                elif consecutive_empty_checks <= 6:
-                    sleep_interval = base_sleep_interval * 4  # 120秒
-                else:
-                    sleep_interval = max_sleep_interval  # 300秒
+                await asyncio.sleep(self.reconcile_interval)
                 
-                await asyncio.sleep(sleep_interval)
+                # 回收过期租约（worker崩溃或进程重启留下的任务）
+                requeued, dead = await self.queue_repo.reclaim_expired_leases(self.retry_delay)
+                if requeued:
+                    logger.warning(f"♻️ [AGENT-QUEUE] {len(requeued)} 个任务租约超时，{self.retry_delay}秒后重新处理")
+                for row in dead:
+                    task_id = row['task_instance_id']
+                    error_message = f"Agent任务租约超时 {row['attempts']} 次，已转入死信"
+                    logger.error(f"💀 [AGENT-QUEUE] 任务 {task_id}: {error_message} (最后持有者: {row['lease_owner']})")
+                    await self.task_repo.update_task(task_id, TaskInstanceUpdate(
+                        status=TaskInstanceStatus.FAILED,
+                        error_message=error_message
+                    ))
+                    await self._notify_task_failure(task_id, error_message)
                 
-                # 获取待处理的Agent任务
-                pending_tasks = await self.get_pending_agent_tasks(limit=10)
+                # 补偿入队：提交失败或由其他路径创建的PENDING任务
+                missing_task_ids = await self.queue_repo.get_unqueued_pending_task_ids(limit=100)
+                for task_id in missing_task_ids:
+                    await self.queue_repo.enqueue(task_id, self.max_attempts,
+                                                  priority_thresholds=self.scheduler.priority_thresholds)
+                    logger.trace(f"补偿加入Agent任务到处理队列: {task_id}")
                 
-                if pending_tasks:
-                    # 有待处理任务，重置计数器
-                    consecutive_empty_checks = 0
-                    
-                    # 将待处理任务加入队列
-                    for task in pending_tasks:
-                        if task['status'] == TaskInstanceStatus.PENDING.value:
-                            queue_item = {
-                                'task_id': task['task_instance_id'],
-                                'submitted_at': now_utc()
-                            }
-                            await self.processing_queue.put(queue_item)
-                            
-                            logger.trace(f"自动加入Agent任务到处理队列: {task['task_instance_id']}")
-                else:
-                    # 没有待处理任务，增加空检查计数
-                    consecutive_empty_checks += 1
-                    
-                    # 检查是否有活跃的工作流
-                    has_active_workflows = await self._has_active_workflows()
-                    
-                    # 如果没有活跃工作流，进一步延长检查间隔
-                    if not has_active_workflows and consecutive_empty_checks > 10:
-                        sleep_interval = min(sleep_interval * 2, 600)  # 最长10分钟
-                    
-                    # 每隔一定次数才输出一次警告，避免日志刷屏
-                    if consecutive_empty_checks in [1, 5, 10, 20] or consecutive_empty_checks % 50 == 0:
-                        status_msg = "无活跃工作流" if not has_active_workflows else "有活跃工作流"
-                        logger.trace(f"🔍 [AGENT-MONITOR] 连续 {consecutive_empty_checks} 次未找到待处理任务，{status_msg}，检查间隔已调整为 {sleep_interval} 秒")
+                if requeued or missing_task_ids:
+                    self._queue_event.set()
                 
             except Exception as e:
-                logger.error(f"监控待处理任务失败: {e}")
+                logger.error(f"维护Agent任务队列失败: {e}")
                 await asyncio.sleep(10)
-                consecutive_empty_checks = 0  # 重置计数器
+    
+    async def get_queue_status(self) -> Dict[str, Any]:
+        """获取持久化队列状态（按状态计数与本进程处理中的租约数）"""
+        return {
+            'queue': await self.queue_repo.get_queue_stats(),
+            'leased_by_this_process': self.leased_tasks
+        }
     
     async def get_agent_task_statistics(self, agent_id: Optional[uuid.UUID] = None) -> Dict[str, Any]:
         """获取Agent任务统计"""
         try:
             # 获取Agent的所有任务
             all_tasks = await self.task_repo.get_agent_tasks_for_processing(agent_id, 1000)
+            queue_stats = await self.queue_repo.get_queue_stats()
             
             # 统计信息
             stats = {
@@ -835,7 +964,10 @@ class AgentTaskService:
                 'failed_tasks': 0,
                 'average_processing_time': 0,
                 'success_rate': 0,
-                'queue_size': self.processing_queue.qsize()
+                'queue_size': queue_stats.get('queued', 0),
+                'queue': queue_stats,
+                'limits': self.limiter.get_stats(),
+                'scheduling': self.scheduler.get_stats(self.max_concurrent_tasks)
             }
             
             total_duration = 0
@@ -917,6 +1049,9 @@ class AgentTaskService:
             )
             await self.task_repo.update_task(task_id, cancel_update)
             
+            # 撤销尚未被领取的队列项
+            await self.queue_repo.cancel(task_id)
+            
             logger.trace(f"取消Agent任务: {task_id}")
             return {
                 'task_id': task_id,
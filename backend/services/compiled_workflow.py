@@ -0,0 +1,379 @@
+"""
+编译后的工作流定义缓存
+Compiled Workflow Cache
+
+按 workflow_id 一次性加载工作流定义（节点、连接、处理器绑定），
+编译为节点数组、正/反向邻接表、拓扑序和已解析的条件配置，
+放入执行引擎与工作流执行上下文共享的有界LRU缓存。
+启动实例、触发下游节点时直接读取编译结果，不再逐节点查询定义。
+
+工作流定义变更（新版本、节点/连接/处理器修改）时按 workflow_base_id 失效；
+另有TTL兜底，覆盖未经过服务层的批量写入（导入、合并等）。
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Union
+
+from loguru import logger
+
+from ..config.settings import get_settings
+from ..utils.database import get_db_manager
+
+
+IdLike = Union[str, uuid.UUID]
+
+# IN 列表每批的ID数量
+_IN_BATCH_SIZE = 500
+
+
+def _key(value: IdLike) -> str:
+    return str(value)
+
+
+def _parse_condition_config(raw: Any) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning(f"解析条件配置失败: {e}")
+            return {}
+    return raw
+
+
+class CompiledWorkflow:
+    """单个工作流版本的只读编译结果"""
+
+    def __init__(self, workflow_id: IdLike, workflow_base_id: IdLike, nodes: List[Dict[str, Any]],
+                 connections: List[Dict[str, Any]], processors: Dict[str, List[Dict[str, Any]]]):
+        self.workflow_id = workflow_id
+        self.workflow_base_id = workflow_base_id
+        self.compiled_at = time.monotonic()
+
+        # 节点数组（与 _get_workflow_nodes_by_version_id 的返回结构一致，含processor_id）
+        self.nodes = nodes
+        self.node_index: Dict[str, Dict[str, Any]] = {_key(node['node_id']): node for node in nodes}
+
+        # 正向邻接：str(node_id) -> 下游连接列表（与 _get_next_nodes 的返回结构一致）
+        self.adjacency: Dict[str, List[Dict[str, Any]]] = {}
+        # 反向邻接：str(node_id) -> [(上游node_id, 上游节点名称)]
+        self.reverse_adjacency: Dict[str, List[tuple]] = {}
+        for connection in connections:
+            from_key = _key(connection.pop('from_node_id'))
+            from_name = connection.pop('from_node_name')
+            self.adjacency.setdefault(from_key, []).append(connection)
+            upstream = self.reverse_adjacency.setdefault(_key(connection['to_node_id']), [])
+            if all(_key(node_id) != from_key for node_id, _ in upstream):
+                upstream.append((self.node_index.get(from_key, {}).get('node_id', from_key), from_name))
+        for upstream in self.reverse_adjacency.values():
+            upstream.sort(key=lambda item: item[1] or '')
+
+        # 处理器绑定：str(node_id) -> 处理器列表（与 _get_node_processors 的返回结构一致）
+        self.processors = processors
+
+        self.topological_order = self._topological_sort()
+
+    def _topological_sort(self) -> List[Any]:
+        """Kahn拓扑排序；回环中的节点按原始顺序追加在末尾"""
+        in_degree = {key: 0 for key in self.node_index}
+        for connections in self.adjacency.values():
+            for connection in connections:
+                to_key = _key(connection['to_node_id'])
+                if to_key in in_degree:
+                    in_degree[to_key] += 1
+
+        queue = deque(key for key in self.node_index if in_degree[key] == 0)
+        order = []
+        while queue:
+            key = queue.popleft()
+            order.append(key)
+            for connection in self.adjacency.get(key, ()):
+                to_key = _key(connection['to_node_id'])
+                if to_key in in_degree:
+                    in_degree[to_key] -= 1
+                    if in_degree[to_key] == 0:
+                        queue.append(to_key)
+
+        if len(order) < len(self.node_index):
+            ordered = set(order)
+            order.extend(key for key in self.node_index if key not in ordered)
+        return [self.node_index[key]['node_id'] for key in order]
+
+    def has_node(self, node_id: IdLike) -> bool:
+        return _key(node_id) in self.node_index
+
+    def get_nodes(self) -> List[Dict[str, Any]]:
+        """节点列表（浅拷贝，调用方可以修改）"""
+        return [dict(node) for node in self.nodes]
+
+    def get_next_nodes(self, node_id: IdLike) -> List[Dict[str, Any]]:
+        return [dict(connection) for connection in self.adjacency.get(_key(node_id), ())]
+
+    def get_upstream_node_ids(self, node_id: IdLike) -> List[Any]:
+        """直接上游节点ID（按节点名称排序，与原上游查询一致）"""
+        return [upstream_id for upstream_id, _ in self.reverse_adjacency.get(_key(node_id), ())]
+
+    def get_upstream_connections(self, node_id: IdLike) -> List[Dict[str, Any]]:
+        """直接上游连接（与 _get_upstream_node_instances 中上游查询的返回结构一致）"""
+        return [
+            {'upstream_node_id': upstream_id, 'upstream_node_name': upstream_name}
+            for upstream_id, upstream_name in self.reverse_adjacency.get(_key(node_id), ())
+        ]
+
+    def get_node_processors(self, node_id: IdLike) -> List[Dict[str, Any]]:
+        return [dict(processor) for processor in self.processors.get(_key(node_id), ())]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workflow_id": str(self.workflow_id),
+            "workflow_base_id": str(self.workflow_base_id),
+            "nodes": len(self.nodes),
+            "connections": sum(len(connections) for connections in self.adjacency.values()),
+            "age_seconds": round(time.monotonic() - self.compiled_at, 1),
+        }
+
+
+class CompiledWorkflowCache:
+    """按 workflow_id 缓存 CompiledWorkflow 的有界LRU，并发未命中只编译一次"""
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 300.0):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self.db = get_db_manager()
+        self._cache: "OrderedDict[str, CompiledWorkflow]" = OrderedDict()
+        # str(node_id) -> str(workflow_id)，供只知道node_id的查询定位编译结果
+        self._node_owner: Dict[str, str] = {}
+        self._compiling: Dict[str, asyncio.Future] = {}
+        # 每次失效递增，用于丢弃失效前开始的编译结果
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._compile_seconds = 0.0
+
+    async def get(self, workflow_id: IdLike) -> Optional[CompiledWorkflow]:
+        """获取工作流的编译结果，未命中时加载并编译"""
+        workflow_key = _key(workflow_id)
+        compiled = self._lookup(workflow_key)
+        if compiled is not None:
+            self._hits += 1
+            return compiled
+
+        pending = self._compiling.get(workflow_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._compiling[workflow_key] = future
+        generation = self._generation
+        try:
+            start = time.perf_counter()
+            compiled = await self._compile(workflow_id)
+            self._compile_seconds += time.perf_counter() - start
+            # 编译期间发生过失效时不写入缓存，避免缓存旧定义
+            if compiled is not None and generation == self._generation:
+                self._store(workflow_key, compiled)
+            future.set_result(compiled)
+            return compiled
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._compiling.pop(workflow_key, None)
+
+    def get_cached_by_node(self, node_id: IdLike) -> Optional[CompiledWorkflow]:
+        """按node_id查找已缓存的编译结果（不触发加载）"""
+        workflow_key = self._node_owner.get(_key(node_id))
+        if workflow_key is None:
+            return None
+        compiled = self._lookup(workflow_key)
+        if compiled is not None:
+            self._hits += 1
+        return compiled
+
+    def _lookup(self, workflow_key: str) -> Optional[CompiledWorkflow]:
+        compiled = self._cache.get(workflow_key)
+        if compiled is None:
+            return None
+        if self.ttl_seconds and time.monotonic() - compiled.compiled_at > self.ttl_seconds:
+            self._remove(workflow_key)
+            return None
+        self._cache.move_to_end(workflow_key)
+        return compiled
+
+    def _store(self, workflow_key: str, compiled: CompiledWorkflow):
+        self._remove(workflow_key)
+        self._cache[workflow_key] = compiled
+        for node_key in compiled.node_index:
+            self._node_owner[node_key] = workflow_key
+        while len(self._cache) > self.max_size:
+            oldest_key = next(iter(self._cache))
+            self._remove(oldest_key)
+            self._evictions += 1
+
+    def _remove(self, workflow_key: str):
+        compiled = self._cache.pop(workflow_key, None)
+        if compiled is None:
+            return
+        for node_key in compiled.node_index:
+            if self._node_owner.get(node_key) == workflow_key:
+                del self._node_owner[node_key]
+
+    def invalidate(self, workflow_id: Optional[IdLike] = None,
+                   workflow_base_id: Optional[IdLike] = None) -> int:
+        """按 workflow_id 或 workflow_base_id 失效，返回移除的条目数"""
+        if workflow_id is not None:
+            keys = [_key(workflow_id)] if _key(workflow_id) in self._cache else []
+        elif workflow_base_id is not None:
+            base_key = _key(workflow_base_id)
+            keys = [key for key, compiled in self._cache.items() if _key(compiled.workflow_base_id) == base_key]
+        else:
+            keys = list(self._cache.keys())
+        self._generation += 1
+        for key in keys:
+            self._remove(key)
+        if keys:
+            self._invalidations += len(keys)
+            logger.debug(f"🧹 工作流编译缓存失效: {len(keys)} 个 (workflow_id={workflow_id}, base_id={workflow_base_id})")
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存（统计保留）"""
+        self._generation += 1
+        self._cache.clear()
+        self._node_owner.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中率与编译耗时统计"""
+        total = self._hits + self._misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "cached_nodes": len(self._node_owner),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            "avg_compile_ms": round(self._compile_seconds * 1000 / self._misses, 3) if self._misses else 0.0,
+        }
+
+    async def _compile(self, workflow_id: IdLike) -> Optional[CompiledWorkflow]:
+        """加载工作流定义并编译（查询次数与节点数无关）"""
+        workflow_result = await self.db.fetch_one(
+            "SELECT workflow_base_id FROM workflow WHERE workflow_id = $1 AND is_deleted = FALSE",
+            workflow_id
+        )
+        if not workflow_result:
+            logger.error(f"工作流版本不存在: {workflow_id}")
+            return None
+        workflow_base_id = workflow_result['workflow_base_id']
+
+        # 与 _get_workflow_nodes_by_version_id 一致：当前版本节点，没有时回退到按workflow_id查询
+        nodes = await self.db.fetch_all("""
+            SELECT n.*
+            FROM "node" n
+            WHERE n.workflow_base_id = $1
+            AND n.is_current_version = TRUE
+            AND n.is_deleted = FALSE
+            ORDER BY n.created_at ASC
+        """, workflow_base_id)
+        if not nodes:
+            nodes = await self.db.fetch_all("""
+                SELECT n.*
+                FROM "node" n
+                WHERE n.workflow_id = $1
+                AND n.is_deleted = FALSE
+                ORDER BY n.created_at ASC
+            """, workflow_id)
+        nodes = [dict(node) for node in nodes]
+        node_ids = [node['node_id'] for node in nodes]
+
+        primary_processor: Dict[str, Any] = {}
+        processors: Dict[str, List[Dict[str, Any]]] = {}
+        connections: List[Dict[str, Any]] = []
+        for offset in range(0, len(node_ids), _IN_BATCH_SIZE):
+            batch = node_ids[offset:offset + _IN_BATCH_SIZE]
+            placeholders = ", ".join(f"${i}" for i in range(1, len(batch) + 1))
+
+            # 节点的主处理器（取第一个未删除的绑定，保持兼容性）
+            for row in await self.db.fetch_all(f"""
+                SELECT node_id, processor_id FROM node_processor
+                WHERE node_id IN ({placeholders}) AND is_deleted = FALSE
+            """, *batch):
+                primary_processor.setdefault(_key(row['node_id']), row['processor_id'])
+
+            # 处理器绑定详情（与 _get_node_processors 一致）
+            for row in await self.db.fetch_all(f"""
+                SELECT np.*, p.name as processor_name, p.type as processor_type,
+                       u.username, a.agent_name, p.user_id, p.agent_id
+                FROM node_processor np
+                JOIN processor p ON p.processor_id = np.processor_id AND p.is_deleted = FALSE
+                LEFT JOIN "user" u ON u.user_id = p.user_id AND u.is_deleted = FALSE
+                LEFT JOIN agent a ON a.agent_id = p.agent_id AND a.is_deleted = FALSE
+                WHERE np.node_id IN ({placeholders})
+                ORDER BY np.created_at ASC
+            """, *batch):
+                processors.setdefault(_key(row['node_id']), []).append(dict(row))
+
+            # 出边（与 _get_next_nodes 一致，条件配置预先解析）
+            for row in await self.db.fetch_all(f"""
+                SELECT
+                    nc.from_node_id,
+                    fn.name as from_node_name,
+                    nc.to_node_id,
+                    nc.connection_type,
+                    nc.condition_config,
+                    tn.node_base_id as to_node_base_id,
+                    tn.name as to_node_name,
+                    tn.type as to_node_type
+                FROM node_connection nc
+                JOIN node tn ON tn.node_id = nc.to_node_id
+                JOIN node fn ON fn.node_id = nc.from_node_id
+                WHERE nc.from_node_id IN ({placeholders})
+                  AND tn.is_deleted = FALSE
+                ORDER BY nc.created_at ASC
+            """, *batch):
+                connections.append({
+                    'from_node_id': row['from_node_id'],
+                    'from_node_name': row['from_node_name'],
+                    'to_node_id': row['to_node_id'],
+                    'to_node_base_id': row['to_node_base_id'],
+                    'to_node_name': row['to_node_name'],
+                    'to_node_type': row['to_node_type'],
+                    'connection_type': row['connection_type'] or 'normal',
+                    'condition_config': _parse_condition_config(row['condition_config'])
+                })
+
+        for node in nodes:
+            node['processor_id'] = primary_processor.get(_key(node['node_id']))
+
+        compiled = CompiledWorkflow(workflow_id, workflow_base_id, nodes, connections, processors)
+        logger.debug(f"📦 编译工作流定义: {workflow_id} ({len(nodes)} 个节点, {len(connections)} 条连接)")
+        return compiled
+
+
+# 全局缓存实例，由ExecutionEngine与WorkflowExecutionContext共享
+_app_settings = get_settings().app
+compiled_workflow_cache = CompiledWorkflowCache(
+    max_size=_app_settings.workflow_cache_size,
+    ttl_seconds=_app_settings.workflow_cache_ttl
+)
+
+
+def get_compiled_workflow_cache() -> CompiledWorkflowCache:
+    """获取全局工作流编译缓存"""
+    return compiled_workflow_cache
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 from loguru import logger
 
 from ..utils.database import db_manager
+from ..utils.db_pool import use_db_pool, DB_POOL_BACKGROUND
 from ..utils.helpers import safe_json_dumps, safe_json_loads
 from .mcp_tool_service import mcp_tool_service
 from .agent_tool_service import agent_tool_service
@@ -34,8 +35,9 @@ class DatabaseMCPService:
         self.http_client = httpx.AsyncClient(timeout=30.0)
         self.is_initialized = True
         
-        # 启动健康检查任务
-        self._health_check_task = asyncio.create_task(self._health_check_loop())
+        # 启动健康检查任务（使用background连接池）
+        with use_db_pool(DB_POOL_BACKGROUND):
+            self._health_check_task = asyncio.create_task(self._health_check_loop())
         
         logger.info("数据库驱动的MCP服务已初始化")
     
@@ -6,7 +6,9 @@ Workflow Execution Engine Service
 import uuid
 import json
 import asyncio
-from typing import Optional, Dict, Any, List
+import weakref
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 from datetime import datetime, timedelta
 import sys
 from loguru import logger
@@ -16,6 +18,7 @@ logger.add(sys.stderr,level="WARNING")
 
 from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
 from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+from ..repositories.instance.workflow_instance_progress_repository import WorkflowInstanceProgressRepository
 from ..repositories.workflow.workflow_repository import WorkflowRepository
 from ..repositories.node.node_repository import NodeRepository
 from ..repositories.processor.processor_repository import ProcessorRepository
@@ -27,7 +30,14 @@ from ..models.instance import (
     WorkflowExecuteRequest
 )
 from ..models.node import NodeType
+from ..config.settings import get_settings
 from ..utils.helpers import now_utc
+from ..utils.db_replicas import use_primary_reads
+from ..utils.db_pool import use_db_pool, DB_POOL_ENGINE, DB_POOL_BACKGROUND
+from .compiled_workflow import get_compiled_workflow_cache, CompiledWorkflow
+from .node_completion_tracker import (
+    NodeCompletionTracker, NodeCompletionState, NODE_OUTCOME_FAILED, NODE_OUTCOME_ABANDONED
+)
 from .agent_task_service import agent_task_service
 from .resource_cleanup_manager import ResourceCleanupManager
 from .simulator_processor_service import SimulatorProcessorService
@@ -35,6 +45,18 @@ from .simulator_processor_service import SimulatorProcessorService
 # 使用新的统一上下文管理器
 from .workflow_execution_context import get_context_manager, WorkflowExecutionContext
 
+# 当前协程是否处于节点并发调度的槽位中：节点内联完成并触发下游时，
+# 嵌套调度不再等待槽位，避免父节点占满槽位后等待子节点造成死锁
+_in_node_dispatch: ContextVar[bool] = ContextVar('in_node_dispatch', default=False)
+
+# 工作流实例启动时批量写入节点实例的列
+NODE_INSTANCE_INSERT_COLUMNS = [
+    "node_instance_id", "workflow_instance_id", "node_id", "node_base_id",
+    "node_instance_name", "task_description", "status", "input_data", "output_data",
+    "error_message", "retry_count", "created_at", "is_deleted"
+]
+
+
 def _json_serializer(obj):
     """自定义JSON序列化函数，处理datetime对象"""
     if isinstance(obj, datetime):
@@ -56,6 +78,7 @@ class ExecutionEngine:
         # 数据访问层
         self.workflow_instance_repo = WorkflowInstanceRepository()
         self.task_instance_repo = TaskInstanceRepository()
+        self.progress_repo = WorkflowInstanceProgressRepository()
         self.workflow_repo = WorkflowRepository()
         self.node_repo = NodeRepository()
         self.processor_repo = ProcessorRepository()
@@ -77,8 +100,20 @@ class ExecutionEngine:
         # 上下文管理器 - 使用新的统一架构
         self.context_manager = get_context_manager()
         
-        # 监听器跟踪
-        self.active_monitors = set()
+        # 工作流定义编译缓存（全局共享）
+        self.workflow_cache = get_compiled_workflow_cache()
+        
+        # 节点完成跟踪（由任务完成/失败回调驱动，低频对账兜底）
+        self.node_completion_tracker = NodeCompletionTracker()
+        self.node_reconcile_interval = 60
+        
+        # 就绪节点并发调度：全局上限 + 单个工作流实例上限
+        app_settings = get_settings().app
+        self.max_concurrent_nodes = max(1, app_settings.max_concurrent_nodes)
+        self.max_concurrent_nodes_per_instance = max(1, app_settings.max_concurrent_nodes_per_instance)
+        self._node_slots = asyncio.Semaphore(self.max_concurrent_nodes)
+        self._instance_node_slots: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+        self.dispatching_nodes = 0
         
         logger.debug("🚀 初始化ExecutionEngine")
     
@@ -110,9 +145,12 @@ class ExecutionEngine:
         logger.info(f"   - 回调列表: {[str(cb) for cb in agent_task_service.completion_callbacks]}")
         logger.info("✅ 已注册Agent任务回调监听器")
         
-        # 启动任务处理协程
-        asyncio.create_task(self._process_execution_queue())
-        asyncio.create_task(self._monitor_running_instances())
+        # 启动任务处理协程（引擎状态推进依赖强一致读，读走主库；使用engine连接池）
+        with use_primary_reads(), use_db_pool(DB_POOL_ENGINE):
+            asyncio.create_task(self._process_execution_queue())
+            asyncio.create_task(self._monitor_running_instances())
+        with use_primary_reads(), use_db_pool(DB_POOL_BACKGROUND):
+            asyncio.create_task(self._reconcile_node_completions())
     
     async def stop_engine(self):
         """停止执行引擎"""
@@ -135,6 +173,8 @@ class ExecutionEngine:
         
         # 🔧 修复锁超时：缩小事务范围，只包含数据创建
         workflow_data = None
+        # 进度表需在事务外创建（DDL会隐式提交事务）
+        await self.progress_repo.ensure_table()
         async with self.workflow_instance_repo.db.transaction() as conn:
             try:
                 logger.trace(f"🔄 [编排器] 开始工作流编排: {request.workflow_base_id}")
@@ -161,6 +201,15 @@ class ExecutionEngine:
                 logger.error(f"   - 错误堆栈: {traceback.format_exc()}")
                 raise
         
+        # 🔧 Critical Fix: 实例数据提交后再继承附件（整个实例一条INSERT ... SELECT）
+        # 附件继承失败只记录日志，不影响实例启动，也不会回滚已创建的实例
+        from ..services.file_association_service import FileAssociationService
+        instance_id = workflow_data['workflow_instance_id']
+        try:
+            await FileAssociationService().inherit_node_files_to_workflow_instance(instance_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 工作流实例 {instance_id} 附件继承失败: {e}")
+        
         # 3. 上下文层：注册执行上下文（事务外 - 避免长时间持锁）
         try:
             await self._register_execution_context(workflow_data)
@@ -215,7 +264,6 @@ class ExecutionEngine:
     async def _create_workflow_data(self, conn, request: WorkflowExecuteRequest, 
                                   executor_id: uuid.UUID) -> Dict[str, Any]:
         """数据层：纯数据创建操作"""
-        from ..models.instance import NodeInstanceStatus
         from ..models.node import NodeType
         import uuid, json
         from ..utils.helpers import now_utc
@@ -249,59 +297,20 @@ class ExecutionEngine:
         if not nodes:
             raise ValueError(f"工作流 {workflow_id} 没有节点")
         
-        node_instances = []
-        start_nodes_count = 0
+        start_nodes_count = sum(1 for node in nodes if node['type'] == NodeType.START.value)
         created_tasks_count = 0
         
-        # 🔧 Linus式修复: 导入附件服务
-        from ..services.file_association_service import FileAssociationService
-        file_service = FileAssociationService()
+        # 🔧 修复Critical Bug: 不要在此处创建任务实例！
+        # 任务实例应该只在节点准备执行时才创建，而不是在工作流创建时全部创建
+        # 这样可以确保只有满足依赖关系的节点才会有分配的任务
+        node_instance_rows, node_instances = self._build_node_instance_rows(instance_id, nodes)
         
-        for node in nodes:
-            node_instance_id = uuid.uuid4()
-            
-            # 创建节点实例
-            create_node_query = """
-                INSERT INTO `node_instance`
-                (node_instance_id, workflow_instance_id, node_id, node_base_id, 
-                 node_instance_name, task_description, status, input_data, output_data,
-                 error_message, retry_count, created_at, is_deleted)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            await conn.execute(
-                create_node_query,
-                (node_instance_id, instance_id, node['node_id'], node['node_base_id'],
-                 f"{node['name']}_instance", node.get('task_description', ''),
-                 NodeInstanceStatus.PENDING.value, json.dumps({}), json.dumps({}),
-                 None, 0, now_utc(), False)
-            )
-            
-            # 🔧 Critical Fix: 创建节点实例后立即继承附件
-            try:
-                await file_service.inherit_node_files_to_instance(
-                    node_id=uuid.UUID(node['node_id']), 
-                    node_instance_id=node_instance_id
-                )
-            except Exception as e:
-                logger.warning(f"⚠️ 节点实例 {node_instance_id} 附件继承失败: {e}")
-            
-            node_instances.append({
-                'node_instance_id': node_instance_id,
-                'node_id': node['node_id'],
-                'node_name': node['name'],
-                'node_type': node['type']
-            })
-            
-            if node['type'] == NodeType.START.value:
-                start_nodes_count += 1
-            
-            # 🔧 修复Critical Bug: 不要在此处创建任务实例！
-            # 任务实例应该只在节点准备执行时才创建，而不是在工作流创建时全部创建
-            # 这样可以确保只有满足依赖关系的节点才会有分配的任务
-            
-            # 注释掉原来的任务创建逻辑，改为节点执行时再创建
-            # TODO: 在节点触发时动态创建任务实例
+        # 在同一事务内用多行INSERT一次写入全部节点实例
+        await conn.insert_many("node_instance", NODE_INSTANCE_INSERT_COLUMNS, node_instance_rows)
+        
+        # 同一事务内建立进度计数
+        if self.progress_repo.table_ready:
+            await self.progress_repo.refresh(instance_id, conn)
         
         logger.trace(f"✅ [数据层] 创建完成: 实例={instance_id}, 节点={len(node_instances)}, 任务={created_tasks_count}")
         
@@ -335,32 +344,13 @@ class ExecutionEngine:
             context_manager = get_context_manager()
             workflow_context = await context_manager.get_or_create_context(instance_id)
             
-            # 3. 使用已有数据注册节点依赖（无需查询数据库）
-            registered_count = 0
-            start_nodes_triggered = 0
-            
-            for node_instance in workflow_data['node_instances']:
-                node_instance_id = node_instance['node_instance_id']
-                node_id = node_instance['node_id']
-                node_type = node_instance['node_type']
-                
-                # 获取上游节点（基于node_id查询） - 🔧 修复参数顺序
-                upstream_node_instances = await self._get_upstream_node_instances(
-                    node_id, instance_id
-                )
-                
-                # 注册到上下文
-                await workflow_context.register_node_dependencies(
-                    node_instance_id=node_instance_id,
-                    node_id=node_id,
-                    upstream_nodes=upstream_node_instances
-                )
-                
-                registered_count += 1
-                if node_type == 'START':
-                    start_nodes_triggered += 1
-                
-                logger.trace(f"✅ [上下文层] 注册节点: {node_instance['node_name']}")
+            # 3. 使用已有数据注册节点依赖：上游关系来自编译后的工作流定义，一次加锁批量注册
+            compiled = await self.workflow_cache.get(workflow_data['workflow_id'])
+            registrations = await self._resolve_node_registrations(
+                compiled, instance_id, workflow_data['node_instances']
+            )
+            await workflow_context.register_node_dependencies_bulk(registrations)
+            registered_count = len(registrations)
             
             logger.trace(f"📊 [上下文层] 注册完成: {registered_count} 个节点")
             
@@ -373,13 +363,11 @@ class ExecutionEngine:
                 logger.trace(f"   - 预期START节点: {expected_start_nodes}")
                 logger.trace(f"   - 触发的节点: {triggered_nodes}")
                 
-                # 🔧 修复Critical Bug: 将触发的节点实际提交执行
-                for node_instance_id in triggered_nodes:
-                    try:
-                        await self._execute_node_with_new_context(workflow_context, node_instance_id)
-                        logger.trace(f"✅ [执行提交] 启动节点执行: {node_instance_id}")
-                    except Exception as e:
-                        logger.error(f"❌ [执行提交] 启动节点执行失败 {node_instance_id}: {e}")
+                # 🔧 修复Critical Bug: 将触发的节点实际提交执行（并发）
+                await self._dispatch_ready_nodes(
+                    instance_id, triggered_nodes,
+                    lambda node_instance_id: self._execute_node_with_new_context(workflow_context, node_instance_id)
+                )
                         
             else:
                 logger.warning(f"⚠️ [上下文层] 未触发任何节点")
@@ -400,99 +388,83 @@ class ExecutionEngine:
             logger.error(f"   - 详细堆栈: {traceback.format_exc()}")
             # 不抛出异常，数据已创建成功
     
+    def _build_node_instance_rows(self, workflow_instance_id: uuid.UUID,
+                                  nodes: List[Dict[str, Any]]) -> Tuple[List[tuple], List[Dict[str, Any]]]:
+        """在内存中构造节点实例行（列顺序同 NODE_INSTANCE_INSERT_COLUMNS）与节点实例映射"""
+        from ..models.instance import NodeInstanceStatus
+        
+        created_at = now_utc()
+        rows = []
+        node_instances = []
+        for node in nodes:
+            node_instance_id = uuid.uuid4()
+            rows.append(
+                (node_instance_id, workflow_instance_id, node['node_id'], node['node_base_id'],
+                 f"{node['name']}_instance", node.get('task_description') or '',
+                 NodeInstanceStatus.PENDING.value, json.dumps({}), json.dumps({}),
+                 None, 0, created_at, False)
+            )
+            node_instances.append({
+                'node_instance_id': node_instance_id,
+                'node_id': node['node_id'],
+                'node_name': node['name'],
+                'node_type': node['type']
+            })
+        return rows, node_instances
+    
+    async def _resolve_node_registrations(self, compiled: Optional[CompiledWorkflow],
+                                          workflow_instance_id: uuid.UUID,
+                                          node_instances: List[Dict[str, Any]]) -> List[Tuple[uuid.UUID, Any, List[uuid.UUID]]]:
+        """由编译后的工作流定义计算每个节点实例的上游节点实例，返回批量注册所需的
+        (node_instance_id, node_id, upstream_nodes) 列表；定义中缺失的节点回退到逐个查询"""
+        instance_by_node_id = {
+            str(node_instance['node_id']): node_instance['node_instance_id']
+            for node_instance in node_instances
+        }
+        
+        registrations = []
+        for node_instance in node_instances:
+            node_id = node_instance['node_id']
+            if compiled is not None and compiled.has_node(node_id):
+                upstream_node_instances = [
+                    instance_by_node_id[str(upstream_node_id)]
+                    for upstream_node_id in compiled.get_upstream_node_ids(node_id)
+                    if str(upstream_node_id) in instance_by_node_id
+                ]
+            else:
+                upstream_node_instances = await self._get_upstream_node_instances(
+                    node_id, workflow_instance_id
+                )
+            registrations.append((node_instance['node_instance_id'], node_id, upstream_node_instances))
+        return registrations
+    
     async def _get_workflow_nodes_by_version_id(self, workflow_id: uuid.UUID) -> List[Dict[str, Any]]:
-        """通过工作流版本ID获取所有节点（修复版本 - 使用当前版本逻辑）"""
-        logger.debug(f"🔍 [节点查询] 正在查询工作流版本 {workflow_id} 的节点...")
+        """通过工作流版本ID获取所有节点（读取编译缓存，未命中时一次性加载工作流定义）"""
+        logger.debug(f"🔍 [节点查询] 正在获取工作流版本 {workflow_id} 的节点...")
         try:
-            # 首先获取workflow_base_id，然后查询当前版本的节点
-            workflow_query = """
-                SELECT workflow_base_id 
-                FROM workflow 
-                WHERE workflow_id = $1 AND is_deleted = FALSE
-            """
-            workflow_result = await self.node_repo.db.fetch_one(workflow_query, workflow_id)
-            
-            if not workflow_result:
-                logger.error(f"工作流版本不存在: {workflow_id}")
-                return []
-            
-            workflow_base_id = workflow_result['workflow_base_id']
-            logger.trace(f"工作流版本 {workflow_id} 对应的base_id: {workflow_base_id}")
-            
-            # 查询当前版本的所有节点（避免笛卡尔积问题）
-            query = """
-                SELECT n.*
-                FROM "node" n
-                WHERE n.workflow_base_id = $1
-                AND n.is_current_version = TRUE
-                AND n.is_deleted = FALSE
-                ORDER BY n.created_at ASC
-            """
-            results = await self.node_repo.db.fetch_all(query, workflow_base_id)
-            logger.trace(f"✅ 通过base_id {workflow_base_id} 获取当前版本节点 {len(results)} 个")
-
-            # 为每个节点单独查询处理器信息（避免重复节点记录）
-            nodes_with_processors = []
-            for node_result in results:
-                node_dict = dict(node_result)
-
-                # 查询该节点的处理器
-                processor_query = """
-                    SELECT processor_id FROM node_processor
-                    WHERE node_id = $1 AND is_deleted = FALSE
-                """
-                processors = await self.node_repo.db.fetch_all(processor_query, node_dict['node_id'])
-
-                # 如果有处理器，取第一个（保持兼容性）
-                if processors:
-                    node_dict['processor_id'] = processors[0]['processor_id']
-                else:
-                    node_dict['processor_id'] = None
-
-                nodes_with_processors.append(node_dict)
-
-            results = nodes_with_processors
-            
-            # 如果没有找到当前版本节点，尝试直接用workflow_id查询
-            if not results:
-                logger.warning(f"通过base_id未找到节点，尝试直接查询workflow_id: {workflow_id}")
-                fallback_query = """
-                    SELECT n.*
-                    FROM "node" n
-                    WHERE n.workflow_id = $1
-                    AND n.is_deleted = FALSE
-                    ORDER BY n.created_at ASC
-                """
-                fallback_results = await self.node_repo.db.fetch_all(fallback_query, workflow_id)
-                logger.trace(f"✅ 通过workflow_id {workflow_id} fallback查询获取到 {len(fallback_results)} 个节点")
-
-                # 为fallback结果也单独查询处理器信息
-                nodes_with_processors = []
-                for node_result in fallback_results:
-                    node_dict = dict(node_result)
-
-                    # 查询该节点的处理器
-                    processor_query = """
-                        SELECT processor_id FROM node_processor
-                        WHERE node_id = $1 AND is_deleted = FALSE
-                    """
-                    processors = await self.node_repo.db.fetch_all(processor_query, node_dict['node_id'])
-
-                    # 如果有处理器，取第一个（保持兼容性）
-                    if processors:
-                        node_dict['processor_id'] = processors[0]['processor_id']
-                    else:
-                        node_dict['processor_id'] = None
-
-                    nodes_with_processors.append(node_dict)
-
-                results = nodes_with_processors
-            
-            return results
+            compiled = await self.workflow_cache.get(workflow_id)
+            return compiled.get_nodes() if compiled else []
         except Exception as e:
             logger.error(f"获取工作流节点列表失败: {e}")
             raise
     
+    async def _get_compiled_workflow_for_node(self, node_id: uuid.UUID) -> Optional[CompiledWorkflow]:
+        """获取包含该节点的编译后工作流定义；节点不属于当前版本时返回None"""
+        compiled = self.workflow_cache.get_cached_by_node(node_id)
+        if compiled is not None:
+            return compiled
+        try:
+            node = await self.node_repo.db.fetch_one(
+                "SELECT workflow_id FROM node WHERE node_id = $1", node_id
+            )
+            if not node:
+                return None
+            compiled = await self.workflow_cache.get(node['workflow_id'])
+            return compiled if compiled is not None and compiled.has_node(node_id) else None
+        except Exception as e:
+            logger.warning(f"加载节点 {node_id} 的工作流定义失败，回退到直接查询: {e}")
+            return None
+    
     async def _check_running_instances(self, workflow_base_id: uuid.UUID, executor_id: uuid.UUID) -> List[Dict]:
         """检查是否已有正在运行的工作流实例"""
         try:
@@ -522,6 +494,12 @@ class ExecutionEngine:
     async def _get_node_processors(self, node_id: uuid.UUID):
         """获取节点的处理器列表（修复版本：使用具体node_id）"""
         try:
+            compiled = await self._get_compiled_workflow_for_node(node_id)
+            if compiled is not None:
+                processors = compiled.get_node_processors(node_id)
+                if processors:
+                    return processors
+            
             logger.debug(f"🔍 [处理器查询] 正在查询节点 {node_id} 的处理器绑定...")
             
             query = """
@@ -568,6 +546,10 @@ class ExecutionEngine:
     async def _get_next_nodes(self, node_id: uuid.UUID):
         """获取节点的下游节点（支持条件边）"""
         try:
+            compiled = await self._get_compiled_workflow_for_node(node_id)
+            if compiled is not None:
+                return compiled.get_next_nodes(node_id)
+
             # 修改查询以获取连接信息，包括条件配置
             query = """
                 SELECT
@@ -694,11 +676,18 @@ class ExecutionEngine:
             
             logger.trace(f"处理工作流实例 {instance_id} 的节点: {current_nodes}")
             
-            # 处理当前节点
+            # 并发处理当前节点，单个节点失败不影响同批其他节点
+            results = await self._dispatch_ready_nodes(
+                instance_id, current_nodes,
+                lambda node_id: self._process_node(instance_id, workflow_id, node_id)
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                raise errors[0]
+            
             next_nodes = []
-            for node_id in current_nodes:
-                node_result = await self._process_node(instance_id, workflow_id, node_id)
-                if node_result.get('next_nodes'):
+            for node_result in results:
+                if node_result and node_result.get('next_nodes'):
                     next_nodes.extend(node_result['next_nodes'])
             
             # 如果有下一步节点，继续执行
@@ -713,6 +702,46 @@ class ExecutionEngine:
             logger.error(f"处理工作流步骤失败: {e}")
             await self._fail_workflow(execution_item['instance_id'], str(e))
     
+    async def _dispatch_ready_nodes(self, workflow_instance_id: uuid.UUID, node_ids: List[uuid.UUID],
+                                    run_node: Callable[[uuid.UUID], Awaitable[Any]]) -> List[Any]:
+        """并发执行同一工作流实例中的就绪节点
+        
+        受全局与单实例并发上限约束；每个节点的异常单独捕获，不会中断同批其他节点。
+        返回与node_ids顺序一致的结果列表，失败的节点对应其异常对象。
+        """
+        if not node_ids:
+            return []
+        
+        nested = _in_node_dispatch.get()
+        instance_key = str(workflow_instance_id)
+        instance_slots = self._instance_node_slots.get(instance_key)
+        if instance_slots is None:
+            instance_slots = asyncio.Semaphore(self.max_concurrent_nodes_per_instance)
+            self._instance_node_slots[instance_key] = instance_slots
+        
+        async def run_one(node_id: uuid.UUID):
+            token = _in_node_dispatch.set(True)
+            try:
+                if nested:
+                    return await run_node(node_id)
+                async with self._node_slots, instance_slots:
+                    self.dispatching_nodes += 1
+                    try:
+                        return await run_node(node_id)
+                    finally:
+                        self.dispatching_nodes -= 1
+            except Exception as e:
+                logger.error(f"❌ [并发调度] 节点 {node_id} 执行失败: {e}")
+                import traceback
+                logger.error(f"错误堆栈: {traceback.format_exc()}")
+                return e
+            finally:
+                _in_node_dispatch.reset(token)
+        
+        if len(node_ids) == 1:
+            return [await run_one(node_ids[0])]
+        return list(await asyncio.gather(*(run_one(node_id) for node_id in node_ids)))
+    
     async def _process_node(self, instance_id: uuid.UUID, workflow_id: uuid.UUID, 
                           node_id: uuid.UUID) -> Dict[str, Any]:
         """处理单个节点（修复版本：使用具体的node_id）"""
@@ -927,6 +956,9 @@ class ExecutionEngine:
                     logger.trace(f"✅ Agent任务完成后节点状态更新完成")
                 else:
                     logger.error(f"无法获取节点信息: node_instance_id={node_instance_id}")
+                
+                # 上报节点完成跟踪器（多任务节点在全部任务完成时结算）
+                await self.notify_task_status(task_id, TaskInstanceStatus.COMPLETED.value, node_instance_id)
             else:
                 logger.error(f"无法获取任务信息: task_id={task_id}")
                 
@@ -979,6 +1011,8 @@ class ExecutionEngine:
                     logger.trace(f"❌ Agent任务失败后节点状态更新完成")
                 else:
                     logger.error(f"无法获取节点信息: node_instance_id={node_instance_id}")
+                
+                await self.notify_task_status(task_id, TaskInstanceStatus.FAILED.value, node_instance_id)
             else:
                 logger.error(f"无法获取任务信息: task_id={task_id}")
                 
@@ -1057,12 +1091,14 @@ class ExecutionEngine:
                         'total_rounds': simulator_result.get('total_rounds', 0)
                     }
                 )
-                await self.task_instance_repo.update_task(task_id, completion_update)
+                updated_task = await self.task_instance_repo.update_task(task_id, completion_update)
 
                 logger.trace(f"Simulator任务 {task_id} 已完成 (类型: {simulator_result['execution_type']})")
 
-                # 触发工作流执行引擎的任务完成处理
-                await self._handle_task_completion_unified(task, simulator_result['result'])
+                # 触发工作流执行引擎的任务完成处理（结束时上报节点完成跟踪器）
+                result = simulator_result['result']
+                output_data = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+                await self._handle_task_completion_unified(task, updated_task or {}, output_data, "simulator")
 
             elif simulator_result['status'] == 'conversation_started':
                 # 对话已开始，需要等待用户交互
@@ -1096,7 +1132,7 @@ class ExecutionEngine:
             logger.trace(f"为任务 {original_task_id} 生成AI建议")
             
             # 调用AgentTaskService生成AI建议
-            ai_result = await agent_task_service.process_agent_task(original_task_id)
+            ai_result = await agent_task_service.process_agent_task_leased(original_task_id)
             
             # 将AI建议存储到原任务的上下文中
             if ai_result['status'] == TaskInstanceStatus.COMPLETED.value:
@@ -2127,11 +2163,11 @@ class ExecutionEngine:
             # 检查Agent服务是否正在运行
             logger.info(f"🔍 [EXECUTION-ENGINE] 检查Agent服务状态...")
             logger.info(f"   - Agent服务运行状态: {agent_task_service.is_running}")
-            logger.info(f"   - Agent服务处理队列大小: {agent_task_service.processing_queue.qsize()}")
+            logger.info(f"   - Agent服务处理中租约数: {agent_task_service.leased_tasks}")
             logger.info(f"   - Agent服务回调数量: {len(agent_task_service.completion_callbacks)}")
             
             # 调用AgentTaskService处理任务
-            logger.info(f"🔄 [EXECUTION-ENGINE] 调用AgentTaskService.process_agent_task()")
+            logger.info(f"🔄 [EXECUTION-ENGINE] 调用AgentTaskService.process_agent_task_leased()")
             logger.info(f"   - 传递任务ID: {task_id}")
             logger.info(f"   - 预期流程: assigned → in_progress → completed")
             
@@ -2145,7 +2181,7 @@ class ExecutionEngine:
                     logger.info(f"   - Agent ID匹配: {'是' if str(current_task.get('assigned_agent_id', '')) == str(assigned_agent_id) else '否'}")
                 
                 # 实际调用Agent处理
-                result = await agent_task_service.process_agent_task(task_id)
+                result = await agent_task_service.process_agent_task_leased(task_id)
                 
                 # 记录执行后的时间和结果
                 end_time = datetime.now()
@@ -2359,135 +2395,136 @@ class ExecutionEngine:
             raise
     
     async def _register_node_completion_monitor(self, workflow_instance_id: uuid.UUID, node_instance_id: uuid.UUID):
-        """注册节点完成监听器（防重复）"""
+        """注册节点完成跟踪（防重复）
+
+        读取一次节点的任务列表登记到内存跟踪器，之后由任务完成/失败回调直接上报，
+        不再为每个节点启动轮询协程；遗漏的上报由低频对账循环兜底。
+        """
         try:
-            # 检查是否已经有活跃的监听器
-            if node_instance_id in self.active_monitors:
-                logger.warning(f"🔄 [监听器注册-防重复] 节点 {node_instance_id} 已有活跃监听器，跳过重复注册")
+            tracker = self.node_completion_tracker
+            if tracker.is_tracking(node_instance_id):
+                logger.warning(f"🔄 [监听器注册-防重复] 节点 {node_instance_id} 已在跟踪中，跳过重复注册")
                 return
             
-            logger.trace(f"📋 [监听器注册] 为节点 {node_instance_id} 注册完成监听器")
+            logger.trace(f"📋 [监听器注册] 为节点 {node_instance_id} 注册完成跟踪")
             logger.trace(f"   - 工作流实例: {workflow_instance_id}")
             
-            # 添加到活跃监听器集合
-            self.active_monitors.add(node_instance_id)
+            tasks = await self.task_instance_repo.get_tasks_by_node_instance(node_instance_id)
+            if not tasks:
+                logger.trace(f"⚠️ [节点监听] 节点 {node_instance_id} 没有任务，不登记跟踪")
+                return
             
-            # 启动节点完成监听协程
-            task = asyncio.create_task(self._monitor_node_completion(workflow_instance_id, node_instance_id))
-            logger.trace(f"✅ [监听器注册] 节点 {node_instance_id} 监听协程已启动")
+            # 任务可能在注册前已经执行完（如Processor任务同步完成），此时直接结算
+            settled = tracker.register(workflow_instance_id, node_instance_id, tasks)
+            if settled is not None:
+                await self._settle_node_completion(settled)
+            else:
+                logger.trace(f"✅ [监听器注册] 节点 {node_instance_id} 已登记跟踪，共 {len(tasks)} 个任务")
             
         except Exception as e:
-            logger.error(f"❌ [监听器注册] 注册节点完成监听失败: {e}")
+            logger.error(f"❌ [监听器注册] 注册节点完成跟踪失败: {e}")
             import traceback
             logger.error(f"错误堆栈: {traceback.format_exc()}")
     
-    async def _monitor_node_completion(self, workflow_instance_id: uuid.UUID, node_instance_id: uuid.UUID):
-        """监听节点完成"""
+    async def notify_task_status(self, task_id: uuid.UUID, status: str,
+                                 node_instance_id: Optional[uuid.UUID] = None):
+        """任务完成/失败时上报节点完成跟踪器，节点的任务全部结束时立即结算节点"""
         try:
-            logger.trace(f"🔍 [节点监听] 开始监听节点完成: {node_instance_id}")
+            settled = self.node_completion_tracker.update(task_id, status, node_instance_id)
+            if settled is not None:
+                await self._settle_node_completion(settled)
+        except Exception as e:
+            logger.error(f"❌ [节点监听] 处理任务状态上报失败: {task_id} - {e}")
+    
+    async def _settle_node_completion(self, state: NodeCompletionState):
+        """节点的任务全部完成或出现失败时，标记节点完成/失败"""
+        workflow_instance_id = state.workflow_instance_id
+        node_instance_id = state.node_instance_id
+        counts = state.counts()
+        logger.trace(f"📊 [节点监听] 节点 {node_instance_id} 任务状态: 总数 {counts['total']}, "
+                     f"已完成 {counts['completed']}, 失败 {counts['failed']}, 结算结果: {state.outcome}")
+        
+        if state.outcome == NODE_OUTCOME_ABANDONED:
+            logger.trace(f"⚠️ [节点监听] 节点 {node_instance_id} 的任务已结束但未全部完成，停止跟踪")
+            return
+        
+        try:
+            # 检查context manager是否可用
+            if self.context_manager is None:
+                logger.error(f"❌ [节点监听] context_manager 为 None，无法标记节点状态")
+                return
             
-            while True:
-                # 检查节点的所有任务是否完成
-                tasks = await self.task_instance_repo.get_tasks_by_node_instance(node_instance_id)
-                
-                if not tasks:
-                    logger.trace(f"⚠️ [节点监听] 节点 {node_instance_id} 没有任务，停止监听")
-                    break
-                
-                completed_tasks = [t for t in tasks if t['status'] == TaskInstanceStatus.COMPLETED.value]
-                failed_tasks = [t for t in tasks if t['status'] == TaskInstanceStatus.FAILED.value]
-                
-                logger.trace(f"📊 [节点监听] 节点 {node_instance_id} 任务状态:")
-                logger.trace(f"   - 总任务数: {len(tasks)}")
-                logger.trace(f"   - 已完成: {len(completed_tasks)}")
-                logger.trace(f"   - 失败: {len(failed_tasks)}")
-                
-                # 显示每个任务的详细状态
-                for i, task in enumerate(tasks):
-                    task_id = task.get('task_instance_id', 'unknown')
-                    task_status = task.get('status', 'unknown')
-                    task_title = task.get('task_title', 'unknown')
-                    logger.trace(f"   - 任务{i+1}: {task_title} (ID: {task_id}) - 状态: {task_status}")
+            # 获取node_id用于依赖匹配，因为依赖关系是基于node_id注册的
+            from ..repositories.instance.node_instance_repository import NodeInstanceRepository
+            node_repo = NodeInstanceRepository()
+            node_instance_data = await node_repo.get_instance_by_id(node_instance_id)
+            node_id = node_instance_data['node_id'] if node_instance_data else None
+            
+            if not node_id:
+                logger.error(f"❌ [节点监听] 无法获取node_id，无法标记节点状态")
+                return
+            
+            if state.outcome == NODE_OUTCOME_FAILED:
+                # 有任务失败，标记节点失败
+                logger.error(f"❌ [节点监听] 节点 {node_instance_id} 有任务失败，标记节点失败")
+                error_info = {'failed_tasks': state.failed_task_ids()}
+                await self.context_manager.mark_node_failed(
+                    workflow_instance_id, node_id, node_instance_id, error_info
+                )
+                return
+            
+            # 所有任务完成，读取一次任务输出并标记节点完成
+            logger.trace(f"🎉 [节点监听] 节点 {node_instance_id} 所有任务已完成，开始标记节点完成")
+            tasks = await self.task_instance_repo.get_tasks_by_node_instance(node_instance_id)
+            completed_tasks = [t for t in tasks if t['status'] == TaskInstanceStatus.COMPLETED.value]
+            output_data = await self._aggregate_node_output(completed_tasks)
+            
+            logger.trace(f"🎯 [节点监听] 标记节点完成: node_id={node_id}")
+            await self.context_manager.mark_node_completed(
+                workflow_instance_id, node_id, node_instance_id, output_data
+            )
+            
+            # 同时更新数据库中的节点实例状态
+            try:
+                from ..models.instance import NodeInstanceStatus, NodeInstanceUpdate
                 
-                if len(completed_tasks) == len(tasks):
-                    # 所有任务完成，标记节点完成
-                    logger.trace(f"🎉 [节点监听] 节点 {node_instance_id} 所有任务已完成，开始标记节点完成")
-                    output_data = await self._aggregate_node_output(completed_tasks)
-                    
-                    # 检查context manager是否可用
-                    if self.context_manager is None:
-                        logger.error(f"❌ [节点监听] context_manager 为 None，无法标记节点完成")
-                        break
-                    
-                    # 获取node_id用于依赖匹配，因为依赖关系是基于node_id注册的
-                    from ..repositories.instance.node_instance_repository import NodeInstanceRepository
-                    node_repo = NodeInstanceRepository()
-                    node_instance_data = await node_repo.get_instance_by_id(node_instance_id)
-                    node_id = node_instance_data['node_id'] if node_instance_data else None
-                    
-                    if node_id:
-                        logger.trace(f"🎯 [节点监听] 标记节点完成: node_id={node_id}")
-                        await self.context_manager.mark_node_completed(
-                            workflow_instance_id, node_id, node_instance_id, output_data
-                        )
-                    else:
-                        logger.error(f"❌ [节点监听] 无法获取node_id，无法标记节点完成")
-                        break
-                    
-                    # 同时更新数据库中的节点实例状态
-                    try:
-                        from datetime import datetime
-                        from ..models.instance import NodeInstanceStatus, NodeInstanceUpdate
-                        from ..repositories.instance.node_instance_repository import NodeInstanceRepository
-                        
-                        node_repo = NodeInstanceRepository()
-                        node_update = NodeInstanceUpdate(
-                            status=NodeInstanceStatus.COMPLETED,
-                            output_data=output_data,
-                            completed_at=datetime.utcnow()
-                        )
-                        await node_repo.update_node_instance(node_instance_id, node_update)
-                        logger.trace(f"💾 [节点监听] 节点实例 {node_instance_id} 数据库状态已更新为COMPLETED")
-                    except Exception as e:
-                        logger.error(f"❌ [节点监听] 更新节点实例数据库状态失败: {e}")
-                    
-                    logger.trace(f"✅ [节点监听] 节点 {node_instance_id} 已标记为完成，停止监听")
-                    # 从活跃监听器集合中移除
-                    self.active_monitors.discard(node_instance_id)
-                    break
-                elif len(failed_tasks) > 0:
-                    # 有任务失败，标记节点失败
-                    logger.error(f"❌ [节点监听] 节点 {node_instance_id} 有任务失败，标记节点失败")
-                    error_info = {'failed_tasks': [str(t['task_instance_id']) for t in failed_tasks]}
+                node_update = NodeInstanceUpdate(
+                    status=NodeInstanceStatus.COMPLETED,
+                    output_data=output_data,
+                    completed_at=datetime.utcnow()
+                )
+                await node_repo.update_node_instance(node_instance_id, node_update)
+                logger.trace(f"💾 [节点监听] 节点实例 {node_instance_id} 数据库状态已更新为COMPLETED")
+            except Exception as e:
+                logger.error(f"❌ [节点监听] 更新节点实例数据库状态失败: {e}")
+            
+            logger.trace(f"✅ [节点监听] 节点 {node_instance_id} 已标记为完成")
+            
+        except Exception as e:
+            logger.error(f"结算节点完成失败: {node_instance_id} - {e}")
+    
+    async def _reconcile_node_completions(self):
+        """低频对账：按数据库中的任务状态修正节点完成跟踪器，兜底遗漏的完成/失败上报"""
+        while self.is_running:
+            await asyncio.sleep(self.node_reconcile_interval)
+            try:
+                tracker = self.node_completion_tracker
+                node_ids = tracker.tracked_node_ids()
+                for start in range(0, len(node_ids), 500):
+                    batch = node_ids[start:start + 500]
+                    rows = await self.task_instance_repo.get_task_statuses_by_node_instances(batch)
                     
-                    # 获取node_id用于标记失败
-                    from ..repositories.instance.node_instance_repository import NodeInstanceRepository
-                    node_repo = NodeInstanceRepository()
-                    node_instance_data = await node_repo.get_instance_by_id(node_instance_id)
-                    node_id = node_instance_data['node_id'] if node_instance_data else None
+                    tasks_by_node = {node_id: [] for node_id in batch}
+                    for row in rows:
+                        tasks_by_node.setdefault(str(row['node_instance_id']), []).append(row)
                     
-                    if node_id:
-                        await self.context_manager.mark_node_failed(
-                            workflow_instance_id, node_id, node_instance_id, error_info
-                        )
-                    else:
-                        logger.error(f"❌ [节点监听] 无法获取node_id，无法标记节点失败")
-                    # 从活跃监听器集合中移除
-                    self.active_monitors.discard(node_instance_id)
-                    break
-                
-                # 等待5秒后再次检查
-                logger.trace(f"⏳ [节点监听] 节点 {node_instance_id} 仍有任务未完成，5秒后再次检查")
-                await asyncio.sleep(5)
-                
-        except Exception as e:
-            logger.error(f"监听节点完成失败: {e}")
-            # 异常时也要从活跃监听器集合中移除
-            self.active_monitors.discard(node_instance_id)
-        finally:
-            # 确保监听器被清理
-            self.active_monitors.discard(node_instance_id)
-            logger.trace(f"🧹 [节点监听] 节点 {node_instance_id} 监听器已清理")
+                    for node_id, tasks in tasks_by_node.items():
+                        settled = tracker.reconcile(node_id, tasks)
+                        if settled is not None:
+                            logger.warning(f"🩹 [节点对账] 节点 {node_id} 的完成上报缺失，由对账结算: {settled.outcome}")
+                            await self._settle_node_completion(settled)
+            except Exception as e:
+                logger.error(f"节点完成对账失败: {e}")
     
     def _make_json_serializable(self, obj):
         """将对象转换为JSON可序列化的形式"""
@@ -2551,15 +2588,13 @@ class ExecutionEngine:
                 logger.error(f"❌ [统一架构-回调] 未找到工作流上下文: {workflow_instance_id}")
                 return
             
-            # 使用新架构执行准备好的节点
-            for node_instance_id in ready_node_instance_ids:
-                try:
-                    logger.info(f"⚡ [统一架构-回调] 开始执行节点: {node_instance_id}")
-                    await self._execute_node_with_unified_context(workflow_context, workflow_instance_id, node_instance_id)
-                except Exception as e:
-                    logger.error(f"❌ [统一架构-回调] 执行节点 {node_instance_id} 失败: {e}")
-                    import traceback
-                    logger.error(f"错误堆栈: {traceback.format_exc()}")
+            # 使用新架构并发执行准备好的节点（单个节点失败不影响其他节点）
+            await self._dispatch_ready_nodes(
+                workflow_instance_id, ready_node_instance_ids,
+                lambda node_instance_id: self._execute_node_with_unified_context(
+                    workflow_context, workflow_instance_id, node_instance_id
+                )
+            )
                 
         except Exception as e:
             logger.error(f"❌ [统一架构-回调] 执行准备好的节点失败: {e}")
@@ -3685,7 +3720,11 @@ class ExecutionEngine:
             """
             
             logger.info(f"🔍 [上游查询] 查询节点 {node_id} 的上游依赖")
-            upstream_connections = await node_repo.db.fetch_all(upstream_query, node_id)
+            compiled = await self._get_compiled_workflow_for_node(node_id)
+            if compiled is not None:
+                upstream_connections = compiled.get_upstream_connections(node_id)
+            else:
+                upstream_connections = await node_repo.db.fetch_all(upstream_query, node_id)
             logger.info(f"🔍 [上游查询] 查询到 {len(upstream_connections)} 个上游连接")
             
             # 输出所有上游连接的详细信息
@@ -3732,12 +3771,10 @@ class ExecutionEngine:
                                                     workflow_base_id: uuid.UUID,
                                                     nodes: List[Dict[str, Any]],
                                                     execute_request):
-        """使用新上下文管理器创建节点实例（修复版：真正的分阶段处理，避免时序问题）"""
+        """使用新上下文管理器创建节点实例（分阶段处理：先在内存中构造全部节点实例与依赖，
+        再在一个事务内多行写入，最后一次加锁批量注册依赖）"""
         try:
-            from ..repositories.instance.node_instance_repository import NodeInstanceRepository
-            from ..models.instance import NodeInstanceCreate, NodeInstanceStatus
-            
-            node_instance_repo = NodeInstanceRepository()
+            from ..services.file_association_service import FileAssociationService
             
             logger.info(f"🏗️ [节点创建] 开始为工作流 {workflow_instance_id} 创建 {len(nodes)} 个节点实例")
             
@@ -3749,68 +3786,29 @@ class ExecutionEngine:
                 'tasks_deferred': 0
             }
             
-            # 存储创建的节点信息
-            created_nodes_info = []
-            start_nodes_to_complete = []
+            # ====== 第一阶段：在内存中构造节点实例，单事务多行写入 ======
+            node_instance_rows, created_nodes_info = self._build_node_instance_rows(workflow_instance_id, nodes)
             
-            # ====== 第一阶段：仅创建所有节点实例 ======
-            logger.info(f"📋 [第一阶段] 创建所有节点实例")
-            instance_id_set = set()  # 用于跟踪已创建的节点实例ID
+            progress_ready = await self.progress_repo.ensure_table()
+            async with self.workflow_instance_repo.db.transaction() as conn:
+                await conn.insert_many("node_instance", NODE_INSTANCE_INSERT_COLUMNS, node_instance_rows)
+                if progress_ready:
+                    await self.progress_repo.refresh(workflow_instance_id, conn)
             
-            for i, node in enumerate(nodes, 1):
-                logger.info(f"📋 [节点创建 {i}/{len(nodes)}] 处理节点: {node['name']} (类型: {node['type']})")
-                logger.info(f"   - node_id: {node['node_id']}")
-                logger.info(f"   - node_base_id: {node['node_base_id']}")
-                # await asyncio.sleep(1) 
-                
-                # 创建节点实例
-                task_description = node.get('task_description') or ''  # 确保不传入None
-                node_instance_data = NodeInstanceCreate(
-                    workflow_instance_id=workflow_instance_id,
-                    node_id=node['node_id'],
-                    node_base_id=node['node_base_id'],
-                    node_instance_name=f"{node['name']}_instance",
-                    task_description=task_description,
-                    status=NodeInstanceStatus.PENDING,
-                    input_data={},
-                    output_data={},
-                    error_message=None,
-                    retry_count=0
-                )
-                
-                node_instance = await node_instance_repo.create_node_instance(node_instance_data)
-                if not node_instance:
-                    logger.error(f"❌ [节点创建] 创建节点实例失败: {node['name']}")
-                    continue
-                
-                node_instance_id = node_instance['node_instance_id']
-                if node_instance_id in instance_id_set:
-                    raise ValueError(f"创建节点实例失败: 节点 {node['name']} 已存在于实例 {workflow_instance_id}")
-                instance_id_set.add(node_instance_id)
-                logger.info(f"✅ [节点创建] 节点实例创建成功: {node['name']} (实例ID: {node_instance_id})")
-                # logger.debug(f"🔍 [变量检查] 节点 {node['name']} 变量状态:")
-                # logger.debug(f"   - node字典内存地址: {id(node)}")
-                # logger.debug(f"   - node_instance_id: {node_instance_id}")
-                # logger.debug(f"   - node_instance字典内存地址: {id(node_instance)}")
-                
-                # 收集节点信息用于第二阶段处理
-                # 使用深拷贝确保node字典的独立性，防止变量引用问题
-                node_info = {
-                    'node': {
-                        'node_id': node['node_id'],
-                        'node_base_id': node['node_base_id'], 
-                        'name': node['name'],
-                        'type': node['type'],
-                        'task_description': node.get('task_description')
-                    },  # 创建新的字典对象而不是引用原对象
-                    'node_instance_id': node_instance_id  # 明确使用当前循环中的node_instance_id
-                }
-                created_nodes_info.append(node_info)
-                
-                # 记录节点类型统计
+            # 节点实例提交后再继承附件：附件继承失败只记录日志，不影响实例启动
+            try:
+                await FileAssociationService().inherit_node_files_to_workflow_instance(workflow_instance_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 工作流实例 {workflow_instance_id} 附件继承失败: {e}")
+            
+            start_nodes_to_complete = []
+            for node, node_info in zip(nodes, created_nodes_info):
                 if node['type'] == NodeType.START.value:
                     task_creation_summary['start_nodes'] += 1
-                    start_nodes_to_complete.append(node_info)
+                    start_nodes_to_complete.append({
+                        'node': node,
+                        'node_instance_id': node_info['node_instance_id']
+                    })
                 elif node['type'] == NodeType.PROCESSOR.value:
                     task_creation_summary['processor_nodes'] += 1
                     task_creation_summary['tasks_deferred'] += 1
@@ -3819,46 +3817,12 @@ class ExecutionEngine:
             
             logger.info(f"✅ [第一阶段] 所有 {len(created_nodes_info)} 个节点实例创建完成")
             
-            # ====== 第二阶段：查询依赖关系并注册 ======
-            logger.info(f"📋 [第二阶段] 查询依赖关系并注册到上下文")
-            
-            for i, node_info in enumerate(created_nodes_info, 1):
-                node = node_info['node']
-                node_instance_id = node_info['node_instance_id']
-                
-                logger.info(f"🔗 [依赖分析 {i}/{len(created_nodes_info)}] 分析节点 {node['name']} 的上游依赖...")
-                logger.debug(f"🔍 [第二阶段变量检查] 节点 {node['name']} 变量状态:")
-                logger.debug(f"   - node_info内存地址: {id(node_info)}")
-                logger.debug(f"   - node字典内存地址: {id(node)}")
-                logger.debug(f"   - 从node_info获取的node_instance_id: {node_instance_id}")
-                
-                try:
-                    # 现在所有节点实例都已创建，可以安全查询上游依赖
-                    upstream_node_instance_ids = await self._get_upstream_node_instances(
-                        node['node_id'], workflow_instance_id
-                    )
-                    logger.info(f"🔗 [依赖分析] 节点 {node['name']} 有 {len(upstream_node_instance_ids)} 个上游依赖: {upstream_node_instance_ids}")
-                except Exception as e:
-                    logger.error(f"❌ [依赖分析] 查询节点 {node['name']} 上游依赖失败: {e}")
-                    import traceback
-                    logger.error(f"错误堆栈: {traceback.format_exc()}")
-                    upstream_node_instance_ids = []
-                
-                # 在新上下文中注册依赖
-                logger.info(f"📝 [依赖注册] 准备注册节点 {node['name']} 的依赖关系")
-                logger.info(f"   - 当前节点实例ID: {node_instance_id}")
-                logger.info(f"   - 当前节点ID: {node['node_id']}")
-                logger.info(f"   - 上游实例ID列表: {upstream_node_instance_ids}")
-                
-                await workflow_context.register_node_dependencies(
-                    node_instance_id,
-                    node['node_id'],  # 使用node_id而不是node_base_id
-                    upstream_node_instance_ids  # 使用node_instance_id列表
-                )
-                logger.info(f"📝 [依赖注册] 节点 {node['name']} 依赖关系注册完成: {len(upstream_node_instance_ids)} 个上游依赖")
-                
-                # 更新节点信息
-                node_info['upstream_count'] = len(upstream_node_instance_ids)
+            # ====== 第二阶段：由编译后的工作流定义计算依赖并批量注册 ======
+            compiled = await self._get_compiled_workflow_for_node(nodes[0]['node_id']) if nodes else None
+            registrations = await self._resolve_node_registrations(
+                compiled, workflow_instance_id, created_nodes_info
+            )
+            await workflow_context.register_node_dependencies_bulk(registrations)
                 
             logger.info(f"✅ [第二阶段] 所有 {len(created_nodes_info)} 个节点的依赖关系注册完成")
             
@@ -3925,99 +3889,56 @@ class ExecutionEngine:
                 logger.warning(f"⚠️ [新架构-任务创建] 节点 {node.get('name')} 没有绑定处理器，跳过任务创建")
                 return
             
-            created_task_count = 0
-            for i, processor in enumerate(processors, 1):
-                logger.info(f"🔍 [新架构-任务创建] 处理处理器 {i}/{len(processors)}:")
-                logger.info(f"   - 处理器名称: {processor.get('processor_name', 'Unknown')}")
-                logger.info(f"   - 处理器ID: {processor.get('processor_id')}")
-                
+            # 同一节点的所有任务共享上下文：只获取并序列化一次
+            context_data = await self.context_manager.get_task_context_data(workflow_instance_id, node_instance_id)
+            logger.info(f"   - 上下文数据键: {list(context_data.keys()) if context_data else '空'}")
+            
+            if context_data:
+                upstream_results = context_data.get('immediate_upstream_results', {})
+                global_data = context_data.get('workflow_global', {}).get('global_data', {})
+                logger.info(f"   - 上游节点结果数量: {len(upstream_results)}, 全局数据: {len(global_data)} 个键")
+            
+            # 将上下文数据转换为文本格式（与旧方法保持一致）
+            context_text = json.dumps(context_data, ensure_ascii=False, indent=2, default=_json_serializer) if context_data else ""
+            input_text = json.dumps(node.get('input_data', {}), ensure_ascii=False, indent=2, default=_json_serializer)
+            
+            task_title = node['name']
+            task_description = node.get('task_description') or node.get('description') or f"执行节点 {node['name']} 的任务"
+            
+            task_data_list = []
+            for processor in processors:
                 # 根据处理器类型确定任务类型和分配
                 processor_type = processor.get('processor_type', processor.get('type', 'HUMAN'))
                 task_type = self._determine_task_type(processor_type)
-                assigned_user_id = processor.get('user_id')
-                assigned_agent_id = processor.get('agent_id')
-
-                logger.info(f"🔍 [任务类型判断] 处理器类型: {processor_type} -> 任务类型: {task_type.value}")
-                logger.info(f"🔍 [任务类型判断] 处理器详情: {processor}")
-                logger.info(f"   - 分配用户ID: {assigned_user_id}")
-                logger.info(f"   - 分配AgentID: {assigned_agent_id}")
-
-                # 特别关注Simulator类型
-                if processor_type.upper() == "SIMULATOR":
-                    logger.info(f"🤖 [SIMULATOR检测] 发现Simulator处理器!")
-                    logger.info(f"🤖 [SIMULATOR检测] 任务类型应该是: {task_type.value}")
-                    logger.info(f"🤖 [SIMULATOR检测] 处理器绑定的Agent: {assigned_agent_id}")
-                
-                # 🔧 修复：获取真实的上下文和输入数据
-                logger.info(f"🔍 [新架构-任务创建] 获取节点上下文数据...")
-                logger.info(f"   - 工作流实例ID: {workflow_instance_id}")
-                logger.info(f"   - 节点实例ID: {node_instance_id}")
-                
-                context_data = await self.context_manager.get_task_context_data(workflow_instance_id, node_instance_id)
-                logger.info(f"   - 上下文数据键: {list(context_data.keys()) if context_data else '空'}")
-                
-                if context_data:
-                    # 详细记录上下文内容
-                    upstream_results = context_data.get('immediate_upstream_results', {})
-                    logger.info(f"   - 上游节点结果数量: {len(upstream_results)}")
-                    for upstream_name, upstream_data in upstream_results.items():
-                        output_data = upstream_data.get('output_data', '')
-                        logger.info(f"     * {upstream_name}: {len(str(output_data))} 字符输出")
-                        if output_data:
-                            logger.info(f"       预览: {str(output_data)[:100]}...")
-                    
-                    global_data = context_data.get('workflow_global', {}).get('global_data', {})
-                    logger.info(f"   - 全局数据: {len(global_data)} 个键")
-                
-                # 将上下文数据转换为文本格式（与旧方法保持一致）
-                context_text = json.dumps(context_data, ensure_ascii=False, indent=2, default=_json_serializer) if context_data else ""
-                input_text = json.dumps(node.get('input_data', {}), ensure_ascii=False, indent=2, default=_json_serializer)
-                
-                logger.info(f"   - 上下文文本长度: {len(context_text)} 字符")
-                logger.info(f"   - 输入数据文本长度: {len(input_text)} 字符")
-                if context_text:
-                    logger.info(f"   - 上下文预览: {context_text}...")
-
                 
-                # 创建任务实例
-                task_title = node['name']
-                task_description = node.get('task_description') or node.get('description') or f"执行节点 {node['name']} 的任务"
+                logger.info(f"🔍 [任务类型判断] 处理器 {processor.get('processor_name', 'Unknown')}: "
+                            f"{processor_type} -> {task_type.value}, 用户={processor.get('user_id')}, Agent={processor.get('agent_id')}")
                 
-                task_data = TaskInstanceCreate(
+                task_data_list.append(TaskInstanceCreate(
                     workflow_instance_id=workflow_instance_id,
                     node_instance_id=node_instance_id,
                     processor_id=processor.get('processor_id'),
                     task_type=task_type,
                     task_title=task_title,
                     task_description=task_description,
-                    assigned_user_id=assigned_user_id,
-                    assigned_agent_id=assigned_agent_id,
+                    assigned_user_id=processor.get('user_id'),
+                    assigned_agent_id=processor.get('agent_id'),
                     estimated_duration=processor.get('estimated_duration', 30),
                     input_data=input_text,  
                     context_data=context_text, 
                     status=TaskInstanceStatus.PENDING,
                     priority='MEDIUM'
-                )
-                
-                logger.info(f"🔍 [新架构-任务创建] 准备创建任务实例...")
-                logger.info(f"   - 任务标题: {task_title}")
-                logger.info(f"   - 任务描述: {task_description[:100]}...")
-                
-                try:
-                    # 修复：使用正确的方法名称
-                    task_instance = await self.task_instance_repo.create_task(task_data)
-                    if task_instance:
-                        created_task_count += 1
-                        task_id = task_instance.get('task_instance_id')
-                        logger.info(f"✅ [新架构-任务创建] 任务创建成功:")
-                        logger.info(f"   - 任务实例ID: {task_id}")
-                        logger.info(f"   - 任务状态: {task_instance.get('status')}")
-                    else:
-                        logger.error(f"❌ [新架构-任务创建] 任务创建失败: create_task_instance返回空结果")
-                except Exception as task_creation_error:
-                    logger.error(f"❌ [新架构-任务创建] 任务创建异常: {task_creation_error}")
-                    import traceback
-                    logger.error(f"异常堆栈: {traceback.format_exc()}")
+                ))
+            
+            # 一个事务内多行写入该节点的全部任务实例
+            try:
+                created_tasks = await self.task_instance_repo.create_tasks(task_data_list)
+                created_task_count = len(created_tasks)
+            except Exception as task_creation_error:
+                created_task_count = 0
+                logger.error(f"❌ [新架构-任务创建] 任务创建异常: {task_creation_error}")
+                import traceback
+                logger.error(f"异常堆栈: {traceback.format_exc()}")
                 
             logger.info(f"🎉 [新架构-任务创建] 节点 {node.get('name')} 任务创建完成，共创建 {created_task_count} 个任务")
                 
@@ -4038,14 +3959,11 @@ class ExecutionEngine:
             
             logger.trace(f"找到 {len(ready_nodes)} 个准备执行的节点")
             
-            for node_instance_id in ready_nodes:
-                try:
-                    # 执行节点
-                    await self._execute_node_with_new_context(workflow_context, node_instance_id)
-                    logger.trace(f"启动节点执行: {node_instance_id}")
-                    
-                except Exception as e:
-                    logger.error(f"启动节点执行失败 {node_instance_id}: {e}")
+            # 并发执行节点
+            await self._dispatch_ready_nodes(
+                workflow_instance_id, ready_nodes,
+                lambda node_instance_id: self._execute_node_with_new_context(workflow_context, node_instance_id)
+            )
             
         except Exception as e:
             logger.error(f"使用新上下文启动工作流执行失败: {e}")
@@ -4949,21 +4867,31 @@ class ExecutionEngine:
     async def get_task_history(self, user_id: uuid.UUID, 
                              days: int = 30, limit: int = 100) -> List[Dict[str, Any]]:
         """获取用户任务历史"""
+        tasks, _ = await self.get_task_history_page(user_id, days, limit)
+        return tasks
+    
+    async def get_task_history_page(self, user_id: uuid.UUID, days: int = 30, limit: int = 100,
+                                    cursor: Optional[str] = None) -> tuple:
+        """键集分页获取用户任务历史，返回 (tasks, next_cursor)"""
         try:
             logger.info(f"📜 [任务历史] 查询用户任务历史:")
             logger.info(f"   - 用户ID: {user_id}")
             logger.info(f"   - 天数: {days}")
             logger.info(f"   - 限制: {limit}")
             
-            tasks = await self.task_instance_repo.get_user_task_history(user_id, days, limit)
+            tasks, next_cursor, _ = await self.task_instance_repo.get_user_task_history_page(
+                user_id, days, limit, cursor
+            )
             
             # 丰富任务信息
             for task in tasks:
                 task = await self._enrich_task_info(task)
             
             logger.info(f"✅ [任务历史] 找到 {len(tasks)} 条历史记录")
-            return tasks
+            return tasks, next_cursor
             
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"获取任务历史失败: {e}")
             raise
@@ -5097,6 +5025,8 @@ class ExecutionEngine:
         """统一处理任务完成 - 修复并发竞态条件"""
         # 🔧 关键修复：使用分布式锁防止并发竞态条件
         lock_key = f"task_completion_{task['workflow_instance_id']}"
+        # 数据库中确认的任务状态，确认后才上报节点完成跟踪器
+        confirmed_status = None
         
         try:
             logger.info(f"🔄 [统一任务完成-并发修复] 处理{task_type}任务完成: {task['task_instance_id']}")
@@ -5127,6 +5057,7 @@ class ExecutionEngine:
                 
                 # 🔧 状态一致性检查：确保任务和节点状态同步
                 fresh_task = await self.task_instance_repo.get_task_by_id(task['task_instance_id'])
+                confirmed_status = fresh_task.get('status') if fresh_task else updated_task.get('status')
                 if fresh_task and fresh_task.get('status') != 'completed':
                     logger.warning(f"⚠️  任务状态不一致，重新检查: {fresh_task.get('status')}")
                     return
@@ -5170,6 +5101,11 @@ class ExecutionEngine:
             logger.error(f"💥 [统一任务完成] 处理失败: {e}")
             import traceback
             logger.error(f"错误堆栈: {traceback.format_exc()}")
+        finally:
+            # 上报节点完成跟踪器（人工/Simulator任务提交路径），上报数据库中的实际状态
+            if confirmed_status:
+                await self.notify_task_status(task['task_instance_id'], confirmed_status,
+                                              task['node_instance_id'])
     
     async def _get_node_instance_data(self, node_instance_id: uuid.UUID) -> Optional[Dict[str, Any]]:
         """获取节点实例数据（包含节点类型）"""
@@ -18,7 +18,7 @@ from ..models.file_attachment import (
     TaskInstanceFile, TaskInstanceFileCreate, TaskInstanceFileResponse,
     AttachmentType, AccessType, FileBatchResponse
 )
-from ..utils.helpers import now_utc
+from ..utils.helpers import now_utc, decode_cursor, build_keyset_condition, build_keyset_page
 
 
 class FileAssociationService:
@@ -173,8 +173,13 @@ class FileAssociationService:
     async def get_user_files(self, user_id: uuid.UUID, page: int = 1, 
                            page_size: int = 20, keyword: Optional[str] = None,
                            content_type: Optional[str] = None, sort_by: str = "created_at",
-                           sort_order: str = "desc") -> Dict[str, Any]:
-        """获取用户的所有文件"""
+                           sort_order: str = "desc", cursor: Optional[str] = None,
+                           include_total: bool = True) -> Dict[str, Any]:
+        """获取用户的所有文件
+        
+        指定cursor时使用键集分页（按排序列 + file_id 定位），忽略page；
+        include_total为False时跳过COUNT查询，total返回None。
+        """
         try:
             offset = (page - 1) * page_size
             
@@ -203,24 +208,43 @@ class FileAssociationService:
             sort_field = sort_by if sort_by in valid_sort_fields else "created_at"
             sort_direction = "DESC" if sort_order.upper() == "DESC" else "ASC"
             
-            # 获取文件列表
+            count_params = list(params)
+            data_conditions = list(where_conditions)
+            if cursor:
+                # 键集分页：从游标位置向后取，页码越大代价不变
+                keyset_clause, keyset_values, next_param = build_keyset_condition(
+                    f"wf.{sort_field}", "wf.file_id", decode_cursor(cursor), sort_direction, param_counter + 1
+                )
+                data_conditions.append(keyset_clause)
+                params.extend(keyset_values)
+                limit_clause = f"LIMIT ${next_param}"
+                params.append(page_size + 1)
+            else:
+                limit_clause = f"LIMIT ${param_counter + 1} OFFSET ${param_counter + 2}"
+                params.extend([page_size + 1, offset])
+            
+            # 获取文件列表（多取一条用于判断是否有下一页）
             query = f"""
-                SELECT uf.*, wf.*, u.username as uploaded_by_name
+                SELECT uf.user_file_id, uf.user_id, uf.access_type,
+                       wf.file_id, wf.filename, wf.original_filename, wf.file_path, wf.file_size,
+                       wf.content_type, wf.file_hash, wf.uploaded_by, wf.created_at, wf.updated_at,
+                       wf.{sort_field} as sort_key, u.username as uploaded_by_name
                 FROM user_file uf
                 JOIN workflow_file wf ON uf.file_id = wf.file_id
                 LEFT JOIN user u ON wf.uploaded_by = u.user_id
-                WHERE {" AND ".join(where_conditions)}
-                ORDER BY wf.{sort_field} {sort_direction}
-                LIMIT ${param_counter + 1} OFFSET ${param_counter + 2}
+                WHERE {" AND ".join(data_conditions)}
+                ORDER BY wf.{sort_field} {sort_direction}, wf.file_id {sort_direction}
+                {limit_clause}
             """
             
-            params.extend([page_size, offset])
-            
             # Linus式调试: 记录完整查询
             logger.info(f"执行查询: {query}")
             logger.info(f"查询参数: {params}")
             
-            files = await self.db.fetch_all(query, *params)
+            rows = await self.db.fetch_all(query, *params)
+            # 游标取自与ORDER BY/键集条件相同的 wf 排序列（uf 与 wf 都有 created_at）
+            files, next_cursor, has_more = build_keyset_page(rows, page_size, "sort_key", "file_id")
+            files = [{key: value for key, value in file.items() if key != "sort_key"} for file in files]
             
             # Linus式调试: 记录查询结果
             logger.info(f"查询到 {len(files)} 个文件")
@@ -228,17 +252,17 @@ class FileAssociationService:
                 for i, file in enumerate(files):
                     logger.info(f"文件 {i+1}: {dict(file)}")
             
-            # 获取总数
-            count_query = f"""
-                SELECT COUNT(*) as total
-                FROM user_file uf
-                JOIN workflow_file wf ON uf.file_id = wf.file_id
-                WHERE {" AND ".join(where_conditions)}
-            """
-            
-            count_params = params[:-2]  # 移除LIMIT和OFFSET参数
-            count_result = await self.db.fetch_one(count_query, *count_params)
-            total = int(count_result['total']) if count_result else 0
+            # 获取总数（游标分页时可选）
+            total = None
+            if include_total or not cursor:
+                count_query = f"""
+                    SELECT COUNT(*) as total
+                    FROM user_file uf
+                    JOIN workflow_file wf ON uf.file_id = wf.file_id
+                    WHERE {" AND ".join(where_conditions)}
+                """
+                count_result = await self.db.fetch_one(count_query, *count_params)
+                total = int(count_result['total']) if count_result else 0
             
             logger.info(f"文件总数: {total}")
             
@@ -250,12 +274,17 @@ class FileAssociationService:
                 'total': total,
                 'page': page,
                 'page_size': page_size,
-                'total_pages': (total + page_size - 1) // page_size
+                'total_pages': (total + page_size - 1) // page_size if total is not None else None,
+                'next_cursor': next_cursor,
+                'has_more': has_more
             }
             
             logger.info(f"返回结果: files={len(result['files'])}, total={result['total']}")
             return result
             
+        except ValueError:
+            # 无效游标交由上层返回400
+            raise
         except Exception as e:
             logger.error(f"获取用户文件失败: {e}")
             return {'files': [], 'total': 0, 'page': page, 'page_size': page_size, 'total_pages': 0}
@@ -349,6 +378,29 @@ class FileAssociationService:
             logger.error(f"❌ [附件继承] 节点附件继承失败: {e}")
             return False
     
+    async def inherit_node_files_to_workflow_instance(self, workflow_instance_id: uuid.UUID, conn=None) -> int:
+        """
+        将工作流实例全部节点设计时的附件一次性继承到对应的节点实例
+        传入conn时在调用方的事务内执行，与节点实例的创建一同提交
+        """
+        inherit_query = """
+            INSERT INTO node_instance_file (node_instance_file_id, node_instance_id, file_id, attachment_type)
+            SELECT UUID(), ni.node_instance_id, nf.file_id, nf.attachment_type
+            FROM node_instance ni
+            JOIN node n ON n.node_id = ni.node_id
+            JOIN node_file nf ON nf.node_id = n.node_base_id
+            WHERE ni.workflow_instance_id = %s AND ni.is_deleted = FALSE
+        """
+        
+        if conn is not None:
+            result = await conn.execute(inherit_query, (workflow_instance_id,))
+        else:
+            result = await self.db.execute(inherit_query, workflow_instance_id)
+        inherited_count = int(result.split()[-1]) if isinstance(result, str) and result else 0
+        
+        logger.info(f"✅ [附件继承] 工作流实例 {workflow_instance_id}: 继承了 {inherited_count} 个附件")
+        return inherited_count
+    
     # ==================== 节点实例文件关联管理 ====================
     
     async def associate_node_instance_file(self, node_instance_id: uuid.UUID, file_id: uuid.UUID,
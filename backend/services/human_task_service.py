@@ -18,6 +18,8 @@ from ..utils.helpers import now_utc
 from ..utils.timestamp_utils import safe_parse_timestamp, safe_format_timestamp
 from .workflow_context_manager import WorkflowContextManager
 from .feishu_bot_service import feishu_bot_service
+from .workflow_status_projection import get_workflow_status_projection
+from .workflow_event_bus import get_workflow_event_bus, EVENT_WORKFLOW_STATUS
 
 
 class HumanTaskService:
@@ -570,7 +572,13 @@ class HumanTaskService:
                 # 检查是否需要触发下游任务 - 使用统一的依赖管理
                 logger.info(f"🔄 通过WorkflowContextManager检查下游任务...")
                 await self._handle_task_completion_through_context_manager(task, updated_task, output_data_str)
-                
+
+                # 上报执行引擎的节点完成跟踪器，多任务节点在全部任务完成时立即结算
+                from ..services.execution_service import execution_engine
+                await execution_engine.notify_task_status(
+                    task_id, TaskInstanceStatus.COMPLETED.value, task['node_instance_id']
+                )
+
                 result = {
                     'task_id': task_id,
                     'status': TaskInstanceStatus.COMPLETED.value,
@@ -690,6 +698,12 @@ class HumanTaskService:
                 # 通知工作流引擎任务被拒绝，可能需要重新分配或处理
                 await self._notify_task_rejected(task_id, reject_reason)
                 
+                # 上报执行引擎的节点完成跟踪器，节点立即按失败结算
+                from ..services.execution_service import execution_engine
+                await execution_engine.notify_task_status(
+                    task_id, TaskInstanceStatus.FAILED.value, task['node_instance_id']
+                )
+                
                 return {
                     'task_id': task_id,
                     'status': TaskInstanceStatus.FAILED.value,
@@ -732,6 +746,12 @@ class HumanTaskService:
                 # 通知工作流引擎任务被取消
                 await self._notify_task_cancelled(task_id, cancel_reason)
                 
+                # 上报执行引擎的节点完成跟踪器
+                from ..services.execution_service import execution_engine
+                await execution_engine.notify_task_status(
+                    task_id, TaskInstanceStatus.CANCELLED.value, task['node_instance_id']
+                )
+                
                 return {
                     'task_id': task_id,
                     'status': TaskInstanceStatus.CANCELLED.value,
@@ -1016,14 +1036,10 @@ class HumanTaskService:
                 else:
                     logger.info(f"    ⏭️ 任务已完成，跳过: {task['task_title']}")
             
-            # 4. 更新所有节点实例状态为已取消
-            nodes_query = '''
-            UPDATE node_instance 
-            SET status = 'cancelled', updated_at = $1
-            WHERE workflow_instance_id = $2 AND status NOT IN ('completed', 'failed')
-            '''
+            # 4. 更新所有节点实例状态为已取消（同时重新统计进度计数）
+            from ..repositories.instance.node_instance_repository import NodeInstanceRepository
             from ..utils.helpers import now_utc
-            await self.task_repo.db.execute(nodes_query, now_utc(), instance_id)
+            await NodeInstanceRepository().cancel_unfinished_instances(instance_id)
             logger.info(f"  ✅ 节点实例状态已更新为cancelled")
             
             # 5. 更新工作流实例状态为已取消
@@ -1040,6 +1056,14 @@ class HumanTaskService:
                 now_utc(), 
                 instance_id
             )
+            get_workflow_status_projection().invalidate(instance_id)
+            # 被取消任务的分配用户同样收到通知
+            await get_workflow_event_bus().publish(EVENT_WORKFLOW_STATUS, {
+                "status": "cancelled",
+                "error_message": cancel_reason,
+                "cancelled_task_ids": [task['task_id'] for task in cancelled_tasks]
+            }, workflow_instance_id=instance_id,
+                user_ids=[task['assigned_user_id'] for task in cancelled_tasks])
             logger.info(f"  ✅ 工作流实例状态已更新为cancelled")
             
             # 6. 返回取消结果
@@ -1219,13 +1243,9 @@ class HumanTaskService:
         try:
             logger.info(f"📝 更新节点实例状态: {node_instance_id} -> {status}")
             
-            from ..utils.helpers import now_utc
-            update_query = '''
-            UPDATE node_instance 
-            SET status = $1, updated_at = $2
-            WHERE node_instance_id = $3
-            '''
-            await self.task_repo.db.execute(update_query, status, now_utc(), node_instance_id)
+            from ..repositories.instance.node_instance_repository import NodeInstanceRepository
+            from ..models.instance import NodeInstanceStatus
+            await NodeInstanceRepository().update_instance_status(node_instance_id, NodeInstanceStatus(status))
             logger.info(f"  ✅ 节点实例状态更新成功")
             
         except Exception as e:
@@ -11,10 +11,13 @@ from loguru import logger
 import sys
 from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
 from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+from ..repositories.instance.workflow_instance_progress_repository import WorkflowInstanceProgressRepository
 from ..models.instance import (
     WorkflowInstanceStatus, TaskInstanceStatus, TaskInstanceType
 )
 from ..utils.helpers import now_utc
+from ..utils.db_pool import use_db_pool, DB_POOL_BACKGROUND
+from .workflow_event_bus import get_workflow_event_bus, EVENT_NODE_STATUS, EVENT_NODES_CHANGED
 
 
 class MonitoringService:
@@ -22,11 +25,14 @@ class MonitoringService:
     
     def __init__(self):
         self.workflow_instance_repo = WorkflowInstanceRepository()
+        self.progress_repo = WorkflowInstanceProgressRepository()
         self.task_instance_repo = TaskInstanceRepository()
         
         # 监控配置
         self.is_monitoring = False
         self.monitor_interval = 15  # 监控间隔（秒）- 优化为更频繁
+        self.status_sync_sweep_interval = 60  # 实时状态同步的全量检查间隔（秒），其余由节点状态事件触发
+        self.status_sync_debounce = 0.5  # 合并节点状态事件的等待时间（秒）
         self.alert_thresholds = {
             'workflow_timeout_minutes': 60,  # 工作流超时阈值
             'task_timeout_minutes': 30,      # 任务超时阈值
@@ -73,12 +79,13 @@ class MonitoringService:
         self.is_monitoring = True
         logger.info("启动工作流监控服务")
         
-        # 启动监控协程
-        asyncio.create_task(self._monitoring_loop())
-        asyncio.create_task(self._collect_metrics())
-        asyncio.create_task(self._check_timeouts())
-        asyncio.create_task(self._performance_analysis())
-        asyncio.create_task(self._real_time_status_sync())  # 新增实时状态同步
+        # 启动监控协程（使用background连接池，不挤占API请求连接）
+        with use_db_pool(DB_POOL_BACKGROUND):
+            asyncio.create_task(self._monitoring_loop())
+            asyncio.create_task(self._collect_metrics())
+            asyncio.create_task(self._check_timeouts())
+            asyncio.create_task(self._performance_analysis())
+            asyncio.create_task(self._real_time_status_sync())  # 新增实时状态同步
     
     async def stop_monitoring(self):
         """停止监控服务"""
@@ -417,55 +424,95 @@ class MonitoringService:
             logger.error(f"分析瓶颈失败: {e}")
     
     async def _real_time_status_sync(self):
-        """实时状态同步 - 每5秒主动检查运行中工作流的状态变化"""
-        while self.is_monitoring:
-            try:
-                # 获取所有运行中的工作流
-                running_workflows = await self.workflow_instance_repo.db.fetch_all("""
-                    SELECT workflow_instance_id, workflow_instance_name, status, updated_at
-                    FROM workflow_instance 
-                    WHERE status IN ('RUNNING', 'PENDING')
-                    AND is_deleted = FALSE
-                    AND status NOT IN ('cancelled', 'CANCELLED', 'failed', 'FAILED')
-                    ORDER BY updated_at DESC
-                """)
-                
-                if running_workflows:
-                    logger.trace(f"🔄 [实时同步] 检查 {len(running_workflows)} 个运行中的工作流状态")
+        """实时状态同步 - 订阅节点状态事件，只检查有节点完成的工作流；定期全量检查兜底其他进程的写入"""
+        event_bus = get_workflow_event_bus()
+        subscription = event_bus.subscribe(
+            None, see_all=True, event_types=[EVENT_NODE_STATUS, EVENT_NODES_CHANGED]
+        )[0]
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time()
+        try:
+            while self.is_monitoring:
+                try:
+                    workflow_ids = set()
+                    timeout = next_sweep - loop.time()
+                    if timeout > 0 and not subscription.overflowed:
+                        try:
+                            event = await asyncio.wait_for(subscription.queue.get(), timeout=timeout)
+                            # 合并短时间内到达的事件，一次批量检查
+                            await asyncio.sleep(self.status_sync_debounce)
+                            events = [event]
+                            while not subscription.queue.empty():
+                                events.append(subscription.queue.get_nowait())
+                            workflow_ids = {
+                                e.workflow_instance_id for e in events
+                                if e.workflow_instance_id and (
+                                    e.event_type == EVENT_NODES_CHANGED or e.data.get("status") == "completed"
+                                )
+                            }
+                            if not workflow_ids:
+                                continue
+                        except asyncio.TimeoutError:
+                            pass
                     
-                    for workflow in running_workflows:
-                        workflow_id = workflow['workflow_instance_id']
-                        
-                        # 检查节点实例状态是否有变化
-                        nodes_status = await self.workflow_instance_repo.db.fetch_all("""
-                            SELECT node_instance_id, status, updated_at
-                            FROM node_instance 
-                            WHERE workflow_instance_id = $1 
-                            AND is_deleted = FALSE
-                            ORDER BY updated_at DESC
-                        """, workflow_id)
-                        
-                        completed_nodes = sum(1 for n in nodes_status if n['status'] == 'completed')
-                        total_nodes = len(nodes_status)
-                        
-                        # 如果所有节点都完成了，但工作流状态还是RUNNING，立即更新
-                        if total_nodes > 0 and completed_nodes == total_nodes and workflow['status'] == 'RUNNING':
-                            logger.info(f"🎯 [实时同步] 发现完成的工作流需要状态更新: {workflow['workflow_instance_name']}")
-                            
-                            # 触发状态更新（通过执行引擎）
-                            try:
-                                from .execution_service import execution_engine
-                                # 🔧 修复：调用执行引擎的方法，而不是context_manager的方法
-                                await execution_engine._check_workflow_completion(workflow_id)
-                            except Exception as sync_error:
-                                logger.error(f"实时同步触发状态更新失败: {sync_error}")
-                
-                # 每5秒检查一次，保持高实时性
-                await asyncio.sleep(5)
+                    if not workflow_ids:
+                        # 定期全量检查；事件积压溢出后同样全量检查一次
+                        subscription.take_overflow()
+                        next_sweep = loop.time() + self.status_sync_sweep_interval
+                    await self._sync_completed_workflows(workflow_ids or None)
+                    
+                except Exception as e:
+                    logger.error(f"实时状态同步失败: {e}")
+                    await asyncio.sleep(10)  # 错误时等待10秒再重试
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    async def _sync_completed_workflows(self, workflow_ids: Optional[set] = None):
+        """检查运行中工作流：所有节点已完成但工作流仍为RUNNING时触发完成检查
+        
+        Args:
+            workflow_ids: 只检查这些工作流实例；为None时检查全部运行中的工作流
+        """
+        query = """
+            SELECT workflow_instance_id, workflow_instance_name, status, updated_at
+            FROM workflow_instance 
+            WHERE status IN ('RUNNING', 'PENDING')
+            AND is_deleted = FALSE
+            AND status NOT IN ('cancelled', 'CANCELLED', 'failed', 'FAILED')
+        """
+        args = []
+        if workflow_ids:
+            args = list(workflow_ids)
+            query += f" AND workflow_instance_id IN ({', '.join(f'${i + 1}' for i in range(len(args)))})"
+        running_workflows = await self.workflow_instance_repo.db.fetch_all(query + " ORDER BY updated_at DESC", *args)
+        
+        if not running_workflows:
+            return
+        logger.trace(f"🔄 [实时同步] 检查 {len(running_workflows)} 个运行中的工作流状态")
+        
+        # 一次按主键批量读取所有待检查工作流的进度计数
+        progress = await self.progress_repo.get_progress_many(
+            workflow['workflow_instance_id'] for workflow in running_workflows
+        )
+        
+        for workflow in running_workflows:
+            workflow_id = workflow['workflow_instance_id']
+            
+            workflow_progress = progress[str(workflow_id)]
+            completed_nodes = workflow_progress['completed_nodes']
+            total_nodes = workflow_progress['total_nodes']
+            
+            # 如果所有节点都完成了，但工作流状态还是RUNNING，立即更新
+            if total_nodes > 0 and completed_nodes == total_nodes and workflow['status'] == 'RUNNING':
+                logger.info(f"🎯 [实时同步] 发现完成的工作流需要状态更新: {workflow['workflow_instance_name']}")
                 
-            except Exception as e:
-                logger.error(f"实时状态同步失败: {e}")
-                await asyncio.sleep(10)  # 错误时等待10秒再重试
+                # 触发状态更新（通过执行引擎）
+                try:
+                    from .execution_service import execution_engine
+                    # 🔧 修复：调用执行引擎的方法，而不是context_manager的方法
+                    await execution_engine._check_workflow_completion(workflow_id)
+                except Exception as sync_error:
+                    logger.error(f"实时同步触发状态更新失败: {sync_error}")
     
     async def _create_alert(self, alert_type: str, message: str, 
                           severity: str, context: Optional[Dict[str, Any]] = None):
@@ -0,0 +1,167 @@
+"""
+节点完成跟踪器
+Node Completion Tracker
+
+按节点实例在内存中记录各任务的状态（待完成/已完成/失败计数），
+任务完成或失败时由回调直接上报，节点的所有任务完成或出现失败时立即返回结算结果，
+代替每个节点一个、每5秒查询一次任务列表的轮询监听协程。
+执行引擎另有低频对账循环，按数据库中的任务状态修正遗漏的上报。
+"""
+
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Iterable, Union
+
+from ..models.instance import TaskInstanceStatus
+
+
+NODE_OUTCOME_COMPLETED = "completed"
+NODE_OUTCOME_FAILED = "failed"
+# 任务全部结束（如被取消）但既未全部完成也没有失败，停止跟踪且不结算
+NODE_OUTCOME_ABANDONED = "abandoned"
+
+_COMPLETED = TaskInstanceStatus.COMPLETED.value
+_FAILED = TaskInstanceStatus.FAILED.value
+_CANCELLED = TaskInstanceStatus.CANCELLED.value
+
+
+def _key(value: Union[str, uuid.UUID, None]) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+class NodeCompletionState:
+    """单个节点实例的任务状态"""
+
+    __slots__ = ('workflow_instance_id', 'node_instance_id', 'task_statuses', 'registered_at', 'outcome')
+
+    def __init__(self, workflow_instance_id: uuid.UUID, node_instance_id: uuid.UUID):
+        self.workflow_instance_id = workflow_instance_id
+        self.node_instance_id = node_instance_id
+        # 任务ID(str) -> 状态
+        self.task_statuses: Dict[str, str] = {}
+        self.registered_at = time.monotonic()
+        self.outcome: Optional[str] = None
+
+    def counts(self) -> Dict[str, int]:
+        completed = failed = 0
+        for status in self.task_statuses.values():
+            if status == _COMPLETED:
+                completed += 1
+            elif status == _FAILED:
+                failed += 1
+        return {
+            "total": len(self.task_statuses),
+            "completed": completed,
+            "failed": failed,
+            "pending": len(self.task_statuses) - completed - failed,
+        }
+
+    def evaluate(self) -> Optional[str]:
+        """与原轮询逻辑一致：全部完成 -> 完成；任一失败 -> 失败；否则继续等待"""
+        statuses = self.task_statuses.values()
+        if not self.task_statuses:
+            return NODE_OUTCOME_ABANDONED
+        if all(status == _COMPLETED for status in statuses):
+            return NODE_OUTCOME_COMPLETED
+        if any(status == _FAILED for status in statuses):
+            return NODE_OUTCOME_FAILED
+        if all(status in (_COMPLETED, _CANCELLED) for status in statuses):
+            return NODE_OUTCOME_ABANDONED
+        return None
+
+    def failed_task_ids(self) -> List[str]:
+        return [task_id for task_id, status in self.task_statuses.items() if status == _FAILED]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workflow_instance_id": str(self.workflow_instance_id),
+            "node_instance_id": str(self.node_instance_id),
+            "waiting_seconds": round(time.monotonic() - self.registered_at, 1),
+            **self.counts(),
+        }
+
+
+class NodeCompletionTracker:
+    """按节点实例跟踪任务完成情况，节点达到终态时从跟踪中移除并返回其状态（只结算一次）"""
+
+    def __init__(self):
+        self._nodes: Dict[str, NodeCompletionState] = {}
+        # 任务ID -> 节点实例ID，供只知道任务ID的回调定位节点
+        self._task_index: Dict[str, str] = {}
+        self.settled = {NODE_OUTCOME_COMPLETED: 0, NODE_OUTCOME_FAILED: 0, NODE_OUTCOME_ABANDONED: 0}
+        self.settled_by_reconcile = 0
+
+    def is_tracking(self, node_instance_id: uuid.UUID) -> bool:
+        return _key(node_instance_id) in self._nodes
+
+    def tracked_node_ids(self) -> List[str]:
+        return list(self._nodes.keys())
+
+    def register(self, workflow_instance_id: uuid.UUID, node_instance_id: uuid.UUID,
+                 tasks: Iterable[Dict[str, Any]]) -> Optional[NodeCompletionState]:
+        """按当前任务列表开始跟踪节点；任务在注册前已全部结束时直接返回结算状态"""
+        node_key = _key(node_instance_id)
+        state = NodeCompletionState(workflow_instance_id, node_instance_id)
+        self._nodes[node_key] = state
+        return self._apply(state, tasks)
+
+    def update(self, task_id: uuid.UUID, status: str,
+               node_instance_id: Optional[uuid.UUID] = None) -> Optional[NodeCompletionState]:
+        """上报单个任务状态；节点因此达到终态时返回其状态，否则返回None"""
+        task_key = _key(task_id)
+        node_key = _key(node_instance_id) or self._task_index.get(task_key)
+        state = self._nodes.get(node_key) if node_key else None
+        if state is None:
+            return None
+        state.task_statuses[task_key] = status
+        self._task_index[task_key] = node_key
+        return self._settle(state)
+
+    def reconcile(self, node_instance_id: uuid.UUID,
+                  tasks: Iterable[Dict[str, Any]]) -> Optional[NodeCompletionState]:
+        """用数据库中的任务状态覆盖内存状态（对账）"""
+        state = self._nodes.get(_key(node_instance_id))
+        if state is None:
+            return None
+        state.task_statuses.clear()
+        settled = self._apply(state, tasks)
+        if settled is not None:
+            self.settled_by_reconcile += 1
+        return settled
+
+    def _apply(self, state: NodeCompletionState, tasks: Iterable[Dict[str, Any]]) -> Optional[NodeCompletionState]:
+        node_key = _key(state.node_instance_id)
+        for task in tasks:
+            task_key = _key(task['task_instance_id'])
+            state.task_statuses[task_key] = task['status']
+            self._task_index[task_key] = node_key
+        return self._settle(state)
+
+    def _settle(self, state: NodeCompletionState) -> Optional[NodeCompletionState]:
+        outcome = state.evaluate()
+        if outcome is None:
+            return None
+        self._nodes.pop(_key(state.node_instance_id), None)
+        for task_key in state.task_statuses:
+            self._task_index.pop(task_key, None)
+        state.outcome = outcome
+        self.settled[outcome] += 1
+        return state
+
+    def discard(self, node_instance_id: uuid.UUID) -> None:
+        """停止跟踪节点（不结算）"""
+        state = self._nodes.pop(_key(node_instance_id), None)
+        if state is not None:
+            for task_key in state.task_statuses:
+                self._task_index.pop(task_key, None)
+
+    def get_stats(self, limit: int = 20) -> Dict[str, Any]:
+        """获取跟踪统计，附等待最久的节点"""
+        waiting = sorted(self._nodes.values(), key=lambda state: state.registered_at)
+        return {
+            "tracked_nodes": len(self._nodes),
+            "tracked_tasks": len(self._task_index),
+            "settled": dict(self.settled),
+            "settled_by_reconcile": self.settled_by_reconcile,
+            "oldest": [state.to_dict() for state in waiting[:limit]],
+        }
@@ -17,6 +17,7 @@ from ..repositories.processor.processor_repository import NodeProcessorRepositor
 from ..repositories.workflow.workflow_repository import WorkflowRepository
 from ..utils.helpers import now_utc
 from ..utils.exceptions import ValidationError, ConflictError
+from .compiled_workflow import get_compiled_workflow_cache
 
 
 class NodeService:
@@ -27,6 +28,8 @@ class NodeService:
         self.node_connection_repository = NodeConnectionRepository()
         self.node_processor_repository = NodeProcessorRepository()
         self.workflow_repository = WorkflowRepository()
+        # 工作流定义变更后使执行引擎的编译缓存失效
+        self.workflow_cache = get_compiled_workflow_cache()
         # 为了兼容，也添加简短的别名
         self.node_repo = self.node_repository
         self.workflow_repo = self.workflow_repository
@@ -149,6 +152,8 @@ class NodeService:
                     logger.error(f"添加节点-处理器关联失败: {e}")
                     # 不抛出异常，因为节点创建已经成功
             
+            self.workflow_cache.invalidate(workflow_base_id=node_data.workflow_base_id)
+            
             # 格式化节点响应
             logger.info(f"[DEBUG] 开始调用_format_node_response")
             try:
@@ -333,6 +338,7 @@ class NodeService:
                     logger.info(f"清空节点-处理器关联: {node_base_id}")
             
             logger.info(f"用户 {user_id} 更新了节点: {node_base_id}")
+            self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
             
             # 重新查询节点以包含最新的processor关联信息
             final_node = await self._get_node_with_processor(node_base_id, workflow_base_id)
@@ -381,6 +387,7 @@ class NodeService:
             
             if success:
                 logger.info(f"用户 {user_id} 删除了节点: {node_base_id}")
+                self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
             
             return success
             
@@ -436,6 +443,7 @@ class NodeService:
                 raise ValueError("创建节点连接失败")
             
             logger.info(f"用户 {user_id} 创建了节点连接: {connection_data.from_node_base_id} -> {connection_data.to_node_base_id}")
+            self.workflow_cache.invalidate(workflow_base_id=connection_data.workflow_base_id)
             
             # 格式化返回数据 - 确保创建的和现有的连接都正确格式化
             if connection and 'created_at' in connection and connection['created_at']:
@@ -541,6 +549,7 @@ class NodeService:
 
             if result:
                 logger.info(f"更新节点连接成功: {from_node_base_id} -> {to_node_base_id}")
+                self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
                 return {
                     "from_node_base_id": str(from_node_base_id),
                     "to_node_base_id": str(to_node_base_id),
@@ -586,6 +595,7 @@ class NodeService:
             
             if success:
                 logger.info(f"用户 {user_id} 删除了节点连接: {from_node_base_id} -> {to_node_base_id}")
+                self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
             
             return success
             
@@ -636,6 +646,7 @@ class NodeService:
                 raise ValueError("分配处理器失败")
             
             logger.info(f"用户 {user_id} 为节点 {node_base_id} 分配了处理器 {processor_id}")
+            self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
             
             # 格式化返回数据
             result['created_at'] = result['created_at'].isoformat() if result['created_at'] else None
@@ -711,6 +722,7 @@ class NodeService:
             
             if success:
                 logger.info(f"用户 {user_id} 从节点 {node_base_id} 移除了处理器 {processor_id}")
+                self.workflow_cache.invalidate(workflow_base_id=workflow_base_id)
             
             return success
             
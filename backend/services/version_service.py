@@ -11,6 +11,7 @@ from ..utils.database import get_db_manager
 from ..repositories.workflow.workflow_repository import WorkflowRepository
 from ..repositories.node.node_repository import NodeRepository, NodeConnectionRepository
 from ..repositories.processor.processor_repository import NodeProcessorRepository
+from .compiled_workflow import get_compiled_workflow_cache
 
 
 class VersionService:
@@ -43,6 +44,7 @@ class VersionService:
             new_workflow = await self.workflow_repo.get_workflow_by_id(new_workflow_id)
             
             logger.info(f"成功创建工作流版本: {workflow_base_id} -> 版本 {new_workflow['version']}")
+            get_compiled_workflow_cache().invalidate(workflow_base_id=workflow_base_id)
             
             return {
                 "workflow_id": new_workflow_id,
@@ -82,6 +84,7 @@ class VersionService:
             new_node = await self.node_repo.get_node_by_id(new_node_id)
             
             logger.info(f"成功创建节点版本: {node_base_id} -> 版本 {new_node['version']}")
+            get_compiled_workflow_cache().invalidate(workflow_base_id=workflow_base_id)
             
             # 验证连接关系完整性
             new_workflow_id = new_node['workflow_id']
@@ -169,6 +172,7 @@ class VersionService:
             # 复制目标版本的所有节点和连接
             new_workflow_id = result['workflow_id']
             await self._copy_workflow_content(target_workflow['workflow_id'], new_workflow_id)
+            get_compiled_workflow_cache().invalidate(workflow_base_id=workflow_base_id)
             
             logger.info(f"成功回滚工作流 {workflow_base_id} 到版本 {target_version}")
             
@@ -195,21 +199,12 @@ class VersionService:
             
             node_id_mapping = {}
             
-            # 复制节点
+            # 复制节点（批量多行插入）
+            node_rows = []
             for source_node in source_nodes:
                 new_node_id = uuid.uuid4()
                 node_id_mapping[source_node['node_id']] = new_node_id
-                
-                insert_node_query = """
-                    INSERT INTO node (
-                        node_id, node_base_id, workflow_id, workflow_base_id,
-                        name, type, task_description, version, parent_version_id,
-                        is_current_version, position_x, position_y, created_at, is_deleted
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14)
-                """
-                
-                await self.db.execute(
-                    insert_node_query,
+                node_rows.append((
                     new_node_id,
                     source_node['node_base_id'],
                     target_workflow_id,
@@ -224,46 +219,53 @@ class VersionService:
                     source_node['position_y'],
                     source_node['created_at'],
                     False
-                )
+                ))
             
             # 复制连接
             source_connections_query = "SELECT * FROM node_connection WHERE workflow_id = $1"
             source_connections = await self.db.fetch_all(source_connections_query, source_workflow_id)
             
-            for connection in source_connections:
-                insert_connection_query = """
-                    INSERT INTO node_connection (
-                        from_node_id, to_node_id, workflow_id, 
-                        connection_type, condition_config, created_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6)
-                """
-                
-                await self.db.execute(
-                    insert_connection_query,
-                    node_id_mapping[connection['from_node_id']],
-                    node_id_mapping[connection['to_node_id']],
-                    target_workflow_id,
-                    connection['connection_type'],
-                    connection['condition_config'],
-                    connection['created_at']
+            connection_rows = [
+                {
+                    "from_node_id": node_id_mapping.get(connection['from_node_id']),
+                    "to_node_id": node_id_mapping.get(connection['to_node_id']),
+                    "connection_type": connection['connection_type'],
+                    "condition_config": connection['condition_config'],
+                    "created_at": connection['created_at']
+                }
+                for connection in source_connections
+            ]
+            
+            # 复制节点处理器关联（一次查询取出源工作流全部绑定）
+            processors_query = """
+                SELECT np.node_id, np.processor_id, np.created_at
+                FROM node_processor np
+                JOIN node n ON n.node_id = np.node_id
+                WHERE n.workflow_id = $1 AND n.is_deleted = FALSE
+            """
+            processors = await self.db.fetch_all(processors_query, source_workflow_id)
+            
+            processor_rows = [
+                (node_id_mapping[processor['node_id']], processor['processor_id'], processor['created_at'])
+                for processor in processors
+                if processor['node_id'] in node_id_mapping
+            ]
+            
+            # 节点、连接（插入前校验类型与两端节点）和处理器关联在同一事务内写入，失败时整体回滚
+            async with self.db.transaction() as conn:
+                await conn.insert_many(
+                    "node",
+                    [
+                        "node_id", "node_base_id", "workflow_id", "workflow_base_id",
+                        "name", "type", "task_description", "version", "parent_version_id",
+                        "is_current_version", "position_x", "position_y", "created_at", "is_deleted"
+                    ],
+                    node_rows
+                )
+                await self.connection_repo.create_connections(target_workflow_id, connection_rows, conn=conn)
+                await conn.insert_many(
+                    "node_processor", ["node_id", "processor_id", "created_at"], processor_rows
                 )
-            
-            # 复制节点处理器关联
-            for source_node_id, new_node_id in node_id_mapping.items():
-                processor_query = "SELECT * FROM node_processor WHERE node_id = $1"
-                processors = await self.db.fetch_all(processor_query, source_node_id)
-                
-                for processor in processors:
-                    insert_processor_query = """
-                        INSERT INTO node_processor (node_id, processor_id, created_at)
-                        VALUES ($1, $2, $3)
-                    """
-                    await self.db.execute(
-                        insert_processor_query,
-                        new_node_id,
-                        processor['processor_id'],
-                        processor['created_at']
-                    )
                     
         except Exception as e:
             logger.error(f"复制工作流内容失败: {e}")
@@ -0,0 +1,246 @@
+"""
+工作流事件总线
+Workflow Event Bus
+
+进程内发布/订阅：仓储与服务在写入后发布工作流实例状态、节点状态变迁、任务分配/状态与Agent输出事件，
+事件流接口（SSE）把事件推送给已连接的客户端，取代前端与监控循环的轮询。
+
+  - 按用户过滤：事件的接收者为工作流执行者与相关任务的分配用户，admin/manager 可接收全部事件
+  - 可续传：事件ID为 "<进程纪元>-<序号>"，最近 buffer_size 个事件保留在内存中，
+    断线重连时按 Last-Event-ID 补发；纪元不同（进程重启）或已超出缓冲时通知客户端重新同步
+  - 慢消费者的积压超过 queue_size 时丢弃积压并通知其重新同步，不阻塞发布方
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple, Union
+import uuid
+
+from loguru import logger
+
+from ..config.settings import get_settings
+from ..utils.database import get_db_manager
+from ..utils.helpers import safe_json_serializer
+
+# 事件类型
+EVENT_WORKFLOW_STATUS = "workflow_status"
+EVENT_NODE_STATUS = "node_status"
+EVENT_NODES_CHANGED = "nodes_changed"
+EVENT_TASK_ASSIGNED = "task_assigned"
+EVENT_TASK_STATUS = "task_status"
+EVENT_AGENT_OUTPUT = "agent_output"
+# 通知客户端重新全量读取（无法按事件ID补发时）
+EVENT_RESYNC = "resync"
+
+# 工作流执行者缓存上限
+OWNER_CACHE_SIZE = 10000
+
+
+def _key(value: Union[str, uuid.UUID, None]) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+class WorkflowEvent:
+    """一条工作流事件"""
+
+    __slots__ = ("event_id", "sequence", "event_type", "workflow_instance_id", "user_ids", "data", "created_at")
+
+    def __init__(self, event_id: str, sequence: int, event_type: str, workflow_instance_id: Optional[str],
+                 user_ids: frozenset, data: Dict[str, Any]):
+        self.event_id = event_id
+        self.sequence = sequence
+        self.event_type = event_type
+        self.workflow_instance_id = workflow_instance_id
+        self.user_ids = user_ids
+        self.data = data
+        self.created_at = time.time()
+
+    def to_sse(self) -> str:
+        """编码为SSE消息"""
+        payload = json.dumps({
+            "type": self.event_type,
+            "workflow_instance_id": self.workflow_instance_id,
+            "data": self.data,
+            "timestamp": self.created_at
+        }, ensure_ascii=False, default=safe_json_serializer)
+        return f"id: {self.event_id}\nevent: {self.event_type}\ndata: {payload}\n\n"
+
+
+class EventSubscription:
+    """一个事件流连接的订阅"""
+
+    def __init__(self, user_id: Optional[str], see_all: bool, queue_size: int,
+                 workflow_instance_ids: Optional[Set[str]] = None, event_types: Optional[Set[str]] = None):
+        self.user_id = user_id
+        self.see_all = see_all
+        self.workflow_instance_ids = workflow_instance_ids
+        self.event_types = event_types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        # 积压超出队列容量后置位，消费方应通知客户端重新同步
+        self.overflowed = False
+
+    def matches(self, event: WorkflowEvent) -> bool:
+        if self.event_types is not None and event.event_type not in self.event_types:
+            return False
+        if self.workflow_instance_ids is not None and event.workflow_instance_id not in self.workflow_instance_ids:
+            return False
+        return self.see_all or self.user_id in event.user_ids
+
+    def offer(self, event: WorkflowEvent) -> None:
+        if self.overflowed or not self.matches(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def take_overflow(self) -> bool:
+        """读取并清除溢出标记（同时丢弃积压）"""
+        if not self.overflowed:
+            return False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+        return True
+
+
+class WorkflowEventBus:
+    """进程内工作流事件总线"""
+
+    def __init__(self, buffer_size: int = 2000, queue_size: int = 500):
+        self.queue_size = queue_size
+        # 进程纪元：区分重启前后的事件ID
+        self.epoch = format(int(time.time() * 1000), "x")
+        self._sequence = 0
+        self._buffer: deque = deque(maxlen=max(1, buffer_size))
+        self._subscribers: Set[EventSubscription] = set()
+        # str(workflow_instance_id) -> str(executor_id)
+        self._owners: "OrderedDict[str, Optional[str]]" = OrderedDict()
+
+        self._published = 0
+        self._publish_errors = 0
+        self._replayed = 0
+        self._resyncs = 0
+        self._overflows = 0
+
+    def register_owner(self, workflow_instance_id: Union[str, uuid.UUID, None],
+                       executor_id: Union[str, uuid.UUID, None]) -> None:
+        """记录工作流实例的执行者（事件接收者）"""
+        instance_key = _key(workflow_instance_id)
+        if instance_key is None or executor_id is None:
+            return
+        self._owners[instance_key] = _key(executor_id)
+        self._owners.move_to_end(instance_key)
+        while len(self._owners) > OWNER_CACHE_SIZE:
+            self._owners.popitem(last=False)
+
+    async def _resolve_owner(self, instance_key: str) -> Optional[str]:
+        if instance_key in self._owners:
+            self._owners.move_to_end(instance_key)
+            return self._owners[instance_key]
+        row = await get_db_manager().fetch_one(
+            "SELECT executor_id FROM workflow_instance WHERE workflow_instance_id = $1", instance_key
+        )
+        owner = _key(row.get("executor_id")) if row else None
+        self.register_owner(instance_key, owner)
+        return owner
+
+    async def publish(self, event_type: str, data: Dict[str, Any],
+                      workflow_instance_id: Union[str, uuid.UUID, None] = None,
+                      user_ids: Iterable[Union[str, uuid.UUID, None]] = ()) -> Optional[WorkflowEvent]:
+        """发布事件；接收者为 user_ids 与工作流执行者。发布失败只记录日志，不影响写入方"""
+        try:
+            instance_key = _key(workflow_instance_id)
+            audience = {str(user_id) for user_id in user_ids if user_id is not None}
+            if instance_key is not None:
+                owner = await self._resolve_owner(instance_key)
+                if owner is not None:
+                    audience.add(owner)
+
+            self._sequence += 1
+            event = WorkflowEvent(f"{self.epoch}-{self._sequence}", self._sequence, event_type,
+                                  instance_key, frozenset(audience), data)
+            self._buffer.append(event)
+            self._published += 1
+            for subscription in self._subscribers:
+                was_overflowed = subscription.overflowed
+                subscription.offer(event)
+                if subscription.overflowed and not was_overflowed:
+                    self._overflows += 1
+            return event
+        except Exception as e:
+            self._publish_errors += 1
+            logger.warning(f"⚠️ 发布工作流事件失败 {event_type}: {e}")
+            return None
+
+    def subscribe(self, user_id: Union[str, uuid.UUID, None], see_all: bool = False,
+                  workflow_instance_ids: Optional[Iterable[Union[str, uuid.UUID]]] = None,
+                  event_types: Optional[Iterable[str]] = None,
+                  last_event_id: Optional[str] = None) -> Tuple[EventSubscription, List[WorkflowEvent], bool]:
+        """订阅事件
+
+        Returns:
+            (订阅, 按 last_event_id 需要补发的事件, 是否需要客户端重新同步)
+        """
+        subscription = EventSubscription(
+            _key(user_id), see_all, self.queue_size,
+            {str(instance_id) for instance_id in workflow_instance_ids} if workflow_instance_ids else None,
+            set(event_types) if event_types else None
+        )
+        replay, resync = self._replay_after(subscription, last_event_id)
+        # 补发与注册之间没有await，不会漏掉或重复事件
+        self._subscribers.add(subscription)
+        return subscription, replay, resync
+
+    def unsubscribe(self, subscription: EventSubscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def _replay_after(self, subscription: EventSubscription,
+                      last_event_id: Optional[str]) -> Tuple[List[WorkflowEvent], bool]:
+        if not last_event_id:
+            return [], False
+        epoch, _, sequence = last_event_id.partition("-")
+        oldest = self._buffer[0].sequence if self._buffer else self._sequence + 1
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) < oldest - 1:
+            # 进程已重启或缓冲已覆盖断线期间的事件
+            return [], True
+        replay = [event for event in self._buffer
+                  if event.sequence > int(sequence) and subscription.matches(event)]
+        self._replayed += len(replay)
+        return replay, False
+
+    def resync_message(self, reason: str) -> str:
+        """通知客户端重新全量读取的SSE消息；事件ID取当前最新序号，之后的事件照常推送与补发"""
+        self._resyncs += 1
+        payload = json.dumps({"type": EVENT_RESYNC, "reason": reason, "timestamp": time.time()})
+        return f"id: {self.epoch}-{self._sequence}\nevent: {EVENT_RESYNC}\ndata: {payload}\n\n"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """事件总线统计"""
+        return {
+            "epoch": self.epoch,
+            "last_event_id": f"{self.epoch}-{self._sequence}",
+            "published": self._published,
+            "publish_errors": self._publish_errors,
+            "subscribers": len(self._subscribers),
+            "buffered": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "replayed": self._replayed,
+            "resyncs": self._resyncs,
+            "overflows": self._overflows,
+            "known_owners": len(self._owners)
+        }
+
+
+_app_settings = get_settings().app
+workflow_event_bus = WorkflowEventBus(
+    buffer_size=_app_settings.event_stream_buffer_size,
+    queue_size=_app_settings.event_stream_queue_size
+)
+
+
+def get_workflow_event_bus() -> WorkflowEventBus:
+    """获取全局工作流事件总线"""
+    return workflow_event_bus
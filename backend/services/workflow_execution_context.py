@@ -6,14 +6,22 @@
 
 import uuid
 from datetime import datetime
-from typing import Dict, List, Any, Set, Optional, Union
+from typing import Dict, List, Any, Set, Optional, Tuple, Union
 import asyncio
 import json
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from loguru import logger
 
 # 延迟导入避免循环依赖
 from ..models.instance import WorkflowInstanceStatus, WorkflowInstanceUpdate
+from ..utils.db_pool import use_db_pool, DB_POOL_BACKGROUND
+from ..utils.query_stats import LatencyHistogram
+from ..utils.snapshot_codec import (
+    pack_context_snapshot, unpack_context_snapshot, resolve_compression
+)
+from ..config.settings import get_settings
 
 
 @dataclass
@@ -131,12 +139,34 @@ class WorkflowExecutionContext:
         
         # 节点依赖关系管理 - 使用node_instance_id作为key
         self.node_dependencies: Dict[uuid.UUID, Dict[str, Any]] = {}
-        
+
+        # 反向依赖索引：str(上游node_instance_id) -> 直接下游node_instance_id集合
+        # 节点完成时只需访问直接下游，而不是扫描全部依赖
+        self._downstream_index: Dict[str, Set[uuid.UUID]] = {}
+        # str(node_id) -> 首个注册的node_instance_id
+        self._instance_by_node_id: Dict[str, uuid.UUID] = {}
+
+        # 上下文构建缓存：节点名称（str(node_id) -> name，未命中时批量加载）、
+        # 已完成节点的附件（节点重置/重新完成时失效）、节点的传递上游顺序（依赖变化时失效）
+        self._node_names: Dict[str, Optional[str]] = {}
+        self._node_attachment_cache: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        self._task_attachment_cache: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        self._upstream_closure: Dict[uuid.UUID, List[uuid.UUID]] = {}
+
         # 节点状态管理
         self.node_states: Dict[uuid.UUID, str] = {}  # node_instance_id -> state
         
         # 待触发的节点队列
         self.pending_triggers: Set[uuid.UUID] = set()
+
+        # 增量持久化：节点状态变迁递增版本号并记录增量，后台只持久化版本有变化的上下文
+        self.version = 0
+        self.persisted_version = 0
+        self.snapshot_version = 0  # 最近一次完整快照包含的版本
+        self.pending_deltas: List[Tuple[int, str, str, Any]] = []  # (version, event_type, node_instance_id, payload)
+        self.needs_full_snapshot = True  # 尚无快照，或有无法用增量表达的变更
+        self.snapshot_written_at: Optional[float] = None  # time.monotonic()
+        self._persist_lock = asyncio.Lock()
         
         # 异步锁管理
         self._context_lock = asyncio.Lock()
@@ -205,38 +235,9 @@ class WorkflowExecutionContext:
                                        upstream_nodes: List[uuid.UUID]):
         """注册节点的依赖关系（修复版：使用node_states检查实例状态）"""
         async with self._context_lock:
-            # 检查已完成的上游节点实例（使用node_states）
-            completed_upstream = set()
-            
-            for upstream_node_instance_id in upstream_nodes:
-                if self.node_states.get(upstream_node_instance_id) == 'COMPLETED':
-                    completed_upstream.add(upstream_node_instance_id)
-                    logger.debug(f"  上游节点实例 {upstream_node_instance_id} 已完成")
-            
-            # 计算是否准备执行
-            ready_to_execute = len(completed_upstream) == len(upstream_nodes)
-            
-            self.node_dependencies[node_instance_id] = {
-                'node_id': node_id,
-                'workflow_instance_id': self.workflow_instance_id,
-                'upstream_nodes': upstream_nodes,
-                'completed_upstream': completed_upstream,
-                'ready_to_execute': ready_to_execute,
-                'dependency_count': len(upstream_nodes)
-            }
-            
-            # 初始化节点状态（但不覆盖已存在的状态）
-            if node_instance_id not in self.node_states:
-                self.node_states[node_instance_id] = 'PENDING'
-            
-            # 🔧 修复：如果节点准备执行且状态为PENDING，添加到pending_triggers
-            current_state = self.node_states.get(node_instance_id, 'PENDING')
-            
-            if (ready_to_execute and 
-                current_state == 'PENDING' and 
-                node_instance_id not in self.pending_triggers):
-                self.pending_triggers.add(node_instance_id)
-                logger.debug(f"🚀 [依赖注册] 节点实例 {node_instance_id} 已准备执行，添加到待触发队列 (状态: {current_state})")
+            completed_upstream, ready_to_execute = self._register_node_dependencies_locked(
+                node_instance_id, node_id, upstream_nodes
+            )
             
             logger.info(f"📋 [依赖注册] 节点实例 {node_instance_id}")
             logger.info(f"  - 上游节点实例总数: {len(upstream_nodes)}")
@@ -247,7 +248,154 @@ class WorkflowExecutionContext:
                 logger.info(f"  - 上游节点实例列表: {upstream_nodes}")
             if completed_upstream:
                 logger.info(f"  - 已完成上游实例列表: {list(completed_upstream)}")
-    
+
+    async def register_node_dependencies_bulk(self,
+                                            registrations: List[Tuple[uuid.UUID, uuid.UUID, List[uuid.UUID]]]) -> int:
+        """批量注册节点依赖：一次加锁注册工作流的全部节点
+
+        Args:
+            registrations: (node_instance_id, node_id, upstream_nodes) 列表
+
+        Returns:
+            注册后准备执行的节点数
+        """
+        ready_count = 0
+        async with self._context_lock:
+            for node_instance_id, node_id, upstream_nodes in registrations:
+                _, ready_to_execute = self._register_node_dependencies_locked(
+                    node_instance_id, node_id, upstream_nodes
+                )
+                if ready_to_execute:
+                    ready_count += 1
+        logger.info(f"📋 [依赖注册] 批量注册 {len(registrations)} 个节点实例，{ready_count} 个准备执行")
+        return ready_count
+
+    def _register_node_dependencies_locked(self, node_instance_id: uuid.UUID, node_id: uuid.UUID,
+                                           upstream_nodes: List[uuid.UUID]) -> Tuple[Set[uuid.UUID], bool]:
+        """注册单个节点的依赖（调用方持有 _context_lock）"""
+        # 检查已完成的上游节点实例（使用node_states）
+        completed_upstream = set()
+        
+        for upstream_node_instance_id in upstream_nodes:
+            if self.node_states.get(upstream_node_instance_id) == 'COMPLETED':
+                completed_upstream.add(upstream_node_instance_id)
+                logger.debug(f"  上游节点实例 {upstream_node_instance_id} 已完成")
+        
+        # 计算是否准备执行
+        ready_to_execute = len(completed_upstream) == len(upstream_nodes)
+
+        self._unindex_node_dependencies(node_instance_id)
+        self.node_dependencies[node_instance_id] = {
+            'node_id': node_id,
+            'workflow_instance_id': self.workflow_instance_id,
+            'upstream_nodes': upstream_nodes,
+            'completed_upstream': completed_upstream,
+            'ready_to_execute': ready_to_execute,
+            'dependency_count': len(upstream_nodes),
+            'remaining_upstream': len(upstream_nodes) - len(completed_upstream)
+        }
+        self._index_node_dependencies(node_instance_id)
+
+        # 初始化节点状态（但不覆盖已存在的状态）
+        if node_instance_id not in self.node_states:
+            self.node_states[node_instance_id] = 'PENDING'
+        
+        # 🔧 修复：如果节点准备执行且状态为PENDING，添加到pending_triggers
+        current_state = self.node_states.get(node_instance_id, 'PENDING')
+        
+        if (ready_to_execute and 
+            current_state == 'PENDING' and 
+            node_instance_id not in self.pending_triggers):
+            self.pending_triggers.add(node_instance_id)
+            logger.debug(f"🚀 [依赖注册] 节点实例 {node_instance_id} 已准备执行，添加到待触发队列 (状态: {current_state})")
+        return completed_upstream, ready_to_execute
+
+    def _index_node_dependencies(self, node_instance_id: uuid.UUID):
+        """将节点的上游边写入反向依赖索引"""
+        deps = self.node_dependencies[node_instance_id]
+        self._upstream_closure.clear()
+        for upstream_node_instance_id in deps['upstream_nodes']:
+            self._downstream_index.setdefault(str(upstream_node_instance_id), set()).add(node_instance_id)
+        if deps.get('node_id') is not None:
+            self._instance_by_node_id.setdefault(str(deps['node_id']), node_instance_id)
+
+    def _unindex_node_dependencies(self, node_instance_id: uuid.UUID):
+        """重新注册前移除节点旧的上游边"""
+        deps = self.node_dependencies.get(node_instance_id)
+        if not deps:
+            return
+        for upstream_node_instance_id in deps['upstream_nodes']:
+            downstream = self._downstream_index.get(str(upstream_node_instance_id))
+            if downstream is not None:
+                downstream.discard(node_instance_id)
+                if not downstream:
+                    del self._downstream_index[str(upstream_node_instance_id)]
+
+    def _record_upstream_completed(self, completed_node_instance_id: uuid.UUID):
+        """上游节点完成：更新直接下游的已完成上游集合与剩余上游计数"""
+        for node_instance_id in self._downstream_index.get(str(completed_node_instance_id), ()):
+            deps = self.node_dependencies[node_instance_id]
+            deps['completed_upstream'].add(completed_node_instance_id)
+            deps['remaining_upstream'] = len(deps['upstream_nodes']) - len(deps['completed_upstream'])
+
+    def _record_upstream_reset(self, reset_node_instance_id: uuid.UUID):
+        """上游节点被重置为PENDING：从直接下游的已完成上游集合中移除并恢复计数"""
+        for node_instance_id in self._downstream_index.get(str(reset_node_instance_id), ()):
+            deps = self.node_dependencies[node_instance_id]
+            deps['completed_upstream'].discard(reset_node_instance_id)
+            deps['remaining_upstream'] = len(deps['upstream_nodes']) - len(deps['completed_upstream'])
+
+    def _record_delta(self, event_type: str, node_instance_id: uuid.UUID, payload: Any = None):
+        """记录一次节点状态变迁，由后台持久化追加到增量日志"""
+        self.version += 1
+        self.pending_deltas.append((self.version, event_type, str(node_instance_id), payload))
+
+    def mark_dirty(self):
+        """记录无法用增量表达的变更（执行路径等），下次持久化时写入完整快照"""
+        self.version += 1
+        self.needs_full_snapshot = True
+
+    @property
+    def is_dirty(self) -> bool:
+        """自上次持久化以来是否有变更"""
+        return self.version != self.persisted_version
+
+    def apply_delta(self, event_type: str, node_instance_id: uuid.UUID, payload: Any = None):
+        """在恢复的快照之上重放一条增量（不写数据库、不触发回调）"""
+        completed_nodes = self.execution_context.setdefault('completed_nodes', set())
+        failed_nodes = self.execution_context.setdefault('failed_nodes', set())
+        executing_nodes = self.execution_context.setdefault('current_executing_nodes', set())
+
+        if event_type == 'executing':
+            self.node_states[node_instance_id] = 'EXECUTING'
+            executing_nodes.add(node_instance_id)
+        elif event_type == 'completed':
+            self.node_states[node_instance_id] = 'COMPLETED'
+            completed_nodes.add(node_instance_id)
+            executing_nodes.discard(node_instance_id)
+            self.execution_context['node_outputs'][node_instance_id] = payload
+            self.execution_context['execution_path'].append(str(node_instance_id))
+        elif event_type == 'failed':
+            self.node_states[node_instance_id] = 'FAILED'
+            failed_nodes.add(node_instance_id)
+            executing_nodes.discard(node_instance_id)
+        elif event_type == 'reset':
+            self.node_states[node_instance_id] = 'PENDING'
+            completed_nodes.discard(node_instance_id)
+            failed_nodes.discard(node_instance_id)
+            executing_nodes.discard(node_instance_id)
+            self.execution_context['node_outputs'].pop(node_instance_id, None)
+        # triggered：依赖就绪状态在恢复时由数据库重建与扫描得出，无需重放
+
+    def _forget_node_attachments(self, node_instance_id: uuid.UUID):
+        """节点重置或重新完成后附件可能变化，丢弃缓存"""
+        self._node_attachment_cache.pop(node_instance_id, None)
+        self._task_attachment_cache.pop(node_instance_id, None)
+
+    def get_downstream_node_instances(self, node_instance_id: uuid.UUID) -> List[uuid.UUID]:
+        """获取节点实例的直接下游节点实例"""
+        return list(self._downstream_index.get(str(node_instance_id), ()))
+
     async def mark_node_executing(self, node_id: uuid.UUID, node_instance_id: uuid.UUID):
         """标记节点开始执行"""
         async with self._context_lock:
@@ -259,6 +407,7 @@ class WorkflowExecutionContext:
             self.node_states[node_instance_id] = 'EXECUTING'
             # 🔧 修复：统一使用node_instance_id管理执行状态
             self.execution_context['current_executing_nodes'].add(node_instance_id)
+            self._record_delta('executing', node_instance_id)
             
             logger.trace(f"⚡ 标记节点实例执行: {node_instance_id} (节点ID: {node_id})")
     
@@ -295,10 +444,13 @@ class WorkflowExecutionContext:
             logger.debug(f"🔧 [上下文修复] 节点输出存储: {node_instance_id} -> {len(str(output_data))}字符")
             logger.debug(f"🔧 [上下文修复] 当前所有输出键: {list(self.execution_context['node_outputs'].keys())}")
             self.execution_context['execution_path'].append(str(node_instance_id))
-            
+            self._record_upstream_completed(node_instance_id)
+
             # 从执行中移除
             # 🔧 修复：统一使用node_instance_id管理执行状态
             self.execution_context['current_executing_nodes'].discard(node_instance_id)
+            self._record_delta('completed', node_instance_id, output_data)
+            self._forget_node_attachments(node_instance_id)
             
             logger.info(f"🎉 节点完成: {node_id}")
             
@@ -333,6 +485,7 @@ class WorkflowExecutionContext:
             # 🔧 修复：统一使用node_instance_id管理失败状态，保持一致性
             self.execution_context['failed_nodes'].add(node_instance_id)
             self.execution_context['current_executing_nodes'].discard(node_instance_id)
+            self._record_delta('failed', node_instance_id, error_info)
             
             logger.error(f"❌ 节点实例失败: {node_instance_id} (节点ID: {node_id}) - {error_info}")
             
@@ -388,49 +541,7 @@ class WorkflowExecutionContext:
                     logger.debug(f"🔧 [上下文获取] ✅ 找到输出数据: {len(str(output_data))}字符")
 
                     # 🆕 获取上游任务的提交附件
-                    upstream_task_attachments = []
-                    try:
-                        logger.info(f"📎 [附件收集] 开始为上游节点 {upstream_node_instance_id} 收集任务附件")
-
-                        # 通过node_instance_id获取task_instance_id
-                        from ..repositories.instance.task_instance_repository import TaskInstanceRepository
-                        task_repo = TaskInstanceRepository()
-                        task_query = "SELECT task_instance_id FROM task_instance WHERE node_instance_id = %s AND is_deleted = FALSE"
-                        task_result = await task_repo.db.fetch_one(task_query, upstream_node_instance_id)
-
-                        logger.info(f"📎 [附件收集] 查询结果: {task_result}")
-
-                        if task_result:
-                            task_instance_id = task_result['task_instance_id']
-                            logger.info(f"📎 [附件收集] 找到上游任务: {task_instance_id}")
-
-                            # 获取任务提交的附件
-                            from ..services.file_association_service import FileAssociationService
-                            file_service = FileAssociationService()
-                            task_attachments = await file_service.get_task_instance_files(task_instance_id)
-
-                            logger.info(f"📎 [附件收集] 原始附件数据: {task_attachments}")
-
-                            # 格式化附件信息
-                            for attachment in task_attachments:
-                                upstream_task_attachments.append({
-                                    'file_id': str(attachment.get('file_id')),
-                                    'filename': attachment.get('filename', ''),
-                                    'original_filename': attachment.get('original_filename', ''),
-                                    'file_size': attachment.get('file_size', 0),
-                                    'content_type': attachment.get('content_type', ''),
-                                    'attachment_type': attachment.get('attachment_type', 'input'),
-                                    'source': 'task_submission'  # 标记来源为任务提交
-                                })
-
-                            logger.info(f"📎 [附件收集] 收集到 {len(upstream_task_attachments)} 个上游任务附件")
-                        else:
-                            logger.info(f"📎 [附件收集] 未找到上游节点 {upstream_node_instance_id} 对应的任务实例")
-
-                    except Exception as e:
-                        logger.warning(f"⚠️ 获取上游任务附件失败: {e}")
-                        import traceback
-                        logger.warning(f"⚠️ 错误堆栈: {traceback.format_exc()}")
+                    upstream_task_attachments = await self._get_upstream_task_attachments(upstream_node_instance_id)
 
                     # 🆕 获取上游节点的完整附件信息（包括节点绑定和任务提交）
                     upstream_node_attachments = await self._get_node_attachments(upstream_node_instance_id)
@@ -491,93 +602,54 @@ class WorkflowExecutionContext:
             return context_data
     
     async def _check_and_trigger_downstream_nodes(self, completed_node_instance_id: uuid.UUID) -> List[uuid.UUID]:
-        """检查并触发下游节点（修复版：防止竞态和重复触发，统一使用node_instance_id）"""
+        """检查并触发下游节点（修复版：防止竞态和重复触发，统一使用node_instance_id）
+
+        通过反向依赖索引只访问完成节点的直接下游，复杂度为O(出度)
+        """
         triggered_nodes = []
         
         # 🔒 使用锁保护整个检查和触发过程，防止竞态条件
         async with self._context_lock:
-            logger.info(f"🔍 [下游触发] 检查完成节点实例 {completed_node_instance_id} 的下游依赖...")
-            logger.info(f"   - 当前注册的节点依赖数量: {len(self.node_dependencies)}")
-            logger.info(f"   - 依赖字典的key列表: {list(self.node_dependencies.keys())}")
-            
-            for node_instance_id, deps in self.node_dependencies.items():
-                logger.info(f"   - 检查节点实例 {node_instance_id}，上游依赖: {deps['upstream_nodes']}")
-                logger.info(f"     - 节点状态: {self.node_states.get(node_instance_id, 'UNKNOWN')}")
-                logger.info(f"     - 已完成上游: {len(deps.get('completed_upstream', set()))}/{len(deps['upstream_nodes'])}")
-                
-                # 🔧 修复：UUID类型一致性比较，先转换为字符串进行比较
-                completed_node_str = str(completed_node_instance_id)
-                upstream_nodes_str = [str(x) for x in deps['upstream_nodes']]
-                
-                if completed_node_str in upstream_nodes_str:
-                    logger.info(f"✅ [下游触发] 找到下游节点实例: {node_instance_id}")
-                    logger.info(f"   - 当前状态: {self.node_states.get(node_instance_id, 'UNKNOWN')}")
-                    logger.info(f"   - 依赖状态: {len(deps.get('completed_upstream', set()))}/{len(deps['upstream_nodes'])}")
-                    
-                    # 🔒 先检查节点是否已经被触发或正在执行
-                    if deps.get('ready_to_execute', False):
-                        logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 已经被标记为准备执行，跳过")
-                        continue
-                        
-                    # 检查节点实例是否正在执行（使用node_states检查）
-                    if self.node_states.get(node_instance_id) == 'EXECUTING':
-                        logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 正在执行中，跳过")
-                        continue
-                        
-                    # 检查节点实例是否已完成（使用node_states检查实例级别状态）
-                    if self.node_states.get(node_instance_id) == 'COMPLETED':
-                        logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 已完成，跳过")
-                        continue
-                    
-                    # 标记上游节点实例完成
-                    if completed_node_instance_id not in deps['completed_upstream']:
-                        deps['completed_upstream'].add(completed_node_instance_id)
-                        logger.info(f"  ✅ 标记上游节点实例 {completed_node_instance_id} 为已完成")
-                    else:
-                        logger.debug(f"  ℹ️ 上游节点实例 {completed_node_instance_id} 已经标记为完成")
-                    
-                    # 🔧 修复：确保完成的节点状态立即更新
-                    if self.node_states.get(completed_node_instance_id) != 'COMPLETED':
-                        self.node_states[completed_node_instance_id] = 'COMPLETED'
-                        logger.info(f"  🔧 强制同步节点状态: {completed_node_instance_id} -> COMPLETED")
-                    
-                    # 严格检查所有上游是否都完成
-                    total_upstream = len(deps['upstream_nodes'])
-                    completed_upstream = len(deps['completed_upstream'])
-                    
-                    logger.info(f"  📊 节点实例 {node_instance_id} 依赖状态: {completed_upstream}/{total_upstream}")
-                    
-                    # 只有当所有上游都完成时才触发
-                    if completed_upstream == total_upstream and total_upstream > 0:
-                        # 🔧 修复：简化检查逻辑，直接基于completed_upstream集合
-                        # 因为我们已经在上面强制同步了状态，不需要双重检查
-                        all_upstream_completed_verified = True
-                        logger.info(f"  ✅ 所有上游节点已完成，准备触发: {node_instance_id}")
-                        
-                        if all_upstream_completed_verified:
-                            # 防止重复触发的最终检查
-                            if node_instance_id not in self.pending_triggers:
-                                deps['ready_to_execute'] = True
-                                self.pending_triggers.add(node_instance_id)
-                                triggered_nodes.append(node_instance_id)
-                                
-                                logger.debug(f"🚀 触发下游节点实例: {node_instance_id} (依赖已全部满足: {deps['upstream_nodes']})")
-                            else:
-                                logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 已在pending_triggers中，避免重复触发")
-                    else:
-                        logger.trace(f"  ⏳ 节点实例 {node_instance_id} 依赖未满足，等待更多上游完成")
+            downstream_nodes = self._downstream_index.get(str(completed_node_instance_id), ())
+            logger.debug(f"🔍 [下游触发] 完成节点实例 {completed_node_instance_id} 有 {len(downstream_nodes)} 个直接下游")
+
+            # 🔧 修复：确保完成的节点状态立即更新
+            if downstream_nodes and self.node_states.get(completed_node_instance_id) != 'COMPLETED':
+                self.node_states[completed_node_instance_id] = 'COMPLETED'
+                logger.info(f"  🔧 强制同步节点状态: {completed_node_instance_id} -> COMPLETED")
+
+            for node_instance_id in downstream_nodes:
+                deps = self.node_dependencies[node_instance_id]
+                node_state = self.node_states.get(node_instance_id)
+
+                # 🔒 先检查节点是否已经被触发、正在执行或已完成
+                if deps.get('ready_to_execute', False):
+                    logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 已经被标记为准备执行，跳过")
+                    continue
+                if node_state in ('EXECUTING', 'COMPLETED'):
+                    logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 状态为 {node_state}，跳过")
+                    continue
+
+                # 标记上游节点实例完成
+                deps['completed_upstream'].add(completed_node_instance_id)
+                deps['remaining_upstream'] = len(deps['upstream_nodes']) - len(deps['completed_upstream'])
+
+                # 只有当所有上游都完成时才触发
+                if deps['remaining_upstream'] > 0 or not deps['upstream_nodes']:
+                    logger.trace(f"  ⏳ 节点实例 {node_instance_id} 还有 {deps['remaining_upstream']} 个上游未完成")
+                    continue
+
+                # 防止重复触发的最终检查
+                if node_instance_id not in self.pending_triggers:
+                    deps['ready_to_execute'] = True
+                    self.pending_triggers.add(node_instance_id)
+                    self._record_delta('triggered', node_instance_id)
+                    triggered_nodes.append(node_instance_id)
+                    logger.debug(f"🚀 触发下游节点实例: {node_instance_id} (依赖已全部满足: {deps['upstream_nodes']})")
                 else:
-                    # 🔧 修复：添加调试信息，为什么没有找到下游节点
-                    logger.info(f"   ➡️ 节点实例 {node_instance_id} 不依赖于完成节点 {completed_node_instance_id}")
-                    logger.info(f"      上游依赖类型检查: {[type(x) for x in deps['upstream_nodes']]}")
-                    logger.info(f"      完成节点类型: {type(completed_node_instance_id)}")
-                    logger.info(f"      UUID比较结果: {[str(x) == str(completed_node_instance_id) for x in deps['upstream_nodes']]}")
-            
-            logger.info(f"🎯 [下游触发] 触发检查完成，共触发 {len(triggered_nodes)} 个下游节点实例")
-            if triggered_nodes:
-                logger.info(f"   - 触发的节点实例: {triggered_nodes}")
-            else:
-                logger.info(f"   - 原因分析: 可能是依赖未完全满足，或节点已处理，或没有下游节点")
+                    logger.trace(f"  ⚠️ 节点实例 {node_instance_id} 已在pending_triggers中，避免重复触发")
+
+            logger.info(f"🎯 [下游触发] 节点实例 {completed_node_instance_id} 完成，共触发 {len(triggered_nodes)} 个下游节点实例")
         
         return triggered_nodes
     
@@ -605,6 +677,7 @@ class WorkflowExecutionContext:
                     node_instance_id not in self.pending_triggers):
                     
                     self.pending_triggers.add(node_instance_id)
+                    self._record_delta('triggered', node_instance_id)
                     ready_nodes.append(node_instance_id)
                     logger.info(f"🔍 [遗漏发现] 添加准备执行的节点: {node_instance_id}")
             
@@ -917,82 +990,179 @@ class WorkflowExecutionContext:
             return {}
     
     async def _get_node_name_by_id(self, node_id: uuid.UUID) -> str:
-        """根据node_id获取节点名称"""
+        """根据node_id获取节点名称
+
+        名称缓存在上下文内；未命中时一次查询加载所有已注册节点中尚未缓存的名称。
+        """
+        if node_id is None:
+            return None
+        key = str(node_id)
+        if key in self._node_names:
+            return self._node_names[key]
+
         try:
             from ..repositories.node.node_repository import NodeRepository
             node_repo = NodeRepository()
-            
-            query = "SELECT name FROM node WHERE node_id = $1"
-            result = await node_repo.db.fetch_one(query, node_id)
-            return result['name'] if result else None
+
+            node_ids = {
+                str(deps['node_id']) for deps in self.node_dependencies.values()
+                if deps.get('node_id') is not None
+            }
+            node_ids = [nid for nid in node_ids | {key} if nid not in self._node_names]
+            placeholders = ", ".join(f"${i}" for i in range(1, len(node_ids) + 1))
+            query = f"SELECT node_id, name FROM node WHERE node_id IN ({placeholders})"
+            rows = await node_repo.db.fetch_all(query, *node_ids)
+
+            for nid in node_ids:
+                self._node_names.setdefault(nid, None)
+            for row in rows:
+                self._node_names[str(row['node_id'])] = row['name']
+            return self._node_names.get(key)
         except Exception as e:
             logger.error(f"获取节点名称失败: {e}")
             return None
 
-    async def _collect_all_upstream_results(self, node_instance_id: uuid.UUID) -> Dict[str, Any]:
-        """收集指定节点的所有上游节点结果（全局上下文）
-        
-        使用深度优先搜索收集从工作流开始到当前节点的所有已完成节点的输出数据和附件
-        """
-        all_upstream = {}
-        visited = set()
-        
-        async def dfs_collect(current_node_instance_id: uuid.UUID):
-            """深度优先搜索收集上游节点数据"""
+    async def _get_upstream_task_attachments(self, node_instance_id: uuid.UUID) -> List[Dict[str, Any]]:
+        """获取上游节点任务提交的附件（已完成节点按节点实例缓存）"""
+        cached = self._task_attachment_cache.get(node_instance_id)
+        if cached is not None:
+            return list(cached)
+
+        upstream_node_instance_id = node_instance_id
+        upstream_task_attachments = []
+        try:
+            logger.info(f"📎 [附件收集] 开始为上游节点 {upstream_node_instance_id} 收集任务附件")
+
+            # 通过node_instance_id获取task_instance_id
+            from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+            task_repo = TaskInstanceRepository()
+            task_query = "SELECT task_instance_id FROM task_instance WHERE node_instance_id = %s AND is_deleted = FALSE"
+            task_result = await task_repo.db.fetch_one(task_query, upstream_node_instance_id)
+
+            logger.info(f"📎 [附件收集] 查询结果: {task_result}")
+
+            if task_result:
+                task_instance_id = task_result['task_instance_id']
+                logger.info(f"📎 [附件收集] 找到上游任务: {task_instance_id}")
+
+                # 获取任务提交的附件
+                from ..services.file_association_service import FileAssociationService
+                file_service = FileAssociationService()
+                task_attachments = await file_service.get_task_instance_files(task_instance_id)
+
+                logger.info(f"📎 [附件收集] 原始附件数据: {task_attachments}")
+
+                # 格式化附件信息
+                for attachment in task_attachments:
+                    upstream_task_attachments.append({
+                        'file_id': str(attachment.get('file_id')),
+                        'filename': attachment.get('filename', ''),
+                        'original_filename': attachment.get('original_filename', ''),
+                        'file_size': attachment.get('file_size', 0),
+                        'content_type': attachment.get('content_type', ''),
+                        'attachment_type': attachment.get('attachment_type', 'input'),
+                        'source': 'task_submission'  # 标记来源为任务提交
+                    })
+
+                logger.info(f"📎 [附件收集] 收集到 {len(upstream_task_attachments)} 个上游任务附件")
+            else:
+                logger.info(f"📎 [附件收集] 未找到上游节点 {upstream_node_instance_id} 对应的任务实例")
+
+        except Exception as e:
+            logger.warning(f"⚠️ 获取上游任务附件失败: {e}")
+            import traceback
+            logger.warning(f"⚠️ 错误堆栈: {traceback.format_exc()}")
+            return upstream_task_attachments
+
+        if self.node_states.get(node_instance_id) == 'COMPLETED':
+            self._task_attachment_cache[node_instance_id] = upstream_task_attachments
+        return list(upstream_task_attachments)
+
+    def _get_upstream_closure(self, node_instance_id: uuid.UUID) -> List[uuid.UUID]:
+        """节点的全部传递上游（深度优先后序、去重），按依赖结构记忆化"""
+        cached = self._upstream_closure.get(node_instance_id)
+        if cached is not None:
+            return cached
+
+        ordered: List[uuid.UUID] = []
+        collected: Set[uuid.UUID] = set()
+        visited: Set[uuid.UUID] = set()
+
+        def dfs(current_node_instance_id: uuid.UUID):
             if current_node_instance_id in visited:
                 return
-            
             visited.add(current_node_instance_id)
             deps = self.node_dependencies.get(current_node_instance_id)
-            
             if not deps:
                 return
-            
-            # 递归收集上游节点的上游
             for upstream_node_instance_id in deps.get('upstream_nodes', []):
-                await dfs_collect(upstream_node_instance_id)
-                
-                # 如果上游节点有输出数据，收集它
-                if upstream_node_instance_id in self.execution_context['node_outputs']:
-                    output_data = self.execution_context['node_outputs'][upstream_node_instance_id]
-                    
-                    # 获取节点名称
-                    upstream_deps = self.node_dependencies.get(upstream_node_instance_id)
-                    if upstream_deps:
-                        upstream_node_id = upstream_deps.get('node_id')
-                        node_name = await self._get_node_name_by_id(upstream_node_id) if upstream_node_id else None
-                    else:
-                        node_name = None
-                    
-                    # 🆕 收集节点相关的附件
-                    node_attachments = await self._get_node_attachments(upstream_node_instance_id)
-                    logger.info(f"🌐 [全局收集调试] 节点 {upstream_node_instance_id} 收集到 {len(node_attachments)} 个附件")
-                    for i, att in enumerate(node_attachments):
-                        logger.debug(f"   全局附件 #{i+1}: {att.get('filename')} (类型: {att.get('association_type')})")
-
-                    # 使用节点实例ID作为唯一键，避免同名节点冲突
-                    unique_key = f"{str(upstream_node_instance_id)[:8]}_{node_name or 'unknown'}"
-                    all_upstream[unique_key] = {
-                        'node_instance_id': str(upstream_node_instance_id),
-                        'node_id': str(upstream_deps.get('node_id')) if upstream_deps else None,
-                        'node_name': node_name or f'节点实例_{str(upstream_node_instance_id)[:8]}',
-                        'output_data': output_data,
-                        'status': 'completed',
-                        'completed_at': self.execution_context.get('node_completion_times', {}).get(str(upstream_node_instance_id)),
-                        'execution_order': len(all_upstream) + 1,  # 按发现顺序编号
-                        'attachments': node_attachments  # 🆕 节点相关附件
-                    }
-                    logger.info(f"🌐 [全局收集调试] 存储到all_upstream[{unique_key}]的附件数量: {len(all_upstream[unique_key]['attachments'])}")
-                    logger.debug(f"🌐 [全局收集] 添加上游节点: {unique_key} -> 输出:{len(str(output_data))}字符, 附件:{len(node_attachments)}个")
+                dfs(upstream_node_instance_id)
+                if upstream_node_instance_id not in collected:
+                    collected.add(upstream_node_instance_id)
+                    ordered.append(upstream_node_instance_id)
+
+        dfs(node_instance_id)
+        self._upstream_closure[node_instance_id] = ordered
+        return ordered
+
+    async def _collect_all_upstream_results(self, node_instance_id: uuid.UUID) -> Dict[str, Any]:
+        """收集指定节点的所有上游节点结果（全局上下文）
         
-        # 从当前节点开始收集所有上游
-        await dfs_collect(node_instance_id)
+        按记忆化的传递上游顺序收集从工作流开始到当前节点的所有已完成节点的输出数据和附件；
+        节点名称与已完成节点的附件来自上下文缓存，已收集过的上游不再访问数据库
+        """
+        all_upstream = {}
+        node_outputs = self.execution_context['node_outputs']
+
+        for upstream_node_instance_id in self._get_upstream_closure(node_instance_id):
+            # 如果上游节点有输出数据，收集它
+            if upstream_node_instance_id not in node_outputs:
+                continue
+            output_data = node_outputs[upstream_node_instance_id]
+
+            # 获取节点名称
+            upstream_deps = self.node_dependencies.get(upstream_node_instance_id)
+            upstream_node_id = upstream_deps.get('node_id') if upstream_deps else None
+            node_name = await self._get_node_name_by_id(upstream_node_id) if upstream_node_id else None
+
+            # 🆕 收集节点相关的附件
+            node_attachments = await self._get_node_attachments(upstream_node_instance_id)
+
+            # 使用节点实例ID作为唯一键，避免同名节点冲突
+            unique_key = f"{str(upstream_node_instance_id)[:8]}_{node_name or 'unknown'}"
+            all_upstream[unique_key] = {
+                'node_instance_id': str(upstream_node_instance_id),
+                'node_id': str(upstream_node_id) if upstream_deps else None,
+                'node_name': node_name or f'节点实例_{str(upstream_node_instance_id)[:8]}',
+                'output_data': output_data,
+                'status': 'completed',
+                'completed_at': self.execution_context.get('node_completion_times', {}).get(str(upstream_node_instance_id)),
+                'execution_order': len(all_upstream) + 1,  # 按发现顺序编号
+                'attachments': node_attachments  # 🆕 节点相关附件
+            }
+            logger.debug(f"🌐 [全局收集] 添加上游节点: {unique_key} -> 输出:{len(str(output_data))}字符, 附件:{len(node_attachments)}个")
         
         logger.debug(f"🌐 [全局收集完成] 为节点 {node_instance_id} 收集了 {len(all_upstream)} 个全局上游节点")
         return all_upstream
 
     async def _get_node_attachments(self, node_instance_id: uuid.UUID) -> List[Dict[str, Any]]:
-        """获取节点实例相关的所有附件（包括节点绑定附件和任务提交附件）"""
+        """获取节点实例相关的所有附件（已完成节点按节点实例缓存）"""
+        cached = self._node_attachment_cache.get(node_instance_id)
+        if cached is not None:
+            return list(cached)
+
+        attachments, complete = await self._load_node_attachments(node_instance_id)
+        if complete and self.node_states.get(node_instance_id) == 'COMPLETED':
+            self._node_attachment_cache[node_instance_id] = attachments
+        return list(attachments)
+
+    async def _load_node_attachments(self, node_instance_id: uuid.UUID) -> Tuple[List[Dict[str, Any]], bool]:
+        """获取节点实例相关的所有附件（包括节点绑定附件和任务提交附件）
+
+        Returns:
+            (附件列表, 是否全部加载成功)
+        """
+        complete = True
         try:
             attachments = []
             logger.info(f"🔗 [节点附件收集] 开始为节点 {node_instance_id} 收集所有附件")
@@ -1017,6 +1187,7 @@ class WorkflowExecutionContext:
                     })
                     logger.debug(f"   - 节点绑定附件 #{i+1}: {file_info['original_filename']}")
             except Exception as e:
+                complete = False
                 logger.warning(f"获取节点 {node_instance_id} 绑定附件失败: {e}")
 
             # 🆕 获取该节点执行的任务提交的附件
@@ -1050,22 +1221,29 @@ class WorkflowExecutionContext:
                             })
                             logger.debug(f"   - 任务提交附件 #{file_idx+1}: {file_info['original_filename']} (来自任务: {task.get('task_title', '未知任务')})")
             except Exception as e:
+                complete = False
                 logger.warning(f"获取节点 {node_instance_id} 任务附件失败: {e}")
                 import traceback
                 logger.warning(f"详细错误: {traceback.format_exc()}")
 
             logger.info(f"🔗 [节点附件收集] 节点 {node_instance_id} 共收集到 {len(attachments)} 个附件")
-            return attachments
+            return attachments, complete
 
         except Exception as e:
             logger.error(f"获取节点附件失败: {e}")
-            return []
+            return [], False
 
     def cleanup(self):
         """清理上下文资源"""
         logger.info(f"🧹 清理工作流上下文: {self.workflow_instance_id}")
         self.execution_context.clear()
         self.node_dependencies.clear()
+        self._downstream_index.clear()
+        self._instance_by_node_id.clear()
+        self._node_names.clear()
+        self._node_attachment_cache.clear()
+        self._task_attachment_cache.clear()
+        self._upstream_closure.clear()
         self.node_states.clear()
         self.pending_triggers.clear()
         self.completion_callbacks.clear()
@@ -1096,6 +1274,7 @@ class WorkflowExecutionContext:
             self.execution_context['execution_paths'][path_id] = new_path
             self.execution_context['active_paths'].add(path_id)
             self.execution_context['node_outputs_by_path'][path_id] = {}
+            self.mark_dirty()
 
             return path_id
 
@@ -1142,6 +1321,8 @@ class WorkflowExecutionContext:
             else:
                 path.visited_nodes.add(node_instance_id)
 
+            self.mark_dirty()
+
             logger.info(f"📝 记录节点执行: {execution_id}")
             return record
 
@@ -1183,6 +1364,7 @@ class WorkflowExecutionContext:
             main_path_id = f"main_{self.workflow_instance_id}"
             if path_id == main_path_id:
                 self.execution_context['node_outputs'][node_instance_id] = output_data
+            self.mark_dirty()
 
             logger.info(f"✅ 完成节点执行: {latest_record.execution_id} (状态: {status})")
             return True
@@ -1252,10 +1434,9 @@ class WorkflowExecutionContext:
         async with self._context_lock:
             logger.info(f"🔍 [智能触发] 检查完成节点 {completed_node_instance_id} 的下游依赖...")
 
-            # 🆕 添加详细的调试信息
-            logger.info(f"🔍 [智能触发] 当前所有节点依赖关系:")
-            for node_id, deps in self.node_dependencies.items():
-                logger.info(f"    节点 {node_id}: 上游={deps['upstream_nodes']}, 状态={self.node_states.get(node_id, 'UNKNOWN')}")
+            for node_id in self._downstream_index.get(str(completed_node_instance_id), ()):
+                logger.debug(f"    直接下游 {node_id}: 剩余上游={self.node_dependencies[node_id].get('remaining_upstream')}, "
+                             f"状态={self.node_states.get(node_id, 'UNKNOWN')}")
 
             # 🔧 改进的触发逻辑：通过条件边评估而不是依赖计数
             triggered_nodes = await self._trigger_via_conditional_edges(completed_node_instance_id)
@@ -1281,8 +1462,7 @@ class WorkflowExecutionContext:
                 return []
 
             # 获取该节点的下游连接
-            from ..services.execution_service import ExecutionEngine
-            execution_engine = ExecutionEngine()
+            from ..services.execution_service import execution_engine
             connections = await execution_engine._get_next_nodes(completed_node_id)
 
             # 🔧 首先检查用户是否选择了特定的下游节点
@@ -1449,10 +1629,7 @@ class WorkflowExecutionContext:
 
     async def _find_node_instance_by_node_id(self, node_id: uuid.UUID) -> Optional[uuid.UUID]:
         """根据node_id查找对应的node_instance_id"""
-        for node_instance_id, deps in self.node_dependencies.items():
-            if deps.get('node_id') == node_id:
-                return node_instance_id
-        return None
+        return self._instance_by_node_id.get(str(node_id))
 
     async def _reset_completed_node_to_pending(self, node_instance_id: uuid.UUID):
         """重置已完成节点及其所有下游节点状态为pending，使用统一工作流执行逻辑"""
@@ -1488,6 +1665,13 @@ class WorkflowExecutionContext:
                 # 🔧 关键修复：清除节点的输出数据，允许重新生成
                 self.execution_context.get('node_outputs', {}).pop(node_id, None)
 
+                # 同步反向依赖：下游不再视该节点为已完成上游，节点自身需重新满足依赖
+                self._record_upstream_reset(node_id)
+                if node_id in self.node_dependencies:
+                    self.node_dependencies[node_id]['ready_to_execute'] = False
+                self._record_delta('reset', node_id)
+                self._forget_node_attachments(node_id)
+
                 logger.info(f"🔄 [状态重置] 节点 {node_id} 状态已重置为 pending")
 
             # 🔧 软删除相关的已完成任务，让系统重新创建新任务
@@ -1519,27 +1703,20 @@ class WorkflowExecutionContext:
             raise  # 重新抛出异常以便调用者处理
 
     async def _collect_downstream_nodes(self, start_node_id: uuid.UUID) -> List[uuid.UUID]:
-        """递归收集指定节点的所有下游节点（包括自己）"""
+        """收集指定节点的所有下游节点（包括自己），沿反向依赖索引广度优先遍历"""
         try:
             nodes_to_reset = [start_node_id]  # 包含起始节点自己
-            visited = set()
+            visited = {str(start_node_id)}
+            queue = deque([start_node_id])
 
-            async def collect_recursive(node_id: uuid.UUID):
-                if node_id in visited:
-                    return
-                visited.add(node_id)
-
-                # 查找该节点的所有下游节点
-                for downstream_node_id, deps in self.node_dependencies.items():
-                    upstream_nodes = deps.get('upstream_nodes', [])
-                    if node_id in upstream_nodes:
-                        # 这是一个下游节点
-                        if downstream_node_id not in nodes_to_reset:
-                            nodes_to_reset.append(downstream_node_id)
-                        await collect_recursive(downstream_node_id)
-
-            # 从起始节点开始递归收集
-            await collect_recursive(start_node_id)
+            while queue:
+                node_id = queue.popleft()
+                for downstream_node_id in self._downstream_index.get(str(node_id), ()):
+                    if str(downstream_node_id) in visited:
+                        continue
+                    visited.add(str(downstream_node_id))
+                    nodes_to_reset.append(downstream_node_id)
+                    queue.append(downstream_node_id)
 
             return nodes_to_reset
 
@@ -1572,8 +1749,7 @@ class WorkflowExecutionContext:
             node_id = node_instance['node_id']
 
             # 获取节点的下游连接（包含条件配置）
-            from ..services.execution_service import ExecutionEngine
-            execution_engine = ExecutionEngine()
+            from ..services.execution_service import execution_engine
             connections = await execution_engine._get_next_nodes(node_id)
 
             if not connections:
@@ -1594,6 +1770,7 @@ class WorkflowExecutionContext:
                         if activated_target not in self.pending_triggers:
                             self.node_dependencies[activated_target]['ready_to_execute'] = True
                             self.pending_triggers.add(activated_target)
+                            self._record_delta('triggered', activated_target)
                             triggered_nodes.append(activated_target)
                             logger.info(f"🔄 直接触发回环节点实例: {activated_target}")
                         else:
@@ -1623,11 +1800,7 @@ class WorkflowExecutionContext:
             return
 
         # 查找对应的节点实例
-        downstream_node_instance_id = None
-        for node_instance_id, deps in self.node_dependencies.items():
-            if deps.get('node_id') == to_node_id:
-                downstream_node_instance_id = node_instance_id
-                break
+        downstream_node_instance_id = self._instance_by_node_id.get(str(to_node_id))
 
         if not downstream_node_instance_id:
             logger.warning(f"未找到节点 {to_node_id} 的实例")
@@ -1644,6 +1817,7 @@ class WorkflowExecutionContext:
         # 标记上游节点完成
         if completed_node_instance_id not in deps['completed_upstream']:
             deps['completed_upstream'].add(completed_node_instance_id)
+            deps['remaining_upstream'] = len(deps['upstream_nodes']) - len(deps['completed_upstream'])
 
         # 检查所有上游依赖是否满足
         total_upstream = len(deps['upstream_nodes'])
@@ -1653,6 +1827,7 @@ class WorkflowExecutionContext:
             if downstream_node_instance_id not in self.pending_triggers:
                 deps['ready_to_execute'] = True
                 self.pending_triggers.add(downstream_node_instance_id)
+                self._record_delta('triggered', downstream_node_instance_id)
                 triggered_nodes.append(downstream_node_instance_id)
 
                 logger.info(f"🚀 条件边触发下游节点: {downstream_node_instance_id}")
@@ -1788,8 +1963,7 @@ class WorkflowExecutionContext:
     async def _get_original_upstream_instances(self, node_id: uuid.UUID) -> List[uuid.UUID]:
         """获取节点的原始上游节点实例（回退方法）"""
         try:
-            from ..services.execution_service import ExecutionEngine
-            execution_engine = ExecutionEngine()
+            from ..services.execution_service import execution_engine
             return await execution_engine._get_upstream_node_instances(node_id, self.workflow_instance_id)
         except Exception as e:
             logger.error(f"获取原始上游依赖失败: {e}")
@@ -1837,24 +2011,28 @@ class WorkflowExecutionContext:
         """
         try:
             # 找到这个node_base_id对应的实例
-            for node_instance_id, deps in self.node_dependencies.items():
-                # 检查是否是同一个node_base_id的实例
-                if str(deps.get('node_id')) == str(node_base_id):
-                    # 重置状态到PENDING，允许重新执行
-                    self.node_states[node_instance_id] = 'PENDING'
+            node_instance_id = self._instance_by_node_id.get(str(node_base_id))
+            deps = self.node_dependencies.get(node_instance_id) if node_instance_id else None
+            if deps:
+                # 重置状态到PENDING，允许重新执行
+                self.node_states[node_instance_id] = 'PENDING'
 
-                    # 从完成集合中移除（如果存在）
-                    self.execution_context.get('completed_nodes', set()).discard(node_instance_id)
+                # 从完成集合中移除（如果存在）
+                self.execution_context.get('completed_nodes', set()).discard(node_instance_id)
 
-                    # 重置依赖满足状态
-                    deps['ready_to_execute'] = False
-                    deps['completed_upstream'] = set()
+                # 重置依赖满足状态
+                deps['ready_to_execute'] = False
+                deps['completed_upstream'] = set()
+                deps['remaining_upstream'] = len(deps['upstream_nodes'])
+                self._record_upstream_reset(node_instance_id)
+                self._record_delta('reset', node_instance_id)
+                self._forget_node_attachments(node_instance_id)
 
-                    # 增加循环计数
-                    path.loop_count[node_base_id] = path.loop_count.get(node_base_id, 0) + 1
+                # 增加循环计数
+                path.loop_count[node_base_id] = path.loop_count.get(node_base_id, 0) + 1
+                self.mark_dirty()
 
-                    logger.info(f"🔄 重置节点状态用于回环: {node_instance_id} (第{path.loop_count[node_base_id]}次)")
-                    break
+                logger.info(f"🔄 重置节点状态用于回环: {node_instance_id} (第{path.loop_count[node_base_id]}次)")
 
         except Exception as e:
             logger.error(f"❌ 重置节点状态失败: {e}")
@@ -1927,6 +2105,8 @@ class WorkflowExecutionContext:
                 path.status = "BRANCHED"
                 self.execution_context['active_paths'].discard(current_path_id)
 
+            self.mark_dirty()
+
             logger.info(f"🔀 用户路径选择处理完成: {len(created_paths)} 个路径")
             return created_paths
 
@@ -2025,6 +2205,12 @@ class WorkflowExecutionContext:
         logger.info(f"🧹 清理工作流上下文: {self.workflow_instance_id}")
         self.execution_context.clear()
         self.node_dependencies.clear()
+        self._downstream_index.clear()
+        self._instance_by_node_id.clear()
+        self._node_names.clear()
+        self._node_attachment_cache.clear()
+        self._task_attachment_cache.clear()
+        self._upstream_closure.clear()
         self.node_states.clear()
         self.pending_triggers.clear()
 
@@ -2049,6 +2235,8 @@ class WorkflowExecutionContextManager:
         self._persistence_enabled = True
         self._auto_recovery_enabled = True
         self._auto_save_interval = 30  # 秒
+        self._snapshot_max_deltas = 200  # 自上次完整快照以来的增量数达到该值时压缩为完整快照
+        self._snapshot_max_age = 600  # 有变更时完整快照的最长间隔（秒）
         self._max_memory_contexts = 1000  # 最大内存中保存的上下文数
         self._context_ttl = 3600  # 上下文生存时间（秒）- 1小时
         self._health_check_interval = 300  # 健康检查间隔（秒）- 5分钟 (从1分钟增加到5分钟)
@@ -2059,20 +2247,38 @@ class WorkflowExecutionContextManager:
         self._task_started = False
         # 上下文恢复时间跟踪
         self._context_restored_at = {}  # workflow_id -> datetime
+        # 自动快照ID，更新快照时直接按主键写入
+        self._snapshot_ids: Dict[uuid.UUID, uuid.UUID] = {}
+        # 快照编码：binary（'3.0'紧凑二进制）或 json（'2.0'）
+        app_settings = get_settings().app
+        self._snapshot_format = app_settings.context_snapshot_format
+        self._snapshot_compression = resolve_compression(app_settings.context_snapshot_compression)
+        self._snapshot_encode_ms = LatencyHistogram()
+        self._snapshot_decode_ms = LatencyHistogram()
+        self._snapshot_bytes_written = 0
+        # workflow_id -> 最近一次快照的大小与编码耗时
+        self._snapshot_sizes: Dict[uuid.UUID, Dict[str, Any]] = {}
         # 统计信息
         self._stats = {
             'context_recoveries': 0,
             'context_losses': 0,
             'health_check_failures': 0,
-            'persistence_failures': 0
+            'persistence_failures': 0,
+            'contexts_persisted': 0,
+            'persist_skipped_clean': 0,
+            'deltas_written': 0,
+            'snapshots_written': 0,
+            'deltas_replayed': 0
         }
     
     async def _ensure_background_task(self):
         """确保后台持久化任务已启动"""
         if not self._task_started:
             try:
-                self._background_task = asyncio.create_task(self._background_persistence_task())
-                self._health_check_task = asyncio.create_task(self._background_health_check_task())
+                # 后台持久化使用background连接池，突发写入不挤占API请求连接
+                with use_db_pool(DB_POOL_BACKGROUND):
+                    self._background_task = asyncio.create_task(self._background_persistence_task())
+                    self._health_check_task = asyncio.create_task(self._background_health_check_task())
                 self._task_started = True
                 logger.info("🔄 启动后台上下文持久化任务")
                 logger.info("🏥 启动后台上下文健康检查任务")
@@ -2312,12 +2518,28 @@ class WorkflowExecutionContextManager:
                    for access_time in self._last_access.values()]
             stats['average_context_age_minutes'] = round(sum(ages) / len(ages), 2)
             stats['oldest_context_age_minutes'] = round(max(ages), 2)
+
+        snapshot_sizes = [size['stored_bytes'] for size in self._snapshot_sizes.values()]
+        stats['snapshot_codec'] = {
+            'format': self._snapshot_format,
+            'compression': self._snapshot_compression if self._snapshot_format == 'binary' else 'none',
+            'bytes_written': self._snapshot_bytes_written,
+            'average_snapshot_bytes': round(sum(snapshot_sizes) / len(snapshot_sizes)) if snapshot_sizes else 0,
+            'largest_snapshot_bytes': max(snapshot_sizes, default=0),
+            'encode': self._snapshot_encode_ms.to_dict(),
+            'decode': self._snapshot_decode_ms.to_dict()
+        }
         
         return stats
     
     async def _background_persistence_task(self):
         """后台持久化任务"""
         logger.info("🔄 后台持久化任务开始运行")
+        try:
+            from ..repositories.instance.workflow_context_delta_repository import WorkflowContextDeltaRepository
+            await WorkflowContextDeltaRepository().ensure_table()
+        except Exception as e:
+            logger.warning(f"⚠️ 创建上下文增量日志表失败，将只写完整快照: {e}")
         while True:
             try:
                 await asyncio.sleep(self._auto_save_interval)
@@ -2343,6 +2565,9 @@ class WorkflowExecutionContextManager:
                 await self._health_check_task
             except asyncio.CancelledError:
                 pass
+
+        # 写出尚未持久化的变更
+        await self._persist_all_contexts()
                 
         logger.info("🛑 上下文管理器已关闭")
     
@@ -2361,28 +2586,103 @@ class WorkflowExecutionContextManager:
             except Exception as e:
                 logger.error(f"持久化上下文失败 {workflow_id}: {e}")
     
-    async def _persist_context_to_database(self, workflow_instance_id: uuid.UUID, context: WorkflowExecutionContext):
-        """将上下文持久化到数据库"""
-        try:
-            # 序列化上下文数据
+    async def _persist_context_to_database(self, workflow_instance_id: uuid.UUID, context: WorkflowExecutionContext,
+                                           force_snapshot: bool = False):
+        """将上下文持久化到数据库
+
+        版本无变化的上下文直接跳过；节点状态变迁追加到增量日志，
+        增量累积到一定数量/时间或有无法用增量表达的变更时写入完整快照并清理增量。
+        """
+        async with context._persist_lock:
+            if not context.is_dirty and not force_snapshot:
+                self._stats['persist_skipped_clean'] += 1
+                return
+
+            version = context.version
+            deltas = context.pending_deltas
+            context.pending_deltas = []
+            snapshot_due = (
+                force_snapshot
+                or context.needs_full_snapshot
+                or version - context.snapshot_version >= self._snapshot_max_deltas
+                or context.snapshot_written_at is None
+                or time.monotonic() - context.snapshot_written_at >= self._snapshot_max_age
+            )
+
+            try:
+                if snapshot_due:
+                    await self._write_full_snapshot(workflow_instance_id, context, version)
+                else:
+                    from ..repositories.instance.workflow_context_delta_repository import WorkflowContextDeltaRepository
+                    await WorkflowContextDeltaRepository().append_deltas(workflow_instance_id, deltas)
+                    self._stats['deltas_written'] += len(deltas)
+                context.persisted_version = version
+                self._stats['contexts_persisted'] += 1
+                logger.trace(f"✅ 上下文持久化完成: {workflow_instance_id} (版本 {version}, "
+                             f"{'完整快照' if snapshot_due else f'{len(deltas)} 条增量'})")
+
+            except Exception as e:
+                # 本轮增量未写入：下次改写完整快照，快照已包含这些变更
+                context.needs_full_snapshot = True
+                self._stats['persistence_failures'] += 1
+                logger.error(f"持久化上下文到数据库失败 {workflow_instance_id}: {e}")
+
+    async def _write_full_snapshot(self, workflow_instance_id: uuid.UUID, context: WorkflowExecutionContext,
+                                   version: int):
+        """写入完整快照（记录其包含的版本号）并清理已被覆盖的增量"""
+        # 编码上下文数据（与版本号在同一同步段内取得，保证快照与版本一致）
+        started = time.perf_counter()
+        if self._snapshot_format == 'binary':
+            # 直接编码内存对象：保留UUID与共享引用，节点输出只存一份
+            context_data = pack_context_snapshot({
+                'workflow_instance_id': str(workflow_instance_id),
+                'execution_context': context.execution_context,
+                'node_dependencies': context.node_dependencies,
+                'node_states': context.node_states,
+                'version': version,
+                'last_updated': datetime.utcnow().isoformat()
+            }, self._snapshot_compression)
+        else:
             context_data = {
                 'workflow_instance_id': str(workflow_instance_id),
                 'execution_context': _serialize_for_json(context.execution_context),
                 'node_dependencies': _serialize_for_json(context.node_dependencies),
                 'node_states': _serialize_for_json(context.node_states),
+                'version': version,
                 'last_updated': datetime.utcnow().isoformat()
             }
-            
-            # 保存到数据库（使用workflow_instance表的context_snapshot字段）
-            from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
-            workflow_repo = WorkflowInstanceRepository()
-            
-            await workflow_repo.update_context_snapshot(workflow_instance_id, context_data)
-            logger.trace(f"✅ 上下文持久化完成: {workflow_instance_id}")
-            
-        except Exception as e:
-            logger.error(f"持久化上下文到数据库失败 {workflow_instance_id}: {e}")
-    
+        serialized = json.dumps(context_data, default=str)
+        encode_ms = (time.perf_counter() - started) * 1000
+        context.needs_full_snapshot = False
+
+        # 保存到数据库（使用workflow_context_snapshot表的自动快照）
+        from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
+        from ..repositories.instance.workflow_context_delta_repository import WorkflowContextDeltaRepository
+        workflow_repo = WorkflowInstanceRepository()
+
+        snapshot_id = await workflow_repo.update_context_snapshot(
+            workflow_instance_id, serialized, self._snapshot_ids.get(workflow_instance_id)
+        )
+        if not snapshot_id:
+            raise RuntimeError("上下文快照写入失败")
+        self._snapshot_ids[workflow_instance_id] = snapshot_id
+
+        # 快照之后的变更仍在内存中（pending_deltas），库中的增量全部可以删除，
+        # 包括上一次进程遗留的、版本号与当前上下文不连续的增量
+        await WorkflowContextDeltaRepository().delete_deltas(workflow_instance_id)
+
+        context.snapshot_version = version
+        context.snapshot_written_at = time.monotonic()
+        self._stats['snapshots_written'] += 1
+        self._snapshot_encode_ms.observe(encode_ms)
+        self._snapshot_bytes_written += len(serialized)
+        self._snapshot_sizes[workflow_instance_id] = {
+            'format': self._snapshot_format,
+            'stored_bytes': len(serialized),
+            'encode_ms': round(encode_ms, 3),
+            'version': version
+        }
+
     async def _ensure_memory_limit(self):
         """确保内存中的上下文数量不超过限制"""
         if len(self.contexts) <= self._max_memory_contexts:
@@ -2444,6 +2744,9 @@ class WorkflowExecutionContextManager:
                 # 清理恢复时间跟踪
                 if workflow_instance_id in self._context_restored_at:
                     del self._context_restored_at[workflow_instance_id]
+
+                self._snapshot_ids.pop(workflow_instance_id, None)
+                self._snapshot_sizes.pop(workflow_instance_id, None)
                     
                 # 清理健康状态跟踪
                 if workflow_instance_id in self._context_health:
@@ -2788,10 +3091,10 @@ class WorkflowExecutionContextManager:
     async def _restore_from_snapshot(self, workflow_instance_id: uuid.UUID, snapshot: Dict[str, Any]) -> Optional[WorkflowExecutionContext]:
         """从快照恢复上下文"""
         try:
-            context_data = snapshot.get('context_data', {})
-            if isinstance(context_data, str):
-                import json
-                context_data = json.loads(context_data)
+            # 兼容 '2.0' JSON 快照与 '3.0' 二进制快照
+            started = time.perf_counter()
+            context_data = unpack_context_snapshot(snapshot.get('context_data')) or {}
+            self._snapshot_decode_ms.observe((time.perf_counter() - started) * 1000)
             
             # 创建新的上下文实例
             context = WorkflowExecutionContext(workflow_instance_id)
@@ -2816,6 +3119,23 @@ class WorkflowExecutionContextManager:
                 for node_id_str, state in node_states.items():
                     node_id = uuid.UUID(node_id_str)
                     context.node_states[node_id] = state
+
+            # 在快照之上重放快照版本之后的增量
+            snapshot_version = int(context_data.get('version') or 0)
+            from ..repositories.instance.workflow_context_delta_repository import WorkflowContextDeltaRepository
+            deltas = await WorkflowContextDeltaRepository().get_deltas_after(workflow_instance_id, snapshot_version)
+            for delta in deltas:
+                context.apply_delta(delta['event_type'], uuid.UUID(delta['node_instance_id']), delta.get('payload'))
+            context.version = deltas[-1]['version'] if deltas else snapshot_version
+            context.persisted_version = context.version
+            context.snapshot_version = snapshot_version
+            context.needs_full_snapshot = False
+            context.snapshot_written_at = time.monotonic()
+            if snapshot.get('snapshot_type') == 'auto' and snapshot.get('snapshot_id'):
+                self._snapshot_ids[workflow_instance_id] = snapshot['snapshot_id']
+            if deltas:
+                self._stats['deltas_replayed'] += len(deltas)
+                logger.info(f"📜 [快照恢复] 重放 {len(deltas)} 条上下文增量 (快照版本 {snapshot_version} -> {context.version})")
             
             # 🔧 重要修复：从数据库重建节点依赖关系，而不是从快照恢复
             # 这确保依赖关系是最新的，即使快照数据过期
@@ -2951,26 +3271,13 @@ class WorkflowExecutionContextManager:
             return None
     
     async def _persist_context_snapshot(self, workflow_instance_id: uuid.UUID, context: WorkflowExecutionContext):
-        """持久化上下文快照到数据库"""
+        """持久化上下文快照到数据库（重建后立即写入完整快照，替代旧快照与遗留增量）"""
         try:
             if not self._persistence_enabled:
                 return
                 
             logger.debug(f"💾 持久化上下文快照: {workflow_instance_id}")
-            
-            # 构造快照数据
-            snapshot_data = {
-                'workflow_instance_id': str(workflow_instance_id),
-                'execution_context': _serialize_for_json(context.execution_context),
-                'node_states': {str(k): v for k, v in context.node_states.items()},
-                'completed_nodes_count': len(context.execution_context.get('completed_nodes', set())),
-                'snapshot_time': datetime.utcnow().isoformat(),
-                'context_version': '2.0'  # 版本标识
-            }
-            
-            # 这里可以存储到Redis或数据库表中
-            # 暂时使用日志记录（生产环境中可替换为实际存储）
-            logger.debug(f"📊 上下文快照数据: {len(str(snapshot_data))} 字符")
+            await self._persist_context_to_database(workflow_instance_id, context, force_snapshot=True)
             
         except Exception as e:
             logger.error(f"持久化上下文快照失败: {e}")
@@ -3017,6 +3324,7 @@ class WorkflowExecutionContextManager:
                 node_states = snapshot.get('node_states', {})
                 for node_id_str, state in node_states.items():
                     context.node_states[uuid.UUID(node_id_str)] = state
+                context.mark_dirty()
                 
                 # logger.info(f"✅ 从快照恢复上下文成功: {workflow_instance_id}")
                 
@@ -3053,7 +3361,14 @@ class WorkflowExecutionContextManager:
                 'db_completed_nodes': db_completed_count,
                 'total_nodes': len(db_nodes),
                 'context_size': len(context.node_dependencies),
-                'last_activity': context.execution_context.get('last_snapshot_time')
+                'last_activity': context.execution_context.get('last_snapshot_time'),
+                'persistence': {
+                    'version': context.version,
+                    'persisted_version': context.persisted_version,
+                    'snapshot_version': context.snapshot_version,
+                    'pending_deltas': len(context.pending_deltas),
+                    'snapshot': self._snapshot_sizes.get(workflow_instance_id)
+                }
             }
             
         except Exception as e:
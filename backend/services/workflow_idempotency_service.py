@@ -0,0 +1,235 @@
+"""
+工作流执行请求去重（Idempotency-Key）
+Workflow Execution Request Deduplication
+
+客户端为一次"执行工作流"操作携带 Idempotency-Key，连点、网关重试产生的重复请求：
+  - 同进程并发重复：singleflight，等待同一个进行中的启动并得到相同响应，只有首个请求访问数据库
+  - 同进程后续重复：在TTL内直接返回缓存的首次响应
+  - 其他进程的重复：经 workflow_execution_idempotency 表占用幂等键，等待首个请求完成后返回其响应
+
+同一个键携带不同请求体视为冲突（409）。首次请求失败时释放键，允许用同一键重试。
+幂等键表不可用时降级为仅进程内去重。
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from loguru import logger
+
+from ..config.settings import get_settings
+from ..repositories.instance.workflow_idempotency_repository import WorkflowIdempotencyRepository
+from ..utils.exceptions import ConflictError
+
+# 等待其他进程完成首次请求时的轮询间隔（秒）
+DURABLE_POLL_INTERVAL = 0.2
+
+# 清理过期幂等键的最小间隔（秒）
+PURGE_INTERVAL = 600
+
+
+def hash_request(payload: Any) -> str:
+    """请求体指纹：键排序后的JSON的SHA-256"""
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _instance_id(response: Dict[str, Any]) -> Optional[Any]:
+    data = response.get("data") if isinstance(response, dict) else None
+    if not isinstance(data, dict):
+        return None
+    return data.get("workflow_instance_id") or data.get("instance_id")
+
+
+class WorkflowIdempotencyService:
+    """按 (用户, Idempotency-Key) 合并重复的工作流执行请求"""
+
+    def __init__(self, ttl_seconds: int = 86400, max_entries: int = 10000, wait_timeout: float = 30,
+                 claim_lease_seconds: int = 120, durable: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.wait_timeout = wait_timeout
+        self.claim_lease_seconds = claim_lease_seconds
+        self.durable = durable
+        self.repo = WorkflowIdempotencyRepository()
+
+        # (user_id, key) -> (request_hash, 进行中的启动)
+        self._inflight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+        # (user_id, key) -> (过期时刻, request_hash, 响应)
+        self._results: "OrderedDict[Tuple[str, str], Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._table_ready = False
+        self._last_purge = time.monotonic()
+
+        self._requests = 0
+        self._executions = 0
+        self._local_hits = 0
+        self._coalesced = 0
+        self._durable_hits = 0
+        self._conflicts = 0
+        self._durable_errors = 0
+
+    async def execute(self, user_id: Any, idempotency_key: str, request_hash: str,
+                      start: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """执行或复用同一幂等键的工作流启动，返回首次请求的响应"""
+        key = (str(user_id), idempotency_key)
+        self._requests += 1
+
+        cached = self._lookup(key)
+        if cached is not None:
+            self._check_hash(cached[1], request_hash)
+            self._local_hits += 1
+            return cached[2]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._check_hash(inflight[0], request_hash)
+            self._coalesced += 1
+            return await asyncio.shield(inflight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request_hash, future)
+        try:
+            response = await self._execute_once(key, request_hash, start)
+            self._store(key, request_hash, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._maybe_purge()
+
+    async def _execute_once(self, key: Tuple[str, str], request_hash: str,
+                            start: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """本进程的首个请求：占用幂等键后启动；键被其他进程占用时等待其响应"""
+        while True:
+            claimed = await self._claim(key, request_hash)
+            if claimed is not False:
+                break
+            row = await self._wait_for_durable(key, request_hash)
+            if row is not None:
+                self._durable_hits += 1
+                return row['response']
+            # 持有者失败并释放了键，重新占用
+
+        try:
+            self._executions += 1
+            response = await start()
+        except Exception:
+            if claimed:
+                try:
+                    await self.repo.release(*key)
+                except Exception as e:
+                    logger.warning(f"⚠️ 释放幂等键失败 {key[1]}: {e}")
+            raise
+
+        if claimed:
+            try:
+                await self.repo.complete(*key, response, _instance_id(response), self.ttl_seconds)
+            except Exception as e:
+                self._durable_errors += 1
+                logger.warning(f"⚠️ 写入幂等键响应失败 {key[1]}: {e}")
+        return response
+
+    async def _claim(self, key: Tuple[str, str], request_hash: str) -> Optional[bool]:
+        """占用幂等键；返回None表示幂等键表不可用（仅进程内去重）"""
+        if not self.durable:
+            return None
+        try:
+            if not self._table_ready:
+                await self.repo.ensure_table()
+                self._table_ready = True
+            return await self.repo.claim(*key, request_hash, self.claim_lease_seconds)
+        except Exception as e:
+            self._durable_errors += 1
+            logger.warning(f"⚠️ 幂等键表不可用，仅进程内去重: {e}")
+            return None
+
+    async def _wait_for_durable(self, key: Tuple[str, str], request_hash: str) -> Optional[Dict[str, Any]]:
+        """等待其他进程的首次请求完成；键被释放（首次请求失败）时返回None"""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            row = await self.repo.get(*key)
+            if row is None:
+                return None
+            self._check_hash(row['request_hash'], request_hash)
+            if row['status'] == 'completed':
+                return row
+            if time.monotonic() >= deadline:
+                raise ConflictError("Idempotency-Key", "相同 Idempotency-Key 的执行请求仍在处理中，请稍后重试")
+            await asyncio.sleep(DURABLE_POLL_INTERVAL)
+
+    def _check_hash(self, stored_hash: str, request_hash: str) -> None:
+        if stored_hash != request_hash:
+            self._conflicts += 1
+            raise ConflictError("Idempotency-Key", "Idempotency-Key 已用于不同的执行请求")
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        cached = self._results.get(key)
+        if cached is None:
+            return None
+        if time.monotonic() > cached[0]:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return cached
+
+    def _store(self, key: Tuple[str, str], request_hash: str, response: Dict[str, Any]) -> None:
+        self._results[key] = (time.monotonic() + self.ttl_seconds, request_hash, response)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _maybe_purge(self) -> None:
+        """定期在后台清理过期的幂等键"""
+        if not self._table_ready or time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+
+        async def purge():
+            try:
+                await self.repo.purge_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ 清理过期幂等键失败: {e}")
+
+        asyncio.create_task(purge())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """去重统计"""
+        return {
+            "requests": self._requests,
+            "executions": self._executions,
+            "local_hits": self._local_hits,
+            "coalesced": self._coalesced,
+            "durable_hits": self._durable_hits,
+            "conflicts": self._conflicts,
+            "durable_errors": self._durable_errors,
+            "inflight": len(self._inflight),
+            "cached_responses": len(self._results),
+            "durable": self.durable,
+            "durable_table_ready": self._table_ready
+        }
+
+
+_app_settings = get_settings().app
+workflow_idempotency_service = WorkflowIdempotencyService(
+    ttl_seconds=_app_settings.idempotency_ttl_seconds,
+    max_entries=_app_settings.idempotency_cache_size,
+    wait_timeout=_app_settings.idempotency_wait_timeout,
+    claim_lease_seconds=_app_settings.idempotency_claim_lease_seconds,
+    durable=_app_settings.idempotency_durable
+)
+
+
+def get_workflow_idempotency_service() -> WorkflowIdempotencyService:
+    """获取全局工作流执行去重服务"""
+    return workflow_idempotency_service
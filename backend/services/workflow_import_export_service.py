@@ -14,11 +14,11 @@ from ..models.workflow_import_export import (
     ExportNodeType, ImportPreview, ImportResult
 )
 from ..models.workflow import WorkflowCreate
-from ..models.node import NodeCreate, NodeType, NodeConnectionCreate
+from ..models.node import NodeCreate, NodeType, ConnectionType
 from ..services.workflow_service import WorkflowService
 from ..services.node_service import NodeService
 from ..repositories.workflow.workflow_repository import WorkflowRepository
-from ..repositories.node.node_repository import NodeRepository
+from ..repositories.node.node_repository import NodeRepository, NodeConnectionRepository
 from ..utils.exceptions import ValidationError, ConflictError
 
 
@@ -30,6 +30,7 @@ class WorkflowImportExportService:
         self.node_service = NodeService()
         self.workflow_repository = WorkflowRepository()
         self.node_repository = NodeRepository()
+        self.connection_repository = NodeConnectionRepository()
     
     async def export_workflow(self, workflow_base_id: uuid.UUID, user_id: uuid.UUID) -> WorkflowExport:
         """
@@ -290,18 +291,9 @@ class WorkflowImportExportService:
             
             logger.info(f"工作流创建成功: {workflow_base_id}")
             
-            # 创建节点
-            created_nodes = {}  # name -> node_base_id
-            nodes_created = 0
-            
-            # 检查重复节点名称
-            node_names = [node_data.name for node_data in import_data.nodes]
-            duplicate_names = [name for name in set(node_names) if node_names.count(name) > 1]
-            if duplicate_names:
-                logger.warning(f"发现重复的节点名称: {duplicate_names}")
-            
-            for node_data in import_data.nodes:
-                node_create = NodeCreate(
+            # 批量创建节点和连接（多行INSERT），整个导入在一个事务内完成，失败时不留下半个工作流
+            node_creates = [
+                NodeCreate(
                     name=node_data.name,
                     type=NodeType(node_data.type.value),
                     task_description=node_data.task_description,
@@ -310,92 +302,83 @@ class WorkflowImportExportService:
                     workflow_base_id=workflow_base_id,
                     creator_id=user_id
                 )
-                
-                created_node = await self.node_service.create_node(node_create, user_id)
-                created_nodes[node_data.name] = created_node.node_base_id
-                nodes_created += 1
-                
-                logger.debug(f"节点创建成功: {node_data.name} -> {created_node.node_base_id}")
-                
-            logger.info(f"创建了 {nodes_created} 个节点，节点映射: {created_nodes}")
+                for node_data in import_data.nodes
+            ]
+            
+            # 检查重复节点名称
+            node_names = [node_data.name for node_data in import_data.nodes]
+            duplicate_names = [name for name in set(node_names) if node_names.count(name) > 1]
+            if duplicate_names:
+                logger.warning(f"发现重复的节点名称: {duplicate_names}")
             
-            # 创建连接
-            connections_created = 0
             connection_errors = []
-            for i, conn_data in enumerate(import_data.connections, 1):
-                try:
-                    from_node_id = created_nodes.get(conn_data.from_node_name)
-                    to_node_id = created_nodes.get(conn_data.to_node_name)
+            try:
+                async with self.node_repository.db.transaction() as conn:
+                    created_node_records = await self.node_repository.create_nodes(
+                        created_workflow.workflow_id, node_creates, conn=conn
+                    )
                     
-                    logger.info(f"处理连接 {i}/{len(import_data.connections)}: {conn_data.from_node_name} -> {conn_data.to_node_name}")
-                    logger.info(f"节点映射结果: {conn_data.from_node_name}({from_node_id}) -> {conn_data.to_node_name}({to_node_id})")
+                    created_nodes = {record['name']: record['node_id'] for record in created_node_records}  # name -> node_id
+                    nodes_created = len(created_node_records)
+                    logger.info(f"创建了 {nodes_created} 个节点")
                     
-                    if not from_node_id:
-                        error_msg = f"连接 {i}: 源节点 '{conn_data.from_node_name}' 不存在于创建的节点中"
-                        logger.error(error_msg)
-                        connection_errors.append(error_msg)
-                        continue
+                    # 校验连接并批量创建
+                    connection_rows = []
+                    connection_keys = set()
+                    duplicate_connections = 0
+                    for i, conn_data in enumerate(import_data.connections, 1):
+                        from_node_id = created_nodes.get(conn_data.from_node_name)
+                        to_node_id = created_nodes.get(conn_data.to_node_name)
                         
-                    if not to_node_id:
-                        error_msg = f"连接 {i}: 目标节点 '{conn_data.to_node_name}' 不存在于创建的节点中"
-                        logger.error(error_msg)
-                        connection_errors.append(error_msg)
-                        continue
-                    
-                    # 检查是否为自连接
-                    if from_node_id == to_node_id:
-                        warning_msg = f"连接 {i}: 跳过自连接 - 节点 '{conn_data.from_node_name}' 尝试连接到自己"
-                        logger.warning(warning_msg)
-                        continue
-                    
-                    # 准备连接的条件配置
-                    condition_config = None
-                    if conn_data.condition_config:
-                        # 确保condition_config是有效的JSON
+                        if not from_node_id:
+                            error_msg = f"连接 {i}: 源节点 '{conn_data.from_node_name}' 不存在于创建的节点中"
+                            logger.error(error_msg)
+                            connection_errors.append(error_msg)
+                            continue
+                            
+                        if not to_node_id:
+                            error_msg = f"连接 {i}: 目标节点 '{conn_data.to_node_name}' 不存在于创建的节点中"
+                            logger.error(error_msg)
+                            connection_errors.append(error_msg)
+                            continue
+                        
+                        # 检查是否为自连接
+                        if from_node_id == to_node_id:
+                            warning_msg = f"连接 {i}: 跳过自连接 - 节点 '{conn_data.from_node_name}' 尝试连接到自己"
+                            logger.warning(warning_msg)
+                            continue
+                        
+                        # 连接类型必须是受支持的ConnectionType（与逐条创建时的模型校验一致）
                         try:
-                            if isinstance(conn_data.condition_config, dict):
-                                import json
-                                condition_config = json.dumps(conn_data.condition_config)
-                            else:
-                                condition_config = str(conn_data.condition_config)
-                        except Exception as e:
-                            logger.warning(f"连接 {i}: 处理条件配置失败: {e}")
-                            condition_config = None
-                    
-                    # 创建NodeConnectionCreate对象，包含所有详细信息
-                    connection_create = NodeConnectionCreate(
-                        from_node_base_id=from_node_id,
-                        to_node_base_id=to_node_id,
-                        workflow_base_id=workflow_base_id,
-                        connection_type=conn_data.connection_type or 'normal'
-                    )
-                    
-                    logger.info(f"连接 {i}: 开始创建连接对象")
-                    
-                    # 创建连接
-                    created_connection = await self.node_service.create_node_connection(connection_create, user_id)
-                    
-                    if created_connection:
-                        logger.info(f"连接 {i}: 创建成功 - {conn_data.from_node_name} -> {conn_data.to_node_name}")
-                        connections_created += 1
+                            connection_type = ConnectionType(conn_data.connection_type or ConnectionType.NORMAL.value)
+                        except ValueError:
+                            error_msg = f"连接 {i}: 不支持的连接类型 '{conn_data.connection_type}'"
+                            logger.error(error_msg)
+                            connection_errors.append(error_msg)
+                            continue
                         
-                        # 如果有条件配置，尝试更新连接记录
-                        if condition_config:
-                            try:
-                                # 这里可以添加更新条件配置的逻辑
-                                logger.info(f"连接 {i}: 包含条件配置，已记录")
-                            except Exception as e:
-                                logger.warning(f"连接 {i}: 更新条件配置失败: {e}")
-                    else:
-                        error_msg = f"连接 {i}: 创建失败，create_node_connection返回空结果"
-                        logger.error(error_msg)
-                        connection_errors.append(error_msg)
+                        # 相同的连接只创建一次（与逐条创建时"连接已存在则返回现有连接"一致）
+                        if (from_node_id, to_node_id) in connection_keys:
+                            logger.info(f"连接 {i}: 连接已存在，跳过重复连接")
+                            duplicate_connections += 1
+                            continue
+                        connection_keys.add((from_node_id, to_node_id))
                         
-                except Exception as e:
-                    error_msg = f"连接 {i} ({conn_data.from_node_name} -> {conn_data.to_node_name}): 创建异常 - {str(e)}"
-                    logger.error(error_msg)
-                    connection_errors.append(error_msg)
-                    # 继续处理下一个连接，不要因为一个连接失败就停止整个导入
+                        connection_rows.append({
+                            "from_node_id": from_node_id,
+                            "to_node_id": to_node_id,
+                            "connection_type": connection_type.value,
+                            "condition_config": conn_data.condition_config
+                        })
+                    
+                    await self.connection_repository.create_connections(
+                        created_workflow.workflow_id, connection_rows, conn=conn
+                    )
+                    connections_created = len(connection_rows) + duplicate_connections
+            except Exception:
+                # 节点与连接已随事务回滚，再删除事务外创建的工作流记录
+                await self.workflow_repository.delete_workflow(workflow_base_id)
+                raise
             
             # 检查连接创建的完整性
             expected_connections = len(import_data.connections)
@@ -12,6 +12,7 @@ from loguru import logger
 from ..repositories.instance.workflow_instance_repository import WorkflowInstanceRepository
 from ..repositories.instance.node_instance_repository import NodeInstanceRepository
 from ..repositories.instance.task_instance_repository import TaskInstanceRepository
+from ..utils.db_pool import use_db_pool, DB_POOL_BACKGROUND
 from .workflow_execution_context import get_context_manager
 from .execution_service import execution_engine
 
@@ -54,7 +55,8 @@ class WorkflowMonitorService:
         logger.info(f"   - 最大重试: {self.max_recovery_attempts}次")
         
         self.is_running = True
-        self.monitor_task = asyncio.create_task(self._monitoring_loop())
+        with use_db_pool(DB_POOL_BACKGROUND):
+            self.monitor_task = asyncio.create_task(self._monitoring_loop())
         
     async def stop_monitoring(self):
         """停止监控服务"""
@@ -11,6 +11,7 @@ from ..models.workflow import WorkflowCreate, WorkflowUpdate, WorkflowResponse
 from ..repositories.workflow.workflow_repository import WorkflowRepository
 from ..utils.helpers import now_utc
 from ..utils.exceptions import ValidationError, ConflictError
+from .compiled_workflow import get_compiled_workflow_cache
 
 
 class WorkflowService:
@@ -174,6 +175,7 @@ class WorkflowService:
                 raise ValueError("更新工作流失败")
             
             logger.info(f"用户 {editor_user_id} 更新了工作流: {workflow_base_id}")
+            get_compiled_workflow_cache().invalidate(workflow_base_id=workflow_base_id)
             
             return self._format_workflow_response(updated_workflow)
             
@@ -212,6 +214,7 @@ class WorkflowService:
             success = deletion_result['deleted_workflow_base']
             if success:
                 logger.info(f"用户 {user_id} 级联删除了工作流: {workflow_base_id}")
+                get_compiled_workflow_cache().invalidate(workflow_base_id=workflow_base_id)
                 logger.info(f"删除统计: 实例{deletion_result['deleted_workflow_instances']}个, "
                            f"任务{deletion_result['deleted_tasks']}个, "
                            f"节点{deletion_result['deleted_nodes']}个")
@@ -0,0 +1,296 @@
+"""
+工作流实例状态投影
+Read-optimized Workflow Status Projection
+
+状态查询接口（GET /workflows/{instance_id}/status）是被轮询最频繁的接口。
+对本进程中正在执行的实例，在内存中维护一份状态投影：按状态的节点计数、运行中节点名称与进度，
+由节点实例/工作流实例仓储在写入状态后更新，状态查询直接读取投影。
+
+  - 首次查询时从数据库加载并驻留（只驻留本进程持有执行上下文的实例）；加载期间到达的状态变更在加载后重放
+  - 无法增量应用的写入（批量取消、原始SQL更新、新建的回环节点实例）使投影失效，下次查询重新加载
+  - 超过 resync_seconds 后重新加载一次，限制其他进程写入造成的陈旧
+  - 实例进入终态后保留 linger_seconds 供最后几次轮询读取，之后移出
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+import uuid
+
+from loguru import logger
+
+from ..config.settings import get_settings
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# 投影中保留的节点字段（不含节点输入/输出数据）
+NODE_FIELDS = ("node_instance_id", "node_name", "node_type", "status", "started_at",
+               "completed_at", "error_message", "retry_count")
+
+# 投影中保留的工作流实例字段
+INSTANCE_FIELDS = ("workflow_instance_name", "workflow_name", "status", "executor_id", "executor_username",
+                   "created_at", "updated_at", "input_data", "output_data", "error_message")
+
+
+def _key(value: Union[str, uuid.UUID, None]) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _status(value: Any) -> Optional[str]:
+    return str(getattr(value, "value", value)).lower() if value is not None else None
+
+
+class InstanceStatusProjection:
+    """单个工作流实例的状态投影"""
+
+    def __init__(self, workflow_instance_id: str, instance: Dict[str, Any], nodes: List[Dict[str, Any]]):
+        self.workflow_instance_id = workflow_instance_id
+        self.instance = {field: instance.get(field) for field in INSTANCE_FIELDS}
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+        # node_instance_id -> 节点名称，按进入运行状态的顺序
+        self.running: Dict[str, Any] = {}
+        self.end_nodes_completed = 0
+        self.loaded_at = time.monotonic()
+        self.terminal_at: Optional[float] = None
+        self.stale = False
+
+        for node in nodes:
+            entry = {field: node.get(field) for field in NODE_FIELDS}
+            entry["node_instance_id"] = _key(entry["node_instance_id"])
+            entry["status"] = _status(entry["status"])
+            self.nodes[entry["node_instance_id"]] = entry
+            self._count(entry, 1)
+        self._update_terminal()
+
+    def _count(self, entry: Dict[str, Any], delta: int) -> None:
+        status = entry["status"]
+        self.counts[status] = self.counts.get(status, 0) + delta
+        if status == "running":
+            if delta > 0:
+                self.running[entry["node_instance_id"]] = entry.get("node_name")
+            else:
+                self.running.pop(entry["node_instance_id"], None)
+        if status == "completed" and _status(entry.get("node_type")) == "end":
+            self.end_nodes_completed += delta
+
+    def _update_terminal(self) -> None:
+        if _status(self.instance.get("status")) in TERMINAL_STATUSES:
+            self.terminal_at = self.terminal_at or time.monotonic()
+        else:
+            self.terminal_at = None
+
+    def apply_node_row(self, row: Dict[str, Any]) -> bool:
+        """应用节点实例写入后的行；节点不在投影中时返回False"""
+        entry = self.nodes.get(_key(row.get("node_instance_id")))
+        if entry is None:
+            return False
+        if row.get("is_deleted"):
+            return False
+        self._count(entry, -1)
+        for field in NODE_FIELDS[3:]:
+            if field in row:
+                entry[field] = row[field]
+        entry["status"] = _status(entry["status"])
+        self._count(entry, 1)
+        return True
+
+    def apply_instance_row(self, row: Dict[str, Any]) -> None:
+        """应用工作流实例写入后的行"""
+        for field in INSTANCE_FIELDS:
+            if field in row and field not in ("workflow_name", "executor_username"):
+                self.instance[field] = row[field]
+        self._update_terminal()
+
+    def needs_completion_check(self) -> bool:
+        """节点状态与工作流状态不一致（END节点已完成/全部完成/有失败节点）时需要主动检查"""
+        current_status = _status(self.instance.get("status"))
+        total_nodes = len(self.nodes)
+        completed_nodes = self.counts.get("completed", 0)
+        failed_nodes = self.counts.get("failed", 0)
+        if self.end_nodes_completed > 0 or (total_nodes > 0 and completed_nodes == total_nodes and failed_nodes == 0):
+            return current_status != "completed"
+        if failed_nodes > 0:
+            return current_status != "failed"
+        return False
+
+    def to_status(self) -> Dict[str, Any]:
+        """与状态查询接口一致的响应数据（node_instances 不含输入/输出数据）"""
+        total_nodes = len(self.nodes)
+        completed_nodes = self.counts.get("completed", 0)
+        instance = self.instance
+        return {
+            "instance_id": self.workflow_instance_id,
+            "workflow_instance_name": instance.get("workflow_instance_name"),
+            "workflow_name": instance.get("workflow_name"),
+            "status": instance.get("status"),
+            "executor_id": _key(instance.get("executor_id")),
+            "executor_username": instance.get("executor_username"),
+            "created_at": instance["created_at"].isoformat() if instance.get("created_at") else None,
+            "updated_at": instance["updated_at"].isoformat() if instance.get("updated_at") else None,
+            "input_data": instance.get("input_data"),
+            "output_data": instance.get("output_data"),
+            "error_message": instance.get("error_message"),
+            "total_nodes": total_nodes,
+            "completed_nodes": completed_nodes,
+            "running_nodes": self.counts.get("running", 0),
+            "failed_nodes": self.counts.get("failed", 0),
+            "progress_percentage": round((completed_nodes / total_nodes) * 100, 1) if total_nodes else 0,
+            "current_running_nodes": list(self.running.values()),
+            "node_instances": [dict(entry) for entry in self.nodes.values()]
+        }
+
+
+class WorkflowStatusProjectionStore:
+    """本进程驻留实例的状态投影，按最近读取淘汰"""
+
+    def __init__(self, max_instances: int = 1000, resync_seconds: float = 30, linger_seconds: float = 300):
+        self.max_instances = max(1, max_instances)
+        self.resync_seconds = resync_seconds
+        self.linger_seconds = linger_seconds
+        self._projections: "OrderedDict[str, InstanceStatusProjection]" = OrderedDict()
+        # str(node_instance_id) -> str(workflow_instance_id)，供只知道节点实例ID的写入定位投影
+        self._node_owner: Dict[str, str] = {}
+        # 加载中的实例 -> 加载期间到达的写入（("node"|"instance", 行)），加载完成后重放
+        self._seeding: Dict[str, List[tuple]] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._node_updates = 0
+        self._invalidations = 0
+
+    def get(self, workflow_instance_id: Union[str, uuid.UUID]) -> Optional[InstanceStatusProjection]:
+        """读取驻留的投影；失效、超过重新加载间隔或终态保留期已过时返回None"""
+        instance_key = _key(workflow_instance_id)
+        projection = self._projections.get(instance_key)
+        if projection is not None:
+            now = time.monotonic()
+            if (projection.stale
+                    or (self.resync_seconds and now - projection.loaded_at > self.resync_seconds)
+                    or (projection.terminal_at is not None and now - projection.terminal_at > self.linger_seconds)):
+                self._remove(instance_key)
+                projection = None
+        if projection is None:
+            self._misses += 1
+            return None
+        self._projections.move_to_end(instance_key)
+        self._hits += 1
+        return projection
+
+    def begin_load(self, workflow_instance_id: Union[str, uuid.UUID]) -> bool:
+        """开始从数据库加载投影；已有加载进行中时返回False"""
+        instance_key = _key(workflow_instance_id)
+        if instance_key in self._seeding:
+            return False
+        self._seeding[instance_key] = []
+        return True
+
+    def finish_load(self, workflow_instance_id: Union[str, uuid.UUID], instance: Dict[str, Any],
+                    nodes: List[Dict[str, Any]]) -> None:
+        """用数据库读取结果建立投影，并重放加载期间到达的写入"""
+        instance_key = _key(workflow_instance_id)
+        pending = self._seeding.pop(instance_key, None)
+        if pending is None:
+            return
+        if _status(instance.get("status")) in TERMINAL_STATUSES:
+            return
+
+        self._remove(instance_key)
+        projection = InstanceStatusProjection(instance_key, instance, nodes)
+        self._projections[instance_key] = projection
+        for node_key in projection.nodes:
+            self._node_owner[node_key] = instance_key
+        for kind, row in pending:
+            self._apply(projection, kind, row)
+        self._loads += 1
+
+        while len(self._projections) > self.max_instances:
+            self._remove(next(iter(self._projections)))
+
+    def abort_load(self, workflow_instance_id: Union[str, uuid.UUID]) -> None:
+        self._seeding.pop(_key(workflow_instance_id), None)
+
+    def apply_node_row(self, row: Optional[Dict[str, Any]]) -> None:
+        """节点实例写入后调用：更新所属实例的投影"""
+        if not row:
+            return
+        instance_key = _key(row.get("workflow_instance_id")) or self._node_owner.get(_key(row.get("node_instance_id")))
+        if instance_key is None:
+            return
+        if instance_key in self._seeding:
+            self._seeding[instance_key].append(("node", row))
+        projection = self._projections.get(instance_key)
+        if projection is not None:
+            self._apply(projection, "node", row)
+
+    def apply_instance_row(self, row: Optional[Dict[str, Any]]) -> None:
+        """工作流实例写入后调用：更新实例状态等字段"""
+        if not row:
+            return
+        instance_key = _key(row.get("workflow_instance_id"))
+        if instance_key in self._seeding:
+            self._seeding[instance_key].append(("instance", row))
+        projection = self._projections.get(instance_key)
+        if projection is not None:
+            self._apply(projection, "instance", row)
+
+    def _apply(self, projection: InstanceStatusProjection, kind: str, row: Dict[str, Any]) -> None:
+        if kind == "instance":
+            projection.apply_instance_row(row)
+        elif projection.apply_node_row(row):
+            self._node_updates += 1
+        else:
+            # 新建的节点实例（如回环）或被删除的节点：投影无法增量维护，下次查询重新加载
+            projection.stale = True
+
+    def invalidate(self, workflow_instance_id: Union[str, uuid.UUID, None] = None,
+                   node_instance_id: Union[str, uuid.UUID, None] = None) -> None:
+        """无法增量应用的写入（批量/原始SQL更新）后调用，下次查询重新加载"""
+        instance_key = _key(workflow_instance_id) or self._node_owner.get(_key(node_instance_id))
+        if instance_key is None:
+            return
+        if instance_key in self._seeding:
+            # 加载结果可能早于本次写入，放弃本次加载
+            self._seeding.pop(instance_key, None)
+        if self._remove(instance_key):
+            self._invalidations += 1
+            logger.trace(f"🧹 状态投影失效: {instance_key}")
+
+    def _remove(self, instance_key: str) -> bool:
+        projection = self._projections.pop(instance_key, None)
+        if projection is None:
+            return False
+        for node_key in projection.nodes:
+            if self._node_owner.get(node_key) == instance_key:
+                del self._node_owner[node_key]
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """投影命中与维护统计"""
+        total = self._hits + self._misses
+        return {
+            "resident_instances": len(self._projections),
+            "loading": len(self._seeding),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            "loads": self._loads,
+            "node_updates": self._node_updates,
+            "invalidations": self._invalidations,
+            "max_instances": self.max_instances,
+            "resync_seconds": self.resync_seconds
+        }
+
+
+_app_settings = get_settings().app
+workflow_status_projection = WorkflowStatusProjectionStore(
+    max_instances=_app_settings.status_projection_max_instances,
+    resync_seconds=_app_settings.status_projection_resync_seconds,
+    linger_seconds=_app_settings.status_projection_linger_seconds
+)
+
+
+def get_workflow_status_projection() -> WorkflowStatusProjectionStore:
+    """获取全局工作流状态投影"""
+    return workflow_status_projection
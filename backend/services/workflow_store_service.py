@@ -130,18 +130,22 @@ class WorkflowStoreService:
     async def search_store_items(self, search_params: WorkflowStoreQuery) -> WorkflowStoreList:
         """搜索商店条目"""
         try:
-            items, total = await self.store_repository.search_store_items(search_params)
+            items, total, next_cursor = await self.store_repository.search_store_items(search_params)
 
-            total_pages = (total + search_params.page_size - 1) // search_params.page_size
+            total_pages = (total + search_params.page_size - 1) // search_params.page_size if total is not None else None
 
             return WorkflowStoreList(
                 items=items,
                 total=total,
                 page=search_params.page,
                 page_size=search_params.page_size,
-                total_pages=total_pages
+                total_pages=total_pages,
+                next_cursor=next_cursor,
+                has_more=next_cursor is not None
             )
 
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"搜索商店条目失败: {e}")
             return WorkflowStoreList(
@@ -4,21 +4,35 @@ MySQL Database Connection Manager - Fully Compatible with PostgreSQL Version
 """
 
 import asyncio
+import time
 import aiomysql
-import re
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 from loguru import logger
 from contextlib import asynccontextmanager
 
 from ..config.settings import get_settings
+from .sql_translator import get_sql_translator
+from .db_replicas import ReplicaSet, mark_write, use_primary_reads
+from .query_stats import get_query_monitor
+from .rows import Row, rows_from_cursor, columns_from_cursor
+from .db_pool import (
+    PoolTelemetry, current_db_pool, DB_POOL_API, DB_POOL_ENGINE, DB_POOL_BACKGROUND
+)
 
 
 class DatabaseManager:
     """MySQL数据库连接管理器 - 与PostgreSQL API兼容"""
     
     def __init__(self):
+        # api连接池（兼容旧代码直接访问self.pool）
         self.pool: Optional[aiomysql.Pool] = None
+        # 连接池名称 -> 连接池；未启用隔离时只有api连接池
+        self.pools: Dict[str, aiomysql.Pool] = {}
         self.settings = get_settings()
+        self.translator = get_sql_translator()
+        self.monitor = get_query_monitor()
+        # 表名 -> 主键列，用于模拟RETURNING时按主键回读
+        self._primary_keys: Dict[str, Tuple[str, ...]] = {}
         self._connection_params = {
             'host': self.settings.database.host,
             'port': self.settings.database.port,
@@ -34,49 +48,42 @@ class DatabaseManager:
                 'SET SESSION lock_wait_timeout=5'           # 设置表级锁等待时间
             )
         }
+        # 只读副本（未配置 DB_REPLICA_HOSTS 时为空集合，读写全部走主库）
+        self.replicas = ReplicaSet(self.settings.database, self._connection_params)
+        # 各主库连接池的借出统计与自适应扩缩容
+        db_settings = self.settings.database
+        self.pool_telemetry = PoolTelemetry(DB_POOL_API, db_settings)
+        self.telemetries: Dict[str, PoolTelemetry] = {DB_POOL_API: self.pool_telemetry}
+        self._pool_sizes: Dict[str, Tuple[int, int]] = {
+            DB_POOL_API: (db_settings.min_connections, db_settings.max_connections)
+        }
+        if db_settings.pool_isolation:
+            self._pool_sizes[DB_POOL_ENGINE] = (db_settings.pool_engine_min, db_settings.pool_engine_max)
+            self._pool_sizes[DB_POOL_BACKGROUND] = (db_settings.pool_background_min, db_settings.pool_background_max)
+            for name in (DB_POOL_ENGINE, DB_POOL_BACKGROUND):
+                self.telemetries[name] = PoolTelemetry(name, db_settings, adaptive=False)
     
     def _convert_postgresql_query(self, query: str) -> str:
-        """将PostgreSQL查询转换为MySQL查询"""
-        # 替换占位符 $1, $2, $3... 为 %s, %s, %s...
-        def replace_placeholder(match):
-            return '%s'
-        
-        # 使用正则表达式替换 $1, $2 等占位符
-        converted_query = re.sub(r'\$\d+', replace_placeholder, query)
-        
-        # 替换双引号标识符为反引号
-        converted_query = re.sub(r'"([^"]+)"', r'`\1`', converted_query)
-        
-        # 替换PostgreSQL特定函数
-        converted_query = converted_query.replace('gen_random_uuid()', 'UUID()')
-        converted_query = converted_query.replace('NOW()', 'CURRENT_TIMESTAMP')
-        
-        # 处理布尔值比较 - MySQL中TRUE/FALSE需要转换为1/0
-        converted_query = re.sub(r'=\s*TRUE\b', '= 1', converted_query, flags=re.IGNORECASE)
-        converted_query = re.sub(r'=\s*FALSE\b', '= 0', converted_query, flags=re.IGNORECASE)
-        converted_query = re.sub(r'\bIS\s+TRUE\b', '= 1', converted_query, flags=re.IGNORECASE)
-        converted_query = re.sub(r'\bIS\s+FALSE\b', '= 0', converted_query, flags=re.IGNORECASE)
-        
-        # 处理RETURNING子句（MySQL不支持，需要特殊处理）
-        if 'RETURNING *' in converted_query.upper():
-            converted_query = converted_query.replace('RETURNING *', '')
-            # 移除可能的尾随空白和换行
-            converted_query = converted_query.rstrip()
-            # 标记需要获取受影响的记录
-            converted_query += ' -- NEEDS_LAST_INSERT'
-        
-        return converted_query
+        """将PostgreSQL查询转换为MySQL查询（结果由共享翻译器缓存）"""
+        return self.translator.convert(query)
     
     async def initialize(self) -> None:
         """初始化数据库连接池"""
         try:
-            # 创建连接池
-            self.pool = await aiomysql.create_pool(
-                minsize=self.settings.database.min_connections,
-                maxsize=self.settings.database.max_connections,
-                **self._connection_params
-            )
-            logger.info("MySQL数据库连接池初始化成功")
+            # 创建连接池（api / engine / background）
+            for name, (minsize, maxsize) in self._pool_sizes.items():
+                pool = await aiomysql.create_pool(
+                    minsize=minsize,
+                    maxsize=maxsize,
+                    **self._connection_params
+                )
+                self.pools[name] = pool
+                self.telemetries[name].start_adaptive(pool)
+                logger.info(f"MySQL数据库连接池初始化成功: {name} ({minsize}-{maxsize})")
+            self.pool = self.pools[DB_POOL_API]
+            
+            if self.replicas.enabled:
+                await self.replicas.initialize()
             
         except Exception as e:
             logger.error(f"MySQL数据库连接初始化失败: {e}")
@@ -84,184 +91,378 @@ class DatabaseManager:
     
     async def close(self) -> None:
         """关闭数据库连接池"""
-        if self.pool:
-            self.pool.close()
-            await self.pool.wait_closed()
-            logger.info("MySQL数据库连接池已关闭")
+        for telemetry in self.telemetries.values():
+            await telemetry.stop()
+        for name, pool in self.pools.items():
+            pool.close()
+            await pool.wait_closed()
+            logger.info(f"MySQL数据库连接池已关闭: {name}")
+        self.pools.clear()
+        self.pool = None
+        await self.replicas.close()
+    
+    async def _current_pool(self) -> Tuple[aiomysql.Pool, PoolTelemetry]:
+        """按当前上下文声明的连接池名称选择主库连接池（未启用隔离时回退api连接池）"""
+        if not self.pool:
+            await self.initialize()
+        name = current_db_pool()
+        if name not in self.pools:
+            name = DB_POOL_API
+        return self.pools[name], self.telemetries[name]
     
     @asynccontextmanager
     async def get_connection(self):
         """获取数据库连接上下文管理器 - 兼容PostgreSQL接口"""
-        if not self.pool:
-            await self.initialize()
+        pool, telemetry = await self._current_pool()
         
-        async with self.pool.acquire() as connection:
+        async with telemetry.acquire(pool) as (connection, lease):
             # 创建兼容PostgreSQL的连接wrapper
-            wrapper = MySQLConnectionWrapper(connection)
+            wrapper = MySQLConnectionWrapper(connection, lease)
             try:
                 yield wrapper
             finally:
                 pass
     
+    def use_primary(self):
+        """在with块内强制读走主库（用于需要强一致读的流程）"""
+        return use_primary_reads()
+    
+    async def _execute_on(self, pool, telemetry, compiled, args: tuple, cursor_class, handler):
+        """在指定连接池上执行一次语句，并记录连接等待、执行耗时与行数"""
+        async with telemetry.acquire(pool) as (connection, lease):
+            async with connection.cursor(cursor_class) as cursor:
+                query_started = time.perf_counter()
+                try:
+                    result = await handler(cursor)
+                except Exception:
+                    elapsed = time.perf_counter() - query_started
+                    lease.db_seconds += elapsed
+                    self.monitor.record(compiled, elapsed, lease.acquire_seconds, 0, args, error=True)
+                    raise
+                elapsed = time.perf_counter() - query_started
+                lease.db_seconds += elapsed
+                self.monitor.record(compiled, elapsed, lease.acquire_seconds, max(cursor.rowcount, 0), args)
+                return result
+    
+    async def _run_read(self, compiled, args: tuple, use_primary: bool, cursor_class, fetch):
+        """执行纯读查询：满足条件时路由到只读副本，副本故障时回退主库"""
+        async def handler(cursor):
+            await cursor.execute(compiled.sql, args)
+            return await fetch(cursor)
+        
+        if self.replicas.should_route_to_replica(compiled.is_read, use_primary):
+            replica = self.replicas.pick()
+            if replica is not None:
+                try:
+                    return await self._execute_on(replica.pool, replica.telemetry, compiled, args,
+                                                  cursor_class, handler)
+                except (aiomysql.OperationalError, aiomysql.InterfaceError) as e:
+                    self.replicas.mark_failed(replica, e)
+        
+        pool, telemetry = await self._current_pool()
+        return await self._execute_on(pool, telemetry, compiled, args, cursor_class, handler)
+    
     async def execute(self, query: str, *args) -> str:
         """执行SQL命令（INSERT, UPDATE, DELETE）- 兼容PostgreSQL接口"""
-        converted_query = self._convert_postgresql_query(query)
+        compiled = self.translator.compile(query)
+        mark_write()
+        pool, telemetry = await self._current_pool()
         
-        async with self.get_connection() as conn:
-            async with conn.connection.cursor() as cursor:
-                affected_rows = await cursor.execute(converted_query, args)
-                return f"UPDATE {affected_rows}" if affected_rows > 0 else "UPDATE 0"
+        async def handler(cursor):
+            return await cursor.execute(compiled.sql, args)
+        
+        affected_rows = await self._execute_on(pool, telemetry, compiled, args, aiomysql.Cursor, handler)
+        return f"UPDATE {affected_rows}" if affected_rows > 0 else "UPDATE 0"
     
-    async def fetch_one(self, query: str, *args) -> Optional[Dict[str, Any]]:
+    async def fetch_one(self, query: str, *args, use_primary: bool = False) -> Optional[Dict[str, Any]]:
         """查询单条记录 - 兼容PostgreSQL接口"""
-        converted_query = self._convert_postgresql_query(query)
-        needs_last_insert = '-- NEEDS_LAST_INSERT' in converted_query
-        converted_query = converted_query.replace(' -- NEEDS_LAST_INSERT', '')
+        compiled = self.translator.compile(query)
+        if compiled.is_read:
+            return await self._run_read(compiled, args, use_primary, aiomysql.DictCursor,
+                                        lambda cursor: cursor.fetchone())
         
-        async with self.get_connection() as conn:
-            async with conn.connection.cursor(aiomysql.DictCursor) as cursor:
-                if needs_last_insert:
-                    # 检查是INSERT还是UPDATE查询
-                    original_query = query.strip().upper()
-                    if original_query.startswith('INSERT'):
-                        # 处理INSERT ... RETURNING的情况
-                        await cursor.execute(converted_query, args)
-                        
-                        # 获取刚插入的记录
-                        table_name = self._extract_table_name_from_insert(query)
-                        if table_name:
-                            # 尝试多种主键字段查询策略
-                            primary_key_queries = [
-                                # 方案1: 使用UUID主键字段（常见于工作流系统）
-                                f"SELECT * FROM `{table_name}` ORDER BY created_at DESC LIMIT 1",
-                                # 方案2: 使用AUTO_INCREMENT主键
-                                f"SELECT * FROM `{table_name}` WHERE id = LAST_INSERT_ID()",
-                                # 方案3: 通用查询最新记录
-                                f"SELECT * FROM `{table_name}` ORDER BY COALESCE(created_at, NOW()) DESC LIMIT 1"
-                            ]
-                            
-                            for pk_query in primary_key_queries:
-                                try:
-                                    await cursor.execute(pk_query)
-                                    result = await cursor.fetchone()
-                                    if result:
-                                        logger.debug(f"成功获取插入记录 from {table_name}: {pk_query[:50]}...")
-                                        return result
-                                except Exception as e:
-                                    logger.debug(f"主键查询失败 {pk_query[:50]}...: {e}")
-                                    continue
-                            
-                            # 如果所有查询都失败，记录警告但返回空字典表示成功插入
-                            logger.warning(f"无法查询刚插入的记录，表名: {table_name}")
-                            return {"_insert_success": True, "table": table_name}
-                        else:
-                            logger.error(f"无法提取表名from INSERT查询: {query[:100]}")
-                            return {"_insert_success": True, "_error": "table_name_extraction_failed"}
-                    
-                    elif original_query.startswith('UPDATE'):
-                        # 处理UPDATE ... RETURNING的情况
-                        logger.debug(f"[DEBUG] 原始UPDATE查询完整内容: {query}")
-                        logger.debug(f"[DEBUG] 转换UPDATE查询完整内容: {converted_query}")
-                        logger.debug(f"[DEBUG] UPDATE参数: {args}")
-                        
-                        await cursor.execute(converted_query, args)
-                        affected_rows = cursor.rowcount
-                        
-                        logger.debug(f"[DEBUG] UPDATE影响行数: {affected_rows}")
-                        
-                        if affected_rows > 0:
-                            # 尝试从WHERE子句中提取主键信息来查询更新后的记录
-                            table_name = self._extract_table_name_from_update(query)
-                            where_conditions = self._extract_where_conditions_from_update(query, args)
-                            
-                            logger.debug(f"[DEBUG] 提取的表名: {table_name}")
-                            logger.debug(f"[DEBUG] 提取的WHERE条件: {where_conditions}")
-                            
-                            if table_name and where_conditions:
-                                try:
-                                    # 构建查询语句来获取更新后的记录
-                                    where_clause = " AND ".join([f"`{key}` = %s" for key in where_conditions.keys()])
-                                    query_values = list(where_conditions.values())
-                                    
-                                    select_query = f"SELECT * FROM `{table_name}` WHERE {where_clause} LIMIT 1"
-                                    logger.debug(f"[DEBUG] 查询更新后记录SQL: {select_query}")
-                                    logger.debug(f"[DEBUG] 查询参数: {query_values}")
-                                    
-                                    await cursor.execute(select_query, query_values)
-                                    result = await cursor.fetchone()
-                                    
-                                    if result:
-                                        logger.debug(f"[DEBUG] 成功获取更新记录: {list(result.keys())[:5]}...")
-                                        return result
-                                    else:
-                                        logger.warning(f"[DEBUG] 查询更新后记录返回空")
-                                except Exception as e:
-                                    logger.error(f"[DEBUG] UPDATE后查询失败: {e}")
-                            
-                            # 如果无法查询更新后的记录，返回成功标记
-                            logger.info(f"[DEBUG] UPDATE成功，影响行数: {affected_rows}")
-                            return {"_update_success": True, "affected_rows": affected_rows}
-                        else:
-                            # 没有记录被更新 - 简化日志，避免垃圾信息
-                            logger.debug(f"[DEBUG] UPDATE操作未影响任何记录 (可能记录不存在或WHERE条件不匹配)")
-                            return None
-                    
-                    else:
-                        # 对于其他查询，正常执行
-                        await cursor.execute(converted_query, args)
-                        result = await cursor.fetchone()
-                        return result
-                else:
-                    await cursor.execute(converted_query, args)
-                    result = await cursor.fetchone()
-                    return result
-        
-        return None
-    
-    async def fetch_all(self, query: str, *args) -> List[Dict[str, Any]]:
+        mark_write()
+        pool, telemetry = await self._current_pool()
+        
+        async def handler(cursor):
+            if compiled.needs_returning and compiled.statement_type == 'INSERT':
+                return await self._insert_returning(cursor, compiled, args)
+            if compiled.needs_returning and compiled.statement_type == 'UPDATE':
+                return await self._update_returning(cursor, compiled, args)
+            await cursor.execute(compiled.sql, args)
+            return await cursor.fetchone()
+        
+        return await self._execute_on(pool, telemetry, compiled, args, aiomysql.DictCursor, handler)
+    
+    async def _get_primary_key_columns(self, cursor, table_name: str) -> Tuple[str, ...]:
+        """获取表的主键列（每个表只查询一次information_schema）"""
+        primary_key = self._primary_keys.get(table_name)
+        if primary_key is None:
+            await cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+                "ORDER BY ORDINAL_POSITION",
+                (table_name,)
+            )
+            rows = await cursor.fetchall()
+            primary_key = tuple(row['COLUMN_NAME'] for row in rows)
+            self._primary_keys[table_name] = primary_key
+        return primary_key
+    
+    async def _select_row(self, cursor, table_name: str, conditions: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按条件在同一连接上读取一行，用于模拟RETURNING"""
+        where_clause = " AND ".join([f"`{key}` = %s" for key in conditions.keys()])
+        await cursor.execute(
+            f"SELECT * FROM `{table_name}` WHERE {where_clause} LIMIT 1",
+            list(conditions.values())
+        )
+        return await cursor.fetchone()
+    
+    async def _insert_returning(self, cursor, compiled, args: tuple) -> Optional[Dict[str, Any]]:
+        """模拟 INSERT ... RETURNING *：按主键在同一连接上回读刚插入的行"""
+        await cursor.execute(compiled.sql, args)
+        
+        table_name = compiled.table_name
+        if not table_name:
+            logger.error(f"无法提取表名from INSERT查询: {compiled.sql[:100]}")
+            return {"_insert_success": True, "_error": "table_name_extraction_failed"}
+        
+        primary_key = await self._get_primary_key_columns(cursor, table_name)
+        
+        # 方案1: 主键值由调用方在插入数据中提供（UUID主键）
+        key_values = compiled.bind_insert(primary_key, args) if primary_key else None
+        
+        # 方案2: AUTO_INCREMENT主键，使用本连接的LAST_INSERT_ID
+        if key_values is None and len(primary_key) == 1 and cursor.lastrowid:
+            key_values = {primary_key[0]: cursor.lastrowid}
+        
+        if key_values:
+            result = await self._select_row(cursor, table_name, key_values)
+            if result:
+                return result
+        
+        # 主键由数据库默认值生成（如DEFAULT (UUID())）时无法定位该行
+        logger.warning(f"无法定位刚插入的记录（主键未包含在插入数据中），表名: {table_name}")
+        return {"_insert_success": True, "table": table_name}
+    
+    async def _update_returning(self, cursor, compiled, args: tuple) -> Optional[Dict[str, Any]]:
+        """模拟 UPDATE ... RETURNING *：按WHERE键在同一连接上回读更新后的行"""
+        await cursor.execute(compiled.sql, args)
+        affected_rows = cursor.rowcount
+        
+        table_name = compiled.table_name
+        where_conditions = compiled.bind_where(args)
+        if not table_name or not where_conditions:
+            if affected_rows > 0:
+                logger.info(f"UPDATE成功但无法解析WHERE条件，影响行数: {affected_rows}")
+                return {"_update_success": True, "affected_rows": affected_rows}
+            return None
+        
+        if affected_rows > 0:
+            # 行已确认命中：优先按主键回读，避免SET修改了WHERE中的其他列
+            primary_key = await self._get_primary_key_columns(cursor, table_name)
+            if primary_key and all(column in where_conditions for column in primary_key):
+                where_conditions = {column: where_conditions[column] for column in primary_key}
+            result = await self._select_row(cursor, table_name, where_conditions)
+            return result or {"_update_success": True, "affected_rows": affected_rows}
+        
+        if not compiled.where_complete:
+            # WHERE中含无法重放的条件（如常量比较、范围条件），不能据此判断记录是否命中
+            return None
+        
+        # 影响行数为0时（值未变化或记录不存在），按完整WHERE条件回读以区分两种情况
+        return await self._select_row(cursor, table_name, where_conditions)
+    
+    async def fetch_all(self, query: str, *args, use_primary: bool = False) -> List[Dict[str, Any]]:
         """查询多条记录 - 兼容PostgreSQL接口"""
-        converted_query = self._convert_postgresql_query(query)
+        compiled = self.translator.compile(query)
+        if not compiled.is_read:
+            mark_write()
         
-        async with self.get_connection() as conn:
-            async with conn.connection.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(converted_query, args)
-                results = await cursor.fetchall()
-                return results or []
+        results = await self._run_read(compiled, args, use_primary, aiomysql.DictCursor,
+                                       lambda cursor: cursor.fetchall())
+        return results or []
     
-    async def fetch_val(self, query: str, *args) -> Any:
+    async def fetch_rows(self, query: str, *args, use_primary: bool = False) -> List[Row]:
+        """查询多条记录，返回轻量Row对象（元组 + 共享列索引，不为每行构造dict）
+        
+        Row支持 row['col']、row.get、dict(row)，供热点列表查询的仓储方法按需使用。
+        """
+        compiled = self.translator.compile(query)
+        if not compiled.is_read:
+            mark_write()
+        
+        async def fetch(cursor):
+            return rows_from_cursor(cursor, await cursor.fetchall())
+        
+        return await self._run_read(compiled, args, use_primary, aiomysql.Cursor, fetch)
+    
+    async def fetch_columns(self, query: str, *args, use_primary: bool = False) -> Dict[str, List[Any]]:
+        """查询多条记录，返回列式结果 {列名: [值, ...]}"""
+        compiled = self.translator.compile(query)
+        if not compiled.is_read:
+            mark_write()
+        
+        async def fetch(cursor):
+            return columns_from_cursor(cursor, await cursor.fetchall())
+        
+        return await self._run_read(compiled, args, use_primary, aiomysql.Cursor, fetch)
+    
+    async def fetch_iter(self, query: str, *args, batch_size: Optional[int] = None,
+                         use_primary: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """流式查询多条记录（服务端游标，不在内存中缓存完整结果集）
+        
+        基于aiomysql的无缓冲SSDictCursor，按batch_size分批从服务端读取。
+        迭代期间会一直占用一个连接，调用方应尽快消费完毕。
+        
+        用法:
+            async for row in db.fetch_iter(query, arg1, batch_size=500):
+                ...
+        """
+        compiled = self.translator.compile(query)
+        batch_size = batch_size or self.settings.database.stream_batch_size
+        
+        # 流式读取开始后无法透明重试，副本仅在选中时使用，不做故障回退
+        replica = None
+        if self.replicas.should_route_to_replica(compiled.is_read, use_primary):
+            replica = self.replicas.pick()
+        if replica is not None:
+            pool, telemetry = replica.pool, replica.telemetry
+        else:
+            pool, telemetry = await self._current_pool()
+        
+        async with telemetry.acquire(pool) as (connection, lease):
+            async with connection.cursor(aiomysql.SSDictCursor) as cursor:
+                query_started = time.perf_counter()
+                await cursor.execute(compiled.sql, args)
+                # 只统计到服务端开始返回结果为止，不含调用方消费结果的时间
+                execute_seconds = time.perf_counter() - query_started
+                lease.db_seconds += execute_seconds
+                row_count = 0
+                try:
+                    while True:
+                        fetch_started = time.perf_counter()
+                        rows = await cursor.fetchmany(batch_size)
+                        lease.db_seconds += time.perf_counter() - fetch_started
+                        if not rows:
+                            break
+                        row_count += len(rows)
+                        for row in rows:
+                            yield row
+                finally:
+                    self.monitor.record(compiled, execute_seconds, lease.acquire_seconds, row_count, args)
+    
+    async def fetch_val(self, query: str, *args, use_primary: bool = False) -> Any:
         """查询单个值 - 兼容PostgreSQL接口"""
-        converted_query = self._convert_postgresql_query(query)
+        compiled = self.translator.compile(query)
+        if not compiled.is_read:
+            mark_write()
         
-        async with self.get_connection() as conn:
-            async with conn.connection.cursor() as cursor:
-                await cursor.execute(converted_query, args)
-                result = await cursor.fetchone()
-                return result[0] if result else None
+        result = await self._run_read(compiled, args, use_primary, aiomysql.Cursor,
+                                      lambda cursor: cursor.fetchone())
+        return result[0] if result else None
+    
+    async def estimate_count(self, query: str, *args) -> int:
+        """按执行计划估算查询的结果行数（代替COUNT(*)，用于大表的近似总数）
+        
+        取驱动表的 rows * filtered 估算值，仅适合单表或以主表驱动的查询。
+        """
+        plan = await self.fetch_all(f"EXPLAIN {query}", *args)
+        if not plan:
+            return 0
+        driving = plan[0]
+        rows = driving.get('rows') or 0
+        filtered = driving.get('filtered')
+        filtered = float(filtered) if filtered is not None else 100.0
+        return int(rows * filtered / 100)
     
     async def call_function(self, function_name: str, *args) -> Any:
         """调用数据库函数 - 兼容PostgreSQL接口"""
         # MySQL函数调用语法
         placeholders = ', '.join(['%s' for _ in args])
         query = f"SELECT {function_name}({placeholders})"
-        return await self.fetch_val(query, *args)
+        # 函数可能有写副作用，始终在主库执行
+        mark_write()
+        return await self.fetch_val(query, *args, use_primary=True)
     
     async def execute_transaction(self, queries: List[Tuple[str, tuple]]) -> None:
         """执行事务 - 兼容PostgreSQL接口"""
+        mark_write()
         async with self.get_connection() as conn:
             async with conn.connection.cursor() as cursor:
                 try:
                     await conn.connection.begin()
                     for query, args in queries:
-                        converted_query = self._convert_postgresql_query(query)
-                        await cursor.execute(converted_query, args)
+                        compiled = self.translator.compile(query)
+                        started = time.perf_counter()
+                        affected_rows = await cursor.execute(compiled.sql, args)
+                        elapsed = time.perf_counter() - started
+                        conn.lease.db_seconds += elapsed
+                        self.monitor.record(compiled, elapsed, None, affected_rows, args)
                     await conn.connection.commit()
                 except Exception as e:
                     await conn.connection.rollback()
                     raise
     
+    async def execute_many(self, query: str, args_list: List[tuple],
+                           batch_size: Optional[int] = None) -> int:
+        """批量执行同一条SQL，每批一个事务
+        
+        对于值全部为占位符的 INSERT ... VALUES ($1, $2, ...) 语句，
+        aiomysql会把一批参数合并为一条多行 INSERT ... VALUES (...), (...) 发送。
+        
+        Returns:
+            受影响的总行数
+        """
+        if not args_list:
+            return 0
+        
+        compiled = self.translator.compile(query)
+        batch_size = batch_size or self.settings.database.bulk_batch_size
+        mark_write()
+        total_affected = 0
+        
+        async with self.get_connection() as conn:
+            async with conn.connection.cursor() as cursor:
+                for start in range(0, len(args_list), batch_size):
+                    batch = args_list[start:start + batch_size]
+                    started = time.perf_counter()
+                    try:
+                        await conn.connection.begin()
+                        await cursor.executemany(compiled.sql, batch)
+                        await conn.connection.commit()
+                    except Exception:
+                        await conn.connection.rollback()
+                        self.monitor.record(compiled, time.perf_counter() - started, None, 0,
+                                            (batch,), error=True)
+                        raise
+                    elapsed = time.perf_counter() - started
+                    conn.lease.db_seconds += elapsed
+                    self.monitor.record(compiled, elapsed, None, max(cursor.rowcount, 0), (batch,))
+                    total_affected += max(cursor.rowcount, 0)
+        
+        return total_affected
+    
+    async def insert_many(self, table_name: str, columns: List[str], rows: List[tuple],
+                          batch_size: Optional[int] = None) -> int:
+        """多行插入：按批生成 INSERT INTO t (...) VALUES (...), (...) 语句
+        
+        Args:
+            table_name: 表名
+            columns: 列名列表
+            rows: 与columns顺序一致的值元组列表
+            batch_size: 每批行数，默认取配置 DB_BULK_BATCH_SIZE
+        
+        Returns:
+            插入的总行数
+        """
+        query = build_bulk_insert_query(table_name, columns)
+        return await self.execute_many(query, rows, batch_size)
+    
     @asynccontextmanager
     async def transaction(self):
         """数据库事务上下文管理器"""
+        mark_write()
         async with self.get_connection() as conn:
             try:
                 # 开始事务
@@ -276,165 +477,118 @@ class DatabaseManager:
                 await conn.connection.rollback()
                 logger.error(f"❌ 事务回滚: {e}")
                 raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取数据库层运行统计"""
+        return {
+            "query_cache": self.translator.get_stats(),
+            "replicas": self.replicas.get_stats(),
+            "pools": self.get_pool_stats()
+        }
     
-    def _extract_table_name_from_insert(self, query: str) -> Optional[str]:
-        """从INSERT语句中提取表名"""
-        import re
-        # 支持各种表名格式: "table", `table`, table, "schema"."table"
-        patterns = [
-            r'INSERT\s+INTO\s+["`]?(\w+)["`]?',  # 简单表名
-            r'INSERT\s+INTO\s+"([^"]+)"',  # 带双引号的表名
-            r'INSERT\s+INTO\s+`([^`]+)`',  # 带反引号的表名
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                # 移除可能的模式引号
-                table_name = table_name.strip('"').strip('`')
-                logger.debug(f"从INSERT语句中提取表名: {table_name}")
-                return table_name
-        
-        logger.warning(f"无法从INSERT语句中提取表名: {query[:100]}...")
-        return None
-    
-    def _extract_table_name_from_update(self, query: str) -> Optional[str]:
-        """从UPDATE语句中提取表名"""
-        import re
-        # 支持各种表名格式: "table", `table`, table
-        patterns = [
-            r'UPDATE\s+["`]?(\w+)["`]?\s+SET',  # 简单表名
-            r'UPDATE\s+"([^"]+)"\s+SET',  # 带双引号的表名
-            r'UPDATE\s+`([^`]+)`\s+SET',  # 带反引号的表名
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
-            if match:
-                table_name = match.group(1)
-                # 移除可能的引号
-                table_name = table_name.strip('"').strip('`')
-                logger.debug(f"从UPDATE语句中提取表名: {table_name}")
-                return table_name
-        
-        logger.warning(f"无法从UPDATE语句中提取表名: {query[:100]}...")
-        return None
-    
-    def _extract_where_conditions_from_update(self, query: str, args: tuple) -> Optional[Dict[str, Any]]:
-        """从UPDATE语句的WHERE子句中提取条件"""
-        import re
-        try:
-            # 查找WHERE子句，排除RETURNING
-            where_match = re.search(r'WHERE\s+(.+?)(?:\s+RETURNING|\s+ORDER\s+BY|\s+LIMIT|\s*$)', query, re.IGNORECASE | re.DOTALL)
-            if not where_match:
-                return None
-            
-            where_clause = where_match.group(1).strip()
-            
-            # 提取字段名（简单匹配 field = $n 的模式）
-            field_patterns = re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*\$(\d+)', where_clause, re.IGNORECASE)
-            
-            conditions = {}
-            for field_name, param_num in field_patterns:
-                param_index = int(param_num) - 1  # $1 对应 args[0]
-                # 确保参数索引在范围内
-                if param_index < len(args):
-                    # 移除字段名的引号
-                    clean_field_name = field_name.strip('"`')
-                    conditions[clean_field_name] = args[param_index]
-                else:
-                    logger.warning(f"[DEBUG] 参数索引超出范围: ${param_num} (索引{param_index}) >= args长度{len(args)}")
-                    logger.warning(f"[DEBUG] 完整args: {args}")
-                    # 尝试从args末尾获取可能的UUID参数
-                    if clean_field_name in ['node_base_id', 'workflow_base_id'] and len(args) >= 2:
-                        if clean_field_name == 'node_base_id':
-                            conditions[clean_field_name] = args[-2]  # 倒数第二个参数
-                        elif clean_field_name == 'workflow_base_id':
-                            conditions[clean_field_name] = args[-1]  # 最后一个参数
-            
-            # 处理布尔值字段的特殊情况 (PostgreSQL TRUE/FALSE -> MySQL 1/0)
-            logger.debug(f"[DEBUG] 检查布尔字段前的conditions: {conditions}")
-            logger.debug(f"[DEBUG] WHERE子句内容: '{where_clause}'")
-            
-            for field_name in ['is_current_version', 'is_deleted']:
-                if field_name not in conditions:
-                    # 从WHERE子句中查找布尔值条件
-                    bool_pattern = re.search(rf'{field_name}\s*=\s*(TRUE|FALSE)', where_clause, re.IGNORECASE)
-                    logger.debug(f"[DEBUG] 查找{field_name}布尔模式: {bool_pattern}")
-                    if bool_pattern:
-                        bool_value = bool_pattern.group(1).upper()
-                        mysql_bool_value = 1 if bool_value == 'TRUE' else 0
-                        conditions[field_name] = mysql_bool_value
-                        logger.debug(f"[DEBUG] 添加布尔条件: {field_name} = {mysql_bool_value} (原值: {bool_value})")
-            
-            logger.debug(f"[DEBUG] 最终提取的WHERE条件: {conditions}")
-            return conditions if conditions else None
-            
-        except Exception as e:
-            logger.debug(f"提取WHERE条件失败: {e}")
-            return None
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取各主库连接池占用、获取等待与最久持有者统计"""
+        return {
+            name: telemetry.get_stats(self.pools.get(name))
+            for name, telemetry in self.telemetries.items()
+        }
+    
+    def get_query_stats(self, top: int = 20, sort_by: str = "total_time") -> Dict[str, Any]:
+        """获取按查询指纹聚合的SQL性能统计"""
+        return self.monitor.get_stats(top=top, sort_by=sort_by)
 
 
 class MySQLConnectionWrapper:
     """MySQL连接包装器，提供PostgreSQL兼容的接口"""
     
-    def __init__(self, mysql_connection):
+    def __init__(self, mysql_connection, lease=None):
         self.connection = mysql_connection
+        # 连接借出记录（由DatabaseManager.get_connection提供），用于统计持有期间的SQL耗时
+        self.lease = lease
     
+    async def _run(self, query: str, args, cursor_class, fetch):
+        """在当前连接上执行语句并记录耗时与行数"""
+        compiled = get_sql_translator().compile(query)
+        if not compiled.is_read:
+            mark_write()
+        monitor = get_query_monitor()
+
+        async with self.connection.cursor(cursor_class) as cursor:
+            started = time.perf_counter()
+            try:
+                # 没有参数时不传递参数，避免语句中的 % 被当作格式符
+                await cursor.execute(compiled.sql, args or None)
+                result = await fetch(cursor)
+            except Exception:
+                self._account(time.perf_counter() - started)
+                monitor.record(compiled, time.perf_counter() - started, None, 0, args, error=True)
+                raise
+            elapsed = time.perf_counter() - started
+            self._account(elapsed)
+            monitor.record(compiled, elapsed, None, max(cursor.rowcount, 0), args)
+            return result
+
+    def _account(self, elapsed: float) -> None:
+        """累计本连接借出期间的SQL耗时"""
+        if self.lease is not None:
+            self.lease.db_seconds += elapsed
+
     async def execute(self, query: str, params=None) -> str:
         """执行SQL - PostgreSQL兼容接口"""
-        db_manager = DatabaseManager()
-        converted_query = db_manager._convert_postgresql_query(query)
+        # 如果params是元组或列表，直接传递；如果是单个参数，包装成元组
+        if params is not None and not isinstance(params, (tuple, list)):
+            params = (params,)
 
-        async with self.connection.cursor() as cursor:
-            if params is None:
-                affected_rows = await cursor.execute(converted_query)
-            else:
-                # 如果params是元组或列表，直接传递；如果是单个参数，包装成元组
-                if isinstance(params, (tuple, list)):
-                    affected_rows = await cursor.execute(converted_query, params)
-                else:
-                    affected_rows = await cursor.execute(converted_query, (params,))
-            return f"UPDATE {affected_rows}" if affected_rows > 0 else "UPDATE 0"
+        async def fetch(cursor):
+            return cursor.rowcount
+
+        affected_rows = await self._run(query, params, aiomysql.Cursor, fetch)
+        return f"UPDATE {affected_rows}" if affected_rows > 0 else "UPDATE 0"
     
     async def fetchrow(self, query: str, *args) -> Optional[Dict[str, Any]]:
         """获取单行 - PostgreSQL兼容接口"""
-        db_manager = DatabaseManager()
-        converted_query = db_manager._convert_postgresql_query(query)
-
-        async with self.connection.cursor(aiomysql.DictCursor) as cursor:
-            # 修复参数传递：如果有参数则传递，否则不传递参数
-            if args:
-                await cursor.execute(converted_query, args)
-            else:
-                await cursor.execute(converted_query)
-            result = await cursor.fetchone()
-            return result
+        return await self._run(query, args, aiomysql.DictCursor, lambda cursor: cursor.fetchone())
     
     async def fetch(self, query: str, *args) -> List[Dict[str, Any]]:
         """获取多行 - PostgreSQL兼容接口"""
-        db_manager = DatabaseManager()
-        converted_query = db_manager._convert_postgresql_query(query)
-
-        async with self.connection.cursor(aiomysql.DictCursor) as cursor:
-            # 修复参数传递：如果有参数则传递，否则不传递参数
-            if args:
-                await cursor.execute(converted_query, args)
-            else:
-                await cursor.execute(converted_query)
-            result = await cursor.fetchall()
-            return result
+        return await self._run(query, args, aiomysql.DictCursor, lambda cursor: cursor.fetchall())
+    
+    async def fetch_rows(self, query: str, *args) -> List[Row]:
+        """获取多行，返回轻量Row对象"""
+        async def fetch(cursor):
+            return rows_from_cursor(cursor, await cursor.fetchall())
+        
+        return await self._run(query, args, aiomysql.Cursor, fetch)
     
     async def fetchval(self, query: str, *args) -> Any:
         """获取单个值 - PostgreSQL兼容接口"""
-        db_manager = DatabaseManager()
-        converted_query = db_manager._convert_postgresql_query(query)
-        
+        result = await self._run(query, args, aiomysql.Cursor, lambda cursor: cursor.fetchone())
+        return result[0] if result else None
+    
+    async def executemany(self, query: str, args_list: List[tuple]) -> int:
+        """批量执行 - PostgreSQL兼容接口（在当前连接/事务内）"""
+        if not args_list:
+            return 0
+        compiled = get_sql_translator().compile(query)
+        mark_write()
+
         async with self.connection.cursor() as cursor:
-            await cursor.execute(converted_query, args)
-            result = await cursor.fetchone()
-            return result[0] if result else None
+            started = time.perf_counter()
+            await cursor.executemany(compiled.sql, args_list)
+            elapsed = time.perf_counter() - started
+            self._account(elapsed)
+            get_query_monitor().record(compiled, elapsed, None, max(cursor.rowcount, 0), (args_list,))
+            return max(cursor.rowcount, 0)
+    
+    async def insert_many(self, table_name: str, columns: List[str], rows: List[tuple],
+                          batch_size: Optional[int] = None) -> int:
+        """多行插入（在当前连接/事务内，不单独开启事务）"""
+        query = build_bulk_insert_query(table_name, columns)
+        batch_size = batch_size or get_settings().database.bulk_batch_size
+        total_inserted = 0
+        for start in range(0, len(rows), batch_size):
+            total_inserted += await self.executemany(query, rows[start:start + batch_size])
+        return total_inserted
     
     @asynccontextmanager
     async def transaction(self):
@@ -456,6 +610,14 @@ class MySQLConnectionWrapper:
         pass  # 连接由连接池管理，无需手动关闭
 
 
+def build_bulk_insert_query(table_name: str, columns: List[str]) -> str:
+    """构建可被批量执行的单行INSERT模板（值全部为占位符）"""
+    table_name = table_name.strip('"`')
+    column_list = ", ".join(columns)
+    placeholders = ", ".join(f"${i + 1}" for i in range(len(columns)))
+    return f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})'
+
+
 # 全局数据库管理器实例
 db_manager = DatabaseManager()
 
@@ -0,0 +1,270 @@
+"""
+数据库连接池监控与自适应扩缩容
+Connection Pool Telemetry and Adaptive Sizing
+
+记录每次从连接池借出连接的等待时间、持有时长与调用方：
+- 占用/空闲连接数、获取等待直方图、当前持有最久的调用方
+- 连接归还时，若持有期间大部分时间不在执行SQL（例如在等待LLM/HTTP等网络I/O），输出告警
+- 自适应模式下按获取等待时间在上下限之间调整连接池上限
+
+连接池隔离（bulkhead）：DatabaseManager按名称维护多个连接池，
+当前上下文使用哪个连接池由 set_db_pool / use_db_pool 声明：
+- api：处理用户请求（默认）
+- engine：执行引擎与Agent任务处理
+- background：监控、上下文持久化、健康检查等后台循环
+"""
+
+import asyncio
+import collections
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any
+
+from loguru import logger
+
+from .query_stats import LatencyHistogram, find_caller
+
+
+DB_POOL_API = "api"
+DB_POOL_ENGINE = "engine"
+DB_POOL_BACKGROUND = "background"
+DB_POOL_NAMES = (DB_POOL_API, DB_POOL_ENGINE, DB_POOL_BACKGROUND)
+
+# 当前上下文使用的连接池名称
+_db_pool: ContextVar[str] = ContextVar("db_pool", default=DB_POOL_API)
+
+
+def set_db_pool(name: str) -> None:
+    """声明当前上下文（及其后创建的子任务）使用的连接池，通常在后台循环开头调用"""
+    if name not in DB_POOL_NAMES:
+        raise ValueError(f"未知的连接池: {name}")
+    _db_pool.set(name)
+
+
+@contextmanager
+def use_db_pool(name: str):
+    """在with块内使用指定连接池（块内创建的任务同样继承）"""
+    if name not in DB_POOL_NAMES:
+        raise ValueError(f"未知的连接池: {name}")
+    token = _db_pool.set(name)
+    try:
+        yield
+    finally:
+        _db_pool.reset(token)
+
+
+def current_db_pool() -> str:
+    """获取当前上下文使用的连接池名称"""
+    return _db_pool.get()
+
+
+class ConnectionLease:
+    """一次连接借出记录"""
+
+    __slots__ = ('lease_id', 'caller', 'task_name', 'acquire_seconds', 'acquired_at', 'db_seconds', 'warned')
+
+    def __init__(self, lease_id: int, caller: Optional[str], task_name: Optional[str], acquire_seconds: float):
+        self.lease_id = lease_id
+        self.acquire_seconds = acquire_seconds
+        self.caller = caller
+        self.task_name = task_name
+        self.acquired_at = time.monotonic()
+        # 持有期间实际执行SQL的累计时间
+        self.db_seconds = 0.0
+        self.warned = False
+
+    def held_seconds(self) -> float:
+        return time.monotonic() - self.acquired_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        held = self.held_seconds()
+        return {
+            "caller": self.caller,
+            "task": self.task_name,
+            "held_seconds": round(held, 3),
+            "db_seconds": round(self.db_seconds, 3),
+            "non_db_seconds": round(max(held - self.db_seconds, 0.0), 3),
+        }
+
+
+def resize_pool(pool, maxsize: int) -> int:
+    """调整aiomysql连接池上限，返回实际生效的上限
+
+    aiomysql没有公开的扩缩容接口，上限即空闲队列 _free 的maxlen。
+    缩容时先关闭多余的空闲连接，且上限不低于当前连接总数，
+    避免归还连接时deque按maxlen静默丢弃（未关闭）连接。
+    """
+    if maxsize == pool.maxsize:
+        return maxsize
+
+    if maxsize < pool.maxsize:
+        while pool.freesize and pool.size > maxsize:
+            pool._free.pop().close()
+        maxsize = max(maxsize, pool.size, pool.minsize)
+
+    grew = maxsize > pool.maxsize
+    pool._free = collections.deque(pool._free, maxlen=maxsize)
+    if grew:
+        # 唤醒所有等待连接的协程，让其按新的上限创建连接
+        asyncio.create_task(_notify_waiters(pool))
+    return maxsize
+
+
+async def _notify_waiters(pool) -> None:
+    async with pool._cond:
+        pool._cond.notify_all()
+
+
+class PoolTelemetry:
+    """单个连接池的借出统计、持有告警与自适应扩缩容"""
+
+    def __init__(self, name: str, database_settings, adaptive: Optional[bool] = None):
+        self.name = name
+        self.settings = database_settings
+        # 隔离的engine/background连接池保持固定上限，不参与自适应扩缩容
+        self.adaptive = database_settings.pool_adaptive if adaptive is None else adaptive
+        self.acquire_wait = LatencyHistogram()
+        self._leases: Dict[int, ConnectionLease] = {}
+        self._lease_ids = itertools.count(1)
+        self.long_hold_warnings = 0
+        self.resize_events = 0
+        # 自适应调整窗口统计
+        self._window_wait = LatencyHistogram()
+        self._window_peak_in_use = 0
+        self._adapt_task: Optional[asyncio.Task] = None
+
+    @property
+    def in_use(self) -> int:
+        return len(self._leases)
+
+    def begin(self, acquire_seconds: float) -> ConnectionLease:
+        """连接借出时调用"""
+        wait_ms = acquire_seconds * 1000
+        self.acquire_wait.observe(wait_ms)
+        self._window_wait.observe(wait_ms)
+
+        caller = task_name = None
+        if self.settings.pool_track_holders:
+            caller = find_caller()
+            task = asyncio.current_task()
+            task_name = task.get_name() if task else None
+
+        lease = ConnectionLease(next(self._lease_ids), caller, task_name, acquire_seconds)
+        self._leases[lease.lease_id] = lease
+        if len(self._leases) > self._window_peak_in_use:
+            self._window_peak_in_use = len(self._leases)
+        return lease
+
+    def end(self, lease: ConnectionLease) -> None:
+        """连接归还时调用：持有期间非SQL时间过长则告警"""
+        self._leases.pop(lease.lease_id, None)
+        held = lease.held_seconds()
+        non_db = held - lease.db_seconds
+        if non_db >= self.settings.pool_hold_warn_seconds and not lease.warned:
+            self._warn_long_hold(lease, held, non_db)
+
+    def _warn_long_hold(self, lease: ConnectionLease, held: float, non_db: float) -> None:
+        lease.warned = True
+        self.long_hold_warnings += 1
+        logger.warning(
+            f"🔒 [DB-POOL:{self.name}] 连接被持有 {held:.2f}s，其中 {non_db:.2f}s 未执行SQL"
+            f"（可能在持有连接时await了网络I/O），调用方: {lease.caller or 'unknown'}, 任务: {lease.task_name}"
+        )
+
+    def longest_holder(self) -> Optional[ConnectionLease]:
+        if not self._leases:
+            return None
+        return min(self._leases.values(), key=lambda lease: lease.acquired_at)
+
+    def check_live_leases(self) -> None:
+        """对仍未归还且持有过久的连接提前告警"""
+        threshold = self.settings.pool_hold_warn_seconds
+        for lease in list(self._leases.values()):
+            held = lease.held_seconds()
+            non_db = held - lease.db_seconds
+            if not lease.warned and non_db >= threshold:
+                self._warn_long_hold(lease, held, non_db)
+
+    def start_adaptive(self, pool) -> None:
+        """启动自适应扩缩容（DB_POOL_ADAPTIVE=true时）与持有检查循环"""
+        if self._adapt_task is None:
+            self._adapt_task = asyncio.create_task(self._adapt_loop(pool))
+
+    @asynccontextmanager
+    async def acquire(self, pool):
+        """从连接池借出连接并登记借出记录，产出 (connection, lease)"""
+        started = time.perf_counter()
+        async with pool.acquire() as connection:
+            lease = self.begin(time.perf_counter() - started)
+            try:
+                yield connection, lease
+            finally:
+                self.end(lease)
+
+    async def stop(self) -> None:
+        if self._adapt_task:
+            self._adapt_task.cancel()
+            self._adapt_task = None
+
+    async def _adapt_loop(self, pool) -> None:
+        while True:
+            await asyncio.sleep(self.settings.pool_adapt_interval)
+            try:
+                self.check_live_leases()
+                if self.adaptive:
+                    self.adapt(pool)
+            except Exception as e:
+                logger.error(f"连接池自适应调整失败 [{self.name}]: {e}")
+            finally:
+                self._window_wait = LatencyHistogram()
+                self._window_peak_in_use = self.in_use
+
+    def adapt(self, pool) -> None:
+        """根据上一个窗口的获取等待与峰值占用调整连接池上限"""
+        if pool is None or pool.closed:
+            return
+
+        settings = self.settings
+        current = pool.maxsize
+        floor = max(settings.pool_adaptive_floor, pool.minsize)
+        ceiling = max(settings.pool_adaptive_ceiling, floor)
+        p95_wait = self._window_wait.percentile(0.95)
+
+        target = current
+        if p95_wait >= settings.pool_grow_wait_ms and current < ceiling:
+            target = min(current + settings.pool_resize_step, ceiling)
+        elif (p95_wait <= 1 and current > floor
+              and self._window_peak_in_use + settings.pool_resize_step < current):
+            target = max(current - settings.pool_resize_step, floor, self._window_peak_in_use)
+
+        if target != current:
+            applied = resize_pool(pool, target)
+            if applied != current:
+                self.resize_events += 1
+                logger.info(
+                    f"📐 [DB-POOL:{self.name}] 连接池上限 {current} -> {applied} "
+                    f"(窗口p95等待: {p95_wait}ms, 峰值占用: {self._window_peak_in_use})"
+                )
+
+    def get_stats(self, pool) -> Dict[str, Any]:
+        """获取连接池统计"""
+        longest = self.longest_holder()
+        stats = {
+            "name": self.name,
+            "in_use": self.in_use,
+            "acquire_wait": self.acquire_wait.to_dict(),
+            "longest_holder": longest.to_dict() if longest else None,
+            "long_hold_warnings": self.long_hold_warnings,
+            "adaptive": self.adaptive,
+            "resize_events": self.resize_events,
+        }
+        if pool is not None:
+            stats.update({
+                "size": pool.size,
+                "idle": pool.freesize,
+                "minsize": pool.minsize,
+                "maxsize": pool.maxsize,
+            })
+        return stats
@@ -0,0 +1,227 @@
+"""
+只读副本管理与读路由
+Read Replica Management and Read Routing
+
+DatabaseManager在配置了 DB_REPLICA_HOSTS 时，把纯读查询分发到只读副本：
+- 写操作、事务、加锁读始终走主库
+- 当前上下文（请求/协程）刚写过数据时，在粘滞窗口内的读走主库（read-your-writes）
+- 可按调用（use_primary=True）或按上下文（use_primary_reads / set_read_routing）强制走主库
+- 后台定期检查副本复制延迟，延迟超限或不可用的副本自动摘除，全部不可用时回退主库
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+
+import aiomysql
+from loguru import logger
+
+from .db_pool import PoolTelemetry
+
+
+READ_ROUTING_PRIMARY = "primary"
+READ_ROUTING_REPLICA = "replica"
+
+# 当前上下文的读路由模式（None表示默认：读走副本）
+_read_routing: ContextVar[Optional[str]] = ContextVar("db_read_routing", default=None)
+# 当前上下文最近一次写操作的时间（time.monotonic）
+_last_write_at: ContextVar[float] = ContextVar("db_last_write_at", default=0.0)
+
+
+def set_read_routing(mode: Optional[str]) -> None:
+    """设置当前上下文（及其后创建的子任务）的读路由模式"""
+    _read_routing.set(mode)
+
+
+@contextmanager
+def use_primary_reads():
+    """在with块内强制读走主库"""
+    token = _read_routing.set(READ_ROUTING_PRIMARY)
+    try:
+        yield
+    finally:
+        _read_routing.reset(token)
+
+
+def mark_write() -> None:
+    """记录当前上下文发生了写操作，用于read-your-writes粘滞"""
+    _last_write_at.set(time.monotonic())
+
+
+class ReplicaState:
+    """单个只读副本的连接池与健康状态"""
+
+    __slots__ = ('name', 'host', 'port', 'pool', 'telemetry', 'healthy', 'lag_seconds',
+                 'last_checked', 'last_error', 'reads')
+
+    def __init__(self, host: str, port: int, database_settings):
+        self.name = f"{host}:{port}"
+        self.host = host
+        self.port = port
+        self.pool: Optional[aiomysql.Pool] = None
+        self.telemetry = PoolTelemetry(f"replica:{self.name}", database_settings)
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reads = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "last_checked_ago_seconds": round(time.monotonic() - self.last_checked, 1) if self.last_checked else None,
+            "last_error": self.last_error,
+            "reads": self.reads,
+            "pool": self.telemetry.get_stats(self.pool),
+        }
+
+
+class ReplicaSet:
+    """只读副本集合：连接池、延迟检查与轮询选择"""
+
+    def __init__(self, database_settings, connection_params: Dict[str, Any]):
+        self.settings = database_settings
+        self._connection_params = connection_params
+        self.replicas: List[ReplicaState] = [
+            ReplicaState(host, port, database_settings) for host, port in self._parse_hosts(database_settings.replica_hosts)
+        ]
+        self._next_index = 0
+        self._health_task: Optional[asyncio.Task] = None
+        self.primary_fallbacks = 0
+
+    @staticmethod
+    def _parse_hosts(replica_hosts: str) -> List[tuple]:
+        """解析 'host1:3306,host2' 形式的副本地址列表"""
+        hosts = []
+        for item in (replica_hosts or "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            host, _, port = item.partition(":")
+            hosts.append((host, int(port) if port else 3306))
+        return hosts
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    async def initialize(self) -> None:
+        """创建副本连接池并启动延迟检查"""
+        for replica in self.replicas:
+            params = dict(self._connection_params, host=replica.host, port=replica.port)
+            try:
+                replica.pool = await aiomysql.create_pool(
+                    minsize=1,
+                    maxsize=self.settings.replica_max_connections,
+                    **params
+                )
+                replica.telemetry.start_adaptive(replica.pool)
+                await self._check_replica(replica)
+                logger.info(f"只读副本连接池初始化成功: {replica.name} (延迟: {replica.lag_seconds}s)")
+            except Exception as e:
+                replica.healthy = False
+                replica.last_error = str(e)
+                logger.warning(f"只读副本连接失败，读请求将回退主库: {replica.name} - {e}")
+
+        if self.replicas and not self._health_task:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def close(self) -> None:
+        """关闭副本连接池"""
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.telemetry.stop()
+            if replica.pool:
+                replica.pool.close()
+                await replica.pool.wait_closed()
+                replica.pool = None
+
+    def should_route_to_replica(self, is_read: bool, use_primary: bool) -> bool:
+        """判断本次读是否可以走副本"""
+        if not self.replicas or use_primary or not is_read:
+            return False
+        if _read_routing.get() == READ_ROUTING_PRIMARY:
+            return False
+        # read-your-writes：当前上下文刚写过，在粘滞窗口内读主库
+        last_write = _last_write_at.get()
+        if last_write and time.monotonic() - last_write < self.settings.replica_sticky_seconds:
+            return False
+        return True
+
+    def pick(self) -> Optional[ReplicaState]:
+        """轮询选择一个健康副本，无可用副本时返回None"""
+        count = len(self.replicas)
+        for offset in range(count):
+            replica = self.replicas[(self._next_index + offset) % count]
+            if replica.healthy and replica.pool is not None:
+                self._next_index = (self._next_index + offset + 1) % count
+                replica.reads += 1
+                return replica
+        self.primary_fallbacks += 1
+        return None
+
+    def mark_failed(self, replica: ReplicaState, error: Exception) -> None:
+        """副本查询失败时立即摘除，等待下一轮健康检查恢复"""
+        replica.healthy = False
+        replica.last_error = str(error)
+        logger.warning(f"只读副本查询失败，已摘除: {replica.name} - {error}")
+
+    async def _check_replica(self, replica: ReplicaState) -> None:
+        """检查单个副本的复制延迟"""
+        replica.last_checked = time.monotonic()
+        if replica.pool is None:
+            replica.healthy = False
+            return
+
+        async with replica.pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                try:
+                    await cursor.execute("SHOW REPLICA STATUS")
+                except aiomysql.Error:
+                    # MySQL 8.0.22 之前的版本
+                    await cursor.execute("SHOW SLAVE STATUS")
+                status = await cursor.fetchone()
+
+        if not status:
+            # 非复制节点（如读代理或同一实例），视为无延迟
+            replica.lag_seconds = 0.0
+        else:
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            replica.lag_seconds = float(lag) if lag is not None else None
+
+        max_lag = self.settings.replica_max_lag_seconds
+        replica.healthy = replica.lag_seconds is not None and replica.lag_seconds <= max_lag
+        replica.last_error = None if replica.healthy else f"复制延迟超限或复制已停止: {replica.lag_seconds}"
+
+    async def _health_check_loop(self) -> None:
+        """后台循环检查副本延迟"""
+        while True:
+            await asyncio.sleep(self.settings.replica_check_interval)
+            for replica in self.replicas:
+                was_healthy = replica.healthy
+                try:
+                    await self._check_replica(replica)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    replica.healthy = False
+                    replica.last_error = str(e)
+                if was_healthy != replica.healthy:
+                    state = "恢复" if replica.healthy else "摘除"
+                    logger.warning(f"只读副本{state}: {replica.name} (延迟: {replica.lag_seconds}, 错误: {replica.last_error})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取副本路由统计"""
+        return {
+            "enabled": self.enabled,
+            "max_lag_seconds": self.settings.replica_max_lag_seconds,
+            "sticky_seconds": self.settings.replica_sticky_seconds,
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [replica.to_dict() for replica in self.replicas],
+        }
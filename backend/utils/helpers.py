@@ -5,7 +5,10 @@ Database Helper Utils
 
 import uuid
 import json
+import base64
 import pytz
+from collections.abc import Mapping
+from decimal import Decimal
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 
@@ -41,6 +44,9 @@ def safe_json_serializer(obj):
     elif isinstance(obj, set):
         # 🔧 修复：处理Set类型
         return list(obj)
+    elif isinstance(obj, Mapping):
+        # 数据库轻量行对象（Row）等映射类型
+        return dict(obj)
     elif hasattr(obj, '__dict__'):
         # 处理自定义对象
         return obj.__dict__
@@ -184,6 +190,34 @@ def dict_to_sql_insert(data: Dict[str, Any], exclude: Optional[List[str]] = None
     return ", ".join(columns), ", ".join(placeholders), tuple(values)
 
 
+def dict_list_to_sql_insert(rows: List[Dict[str, Any]], exclude: Optional[List[str]] = None) -> List[tuple]:
+    """
+    将多条记录字典转换为批量INSERT所需的列与值
+    与dict_to_sql_insert一致：忽略值为None的字段（交给数据库默认值），
+    因此按实际插入的列集合分组，每组可以用同一条多行INSERT写入
+    
+    Args:
+        rows: 要插入的数据字典列表
+        exclude: 要排除的字段列表
+    
+    Returns:
+        [(columns, values_list), ...] 列表，columns为列名列表，values_list为值元组列表
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    for data in rows:
+        filtered_data = {k: v for k, v in data.items() if (not exclude or k not in exclude) and v is not None}
+        if not filtered_data:
+            continue
+        
+        values = tuple(
+            safe_json_dumps(value) if isinstance(value, (dict, list)) else value
+            for value in filtered_data.values()
+        )
+        groups.setdefault(tuple(filtered_data.keys()), []).append(values)
+    
+    return [(list(columns), values_list) for columns, values_list in groups.items()]
+
+
 def build_where_clause(conditions: Dict[str, Any], start_param: int = 1) -> tuple:
     """
     构建WHERE子句
@@ -234,6 +268,114 @@ def paginate_query(base_query: str, page: int = 1, page_size: int = 20) -> str:
     return f"{base_query} LIMIT {page_size} OFFSET {offset}"
 
 
+def encode_cursor(*values: Any) -> str:
+    """
+    将键集分页的定位值（如 created_at, id）编码为不透明游标
+    
+    Args:
+        values: 上一页最后一行的排序列值与主键值
+    
+    Returns:
+        URL安全的base64游标字符串
+    """
+    payload = []
+    for value in values:
+        if isinstance(value, datetime):
+            payload.append({"dt": value.isoformat()})
+        elif isinstance(value, Decimal):
+            payload.append({"dec": str(value)})
+        elif isinstance(value, uuid.UUID):
+            payload.append(str(value))
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    解码不透明游标
+    
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+    
+    if not isinstance(payload, list):
+        raise ValueError(f"无效的分页游标: {cursor}")
+    
+    values = []
+    for value in payload:
+        if isinstance(value, dict) and "dt" in value:
+            values.append(datetime.fromisoformat(value["dt"]))
+        elif isinstance(value, dict) and "dec" in value:
+            values.append(Decimal(value["dec"]))
+        else:
+            values.append(value)
+    return values
+
+
+def build_keyset_condition(sort_column: str, id_column: str, cursor_values: List[Any],
+                           direction: str = "DESC", start_param: int = 1) -> tuple:
+    """
+    构建键集分页条件：定位到 (sort_column, id_column) 严格位于游标之后的行
+    
+    展开为 OR 形式而不是行构造器比较，以便MySQL使用 (sort_column, id_column) 复合索引做范围扫描。
+    
+    Args:
+        sort_column: 排序列（可带表别名，如 wi.created_at）
+        id_column: 唯一的次级排序列（通常是主键）
+        cursor_values: decode_cursor得到的 [sort_value, id_value]
+        direction: 排序方向 ASC/DESC
+        start_param: 参数起始编号
+    
+    Returns:
+        (condition, values, next_param_index) 元组
+    """
+    if len(cursor_values) != 2:
+        raise ValueError("分页游标与排序列不匹配")
+    
+    op = "<" if direction.upper() == "DESC" else ">"
+    sort_value, id_value = cursor_values
+    condition = (
+        f"({sort_column} {op} ${start_param} "
+        f"OR ({sort_column} = ${start_param + 1} AND {id_column} {op} ${start_param + 2}))"
+    )
+    return condition, (sort_value, sort_value, id_value), start_param + 3
+
+
+def build_keyset_page(rows: List[Dict[str, Any]], page_size: int,
+                      sort_key: str, id_key: str) -> tuple:
+    """
+    将按 page_size + 1 条查询到的结果切分为当前页，并生成下一页游标
+    
+    Args:
+        rows: 查询结果（查询时 LIMIT page_size + 1）
+        page_size: 每页大小
+        sort_key: 结果行中排序列的键名
+        id_key: 结果行中主键列的键名
+    
+    Returns:
+        (items, next_cursor, has_more) 元组
+    """
+    has_more = len(rows) > page_size
+    items = list(rows[:page_size])
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(last[sort_key], last[id_key])
+    return items, next_cursor, has_more
+
+
+def _column_key(column: str) -> str:
+    """从 wi.created_at / "created_at" 等写法中取出结果行的键名"""
+    return column.split(".")[-1].strip('"`')
+
+
 class QueryBuilder:
     """SQL查询构建器"""
     
@@ -251,6 +393,7 @@ class QueryBuilder:
         self._having = ""
         self._limit = None
         self._offset = None
+        self._keyset = None
         return self
     
     def select(self, columns: str):
@@ -288,6 +431,27 @@ class QueryBuilder:
         self._offset = offset
         return self
     
+    def keyset(self, cursor: Optional[str], page_size: int, sort_column: str = "created_at",
+               id_column: str = "id", direction: str = "DESC"):
+        """设置键集分页：按 (sort_column, id_column) 排序，从游标之后取 page_size 条
+        
+        多取一条用于判断是否还有下一页，结果交给 keyset_page() 切分并生成下一页游标。
+        """
+        direction = "DESC" if direction.upper() == "DESC" else "ASC"
+        cursor_values = decode_cursor(cursor) if cursor else None
+        self._keyset = (cursor_values, sort_column, id_column, direction, page_size)
+        self._order_by = [f"{sort_column} {direction}", f"{id_column} {direction}"]
+        self._limit = page_size + 1
+        self._offset = None
+        return self
+    
+    def keyset_page(self, rows: List[Dict[str, Any]]) -> tuple:
+        """切分键集分页结果，返回 (items, next_cursor, has_more)"""
+        if not self._keyset:
+            return list(rows), None, False
+        _, sort_column, id_column, _, page_size = self._keyset
+        return build_keyset_page(rows, page_size, _column_key(sort_column), _column_key(id_column))
+    
     def build(self) -> tuple:
         """构建查询语句"""
         query_parts = [f"SELECT {self._select}", f"FROM {self.table_name}"]
@@ -297,7 +461,17 @@ class QueryBuilder:
             query_parts.extend(self._joins)
         
         # 添加WHERE
-        where_clause, values, _ = build_where_clause(self._where_conditions)
+        where_clause, values, next_param = build_where_clause(self._where_conditions)
+        
+        # 添加键集分页条件
+        if self._keyset and self._keyset[0]:
+            cursor_values, sort_column, id_column, direction, _ = self._keyset
+            keyset_clause, keyset_values, _ = build_keyset_condition(
+                sort_column, id_column, cursor_values, direction, next_param
+            )
+            where_clause = f"{where_clause} AND {keyset_clause}" if where_clause else keyset_clause
+            values = tuple(values) + keyset_values
+        
         if where_clause:
             query_parts.append(f"WHERE {where_clause}")
         
@@ -0,0 +1,249 @@
+"""
+SQL查询性能统计与慢查询日志
+Query-level Performance Instrumentation and Slow Query Log
+
+DatabaseManager在每次执行SQL时上报：执行耗时、连接池获取等待、返回/影响行数。
+统计按归一化的查询指纹（常量与占位符替换为 ?）聚合，存放在内存直方图中，
+超过慢查询阈值的语句会记录参数形态与调用方仓储方法，便于定位N+1查询。
+"""
+
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from typing import Optional, Dict, Any, Tuple
+
+from loguru import logger
+
+from ..config.settings import get_settings
+
+
+# 指纹归一化正则
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r'(?<![\w`])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\$\d+')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_LIST_RE = re.compile(r'\bVALUES\s*(\([?,\s]*\))(?:\s*,\s*\([?,\s]*\))+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 直方图桶上界（毫秒）
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 查找调用方时跳过的数据库层文件
+_DB_LAYER_FILES = (
+    os.path.join('utils', 'database.py'),
+    os.path.join('utils', 'query_stats.py'),
+    os.path.join('utils', 'db_replicas.py'),
+    os.path.join('utils', 'db_pool.py'),
+    os.path.join('repositories', 'base.py'),
+    'contextlib.py',
+)
+
+
+def fingerprint_query(sql: str) -> str:
+    """将SQL归一化为指纹：常量/占位符替换为 ?，IN列表与多行VALUES折叠，空白压缩"""
+    normalized = _STRING_LITERAL_RE.sub('?', sql)
+    normalized = _PLACEHOLDER_RE.sub('?', normalized)
+    normalized = _NUMBER_LITERAL_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('IN (...)', normalized)
+    normalized = _VALUES_LIST_RE.sub(r'VALUES \1, ...', normalized)
+    return _WHITESPACE_RE.sub(' ', normalized).strip()
+
+
+def describe_args(args) -> str:
+    """描述参数形态（类型与长度），不记录参数值"""
+    if not args:
+        return "()"
+    parts = []
+    for arg in args:
+        if isinstance(arg, (list, tuple, set, dict)):
+            parts.append(f"{type(arg).__name__}[{len(arg)}]")
+        elif isinstance(arg, (str, bytes)):
+            parts.append(f"{type(arg).__name__}({len(arg)})")
+        else:
+            parts.append(type(arg).__name__)
+    return f"({', '.join(parts)})"
+
+
+def find_caller() -> str:
+    """沿调用栈向上查找数据库层之外的第一个调用方（通常是仓储/服务方法）"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if 'backend' in filename and not filename.endswith(_DB_LAYER_FILES):
+            owner = frame.f_locals.get('self')
+            function = frame.f_code.co_name
+            if owner is not None:
+                function = f"{type(owner).__name__}.{function}"
+            return f"{function} ({os.path.basename(filename)}:{frame.f_lineno})"
+        frame = frame.f_back
+    return "unknown"
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图（毫秒）"""
+
+    __slots__ = ('bounds', 'counts', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def percentile(self, p: float) -> float:
+        """按桶上界估算分位数"""
+        if not self.count:
+            return 0.0
+        threshold = self.count * p
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return float(self.bounds[index]) if index < len(self.bounds) else round(self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                (f"le_{bound}" if index < len(self.bounds) else "inf"): bucket_count
+                for index, (bound, bucket_count) in enumerate(
+                    zip(self.bounds + (None,), self.counts)
+                ) if bucket_count
+            },
+        }
+
+
+class QueryStats:
+    """单个查询指纹的累计统计"""
+
+    __slots__ = ('fingerprint', 'latency', 'acquire_wait', 'rows',
+                 'errors', 'slow_count', 'last_caller')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.latency = LatencyHistogram()
+        self.acquire_wait = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow_count = 0
+        self.last_caller: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.latency.count
+        return {
+            "fingerprint": self.fingerprint,
+            "calls": calls,
+            "errors": self.errors,
+            "slow_count": self.slow_count,
+            "total_ms": round(self.latency.total_ms, 3),
+            "rows": self.rows,
+            "avg_rows": round(self.rows / calls, 2) if calls else 0.0,
+            "latency": self.latency.to_dict(),
+            "acquire_wait": self.acquire_wait.to_dict(),
+            "last_slow_caller": self.last_caller,
+        }
+
+
+class QueryMonitor:
+    """按查询指纹聚合的SQL性能统计"""
+
+    SORT_KEYS = {
+        "total_time": lambda s: s.latency.total_ms,
+        "calls": lambda s: s.latency.count,
+        "avg_time": lambda s: s.latency.total_ms / s.latency.count if s.latency.count else 0.0,
+        "max_time": lambda s: s.latency.max_ms,
+        "rows": lambda s: s.rows,
+        "acquire_wait": lambda s: s.acquire_wait.total_ms,
+    }
+
+    def __init__(self, enabled: bool = True, slow_query_ms: float = 200.0, max_fingerprints: int = 1000):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max(1, max_fingerprints)
+        self._stats: Dict[str, QueryStats] = {}
+        self._started_at = time.time()
+        self._dropped = 0
+
+    def record(self, compiled, elapsed_seconds: float, acquire_seconds: Optional[float] = None,
+               rows: int = 0, args=None, error: bool = False) -> None:
+        """记录一次SQL执行"""
+        if not self.enabled:
+            return
+
+        fingerprint = compiled.fingerprint
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                self._dropped += 1
+                return
+            stats = self._stats[fingerprint] = QueryStats(fingerprint)
+
+        elapsed_ms = elapsed_seconds * 1000
+        stats.latency.observe(elapsed_ms)
+        if acquire_seconds is not None:
+            stats.acquire_wait.observe(acquire_seconds * 1000)
+        stats.rows += rows or 0
+        if error:
+            stats.errors += 1
+
+        if elapsed_ms >= self.slow_query_ms:
+            stats.slow_count += 1
+            stats.last_caller = find_caller()
+            acquire_text = f", 连接等待: {acquire_seconds * 1000:.1f}ms" if acquire_seconds is not None else ""
+            logger.warning(
+                f"🐢 [SLOW-QUERY] {elapsed_ms:.1f}ms{acquire_text}, 行数: {rows}, "
+                f"调用方: {stats.last_caller}, 参数: {describe_args(args)}, SQL: {fingerprint[:500]}"
+            )
+
+    def get_stats(self, top: int = 20, sort_by: str = "total_time") -> Dict[str, Any]:
+        """获取按指定维度排序的Top N查询统计"""
+        sort_key = self.SORT_KEYS.get(sort_by, self.SORT_KEYS["total_time"])
+        ordered = sorted(self._stats.values(), key=sort_key, reverse=True)
+        total_calls = sum(s.latency.count for s in self._stats.values())
+        total_ms = sum(s.latency.total_ms for s in self._stats.values())
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_ms,
+            "since": self._started_at,
+            "fingerprints": len(self._stats),
+            "dropped_fingerprints": self._dropped,
+            "total_calls": total_calls,
+            "total_ms": round(total_ms, 3),
+            "sort_by": sort_by if sort_by in self.SORT_KEYS else "total_time",
+            "queries": [s.to_dict() for s in ordered[:max(0, top)]],
+        }
+
+    def reset(self) -> None:
+        """清空统计"""
+        self._stats.clear()
+        self._dropped = 0
+        self._started_at = time.time()
+
+
+_db_settings = get_settings().database
+query_monitor = QueryMonitor(
+    enabled=_db_settings.query_stats_enabled,
+    slow_query_ms=_db_settings.slow_query_ms,
+    max_fingerprints=_db_settings.query_stats_max_fingerprints,
+)
+
+
+def get_query_monitor() -> QueryMonitor:
+    """获取全局查询统计实例"""
+    return query_monitor
@@ -5,8 +5,12 @@ API Response Utilities
 提供统一的API响应格式化函数
 """
 
-from typing import Any, Optional, Dict
-from fastapi.responses import JSONResponse
+import json
+import uuid
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Any, Optional, Dict, AsyncIterator, Callable, Awaitable
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi import status
 
 
@@ -224,4 +228,44 @@ def not_found(message: str = "资源未找到") -> JSONResponse:
 
 def create_response(data: Any = None, message: str = "操作成功", status_code: int = status.HTTP_200_OK) -> JSONResponse:
     """通用响应创建函数，兼容旧版本API"""
-    return success_response(data=data, message=message, status_code=status_code)
\ No newline at end of file
+    return success_response(data=data, message=message, status_code=status_code)
+
+
+def _stream_json_default(obj: Any) -> Any:
+    """流式响应中数据库行的JSON序列化"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (uuid.UUID, Decimal)):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def ndjson_stream_response(
+    rows: AsyncIterator[Dict[str, Any]],
+    transform: Optional[Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]] = None
+) -> StreamingResponse:
+    """
+    NDJSON流式响应：逐行输出，每行一个JSON对象
+    
+    配合DatabaseManager.fetch_iter使用，服务端内存占用与结果集大小无关
+    
+    Args:
+        rows: 异步行迭代器
+        transform: 可选的异步转换函数，返回None时跳过该行
+        
+    Returns:
+        StreamingResponse: application/x-ndjson 响应
+    """
+    async def generate():
+        async for row in rows:
+            if transform is not None:
+                row = await transform(row)
+                if row is None:
+                    continue
+            yield json.dumps(row, ensure_ascii=False, default=_stream_json_default) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
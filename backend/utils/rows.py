@@ -0,0 +1,151 @@
+"""
+轻量行对象
+Lightweight Row Decoding
+
+DictCursor为每行构造一个dict，仓储层再 dict(result) 复制一次，热点列表查询每行要分配多个字典。
+这里改用普通Cursor返回的元组：每个查询只根据 cursor.description 构造一次列索引，
+每行只包一个 __slots__ 的 Row 对象，按列名读取时查共享的列索引。
+
+Row 实现了 Mapping 协议（row['col']、row.get、keys/items、dict(row)、**row），
+调用方可以像使用字典一样读取；写入的键单独保存，不修改原始元组。
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+_MISSING = object()
+
+
+class RowColumns:
+    """一次查询结果的列名与列索引，由该查询的所有行共享"""
+
+    __slots__ = ('names', 'index')
+
+    def __init__(self, names: Sequence[str]):
+        self.names: Tuple[str, ...] = tuple(names)
+        self.index: Dict[str, int] = {name: position for position, name in enumerate(self.names)}
+
+    @classmethod
+    def from_cursor(cls, cursor) -> "RowColumns":
+        """按cursor结果集构造列索引，重名列与DictCursor一致地命名为 表名.列名"""
+        result = getattr(cursor, '_result', None)
+        fields = getattr(result, 'fields', None)
+        names: List[str] = []
+        if fields:
+            for field in fields:
+                name = field.name
+                if name in names:
+                    name = f"{field.table_name}.{name}"
+                names.append(name)
+        else:
+            for column in cursor.description or ():
+                names.append(column[0])
+        return cls(names)
+
+
+class Row(MutableMapping):
+    """以元组保存一行数据的轻量行对象，可按列名或属性读取"""
+
+    __slots__ = ('_columns', '_values', '_extra')
+
+    def __init__(self, columns: RowColumns, values: Sequence[Any]):
+        self._columns = columns
+        self._values = values
+        # 调用方写入/删除的键（惰性创建）
+        self._extra: Optional[Dict[str, Any]] = None
+
+    def __getitem__(self, key: str) -> Any:
+        extra = self._extra
+        if extra is not None and key in extra:
+            value = extra[key]
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        index = self._columns.index.get(key)
+        if index is None:
+            raise KeyError(key)
+        return self._values[index]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        extra = self._extra
+        if extra is not None and key in extra:
+            value = extra[key]
+            return default if value is _MISSING else value
+        index = self._columns.index.get(key)
+        return default if index is None else self._values[index]
+
+    def __contains__(self, key: object) -> bool:
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key] is not _MISSING
+        return key in self._columns.index
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if self._extra is None:
+            self._extra = {}
+        if key in self._columns.index:
+            self._extra[key] = _MISSING
+        else:
+            del self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        extra = self._extra
+        if extra is None:
+            yield from self._columns.names
+            return
+        for name in self._columns.names:
+            if extra.get(name) is not _MISSING:
+                yield name
+        for name, value in extra.items():
+            if name not in self._columns.index and value is not _MISSING:
+                yield name
+
+    def __len__(self) -> int:
+        if self._extra is None:
+            return len(self._columns.names)
+        return sum(1 for _ in self)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __repr__(self) -> str:
+        return f"Row({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为普通字典"""
+        if self._extra is None:
+            return dict(zip(self._columns.names, self._values))
+        return {key: self[key] for key in self}
+
+    def copy(self) -> Dict[str, Any]:
+        """与dict.copy一致，返回一份可独立修改的字典"""
+        return self.to_dict()
+
+
+def rows_from_cursor(cursor, values: Sequence[Sequence[Any]]) -> List[Row]:
+    """将普通Cursor取回的元组列表包装为Row列表（列索引只构造一次）"""
+    if not values:
+        return []
+    columns = RowColumns.from_cursor(cursor)
+    return [Row(columns, row) for row in values]
+
+
+def columns_from_cursor(cursor, values: Sequence[Sequence[Any]]) -> Dict[str, List[Any]]:
+    """将元组列表转为列式结果 {列名: [值, ...]}，适合只做聚合/取单列的调用方"""
+    names = RowColumns.from_cursor(cursor).names
+    if not values:
+        return {name: [] for name in names}
+    return {name: list(column) for name, column in zip(names, zip(*values))}
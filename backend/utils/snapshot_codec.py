@@ -0,0 +1,356 @@
+"""
+工作流上下文快照紧凑编码
+Compact Binary Encoding for Workflow Context Snapshots
+
+'3.0' 快照格式（WCS3）：类 msgpack 的二进制编码，
+  - UUID 表：UUID 对象与规范格式的 UUID 字符串都以16字节存一次，之后按下标引用
+  - 字符串表：字典键与短字符串去重
+  - 容器去重：同一个对象被多处引用时（如 node_outputs 与 node_outputs_by_path 中的同一份节点输出）只编码一次
+  - 可选压缩：none / zlib / zstd（需安装 zstandard，未安装时回退到 zlib）
+
+存库时包装为 JSON 信封 {"context_version": "3.0", "encoding": "wcs3", "data": base64}，
+兼容 context_data 为 JSON 列的表结构；读取时无法识别的数据按 '2.0' JSON 快照原样返回。
+
+解码结果与 '2.0' JSON 快照经 json.loads 得到的结构一致（UUID 为字符串、集合为列表），
+恢复逻辑无需区分格式。
+"""
+
+import base64
+import json
+import struct
+import uuid
+import zlib
+from dataclasses import fields, is_dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Union
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SNAPSHOT_FORMAT_VERSION = "3.0"
+SNAPSHOT_ENCODING = "wcs3"
+
+_MAGIC = b"WCS\x03"
+_COMPRESSION_CODES = {"none": 0, "zlib": 1, "zstd": 2}
+_COMPRESSION_NAMES = {code: name for name, code in _COMPRESSION_CODES.items()}
+
+# 类型标记
+_T_NONE = 0x00
+_T_FALSE = 0x01
+_T_TRUE = 0x02
+_T_INT = 0x03
+_T_FLOAT = 0x04
+_T_STR_REF = 0x05
+_T_STR = 0x06
+_T_UUID = 0x07
+_T_UUID_STR = 0x08
+_T_LIST = 0x09
+_T_DICT = 0x0A
+_T_SET = 0x0B
+_T_REF = 0x0C
+_T_BYTES = 0x0D
+
+# 不超过该长度的字符串进入字符串表
+_INTERN_MAX_LENGTH = 64
+
+_FLOAT = struct.Struct(">d")
+
+_zstd_fallback_warned = False
+
+
+class SnapshotCodecError(ValueError):
+    """快照数据无法解码"""
+
+
+def _is_uuid_string(value: str) -> bool:
+    if len(value) != 36 or value[8] != '-' or value[13] != '-':
+        return False
+    try:
+        return str(uuid.UUID(value)) == value
+    except ValueError:
+        return False
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray()
+        self.uuids: List[bytes] = []
+        self.uuid_index: Dict[bytes, int] = {}
+        self.strings: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        # id(容器) -> 容器序号；同时持有容器引用，避免编码期间id被复用
+        self.containers: Dict[int, int] = {}
+        self._alive: List[Any] = []
+
+    def _uuid(self, value: uuid.UUID) -> int:
+        raw = value.bytes
+        index = self.uuid_index.get(raw)
+        if index is None:
+            index = self.uuid_index[raw] = len(self.uuids)
+            self.uuids.append(raw)
+        return index
+
+    def _str(self, value: str) -> None:
+        out = self.out
+        if _is_uuid_string(value):
+            out.append(_T_UUID_STR)
+            _write_varint(out, self._uuid(uuid.UUID(value)))
+        elif len(value) <= _INTERN_MAX_LENGTH:
+            index = self.string_index.get(value)
+            if index is None:
+                index = self.string_index[value] = len(self.strings)
+                self.strings.append(value)
+            out.append(_T_STR_REF)
+            _write_varint(out, index)
+        else:
+            data = value.encode("utf-8")
+            out.append(_T_STR)
+            _write_varint(out, len(data))
+            out += data
+
+    def _enter_container(self, value: Any) -> bool:
+        """已编码过的容器写入引用并返回True"""
+        index = self.containers.get(id(value))
+        if index is not None:
+            self.out.append(_T_REF)
+            _write_varint(self.out, index)
+            return True
+        self.containers[id(value)] = len(self.containers)
+        self._alive.append(value)
+        return False
+
+    def encode(self, value: Any) -> None:
+        out = self.out
+        if value is None:
+            out.append(_T_NONE)
+        elif value is True:
+            out.append(_T_TRUE)
+        elif value is False:
+            out.append(_T_FALSE)
+        elif isinstance(value, int):
+            out.append(_T_INT)
+            _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+        elif isinstance(value, float):
+            out.append(_T_FLOAT)
+            out += _FLOAT.pack(value)
+        elif isinstance(value, str):
+            self._str(value)
+        elif isinstance(value, uuid.UUID):
+            out.append(_T_UUID)
+            _write_varint(out, self._uuid(value))
+        elif isinstance(value, (datetime, date)):
+            self._str(value.isoformat())
+        elif isinstance(value, dict):
+            if self._enter_container(value):
+                return
+            out.append(_T_DICT)
+            _write_varint(out, len(value))
+            for key, item in value.items():
+                self.encode(key)
+                self.encode(item)
+        elif isinstance(value, (list, tuple)):
+            if self._enter_container(value):
+                return
+            out.append(_T_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                self.encode(item)
+        elif isinstance(value, (set, frozenset)):
+            if self._enter_container(value):
+                return
+            out.append(_T_SET)
+            _write_varint(out, len(value))
+            for item in value:
+                self.encode(item)
+        elif is_dataclass(value) and not isinstance(value, type):
+            # 与 '2.0' 的 asdict 结果一致，但不深拷贝字段，保留共享引用以便去重
+            if self._enter_container(value):
+                return
+            field_list = fields(value)
+            out.append(_T_DICT)
+            _write_varint(out, len(field_list))
+            for field in field_list:
+                self._str(field.name)
+                self.encode(getattr(value, field.name))
+        elif isinstance(value, (bytes, bytearray)):
+            out.append(_T_BYTES)
+            _write_varint(out, len(value))
+            out += value
+        else:
+            self._str(str(value))
+
+    def finish(self) -> bytes:
+        header = bytearray()
+        _write_varint(header, len(self.uuids))
+        for raw in self.uuids:
+            header += raw
+        _write_varint(header, len(self.strings))
+        for value in self.strings:
+            data = value.encode("utf-8")
+            _write_varint(header, len(data))
+            header += data
+        return bytes(header + self.out)
+
+
+class _Decoder:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+        self.uuids: List[str] = []
+        self.strings: List[str] = []
+        self.containers: List[Any] = []
+
+    def _varint(self) -> int:
+        data = self.data
+        result = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def _raw(self, length: int) -> bytes:
+        start = self.pos
+        self.pos += length
+        if self.pos > len(self.data):
+            raise SnapshotCodecError("快照数据被截断")
+        return self.data[start:self.pos]
+
+    def read_tables(self) -> None:
+        self.uuids = [str(uuid.UUID(bytes=self._raw(16))) for _ in range(self._varint())]
+        self.strings = [self._raw(self._varint()).decode("utf-8") for _ in range(self._varint())]
+
+    def _key(self) -> Any:
+        key = self.decode()
+        if isinstance(key, str):
+            return key
+        # 与JSON对象键的转换规则一致
+        return json.dumps(key) if key is None or isinstance(key, (bool, float)) else str(key)
+
+    def decode(self) -> Any:
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == _T_NONE:
+            return None
+        if tag == _T_TRUE:
+            return True
+        if tag == _T_FALSE:
+            return False
+        if tag == _T_INT:
+            value = self._varint()
+            return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+        if tag == _T_FLOAT:
+            return _FLOAT.unpack(self._raw(8))[0]
+        if tag == _T_STR_REF:
+            return self.strings[self._varint()]
+        if tag == _T_STR:
+            return self._raw(self._varint()).decode("utf-8")
+        if tag in (_T_UUID, _T_UUID_STR):
+            return self.uuids[self._varint()]
+        if tag == _T_DICT:
+            result: Dict[str, Any] = {}
+            self.containers.append(result)
+            for _ in range(self._varint()):
+                key = self._key()
+                result[key] = self.decode()
+            return result
+        if tag in (_T_LIST, _T_SET):
+            items: List[Any] = []
+            self.containers.append(items)
+            for _ in range(self._varint()):
+                items.append(self.decode())
+            return items
+        if tag == _T_REF:
+            return self.containers[self._varint()]
+        if tag == _T_BYTES:
+            return base64.b64encode(self._raw(self._varint())).decode("ascii")
+        raise SnapshotCodecError(f"未知的类型标记: {tag:#x}")
+
+
+def resolve_compression(compression: str) -> str:
+    """校验压缩算法；zstd 不可用时回退到 zlib"""
+    compression = (compression or "none").lower()
+    if compression not in _COMPRESSION_CODES:
+        raise ValueError(f"不支持的快照压缩算法: {compression}")
+    if compression == "zstd" and zstandard is None:
+        global _zstd_fallback_warned
+        if not _zstd_fallback_warned:
+            _zstd_fallback_warned = True
+            logger.warning("⚠️ 未安装 zstandard，上下文快照压缩回退到 zlib")
+        return "zlib"
+    return compression
+
+
+def encode_snapshot(value: Any, compression: str = "zlib") -> bytes:
+    """编码为 WCS3 二进制"""
+    compression = resolve_compression(compression)
+    encoder = _Encoder()
+    encoder.encode(value)
+    body = encoder.finish()
+
+    if compression == "zlib":
+        body = zlib.compress(body, 6)
+    elif compression == "zstd":
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+    return _MAGIC + bytes([_COMPRESSION_CODES[compression]]) + body
+
+
+def decode_snapshot(data: bytes) -> Any:
+    """解码 WCS3 二进制为 JSON 兼容结构"""
+    if data[:4] != _MAGIC or len(data) < 5:
+        raise SnapshotCodecError("不是 WCS3 快照数据")
+    compression = _COMPRESSION_NAMES.get(data[4])
+    body = data[5:]
+    if compression == "zlib":
+        body = zlib.decompress(body)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise SnapshotCodecError("快照使用 zstd 压缩，但未安装 zstandard")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compression != "none":
+        raise SnapshotCodecError(f"未知的压缩算法: {data[4]}")
+
+    decoder = _Decoder(body)
+    decoder.read_tables()
+    return decoder.decode()
+
+
+def pack_context_snapshot(context_data: Dict[str, Any], compression: str = "zlib") -> Dict[str, Any]:
+    """编码并包装为可存入 context_data 列的 JSON 信封"""
+    return {
+        "context_version": SNAPSHOT_FORMAT_VERSION,
+        "encoding": SNAPSHOT_ENCODING,
+        "data": base64.b64encode(encode_snapshot(context_data, compression)).decode("ascii")
+    }
+
+
+def is_packed_snapshot(context_data: Any) -> bool:
+    return isinstance(context_data, dict) and context_data.get("encoding") == SNAPSHOT_ENCODING
+
+
+def unpack_context_snapshot(context_data: Union[str, bytes, Dict[str, Any], None]) -> Optional[Dict[str, Any]]:
+    """读取 context_data：WCS3 信封解码，'2.0' JSON 快照原样解析返回"""
+    if context_data is None:
+        return None
+    if isinstance(context_data, (bytes, bytearray)):
+        if bytes(context_data[:4]) == _MAGIC:
+            return decode_snapshot(bytes(context_data))
+        context_data = context_data.decode("utf-8")
+    if isinstance(context_data, str):
+        context_data = json.loads(context_data)
+    if is_packed_snapshot(context_data):
+        return decode_snapshot(base64.b64decode(context_data["data"]))
+    return context_data
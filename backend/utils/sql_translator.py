@@ -0,0 +1,243 @@
+"""
+SQL方言翻译缓存
+SQL Dialect Translation Cache
+
+将仓储层编写的PostgreSQL风格SQL（$n 占位符、双引号标识符、RETURNING 等）
+编译为MySQL语句，并按原始查询文本缓存编译结果，避免每次执行都重复正则转换。
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from ..config.settings import get_settings
+from .query_stats import fingerprint_query
+
+
+# 预编译的方言转换正则
+_PLACEHOLDER_RE = re.compile(r'\$\d+')
+_QUOTED_IDENT_RE = re.compile(r'"([^"]+)"')
+_EQ_TRUE_RE = re.compile(r'=\s*TRUE\b', re.IGNORECASE)
+_EQ_FALSE_RE = re.compile(r'=\s*FALSE\b', re.IGNORECASE)
+_IS_TRUE_RE = re.compile(r'\bIS\s+TRUE\b', re.IGNORECASE)
+_IS_FALSE_RE = re.compile(r'\bIS\s+FALSE\b', re.IGNORECASE)
+_RETURNING_RE = re.compile(r'\s*\bRETURNING\s+\*', re.IGNORECASE)
+
+# 元数据提取正则
+_INSERT_TABLE_RE = re.compile(r'INSERT\s+INTO\s+["`]?(\w+)["`]?', re.IGNORECASE)
+_INSERT_COLUMNS_RE = re.compile(
+    r'INSERT\s+INTO\s+["`]?\w+["`]?\s*\(([^)]*)\)\s*VALUES\s*\((.*)\)\s*(?:RETURNING\s+\*)?\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_UPDATE_TABLE_RE = re.compile(r'UPDATE\s+["`]?(\w+)["`]?\s+SET', re.IGNORECASE)
+_WHERE_CLAUSE_RE = re.compile(
+    r'WHERE\s+(.+?)(?:\s+RETURNING|\s+ORDER\s+BY|\s+LIMIT|\s*$)', re.IGNORECASE | re.DOTALL
+)
+_WHERE_PARAM_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*\$(\d+)')
+_WHERE_BOOL_RE = re.compile(r'\b(is_current_version|is_deleted)\s*=\s*(TRUE|FALSE)\b', re.IGNORECASE)
+_READ_STATEMENTS = frozenset({'SELECT', 'WITH', 'SHOW', '(SELECT'})
+_LOCKING_READ_RE = re.compile(r'\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b', re.IGNORECASE)
+_WHERE_AND_RE = re.compile(r'\s+AND\s+', re.IGNORECASE)
+_WHERE_SIMPLE_TERM_RE = re.compile(
+    r'(?:\w+\.)?["`]?(\w+)["`]?\s*=\s*(?:\$\d+|TRUE|FALSE)', re.IGNORECASE
+)
+
+
+class CompiledQuery:
+    """编译后的查询：MySQL语句及其元数据"""
+
+    __slots__ = ('sql', 'statement_type', 'needs_returning', 'table_name',
+                 'where_columns', 'where_complete', 'insert_columns', 'is_read',
+                 'fingerprint')
+
+    def __init__(self, sql: str, statement_type: str, needs_returning: bool,
+                 table_name: Optional[str], where_columns: Dict[str, Tuple[str, Any]],
+                 where_complete: bool = False, insert_columns: Optional[Dict[str, int]] = None):
+        self.sql = sql
+        self.statement_type = statement_type
+        self.needs_returning = needs_returning
+        self.table_name = table_name
+        # 列名 -> ('param', 参数下标) 或 ('literal', 常量值)
+        self.where_columns = where_columns
+        # WHERE子句是否完全由上述 列 = 值 条件以AND组成（可据此精确重放）
+        self.where_complete = where_complete
+        # INSERT列名 -> 参数下标（仅限值为 $n 的列）
+        self.insert_columns = insert_columns or {}
+        # 纯读语句（不加锁、无副作用），可路由到只读副本
+        self.is_read = (
+            statement_type in _READ_STATEMENTS
+            and not needs_returning
+            and not _LOCKING_READ_RE.search(sql)
+        )
+        # 归一化指纹，用于按语句聚合性能统计
+        self.fingerprint = fingerprint_query(sql)
+
+    def bind_where(self, args: tuple) -> Optional[Dict[str, Any]]:
+        """用本次执行的参数填充WHERE列映射，得到 {列名: 值}"""
+        conditions = {}
+        for column, (kind, value) in self.where_columns.items():
+            if kind == 'param':
+                if value >= len(args):
+                    continue
+                conditions[column] = args[value]
+            else:
+                conditions[column] = value
+        return conditions or None
+
+    def bind_insert(self, columns: Tuple[str, ...], args: tuple) -> Optional[Dict[str, Any]]:
+        """从INSERT参数中取出指定列（通常是主键）的值，任一列缺失时返回None"""
+        values = {}
+        for column in columns:
+            index = self.insert_columns.get(column)
+            if index is None or index >= len(args) or args[index] is None:
+                return None
+            values[column] = args[index]
+        return values
+
+
+class SQLTranslator:
+    """带LRU缓存的PostgreSQL -> MySQL 查询翻译器"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max(1, max_size)
+        self._cache: "OrderedDict[str, CompiledQuery]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._translate_seconds = 0.0
+
+    def compile(self, query: str) -> CompiledQuery:
+        """获取查询的编译结果，未命中时编译并放入缓存"""
+        compiled = self._cache.get(query)
+        if compiled is not None:
+            self._hits += 1
+            self._cache.move_to_end(query)
+            return compiled
+
+        self._misses += 1
+        start = time.perf_counter()
+        compiled = self._translate(query)
+        self._translate_seconds += time.perf_counter() - start
+
+        self._cache[query] = compiled
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+        return compiled
+
+    def convert(self, query: str) -> str:
+        """只返回转换后的MySQL语句"""
+        return self.compile(query).sql
+
+    def clear(self) -> None:
+        """清空缓存（统计保留）"""
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中率与翻译耗时统计"""
+        total = self._hits + self._misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": round(self._hits / total, 4) if total else 0.0,
+            "total_translate_ms": round(self._translate_seconds * 1000, 3),
+            "avg_translate_us": round(self._translate_seconds * 1_000_000 / self._misses, 2) if self._misses else 0.0,
+        }
+
+    def _translate(self, query: str) -> CompiledQuery:
+        """执行一次完整的方言转换并提取元数据"""
+        # 替换占位符 $1, $2, $3... 为 %s
+        sql = _PLACEHOLDER_RE.sub('%s', query)
+
+        # 替换双引号标识符为反引号
+        sql = _QUOTED_IDENT_RE.sub(r'`\1`', sql)
+
+        # 替换PostgreSQL特定函数
+        sql = sql.replace('gen_random_uuid()', 'UUID()')
+        sql = sql.replace('NOW()', 'CURRENT_TIMESTAMP')
+
+        # 处理布尔值比较 - MySQL中TRUE/FALSE需要转换为1/0
+        sql = _EQ_TRUE_RE.sub('= 1', sql)
+        sql = _EQ_FALSE_RE.sub('= 0', sql)
+        sql = _IS_TRUE_RE.sub('= 1', sql)
+        sql = _IS_FALSE_RE.sub('= 0', sql)
+
+        # 处理RETURNING子句（MySQL不支持，由DatabaseManager模拟）
+        needs_returning = False
+        if _RETURNING_RE.search(sql):
+            sql = _RETURNING_RE.sub('', sql).rstrip()
+            needs_returning = True
+
+        stripped = query.lstrip()
+        statement_type = stripped.split(None, 1)[0].upper() if stripped else ''
+
+        table_name = None
+        where_columns: Dict[str, Tuple[str, Any]] = {}
+        where_complete = False
+        insert_columns: Dict[str, int] = {}
+        if statement_type == 'INSERT':
+            match = _INSERT_TABLE_RE.search(query)
+            table_name = match.group(1) if match else None
+            insert_columns = self._extract_insert_columns(query)
+        elif statement_type == 'UPDATE':
+            match = _UPDATE_TABLE_RE.search(query)
+            table_name = match.group(1) if match else None
+            where_columns, where_complete = self._extract_where_columns(query)
+
+        return CompiledQuery(sql, statement_type, needs_returning, table_name,
+                             where_columns, where_complete, insert_columns)
+
+    @staticmethod
+    def _extract_insert_columns(query: str) -> Dict[str, int]:
+        """解析单行 INSERT INTO t (c1, c2) VALUES ($1, $2) 的列与参数对应关系"""
+        match = _INSERT_COLUMNS_RE.search(query.strip())
+        if not match:
+            return {}
+
+        columns = [c.strip().strip('"`') for c in match.group(1).split(',')]
+        values = [v.strip() for v in match.group(2).split(',')]
+        if len(columns) != len(values):
+            # 多行VALUES或值表达式中含逗号，无法可靠对应
+            return {}
+
+        insert_columns = {}
+        for column, value in zip(columns, values):
+            if re.fullmatch(r'\$\d+', value):
+                insert_columns[column] = int(value[1:]) - 1
+        return insert_columns
+
+    @staticmethod
+    def _extract_where_columns(query: str) -> Tuple[Dict[str, Tuple[str, Any]], bool]:
+        """从WHERE子句中提取 列 = $n 以及布尔常量条件，并判断是否覆盖了全部条件"""
+        where_match = _WHERE_CLAUSE_RE.search(query)
+        if not where_match:
+            return {}, False
+
+        where_clause = where_match.group(1).strip()
+        columns: Dict[str, Tuple[str, Any]] = {}
+        for column, param_num in _WHERE_PARAM_RE.findall(where_clause):
+            columns[column] = ('param', int(param_num) - 1)  # $1 对应 args[0]
+
+        # PostgreSQL TRUE/FALSE -> MySQL 1/0
+        for column, bool_value in _WHERE_BOOL_RE.findall(where_clause):
+            columns.setdefault(column, ('literal', 1 if bool_value.upper() == 'TRUE' else 0))
+
+        terms = _WHERE_AND_RE.split(where_clause)
+        where_complete = bool(columns) and all(
+            (match := _WHERE_SIMPLE_TERM_RE.fullmatch(term.strip())) and match.group(1) in columns
+            for term in terms
+        )
+        return columns, where_complete
+
+
+# 全局翻译器实例，由DatabaseManager和连接包装器共享
+sql_translator = SQLTranslator(max_size=get_settings().database.query_cache_size)
+
+
+def get_sql_translator() -> SQLTranslator:
+    """获取全局SQL翻译器实例"""
+    return sql_translator
@@ -1,4 +1,4 @@
-import React, { useState, useCallback, useMemo, useEffect } from 'react';
+import React, { useState, useCallback, useMemo, useEffect, useRef } from 'react';
 import ReactFlow, {
   Node,
   Edge,
@@ -18,7 +18,7 @@ import ReactFlow, {
 import 'reactflow/dist/style.css';
 import { Button, Modal, Form, Input, Select, message, Card, Space, Tooltip } from 'antd';
 import { PlusOutlined, SaveOutlined, PlayCircleOutlined, DeleteOutlined } from '@ant-design/icons';
-import { nodeAPI, processorAPI, executionAPI } from '../services/api';
+import { nodeAPI, processorAPI, executionAPI, createIdempotencyKey } from '../services/api';
 
 const { Option } = Select;
 
@@ -72,6 +72,8 @@ const ReactFlowDesigner: React.FC<ReactFlowDesignerProps> = ({ workflowId, onSav
   const [nodes, setNodes, onNodesChange] = useNodesState([]);
   const [edges, setEdges, onEdgesChange] = useEdgesState([]);
   const [processors, setProcessors] = useState<any[]>([]);
+  // 请求返回前的重复点击复用同一请求与幂等键，后端只启动一次工作流
+  const pendingExecutionRef = useRef<{ key: string; data: any } | null>(null);
   const [addNodeModalVisible, setAddNodeModalVisible] = useState(false);
   const [nodeForm] = Form.useForm();
   const [selectedNode, setSelectedNode] = useState<Node | null>(null);
@@ -326,11 +328,18 @@ const ReactFlowDesigner: React.FC<ReactFlowDesignerProps> = ({ workflowId, onSav
         return;
       }
 
-      const response = await executionAPI.executeWorkflow({
-        workflow_base_id: workflowId,
-        workflow_instance_name: `执行_${Date.now()}`,
-        input_data: { test: 'data' },
-      });
+      if (!pendingExecutionRef.current || pendingExecutionRef.current.data.workflow_base_id !== workflowId) {
+        pendingExecutionRef.current = {
+          key: createIdempotencyKey(),
+          data: {
+            workflow_base_id: workflowId,
+            workflow_instance_name: `执行_${Date.now()}`,
+            input_data: { test: 'data' },
+          }
+        };
+      }
+      const { key, data } = pendingExecutionRef.current;
+      const response = await executionAPI.executeWorkflow(data, key);
 
       if (response.data && response.data.success) {
         message.success('工作流执行成功');
@@ -360,6 +369,8 @@ const ReactFlowDesigner: React.FC<ReactFlowDesignerProps> = ({ workflowId, onSav
       }
       
       message.error(errorMessage);
+    } finally {
+      pendingExecutionRef.current = null;
     }
   };
 
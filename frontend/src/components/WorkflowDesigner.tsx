@@ -18,7 +18,7 @@ import ReactFlow, {
 import 'reactflow/dist/style.css';
 import { Card, Button, Modal, Form, Input, Select, Space, message, Tag, Tooltip, Badge } from 'antd';
 import { PlusOutlined, PlayCircleOutlined, SaveOutlined, DeleteOutlined, ReloadOutlined, ExclamationCircleOutlined } from '@ant-design/icons';
-import { nodeAPI, processorAPI, executionAPI } from '../services/api';
+import { nodeAPI, processorAPI, executionAPI, createIdempotencyKey } from '../services/api';
 import { processorGroupAPI, groupAPI } from '../services/groupAPI';
 import { validateWorkflow, canSaveWorkflow, type ValidationResult } from '../utils/workflowValidation';
 import NodeAttachmentManager from './NodeAttachmentManager';
@@ -313,6 +313,8 @@ const WorkflowDesigner = forwardRef<WorkflowDesignerRef, WorkflowDesignerProps>(
   const [executionStatus, setExecutionStatus] = useState<any>(null);
   const [statusUpdateInterval, setStatusUpdateInterval] = useState<NodeJS.Timeout | null>(null);
   const reactFlowWrapper = useRef<HTMLDivElement>(null);
+  // 请求返回前的重复点击复用同一请求与幂等键，后端只启动一次工作流
+  const pendingExecutionRef = useRef<{ key: string; data: any } | null>(null);
   
   // 创建动态nodeTypes，传递processors数据，使用useMemo确保稳定引用
   const nodeTypes: NodeTypes = useMemo(() => ({
@@ -1076,17 +1078,20 @@ const WorkflowDesigner = forwardRef<WorkflowDesignerRef, WorkflowDesignerProps>(
     }
 
     try {
-      console.log('执行工作流请求:', {
-        workflow_base_id: workflowId,
-        input_data: {},
-        workflow_instance_name: `执行_${Date.now()}`
-      });
+      if (!pendingExecutionRef.current || pendingExecutionRef.current.data.workflow_base_id !== workflowId) {
+        pendingExecutionRef.current = {
+          key: createIdempotencyKey(),
+          data: {
+            workflow_base_id: workflowId,
+            input_data: {},
+            workflow_instance_name: `执行_${Date.now()}`
+          }
+        };
+      }
+      const { key, data } = pendingExecutionRef.current;
+      console.log('执行工作流请求:', data);
       
-      const result: any = await executionAPI.executeWorkflow({
-        workflow_base_id: workflowId,
-        input_data: {},
-        workflow_instance_name: `执行_${Date.now()}`
-      });
+      const result: any = await executionAPI.executeWorkflow(data, key);
       
       console.log('执行工作流响应:', result);
       setExecutionStatus(result);
@@ -1099,6 +1104,8 @@ const WorkflowDesigner = forwardRef<WorkflowDesignerRef, WorkflowDesignerProps>(
       console.error('执行工作流失败:', error);
       console.error('错误响应:', error.response?.data);
       message.error(error.response?.data?.detail || '执行工作流失败');
+    } finally {
+      pendingExecutionRef.current = null;
     }
   };
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Table, Tag, Button, Space, Modal, message, Tooltip, Badge, Progress, Tabs } from 'antd';
 import { PlayCircleOutlined, PauseCircleOutlined, StopOutlined, ReloadOutlined, EyeOutlined, InfoCircleOutlined, DeleteOutlined, BranchesOutlined, ExpandAltOutlined, ShrinkOutlined, MessageOutlined } from '@ant-design/icons';
 
@@ -18,7 +18,7 @@ import ReactFlow, {
   Position,
 } from 'reactflow';
 import 'reactflow/dist/style.css';
-import { executionAPI } from '../services/api';
+import { executionAPI, subscribeWorkflowEvents } from '../services/api';
 import { useSubWorkflowExpansion } from '../hooks/useSubWorkflowExpansion';
 // 导入重构的布局工具函数
 import { 
@@ -126,6 +126,7 @@ const WorkflowInstanceList: React.FC<WorkflowInstanceListProps> = ({
   const [selectedInstance, setSelectedInstance] = useState<WorkflowInstance | null>(null);
   const [autoRefresh, setAutoRefresh] = useState(false);
   const [refreshInterval, setRefreshInterval] = useState<NodeJS.Timeout | null>(null);
+  const [eventStreamConnected, setEventStreamConnected] = useState(false);
   const [statusFilter, setStatusFilter] = useState<string>('all');
   const [cancelModalVisible, setCancelModalVisible] = useState(false);
   const [deleteModalVisible, setDeleteModalVisible] = useState(false);
@@ -525,14 +526,46 @@ const WorkflowInstanceList: React.FC<WorkflowInstanceListProps> = ({
     }
   }, [visible, workflowBaseId]);
 
-  // 自动刷新机制 - 针对运行中的实例使用更高频率刷新
+  // 事件流回调中读取最新的实例列表与刷新函数
+  const fetchInstancesRef = useRef(fetchInstances);
+  fetchInstancesRef.current = fetchInstances;
+  const instancesRef = useRef(instances);
+  instancesRef.current = instances;
+
+  // 自动刷新开启时订阅工作流事件：列表中实例的状态/节点变化、新实例的状态事件与resync时刷新（合并1秒内的事件）
+  useEffect(() => {
+    if (!autoRefresh || !visible) return;
+
+    let debounceTimer: NodeJS.Timeout | null = null;
+    const unsubscribe = subscribeWorkflowEvents(
+      { types: ['workflow_status', 'node_status', 'nodes_changed'] },
+      (event) => {
+        const known = instancesRef.current.some((instance: any) => instance.instance_id === event.workflow_instance_id);
+        if (!known && event.type !== 'workflow_status' && event.type !== 'resync') return;
+        if (debounceTimer) return;
+        debounceTimer = setTimeout(() => {
+          debounceTimer = null;
+          fetchInstancesRef.current();
+        }, 1000);
+      },
+      setEventStreamConnected
+    );
+
+    return () => {
+      unsubscribe();
+      if (debounceTimer) clearTimeout(debounceTimer);
+      setEventStreamConnected(false);
+    };
+  }, [autoRefresh, visible]);
+
+  // 自动刷新机制 - 事件流已连接时只做低频兜底刷新，否则针对运行中的实例使用更高频率轮询
   useEffect(() => {
     if (autoRefresh && visible) {
       // 检查是否有运行中的实例
       const hasRunningInstances = instances.some((instance: any) => instance.status === 'running');
 
-      // 如果有运行中的实例，使用更高频率刷新（1.5秒），否则使用常规频率（5秒）
-      const refreshFrequency = hasRunningInstances ? 1500 : 5000;
+      // 事件流已连接：30秒兜底；否则有运行中的实例时1.5秒，其余5秒
+      const refreshFrequency = eventStreamConnected ? 30000 : (hasRunningInstances ? 1500 : 5000);
 
       const interval = setInterval(() => {
         console.log(`🔄 [自动刷新] 执行刷新 (频率: ${refreshFrequency}ms, 运行中实例: ${hasRunningInstances ? '是' : '否'})`);
@@ -549,7 +582,7 @@ const WorkflowInstanceList: React.FC<WorkflowInstanceListProps> = ({
         setRefreshInterval(null);
       }
     }
-  }, [autoRefresh, visible, instances]); // 添加instances依赖，当实例状态变化时重新设置刷新频率
+  }, [autoRefresh, visible, instances, eventStreamConnected]); // 实例状态或事件流连接变化时重新设置刷新频率
 
   // 组件卸载时清理定时器
   useEffect(() => {
@@ -1061,9 +1094,11 @@ const WorkflowInstanceList: React.FC<WorkflowInstanceListProps> = ({
               <Badge
                 status="processing"
                 text={
-                  instances.some((instance: any) => instance.status === 'running')
-                    ? "自动刷新中 (1.5秒间隔，有运行中实例)"
-                    : "自动刷新中 (5秒间隔)"
+                  eventStreamConnected
+                    ? "实时推送中 (事件流已连接)"
+                    : instances.some((instance: any) => instance.status === 'running')
+                      ? "自动刷新中 (1.5秒间隔，有运行中实例)"
+                      : "自动刷新中 (5秒间隔)"
                 }
               />
             )}
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, Button, Table, Tag, Modal, Form, Input, Select, Space, message, Row, Col, Typography, Empty, Drawer, Switch } from 'antd';
 import {
   PlusOutlined,
@@ -14,7 +14,7 @@ import {
   AppstoreOutlined
 } from '@ant-design/icons';
 import { useNavigate } from 'react-router-dom';
-import { workflowAPI, executionAPI, aiWorkflowAPI } from '../../services/api';
+import { workflowAPI, executionAPI, aiWorkflowAPI, createIdempotencyKey } from '../../services/api';
 import { useAuthStore } from '../../stores/authStore';
 import WorkflowDesigner from '../../components/WorkflowDesigner';
 import TabCompletionEnhancedDesigner from '../../components/TabCompletionEnhancedDesigner';
@@ -51,6 +51,8 @@ const WorkflowPage: React.FC = () => {
   const [currentWorkflow, setCurrentWorkflow] = useState<WorkflowItem | null>(null);
   const [instanceListVisible, setInstanceListVisible] = useState(false);
   const [createForm] = Form.useForm();
+  // 按工作流记录执行中的请求：请求返回前的重复点击复用同一请求与幂等键，后端只启动一次工作流
+  const pendingExecutionsRef = useRef<Map<string, { key: string; data: any }>>(new Map());
 
   // 导入导出相关状态
   const [importExportVisible, setImportExportVisible] = useState(false);
@@ -199,12 +201,20 @@ const WorkflowPage: React.FC = () => {
         throw new Error('实例名称不能为空');
       }
       
-      const requestData = {
-        workflow_base_id: workflowBaseId,
-        workflow_instance_name: instanceName,
-        input_data: {},  // 添加空的input_data
-        context_data: {}  // 添加空的context_data
-      };
+      let pending = pendingExecutionsRef.current.get(workflowBaseId);
+      if (!pending) {
+        pending = {
+          key: createIdempotencyKey(),
+          data: {
+            workflow_base_id: workflowBaseId,
+            workflow_instance_name: instanceName,
+            input_data: {},  // 添加空的input_data
+            context_data: {}  // 添加空的context_data
+          }
+        };
+        pendingExecutionsRef.current.set(workflowBaseId, pending);
+      }
+      const requestData = pending.data;
       
       console.log('发送的请求数据:', requestData);
       console.log('workflow对象:', workflow);
@@ -212,7 +222,7 @@ const WorkflowPage: React.FC = () => {
       console.log('workflow.id:', workflow.id);
       console.log('UUID验证结果:', uuidRegex.test(workflowBaseId));
       
-      await executionAPI.executeWorkflow(requestData);
+      await executionAPI.executeWorkflow(requestData, pending.key);
       message.success('工作流执行已启动');
       loadWorkflows();
     } catch (error: any) {
@@ -251,6 +261,8 @@ const WorkflowPage: React.FC = () => {
       }
       
       message.error(errorMessage);
+    } finally {
+      pendingExecutionsRef.current.delete(workflow.baseId || workflow.id);
     }
   };
 
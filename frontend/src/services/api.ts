@@ -513,10 +513,112 @@ export const testAPI = {
   runRealTest: (suiteName: string) => api.get(`/test/run-real/${suiteName}`),
 };
 
+// 工作流事件流中的一条事件
+export interface WorkflowStreamEvent {
+  id: string | null;
+  type: string;
+  workflow_instance_id: string | null;
+  data: any;
+  timestamp: number;
+}
+
+// 订阅工作流事件流（SSE）
+// EventSource 无法携带 Authorization 头，这里用 fetch 读取事件流；断线后携带 Last-Event-ID 重连，由后端补发期间的事件
+// 收到 type 为 resync 的事件时，调用方应重新全量读取数据
+export const subscribeWorkflowEvents = (
+  options: { workflowInstanceId?: string; types?: string[] },
+  onEvent: (event: WorkflowStreamEvent) => void,
+  onConnectionChange?: (connected: boolean) => void
+): (() => void) => {
+  const controller = new AbortController();
+  let lastEventId: string | null = null;
+  let retryMs = 3000;
+
+  const dispatch = (block: string) => {
+    let id: string | null = null;
+    const dataLines: string[] = [];
+    for (const line of block.split('\n')) {
+      // 以冒号开头的行是心跳注释
+      if (line.startsWith('id:')) id = line.slice(3).trim();
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).replace(/^ /, ''));
+      else if (line.startsWith('retry:')) retryMs = Number(line.slice(6).trim()) || retryMs;
+    }
+    if (id) lastEventId = id;
+    if (dataLines.length === 0) return;
+    try {
+      onEvent({ id, ...JSON.parse(dataLines.join('\n')) });
+    } catch (error) {
+      console.warn('⚠️ [事件流] 处理事件失败:', error);
+    }
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const params = new URLSearchParams();
+        if (options.workflowInstanceId) params.set('workflow_instance_id', options.workflowInstanceId);
+        if (options.types && options.types.length > 0) params.set('types', options.types.join(','));
+
+        const headers: Record<string, string> = { Accept: 'text/event-stream' };
+        const token = localStorage.getItem('token');
+        if (token) headers.Authorization = `Bearer ${token}`;
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+        const response = await fetch(`${api.defaults.baseURL}/execution/events/stream?${params.toString()}`, {
+          headers,
+          signal: controller.signal
+        });
+        if (response.status === 401 || response.status === 403) {
+          console.warn('⚠️ [事件流] 未授权，停止订阅');
+          onConnectionChange?.(false);
+          return;
+        }
+        if (!response.ok || !response.body) {
+          throw new Error(`事件流连接失败: ${response.status}`);
+        }
+        onConnectionChange?.(true);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let boundary = buffer.indexOf('\n\n');
+          while (boundary >= 0) {
+            dispatch(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf('\n\n');
+          }
+        }
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        console.warn('⚠️ [事件流] 连接中断，稍后重连:', error);
+      }
+      onConnectionChange?.(false);
+      await new Promise(resolve => setTimeout(resolve, retryMs));
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+};
+
+// 生成一次执行操作的幂等键
+export const createIdempotencyKey = (): string => {
+  if (typeof crypto !== 'undefined' && typeof (crypto as any).randomUUID === 'function') {
+    return (crypto as any).randomUUID();
+  }
+  // 非安全上下文（http访问）下没有randomUUID
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+};
+
 // 执行相关API
 export const executionAPI = {
   // 执行工作流
-  executeWorkflow: (data: { workflow_base_id: string; workflow_instance_name: string; input_data?: any; context_data?: any }) => {
+  // idempotencyKey: 同一次执行操作的重试/重复点击使用同一个键，后端只启动一次工作流
+  executeWorkflow: (data: { workflow_base_id: string; workflow_instance_name: string; input_data?: any; context_data?: any }, idempotencyKey?: string) => {
     // 确保字段名正确，防止任何可能的字段名错误
     const requestData = {
       workflow_base_id: data.workflow_base_id,
@@ -527,7 +629,8 @@ export const executionAPI = {
     
     console.log('🔧 API层发送的数据:', requestData);
     
-    return api.post('/execution/workflows/execute', requestData);
+    return api.post('/execution/workflows/execute', requestData,
+      idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined);
   },
 
   // 控制工作流
@@ -540,7 +643,7 @@ export const executionAPI = {
 
   // 获取工作流实例详细状态
   getWorkflowInstanceDetail: (instanceId: string) =>
-    api.get(`/execution/workflows/${instanceId}/status`),
+    api.get(`/execution/workflows/${instanceId}/status`, { params: { include_node_data: true } }),
 
   // 获取工作流节点详细输出信息 - 统一使用task-flow接口
   getWorkflowNodesDetail: (instanceId: string) =>
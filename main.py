@@ -88,6 +88,7 @@ from backend.api.group import router as group_router
 from backend.api.task_conversation import router as task_conversation_router
 from backend.api.simulator_conversation import router as simulator_conversation_router
 from backend.utils.database import initialize_database, close_database
+from backend.utils.db_replicas import set_read_routing, READ_ROUTING_PRIMARY
 from backend.utils.exceptions import BusinessException, ErrorResponse
 from backend.services.execution_service import execution_engine
 from backend.services.agent_task_service import agent_task_service
@@ -128,6 +129,10 @@ async def log_requests(request: Request, call_next):
         logger.trace(f"收到删除处理器请求: {request.url.path}")
         logger.trace(f"完整URL: {request.url}")
     
+    # 读写分离：写请求（及显式要求强一致的读请求）内的所有读走主库
+    if request.method not in ("GET", "HEAD") or request.headers.get("X-DB-Read-Consistency") == "primary":
+        set_read_routing(READ_ROUTING_PRIMARY)
+    
     response = await call_next(request)
     
     # 记录响应信息